@@ -8,34 +8,118 @@ from datetime import timedelta
 # from pathlib import Path
 
 # from server.database.file_crudmanager import FileCrudManager
+# from server.database.sqlite_crudmanager import SqliteCrudManager
 from server.database.mongo_crudmanager import MongoCrudManager
+from server.database.caching_crudmanager import CachingCrudManager
 from server.database.filter import PrimitiveFilter
 from server.database.aggregate_filter import AggregateFilter
 from server.database.paging import Paging
+from server.database.id_generator import createIdGenerator
 from server.services.flask_context import FlaskContext
+from server.services.task_executor import TaskExecutor
 from server.services.userauth import PasswordService, UserAuthenticationService
 from server.services.entity_creation_service import EntityCreationService
 from server.services.search_service import SearchService
+from server.services.view_counter import ViewCountAggregator
 from server.services.update_service import UpdateService
 from server.services.delete_service import DeleteService
 from server.services.session import SessionService
+from server.services.user_cache import UserCache
+from server.services.search_index import SearchIndex
 from server.services.image_scaler import ImageScaler
 from server.services.searchfilter_creator import SearchFilterCreator
 from server.middleware.request_user import RequestUserManager
 
+
+def readFlag(name, default=False):
+    """
+    Reads boolean flag from environment variable,
+    which is set by any of '1', 'true' and 'yes' regardless of case
+
+    Args:
+        name(str): name of environment variable
+        default(bool): value when variable is not set
+    Returns:
+        bool
+    """
+    value = os.environ.get(name, None)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
 # object initialization
+# ids are allocated from counters unless ID_GENERATOR is 'ulid' or 'snowflake'
+# see server/database/id_generator.py before switching on existing data
+id_generator = createIdGenerator(
+    os.environ.get('ID_GENERATOR', 'counter'),
+    workerId=int( os.environ.get('ID_WORKER', 0) ),
+)
+# thread pool shared among requests to run independent repository calls concurrently
+task_executor = TaskExecutor(
+    maxWorkers=int( os.environ.get('TASK_EXECUTOR_WORKERS', TaskExecutor.DEFAULT_MAX_WORKERS) ),
+    timeout=float( os.environ.get('TASK_EXECUTOR_TIMEOUT', TaskExecutor.DEFAULT_TIMEOUT) ),
+)
 repo = MongoCrudManager(
     os.environ.get('MONGO_DBNAME', 'TEST_MYFORUMWEBAPP'),
     PasswordService,
+    useFacetSearch=True,
+    idGenerator=id_generator,
+    executor=task_executor,
+    # looks up search terms through text indexes, see server/database/text_search.py
+    useTextSearch=readFlag('MONGO_TEXT_SEARCH'),
 )
-# repo = FileCrudManager(Path(DATA_LOCATION), AUTHENTICATION_SERVICE)
+# repo = FileCrudManager(
+#     Path(DATA_LOCATION), AUTHENTICATION_SERVICE, storage=os.environ.get('FILE_STORAGE', 'file')
+# )
+# repo = SqliteCrudManager(
+#     os.environ.get('SQLITE_DATABASE', 'myforumwebapp.sqlite3'), PasswordService,
+#     idGenerator=id_generator,
+# )
+# set to None when repo is not backed by mongoDB
+index_manager = repo.createIndexManager()
+# search results are cached in process only when REPOSITORY_CACHE_SIZE is set above 0.
+# writes only evict results cached by the process that made them,
+# so enable it only when the app runs as a single process;
+# with multiple workers, others serve stale results until ttl elapses
+repository_cache_size = int( os.environ.get('REPOSITORY_CACHE_SIZE', 0) )
+if repository_cache_size > 0:
+    repo = CachingCrudManager(
+        repo,
+        ttls={
+            entityType: float( os.environ.get(f'REPOSITORY_CACHE_TTL_{entityType.upper()}', ttl) )
+            for entityType, ttl in CachingCrudManager.DEFAULT_TTLS.items()
+        },
+        maxSize=repository_cache_size,
+    )
 flask_context = FlaskContext()
-session_service = SessionService(repo, flask_context)
+# session users are cached in process only when USER_CACHE_SIZE is set above 0.
+# changed and deleted users are only invalidated in the process that changed them,
+# so enable it only when the app runs as a single process;
+# with multiple workers, others keep serving stale or deleted users until ttl elapses
+user_cache_size = int( os.environ.get('USER_CACHE_SIZE', 0) )
+user_cache = UserCache(
+    ttl=float( os.environ.get('USER_CACHE_TTL', UserCache.DEFAULT_TTL) ),
+    maxSize=user_cache_size,
+) if user_cache_size > 0 else None
+session_service = SessionService(repo, flask_context, user_cache)
 request_user = RequestUserManager(session_service)
-creation_service = EntityCreationService(repo, PrimitiveFilter, session_service)
-search_service = SearchService(repo, SearchFilterCreator, PrimitiveFilter, AggregateFilter, Paging)
-update_service = UpdateService(repo, PrimitiveFilter, session_service)
-delete_service = DeleteService(repo, session_service)
+# search terms of posts and threads are looked up in memory when SEARCH_INDEX is set
+search_index = SearchIndex(
+    maxResults=int( os.environ.get('SEARCH_INDEX_MAX_RESULTS', SearchIndex.DEFAULT_MAX_RESULTS) ),
+) if readFlag('SEARCH_INDEX') else None
+creation_service = EntityCreationService(repo, PrimitiveFilter, session_service, search_index)
+view_counter = ViewCountAggregator(
+    repo,
+    flushInterval=float( os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 5.0) ),
+    flushSize=int( os.environ.get('VIEW_COUNT_FLUSH_SIZE', 1000) ),
+)
+search_service = SearchService(
+    repo, SearchFilterCreator, PrimitiveFilter, AggregateFilter, Paging, view_counter,
+    searchIndex=search_index,
+)
+update_service = UpdateService(repo, PrimitiveFilter, session_service, user_cache, search_index)
+delete_service = DeleteService(repo, session_service, user_cache, search_index)
 image_scaler = ImageScaler()
 authentication_service = UserAuthenticationService(repo, PrimitiveFilter, session_service)
 
@@ -48,6 +132,7 @@ class Config:
     # can be replaced during tests
 
     DATABASE_REPOSITORY = repo
+    INDEX_MANAGER = index_manager
     SEARCH_FILTER = PrimitiveFilter
     AGGREGATE_FILTER = AggregateFilter
     SEARCH_FILTER_CREATOR = SearchFilterCreator
@@ -61,11 +146,21 @@ class Config:
     UPDATE_SERVICE = update_service
     DELETE_SERVICE = delete_service
     IMAGE_SCALER = image_scaler
+    VIEW_COUNTER = view_counter
+    USER_CACHE = user_cache
+    SEARCH_INDEX = search_index
     AUTHENTICATION_SERVICE = authentication_service
+    TASK_EXECUTOR = task_executor
 
     # middlewares
     REQUESTUSER_MIDDLEWARE = request_user
 
+    # warn at startup when indexes declared by entities are missing on database
+    CHECK_DB_INDEXES = readFlag('CHECK_DB_INDEXES')
+
+    # load anonymous user from repo at startup, see SessionService.load_anonymous_user
+    PRELOAD_ANONYMOUS_USER = readFlag('PRELOAD_ANONYMOUS_USER', default=True)
+
     # for session
     SECRET_KEY = os.environ.get('SECRET_KEY')
     # define how long session information would be held by client
@@ -73,7 +168,7 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(days=31)
 
     # cookies are only sent over SSL connection
-    SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', False)
+    SESSION_COOKIE_SECURE = readFlag('SESSION_COOKIE_SECURE')
 
     # methods to extract config from app
 
@@ -81,6 +176,10 @@ class Config:
     def getDB(app):
         return app.config['DATABASE_REPOSITORY']
 
+    @staticmethod
+    def getIndexManager(app):
+        return app.config['INDEX_MANAGER']
+
     @staticmethod
     def getFilter(app):
         return app.config['SEARCH_FILTER']
@@ -125,6 +224,22 @@ class Config:
     def getImageScaler(app):
         return app.config['IMAGE_SCALER']
 
+    @staticmethod
+    def getViewCounter(app):
+        return app.config['VIEW_COUNTER']
+
+    @staticmethod
+    def getUserCache(app):
+        return app.config['USER_CACHE']
+
+    @staticmethod
+    def getSearchIndex(app):
+        return app.config['SEARCH_INDEX']
+
+    @staticmethod
+    def getTaskExecutor(app):
+        return app.config['TASK_EXECUTOR']
+
     @staticmethod
     def getRequestUserManager(app):
         return app.config['REQUESTUSER_MIDDLEWARE']
@@ -4,7 +4,9 @@ This file houses aggregate search filters like
 AND, OR, NOT
 """
 
-from server.database.filter import Filter
+from server.database.filter import (
+    Filter, EQFilter, NullFilter, sortCanonically, containsValue,
+)
 
 
 class AggregateFilter(Filter):
@@ -43,6 +45,17 @@ class AggregateFilter(Filter):
         """
         raise NotImplementedError
 
+    def getFilters(self):
+        """
+        Lists filters aggregated directly under this aggregate
+
+        Args:
+            None
+        Returns:
+            list of filters, which can be primitive or aggregate
+        """
+        return list(self._filters)
+
     def appendFilter(self, filter):
         """
         Append a filter under this aggregate
@@ -75,6 +88,140 @@ class AggregateFilter(Filter):
         """
         raise NotImplementedError
 
+    def getSqlFilter(self, table):
+        """
+        get parameterized SQL condition that relates conditions of filters
+        
+        Args:
+            table(SqliteTable): table that creates SQL expressions of fields
+        Returns:
+            tuple of SQL condition and list of parameters
+        """
+        if len(self._filters) == 0:
+            # empty aggregates do not filter anything, same as matches()
+            return '1', []
+
+        conditions = []
+        params = []
+        for f in self._filters:
+            condition, filterParams = f.getSqlFilter(table)
+            conditions.append(condition)
+            params += filterParams
+
+        joint = f' {self.getOpString().upper()} '
+        return '(' + joint.join(conditions) + ')', params
+
+    def normalize(self):
+        """
+        Creates equivalent filter in canonical form:
+            - nested aggregates of the same type are flattened into this aggregate
+            - empty aggregates are removed, as they do not filter anything
+            - eq filters on the same field are merged into a single eq filter,
+              under and only when one of them holds all values of the other
+            - aggregates left with a single filter are replaced by the filter
+            - filters are ordered stably, as their order does not affect matches
+        Aggregate itself is left unchanged.
+
+        Args:
+            None
+        Returns:
+            Filter in canonical form, NullFilter when nothing is left to filter
+        """
+        opstring = self.getOpString()
+        filters = []
+        for f in self._filters:
+            normalized = f.normalize()
+            if isinstance(normalized, NullFilter):
+                if self._isNullFilterAbsorbing():
+                    return normalized
+                continue
+
+            if isinstance(normalized, AggregateFilter) and normalized.getOpString() == opstring:
+                filters.extend(normalized._filters)
+            else:
+                filters.append(normalized)
+
+        filters = self._mergeEQFilters(filters)
+        if len(filters) == 0:
+            return NullFilter()
+        if len(filters) == 1:
+            return filters[0]
+
+        filters = sortCanonically(filters, key=lambda f: repr( f._describe() ))
+        return AggregateFilter.createFilter(opstring, filters)
+
+    def compile(self):
+        """
+        Creates predicate equivalent to matches() from normalized form of aggregate,
+        so that redundant aggregates are not evaluated per entity.
+        Predicates of filters short-circuit like python's and/or.
+
+        Args:
+            None
+        Returns:
+            function that takes an entity and returns Boolean
+        """
+        normalized = self.normalize()
+        if not isinstance(normalized, AggregateFilter):
+            return normalized.compile()
+
+        predicates = tuple( f.compile() for f in normalized._filters )
+        return normalized._combinePredicates(predicates)
+
+    def _combinePredicates(self, predicates):
+        """
+        Creates predicate that relates predicates of at least 2 filters
+        """
+        raise NotImplementedError
+
+    def _mergeEQFilters(self, filters):
+        """
+        Merges eq filters that share a field, in place of the first of them.
+        Eq filters whose values can not be combined are left as they are.
+        """
+        valuesByField = {}
+        for f in filters:
+            if not isinstance(f, EQFilter):
+                continue
+
+            valueGroups = valuesByField.setdefault(f.getField(), [])
+            values = f.getValues()
+            for idx, groupValues in enumerate(valueGroups):
+                combined = self._combineValues(groupValues, values)
+                if combined is not None:
+                    valueGroups[idx] = combined
+                    break
+            else:
+                valueGroups.append(values)
+
+        merged = []
+        for f in filters:
+            if not isinstance(f, EQFilter):
+                merged.append(f)
+            elif f.getField() in valuesByField:
+                for values in valuesByField.pop( f.getField() ):
+                    merged.append( EQFilter(dict(field=f.getField(), value=values)).normalize() )
+
+        return merged
+
+    def _isNullFilterAbsorbing(self):
+        """
+        Determines if aggregate matches everything once it contains a filter that does
+        """
+        raise NotImplementedError
+
+    def _combineValues(self, values, otherValues):
+        """
+        Combines values of 2 eq filters on the same field into values of a single one
+
+        Returns:
+            list of values, None when filters can not be combined
+        """
+        raise NotImplementedError
+
+    def _describe(self):
+        return (self.getOpString(), tuple( f._describe() for f in self._filters ))
+
     def __len__(self):
         """
         Determines the amount of direct child filter this aggregate contains
@@ -102,6 +249,8 @@ class AggregateFilter(Filter):
             self._filters == other._filters
         ])
 
+    __hash__ = Filter.__hash__
+
 
 class AndFilter(AggregateFilter):
     """
@@ -135,6 +284,31 @@ class AndFilter(AggregateFilter):
     def __len__(self):
         return len(self._filters)
 
+    def _isNullFilterAbsorbing(self):
+        return False
+
+    def _combinePredicates(self, predicates):
+        if len(predicates) == 2:
+            first, second = predicates
+            return lambda entity: first(entity) and second(entity)
+
+        def matchesAll(entity):
+            for predicate in predicates:
+                if not predicate(entity):
+                    return False
+            return True
+
+        return matchesAll
+
+    def _combineValues(self, values, otherValues):
+        # array field can hold a value of each filter without holding any value of both,
+        # so filters only narrow down to one of them that the other holds all values of
+        if all( containsValue(otherValues, value) for value in values ):
+            return values
+        if all( containsValue(values, value) for value in otherValues ):
+            return otherValues
+        return None
+
 
 class OrFilter(AggregateFilter):
     """
@@ -173,3 +347,22 @@ class OrFilter(AggregateFilter):
 
     def __len__(self):
         return len(self._filters)
+
+    def _isNullFilterAbsorbing(self):
+        return True
+
+    def _combinePredicates(self, predicates):
+        if len(predicates) == 2:
+            first, second = predicates
+            return lambda entity: first(entity) or second(entity)
+
+        def matchesAny(entity):
+            for predicate in predicates:
+                if predicate(entity):
+                    return True
+            return False
+
+        return matchesAny
+
+    def _combineValues(self, values, otherValues):
+        return values + [ value for value in otherValues if not containsValue(values, value) ]
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses the class CachingCrudManager.
+It implements the CrudManager class by caching search results of another CrudManager.
+"""
+import threading
+import time
+from collections import OrderedDict, Counter, namedtuple
+from contextlib import contextmanager
+
+from server.database.crudmanager import CrudManager
+
+CacheEntry = namedtuple('CacheEntry', [ 'result', 'expiresAt', 'entityTypes' ])
+
+
+class CachingCrudManager(CrudManager):
+    """
+    Implements CrudManager interface by delegating to another CrudManager,
+    like MongoCrudManager or FileCrudManager, and caching results of searches.
+
+    Results are cached by search method, filter and search options, bounded by:
+        - ttls
+            seconds results of each entity type are served, keyed by
+            'users', 'posts' and 'threads'
+        - maxSize
+            amount of results kept, least recently used result is evicted beyond it
+
+    Creating, updating or deleting entities of a type evicts every cached result
+    that contains entities of the type, including threads joined with relations.
+    Writes made by other processes are not seen until ttl elapses.
+
+    Cached entities are copied on each read,
+    so that callers can join relations to them without changing the cache.
+    """
+    DEFAULT_TTLS = dict(users=60.0, posts=10.0, threads=10.0)
+    DEFAULT_MAX_SIZE = 1000
+
+    def __init__(self, repo, ttls=None, maxSize=DEFAULT_MAX_SIZE, clock=time.monotonic):
+        self._repo = repo
+        self._ttls = { **self.DEFAULT_TTLS, **(ttls or {}) }
+        self._maxSize = maxSize
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._keysByEntityType = { entityType: set() for entityType in self._ttls }
+        # incremented on each write, so that results searched during writes are not cached
+        self._versions = Counter()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # SearchService joins relations on repo side only when repo supports it
+        if hasattr(repo, 'searchThreadWithRelations'):
+            self.searchThreadWithRelations = self._searchThreadWithRelations
+
+    def createUser(self, user):
+        with self._invalidating('users'):
+            return self._repo.createUser(user)
+
+    def searchUser(self, searchFilter, **options):
+        return self._search(
+            self._repo.searchUser, 'searchUser', 'users', ('users',), searchFilter, options
+        )
+
+    def deleteUser(self, searchFilter):
+        with self._invalidating('users'):
+            return self._repo.deleteUser(searchFilter)
+
+    def updateUser(self, searchFilter, user):
+        with self._invalidating('users'):
+            return self._repo.updateUser(searchFilter, user)
+
+    def createPost(self, post):
+        with self._invalidating('posts'):
+            return self._repo.createPost(post)
+
+    def searchPost(self, searchFilter, **options):
+        return self._search(
+            self._repo.searchPost, 'searchPost', 'posts', ('posts',), searchFilter, options
+        )
+
+    def deletePost(self, searchFilter):
+        with self._invalidating('posts'):
+            return self._repo.deletePost(searchFilter)
+
+    def updatePost(self, searchFilter, post):
+        with self._invalidating('posts'):
+            return self._repo.updatePost(searchFilter, post)
+
+    def createThread(self, thread):
+        with self._invalidating('threads'):
+            return self._repo.createThread(thread)
+
+    def searchThread(self, searchFilter, **options):
+        return self._search(
+            self._repo.searchThread, 'searchThread', 'threads', ('threads',),
+            searchFilter, options
+        )
+
+    def _searchThreadWithRelations(self, searchFilter, **options):
+        return self._search(
+            self._repo.searchThreadWithRelations, 'searchThreadWithRelations', 'threads',
+            ('threads', 'posts', 'users'), searchFilter, options
+        )
+
+    def updateThread(self, searchFilter, thread):
+        with self._invalidating('threads'):
+            return self._repo.updateThread(searchFilter, thread)
+
+    def incrementThreadViews(self, viewCounts):
+        with self._invalidating('threads'):
+            return self._repo.incrementThreadViews(viewCounts)
+
+    def deleteThread(self, searchFilter):
+        with self._invalidating('threads'):
+            return self._repo.deleteThread(searchFilter)
+
+    def flush(self):
+        return self._repo.flush()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for keys in self._keysByEntityType.values():
+                keys.clear()
+
+    def getStats(self):
+        """
+        Reports effectiveness of cache
+
+        Args:
+            None
+        Returns:
+            dict of hits, misses and number of cached results
+        """
+        with self._lock:
+            return dict(
+                hits=self._hits,
+                misses=self._misses,
+                size=len(self._entries),
+            )
+
+    def _search(self, search, methodName, resultKey, entityTypes, searchFilter, options):
+        """
+        Reads result of search from cache, or searches repo and caches its result
+
+        Args:
+            search(func): search method of repo
+            methodName(str): name of search method, to tell apart results of methods
+            resultKey(str): key of entities in result, like 'users'
+            entityTypes(tuple): types of entities contained in result
+            searchFilter(Filter): filter to pass to search
+            options(dict): search options like paging, sorter and projection
+        Returns:
+            dict: result of search
+        """
+        key = self._createKey(methodName, searchFilter, options)
+        with self._lock:
+            entry = self._entries.get(key, None)
+            isHit = entry is not None and entry.expiresAt > self._clock()
+            if isHit:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            else:
+                if entry is not None:
+                    self._removeEntry(key)
+                self._misses += 1
+                versions = self._getVersions(entityTypes)
+
+        if isHit:
+            return self._copyResult(entry.result, resultKey)
+
+        result = search(searchFilter, **options)
+
+        with self._lock:
+            # entities were written while searching, result may already be stale
+            if versions == self._getVersions(entityTypes):
+                self._putEntry(key, result, resultKey, entityTypes)
+
+        return result
+
+    def _createKey(self, methodName, searchFilter, options):
+        filterKey = None if searchFilter is None else searchFilter.getCacheKey()
+        optionKeys = tuple(sorted(
+            (name, option.getCacheKey()) for name, option in options.items()
+        ))
+        return (methodName, filterKey, optionKeys)
+
+    def _putEntry(self, key, result, resultKey, entityTypes):
+        ttl = min( self._ttls[entityType] for entityType in entityTypes )
+        if key in self._entries:
+            self._removeEntry(key)
+        self._entries[key] = CacheEntry(
+            self._copyResult(result, resultKey), self._clock() + ttl, entityTypes
+        )
+        for entityType in entityTypes:
+            self._keysByEntityType[entityType].add(key)
+
+        while len(self._entries) > self._maxSize:
+            oldestKey = next( iter(self._entries) )
+            self._removeEntry(oldestKey)
+
+    def _removeEntry(self, key):
+        entry = self._entries.pop(key)
+        for entityType in entry.entityTypes:
+            self._keysByEntityType[entityType].discard(key)
+
+    def _getVersions(self, entityTypes):
+        return tuple( self._versions[entityType] for entityType in entityTypes )
+
+    def _invalidate(self, entityType):
+        with self._lock:
+            self._versions[entityType] += 1
+            for key in list( self._keysByEntityType[entityType] ):
+                self._removeEntry(key)
+
+    @contextmanager
+    def _invalidating(self, entityType):
+        """
+        Evicts results of entity type once the write in block completes,
+        even when the write failed partway
+        """
+        try:
+            yield
+        finally:
+            self._invalidate(entityType)
+
+    def _copyResult(self, result, resultKey):
+        copied = dict(result)
+        copied[resultKey] = [ self._copyEntity(entity) for entity in result[resultKey] ]
+        return copied
+
+    def _copyEntity(self, entity):
+        attrs = {
+            attr: list(value) if isinstance(value, list) else value
+            for attr, value in entity._get_attrs().items()
+        }
+        return entity.__class__.from_storage(attrs)
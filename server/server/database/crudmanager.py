@@ -42,5 +42,12 @@ class CrudManager:
     def updateThread(self, searchFilter, thread):
         raise NotImplementedError
 
+    def incrementThreadViews(self, viewCounts):
+        raise NotImplementedError
+
     def deleteThread(self, searchFilter):
         raise NotImplementedError
+
+    def flush(self):
+        # makes writes buffered by repo durable, called on shutdown
+        return None
@@ -3,73 +3,65 @@
 This file houses class for file-based database system
 Used during the early phases of development
 """
-import json
 import time
 import logging
 
+import server.json_codec as json_codec
 from server.database.sorter import NullSorter
 from server.database.crudmanager import CrudManager
 from server.database.paging import Paging
+from server.database.projection import Projection
+from server.database.filter import PrimitiveFilter
+from server.database.file_table import createFileTable
 from server.entity import User, Post, Thread
 
 
 logger = logging.getLogger(__name__)
 
 
-def updateJSONFileContent(filenameAttr):
-    """
-    The issue was that I was writing the code below over and over:
-    1. read file content
-    2. edit the content
-    3. write the updated content back to the file
-    1 and 3 is essentially the same every time.
-    So the motivation was to isolate step 2 from the rest of recurring code.
-    This decorator helps achieve this.
-
-    usage:
-    @updateJSONFileContent(<filenameAttr>)
-    def updateContent(self, arg, filecontent=None):
-        ... # do something with filecontent and update it
-
-    """
-    def updateJSONFileContentDecorator(func):
-        def wrapper(*args):
-            filename = getattr(args[0], filenameAttr)  # args[0] refers to self
-            with filename.open('r', encoding='utf-8') as f:
-                filecontent = json.load(f)
-
-            # update filecontent with func
-            # None wont appear in *args
-            response = func(*args, filecontent)
-            
-            with filename.open('w') as f:
-                json.dump(filecontent, f)
-
-            return response
-        return wrapper
-    return updateJSONFileContentDecorator
-
-
 class FileCrudManager(CrudManager):
     USERS_FILENAME = 'users.json'
     POSTS_FILENAME = 'posts.json'
     THREADS_FILENAME = 'threads.json'
     COUNTERS_FILENAME = 'counters.json'
+    # fields to index in memory, ids and ids of related entities are looked up by eq filters
+    USERS_HASH_FIELDS = [ 'userId', 'userName' ]
+    POSTS_HASH_FIELDS = [ 'postId', 'userId', 'threadId' ]
+    THREADS_HASH_FIELDS = [ 'threadId', 'userId', 'boardId' ]
+    SORTED_FIELDS = [ 'createdAt' ]
 
-    def __init__(self, filePath, passwordService):
+    def __init__(self, filePath, passwordService, idGenerator=None, storage='file'):
         self._saveLocation = filePath
         self._usersFile = self.createIfNotExist(self._saveLocation / self.USERS_FILENAME)
         self._postsFile = self.createIfNotExist(self._saveLocation / self.POSTS_FILENAME)
         self._threadsFile = self.createIfNotExist(self._saveLocation / self.THREADS_FILENAME)
         self._countersFile = self.createIfNotExist(self._saveLocation / self.COUNTERS_FILENAME)
+        # 'file' writes whole file on each change, 'log' appends changes to log next to file
+        self._usersTable = createFileTable(
+            storage, self._usersFile,
+            hashFields=self.USERS_HASH_FIELDS, sortedFields=self.SORTED_FIELDS,
+        )
+        self._postsTable = createFileTable(
+            storage, self._postsFile,
+            hashFields=self.POSTS_HASH_FIELDS, sortedFields=self.SORTED_FIELDS,
+        )
+        self._threadsTable = createFileTable(
+            storage, self._threadsFile,
+            hashFields=self.THREADS_HASH_FIELDS, sortedFields=self.SORTED_FIELDS,
+        )
+        self._countersTable = createFileTable(
+            storage, self._countersFile, hashFields=[ 'fieldname' ]
+        )
         self._passwordService = passwordService
+        # ids are allocated from counters file unless generator is given
+        self._idGenerator = idGenerator
 
     def createIfNotExist(self, filePath):
         if not filePath.exists():
             directoryPath = filePath.parents[0]
             directoryPath.mkdir(parents=True, exist_ok=True)
-            with filePath.open('w', encoding='utf-8') as f:
-                json.dump([], f)
+            with filePath.open('wb') as f:
+                json_codec.dump([], f)
 
         return filePath
 
@@ -78,10 +70,9 @@ class FileCrudManager(CrudManager):
 
         attrs['createdAt'] = time.time()
         attrs['password'] = self._passwordService.hashPassword( attrs['password'] )
-        attrs['userId'] = str( self._getCounter('userId') )
+        attrs['userId'] = self._generateId('userId')
         
-        self._createUserImpl(attrs)
-        self._incrementCounter('userId')
+        self._usersTable.insert(attrs)
 
         return dict(
             createdCount=1,
@@ -89,31 +80,19 @@ class FileCrudManager(CrudManager):
         )
 
     def searchUser(self, searchFilter, **options):
-        self._setDefaultSearchOptions(options)
-        paging = options.get('paging')
-        sorter = options.get('sorter')
-
-        with self._usersFile.open('r', encoding='utf-8') as f:
-            users = json.load(f)
-
-        if searchFilter is None:
-            matchedUsers = users
-        else:
-            matchedUsers = [
-                user for user in users
-                if searchFilter.matches(user)
-            ]
-        sortedUsers = sorter.sort(matchedUsers)
-        returnUsers = paging.slice(sortedUsers)
+        returnUsers, matchedCount, nextCursor = self._searchEntities(
+            self._usersTable, User, 'userId', searchFilter, options
+        )
         
         return {
-            'users': [ User(user) for user in returnUsers ],
+            'users': [ User.from_storage(user) for user in returnUsers ],
             'returnCount': len(returnUsers),
-            'matchedCount': len(matchedUsers),
+            'matchedCount': matchedCount,
+            'nextCursor': nextCursor,
         }
 
     def deleteUser(self, searchFilter):
-        return self._deleteUserImpl(searchFilter)
+        return dict(deleteCount=self._usersTable.delete(searchFilter))
 
     def updateUser(self, searchFilter, user):
         attrs = user.to_update()
@@ -121,16 +100,15 @@ class FileCrudManager(CrudManager):
             hashed = self._passwordService.hashPassword( attrs['password'] )
             attrs['password'] = hashed
         
-        return self._updateUserImpl(searchFilter, attrs)
+        return self._updateEntities(self._usersTable, searchFilter, attrs)
         
     def createPost(self, post):
         attrs = post.to_create()
 
         attrs['createdAt'] = time.time()
-        attrs['postId'] = str( self._getCounter('postId') )
+        attrs['postId'] = self._generateId('postId')
 
-        self._createPostImpl(attrs)
-        self._incrementCounter('postId')
+        self._postsTable.insert(attrs)
 
         return dict(
             createdCount=1,
@@ -138,45 +116,32 @@ class FileCrudManager(CrudManager):
         )
 
     def searchPost(self, searchFilter, **options):
-        self._setDefaultSearchOptions(options)
-        paging = options.get('paging')
-        sorter = options.get('sorter')
-
-        with self._postsFile.open('r', encoding='utf-8') as f:
-            posts = json.load(f)
-
-        if searchFilter is None:
-            matchedPosts = posts
-        else:
-            matchedPosts = [
-                post for post in posts
-                if searchFilter.matches(post)
-            ]
-        sortedPosts = sorter.sort(matchedPosts)
-        returnPosts = paging.slice(sortedPosts)
+        returnPosts, matchedCount, nextCursor = self._searchEntities(
+            self._postsTable, Post, 'postId', searchFilter, options
+        )
 
         return {
-            'posts': [ Post(post) for post in returnPosts ],
+            'posts': [ Post.from_storage(post) for post in returnPosts ],
             'returnCount': len(returnPosts),
-            'matchedCount': len(matchedPosts),
+            'matchedCount': matchedCount,
+            'nextCursor': nextCursor,
         }
 
     def deletePost(self, searchFilter):
-        return self._deletePostImpl(searchFilter)
+        return dict(deleteCount=self._postsTable.delete(searchFilter))
 
     def updatePost(self, searchFilter, post):
         attrs = post.to_update()
 
-        return self._updatePostImpl(searchFilter, attrs)
+        return self._updateEntities(self._postsTable, searchFilter, attrs)
 
     def createThread(self, thread):
         attrs = thread.to_create()
 
         attrs['createdAt'] = time.time()
-        attrs['threadId'] = str( self._getCounter('threadId') )
+        attrs['threadId'] = self._generateId('threadId')
 
-        self._createThreadImpl(attrs)
-        self._incrementCounter('threadId')
+        self._threadsTable.insert(attrs)
 
         return dict(
             createdCount=1,
@@ -184,29 +149,15 @@ class FileCrudManager(CrudManager):
         )
 
     def searchThread(self, searchFilter, **options):
-        self._setDefaultSearchOptions(options)
-        paging = options.get('paging')
-        sorter = options.get('sorter')
-
-        with self._threadsFile.open('r', encoding='utf-8') as f:
-            threads = json.load(f)
-
-        if searchFilter is None:
-            matchedThreads = threads
-        else:
-            matchedThreads = [
-                thread for thread in threads
-                if searchFilter.matches(thread)
-            ]
-        sortedThreads = sorter.sort(matchedThreads)
-        returnThreads = paging.slice(sortedThreads)
-
-        print(returnThreads)
+        returnThreads, matchedCount, nextCursor = self._searchEntities(
+            self._threadsTable, Thread, 'threadId', searchFilter, options
+        )
 
         return dict(
-            threads=[ Thread(thread) for thread in returnThreads ],
-            matchedCount=len(matchedThreads),
+            threads=[ Thread.from_storage(thread) for thread in returnThreads ],
+            matchedCount=matchedCount,
             returnCount=len(returnThreads),
+            nextCursor=nextCursor,
         )
 
     def updateThread(self, searchFilter, thread):
@@ -214,146 +165,141 @@ class FileCrudManager(CrudManager):
 
         return self._updateThreadImpl(searchFilter, attrs)
 
+    def incrementThreadViews(self, viewCounts):
+        return self._incrementThreadViewsImpl(viewCounts)
+
     def deleteThread(self, searchFilter):
-        return self._deleteThreadImpl(searchFilter)
-
-    @updateJSONFileContent('_usersFile')
-    def _createUserImpl(self, user, currentUsers=None):
-        currentUsers.append(user)
-
-    @updateJSONFileContent('_usersFile')
-    def _deleteUserImpl(self, searchFilter, currentUsers=None):
-        deleteCount = 0
-
-        def matches(user):
-            isMatched = searchFilter.matches(user)
-            if isMatched:
-                nonlocal deleteCount
-                deleteCount += 1
-            return isMatched
-
-        currentUsers[:] = [
-            user for user in currentUsers
-            if not matches(user)
-        ]
+        return dict(deleteCount=self._threadsTable.delete(searchFilter))
+
+    def flush(self):
+        """
+        Syncs changes to tables that are not synced to disk yet
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        tables = [ self._usersTable, self._postsTable, self._threadsTable, self._countersTable ]
+        for table in tables:
+            table.flush()
+
+    def _updateThreadImpl(self, searchFilter, update_attrs):
+        fieldUpdate = update_attrs.copy()
+        incrementFieldToUpdate = update_attrs.pop('increment', None)
 
-        return dict(deleteCount=deleteCount)
-                
-    @updateJSONFileContent('_usersFile')
-    def _updateUserImpl(self, searchFilter, user_attrs, currentUsers=None):
-        # find out which element in list needs update
-        userIdxToUpdate = [
-            idx for idx, u in enumerate(currentUsers)
-            if searchFilter.matches(u)
-        ]
-        
-        # apply update
-        for idx in userIdxToUpdate:
-            for field, value in user_attrs.items():
-                currentUsers[idx][field] = value
+        def applyUpdate(thread):
+            for field in fieldUpdate.keys():
+                thread[field] = fieldUpdate[field]
+            if incrementFieldToUpdate is not None:
+                thread[incrementFieldToUpdate] += 1
+
+        matchedCount = self._threadsTable.update(searchFilter, applyUpdate)
 
         return dict(
-            matchedCount=len(userIdxToUpdate),
-            updatedCount=len(userIdxToUpdate),
+            matchedCount=matchedCount,
+            updatedCount=matchedCount,
         )
-        
-    @updateJSONFileContent('_postsFile')
-    def _createPostImpl(self, post, currentPosts=None):
-        currentPosts.append(post)
-
-    @updateJSONFileContent('_postsFile')
-    def _deletePostImpl(self, searchFilter, currentPosts=None):
-        deleteCount = 0
-
-        def matches(user):
-            isMatched = searchFilter.matches(user)
-            if isMatched:
-                nonlocal deleteCount
-                deleteCount += 1
-            return isMatched
-
-        currentPosts[:] = [
-            post for post in currentPosts
-            if not matches(post)
-        ]
 
-        return dict(deleteCount=deleteCount)
+    def _incrementThreadViewsImpl(self, viewCounts):
+        # all counts are applied with a single write of the file
+        def applyViews(thread):
+            thread['views'] = thread.get('views', 0) + viewCounts[ thread['threadId'] ]
 
-    @updateJSONFileContent('_postsFile')
-    def _updatePostImpl(self, searchFilter, post_attrs, currentPosts=None):
-        # determine which element in list needs update
-        postIdxToUpdate = [
-            idx for idx, p in enumerate(currentPosts)
-            if searchFilter.matches(p)
-        ]
-        # apply update
-        for idx in postIdxToUpdate:
-            for field, value in post_attrs.items():
-                currentPosts[idx][field] = value
+        matchedCount = self._threadsTable.update(
+            self._createEQFilter('threadId', list(viewCounts)), applyViews
+        )
 
         return dict(
-            matchedCount=len(postIdxToUpdate),
-            updatedCount=len(postIdxToUpdate),
+            matchedCount=matchedCount,
+            updatedCount=matchedCount,
         )
 
-    @updateJSONFileContent('_threadsFile')
-    def _createThreadImpl(self, thread_attrs, currentThreads=None):
-        currentThreads.append(thread_attrs)
-
-    @updateJSONFileContent('_threadsFile')
-    def _updateThreadImpl(self, searchFilter, update_attrs, currentThreads=None):
-        threadIdxToUpdate = [
-            idx for idx, t in enumerate(currentThreads)
-            if searchFilter.matches(t)
-        ]
+    def _updateEntities(self, table, searchFilter, attrs):
+        def applyUpdate(entity):
+            for field, value in attrs.items():
+                entity[field] = value
 
-        fieldUpdate = update_attrs.copy()
-        incrementFieldToUpdate = update_attrs.pop('increment', None)
-
-        for idx in threadIdxToUpdate:
-            for field in fieldUpdate.keys():
-                currentThreads[idx][field] = fieldUpdate[field]
-            if incrementFieldToUpdate is not None:
-                currentThreads[idx][incrementFieldToUpdate] += 1
+        matchedCount = table.update(searchFilter, applyUpdate)
 
         return dict(
-            matchedCount=len(threadIdxToUpdate),
-            updatedCount=len(threadIdxToUpdate),
+            matchedCount=matchedCount,
+            updatedCount=matchedCount,
         )
 
-    @updateJSONFileContent('_threadsFile')
-    def _deleteThreadImpl(self, searchFilter, currentThreads=None):
-        deleteCount = 0
+    def _generateId(self, fieldname):
+        if self._idGenerator is not None:
+            return self._idGenerator.generateId(fieldname)
 
-        def matches(thread):
-            isMatched = searchFilter.matches(thread)
-            if isMatched:
-                nonlocal deleteCount
-                deleteCount += 1
-            return isMatched
+        nextId = str( self._getCounter(fieldname) )
+        self._incrementCounter(fieldname)
+        return nextId
 
-        currentThreads[:] = [
-            thread for thread in currentThreads
-            if not matches(thread)
-        ]
+    def _getCounter(self, fieldname):
+        counters = self._countersTable.select( self._createEQFilter('fieldname', [ fieldname ]) )
+        for counter in counters:
+            return counter['value']
 
-        return dict(deleteCount=deleteCount)
+    def _incrementCounter(self, fieldname):
+        def increment(counter):
+            counter['value'] += 1
 
-    def _getCounter(self, fieldname):
-        with self._countersFile.open('r', encoding='utf-8') as f:
-            counters = json.load(f)
-            for counter in counters:
-                if counter['fieldname'] == fieldname:
-                    return counter['value']
-
-    @updateJSONFileContent('_countersFile')
-    def _incrementCounter(self, fieldname, currentCounters=None):
-        for counter in currentCounters:
-            if counter['fieldname'] == fieldname:
-                counter['value'] += 1
+        self._countersTable.update( self._createEQFilter('fieldname', [ fieldname ]), increment )
+
+    def _createEQFilter(self, field, values):
+        return PrimitiveFilter.createFilter(dict(field=field, operator='eq', value=values))
+
+    def _searchEntities(self, table, entityClass, idField, searchFilter, options):
+        """
+        Filters, sorts, pages and projects raw entities read from file
+        
+        Args:
+            table(FileTable): table of raw entities in file
+            entityClass(class): entity class that describes attributes of entities
+            idField(str): fieldname that uniquely identifies entities
+            searchFilter(Filter): filter to apply, None would match all entities
+            options(dict): search options like paging and sorter
+        Returns:
+            tuple of entities in page, total matched count and cursor to next page
+        """
+        self._setDefaultSearchOptions(options)
+        paging = options.get('paging')
+        sorter = options.get('sorter')
+        projection = options.get('projection')
+
+        matchedEntities = table.select(searchFilter)
+
+        if paging.usesKeyset():
+            # narrow down to entities after keyset before sorting,
+            # so that only the remaining entities are sorted
+            keyset = paging.getKeyset()
+            remainingEntities = matchedEntities if keyset is None else [
+                entity for entity in matchedEntities
+                if sorter.isAfterKeyset(entity, keyset, idField)
+            ]
+            sortedEntities = sorter.sortKeyset(remainingEntities, idField, paging.getEnd())
+        else:
+            # only entities up to the end of page are sorted
+            sortedEntities = sorter.sort(matchedEntities, paging.getEnd())
+        returnEntities = paging.slice(sortedEntities)
+        nextCursor = paging.createNextCursor(returnEntities, sorter, idField)
+        # keep the same fields as MongoCrudManager, which needs them to create cursors
+        requiredFields = [ idField ] + sorter.getSortFields()
+        # rows are kept in memory by table, so lists in them are copied before handing out
+        returnEntities = [
+            {
+                field: list(value) if isinstance(value, list) else value
+                for field, value in projection.project(entity, entityClass, requiredFields).items()
+            }
+            for entity in returnEntities
+        ]
+
+        return returnEntities, len(matchedEntities), nextCursor
 
     def _setDefaultSearchOptions(self, options):
         if 'paging' not in options:
             options['paging'] = Paging()
         if 'sorter' not in options:
             options['sorter'] = NullSorter()
+        if 'projection' not in options:
+            options['projection'] = Projection()
@@ -77,9 +77,10 @@ class S3FileRepository(FileRepository):
             )
 
         try:
+            matches = searchFilter.compile()
             return [
                 file_info for file_info in response['Contents']
-                if searchFilter.matches(file_info)
+                if matches(file_info)
             ]
         except Exception as e:
             logging.error(e)
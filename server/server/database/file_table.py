@@ -0,0 +1,672 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses class that keeps rows of a JSON file in memory, for FileCrudManager.
+Rows are indexed by field, so that searches, updates and deletes
+do not have to scan every row of the file.
+"""
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+
+import server.json_codec as json_codec
+from server.database.filter import EQFilter, RangeFilter
+from server.database.aggregate_filter import AndFilter
+
+logger = logging.getLogger(__name__)
+
+# stands for fields missing in row, as None can be a value of field
+_MISSING = object()
+
+
+class HashIndex:
+    """
+    Maps each value of a field to ordinals of rows that have the value.
+    Serves eq filters.
+    """
+    def __init__(self, field):
+        self._field = field
+        self._ordinalsByValue = {}
+
+    def add(self, ordinal, row):
+        value = row.get(self._field, _MISSING)
+        if value is _MISSING:
+            return
+        try:
+            self._ordinalsByValue.setdefault(value, []).append(ordinal)
+        except TypeError:
+            # values like lists only equal unhashable values, which are never looked up
+            pass
+
+    def remove(self, ordinal, row):
+        value = row.get(self._field, _MISSING)
+        try:
+            ordinals = self._ordinalsByValue.get(value, None)
+        except TypeError:
+            return
+        if ordinals is None:
+            return
+
+        ordinals.remove(ordinal)
+        if len(ordinals) == 0:
+            del self._ordinalsByValue[value]
+
+    def lookup(self, values):
+        """
+        Finds rows whose field equals any of values
+
+        Args:
+            values(list): values to look for
+        Returns:
+            list of ordinals in no particular order,
+            None when values can not be looked up
+        """
+        ordinals = []
+        for value in values:
+            try:
+                ordinals.extend( self._ordinalsByValue.get(value, ()) )
+            except TypeError:
+                return None
+        return ordinals
+
+
+class SortedIndex:
+    """
+    Keeps numeric values of a field in order, along with ordinals of rows.
+    Serves gt, gte, lt and lte filters.
+    Rows whose value is not a number are left out,
+    as they can not be compared against numbers in the first place.
+    """
+    def __init__(self, field):
+        self._field = field
+        # (value, ordinal) pairs in ascending order
+        self._entries = []
+
+    def build(self, rows):
+        self._entries = sorted(
+            (row[self._field], ordinal) for ordinal, row in rows.items()
+            if self._isIndexable(row)
+        )
+
+    def add(self, ordinal, row):
+        if self._isIndexable(row):
+            insort(self._entries, (row[self._field], ordinal))
+
+    def remove(self, ordinal, row):
+        if not self._isIndexable(row):
+            return
+        idx = bisect_left(self._entries, (row[self._field], ordinal))
+        del self._entries[idx]
+
+    def lookup(self, opstring, value):
+        """
+        Finds rows whose field compares to value as operator of range filter does
+
+        Args:
+            opstring(str): one of 'gt', 'gte', 'lt' and 'lte'
+            value: value to compare field against
+        Returns:
+            list of ordinals in no particular order,
+            None when value can not be looked up
+        """
+        if not self._isNumber(value):
+            return None
+
+        if opstring == 'gt':
+            entries = self._entries[ bisect_right(self._entries, (value, math.inf)): ]
+        elif opstring == 'gte':
+            entries = self._entries[ bisect_left(self._entries, (value, -math.inf)): ]
+        elif opstring == 'lt':
+            entries = self._entries[ :bisect_left(self._entries, (value, -math.inf)) ]
+        elif opstring == 'lte':
+            entries = self._entries[ :bisect_right(self._entries, (value, math.inf)) ]
+        else:
+            return None
+
+        return [ ordinal for _, ordinal in entries ]
+
+    def _isIndexable(self, row):
+        return self._isNumber( row.get(self._field, _MISSING) )
+
+    @staticmethod
+    def _isNumber(value):
+        # nan is left out, as it does not compare to anything
+        return isinstance(value, (int, float)) and value == value
+
+
+class FileTable:
+    """
+    Rows of a JSON file that holds a list of objects, kept in memory.
+
+    Rows are read once and read again only when the file is changed by someone else,
+    which is told by modification time, size and inode of the file.
+    Every write is written through to the file.
+
+    Indexes are created on first use for:
+        - hashFields
+            fields looked up by eq filters, like ids
+        - sortedFields
+            numeric fields looked up by range filters, like createdAt
+    and maintained on every write from then on.
+    A filter, or any filter directly under an and filter, that an index serves
+    narrows down rows to check against the whole filter.
+    Every row is checked when no index serves the filter.
+    """
+    # file written within this many nanoseconds before it was read could be written
+    # again without changing its modification time, and is read again to be safe.
+    # rows and indexes are kept when its content turns out to be unchanged
+    RACY_WINDOW_NS = 20 * 1000 * 1000
+    # indexes are created again rather than maintained
+    # once a write changes more rows than this
+    MAX_MAINTAINED_CHANGES = 100
+
+    def __init__(self, path, hashFields=(), sortedFields=()):
+        self._path = path
+        self._hashFields = frozenset(hashFields)
+        self._sortedFields = frozenset(sortedFields)
+        self._lock = threading.RLock()
+        # rows by ordinal, ordinals being in the order rows appear in file
+        self._rows = {}
+        self._nextOrdinal = 0
+        self._indexes = {}
+        self._signature = None
+        self._syncedAt = 0
+        # crc32 of content read or written last, tells racy file apart from changed one
+        self._checksum = None
+
+    def select(self, searchFilter):
+        """
+        Finds rows that match filter.
+        Rows are shared with the table and must not be changed.
+
+        Args:
+            searchFilter(Filter): filter to apply, None would match all rows
+        Returns:
+            list of rows in the order they appear in file
+        """
+        with self._lock:
+            self._refresh()
+            if searchFilter is None:
+                return list( self._rows.values() )
+
+            return [ self._rows[ordinal] for ordinal in self._selectOrdinals(searchFilter) ]
+
+    def insert(self, row):
+        """
+        Appends row to the file
+
+        Args:
+            row(dict): row to append
+        Returns:
+            None
+        """
+        with self._writing():
+            ordinal = self._nextOrdinal
+            self._nextOrdinal += 1
+            self._rows[ordinal] = row
+            for index in self._indexes.values():
+                index.add(ordinal, row)
+            self._save( dict(op='insert', row=row) )
+
+    def update(self, searchFilter, apply):
+        """
+        Changes rows that match filter
+
+        Args:
+            searchFilter(Filter): filter to apply
+            apply(func): takes a matched row and changes it in place
+        Returns:
+            int: amount of rows matched
+        """
+        with self._writing():
+            ordinals = self._selectOrdinals(searchFilter)
+            isMaintained = len(ordinals) <= self.MAX_MAINTAINED_CHANGES
+            if not isMaintained:
+                self._indexes.clear()
+
+            for ordinal in ordinals:
+                row = self._rows[ordinal]
+                if isMaintained:
+                    self._unindex(ordinal, row)
+                apply(row)
+                if isMaintained:
+                    self._index(ordinal, row)
+
+            self._save( dict(
+                op='update', ordinals=ordinals, rows=[ self._rows[ordinal] for ordinal in ordinals ]
+            ) )
+            return len(ordinals)
+
+    def delete(self, searchFilter):
+        """
+        Removes rows that match filter
+
+        Args:
+            searchFilter(Filter): filter to apply
+        Returns:
+            int: amount of rows removed
+        """
+        with self._writing():
+            ordinals = self._selectOrdinals(searchFilter)
+            isMaintained = len(ordinals) <= self.MAX_MAINTAINED_CHANGES
+            if not isMaintained:
+                self._indexes.clear()
+
+            for ordinal in ordinals:
+                row = self._rows.pop(ordinal)
+                if isMaintained:
+                    self._unindex(ordinal, row)
+
+            self._save( dict(op='delete', ordinals=ordinals) )
+            return len(ordinals)
+
+    def flush(self):
+        """
+        Makes writes durable, which they are already as each write replaces the file
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        return None
+
+    def _selectOrdinals(self, searchFilter):
+        normalized = searchFilter.normalize()
+        matches = normalized.compile()
+        candidates = self._plan(normalized)
+        if candidates is None:
+            return [ ordinal for ordinal, row in self._rows.items() if matches(row) ]
+
+        rows = self._rows
+        return [ ordinal for ordinal in sorted(candidates) if matches( rows[ordinal] ) ]
+
+    def _plan(self, normalized):
+        """
+        Picks the index lookup that leaves the fewest rows to check against filter
+
+        Args:
+            normalized(Filter): filter in canonical form
+        Returns:
+            list of ordinals of rows that could match, None when every row has to be checked
+        """
+        filters = normalized.getFilters() if isinstance(normalized, AndFilter) else [ normalized ]
+        bestCandidates = None
+        for f in filters:
+            candidates = self._lookup(f)
+            if candidates is not None and (
+                bestCandidates is None or len(candidates) < len(bestCandidates)
+            ):
+                bestCandidates = candidates
+
+        return bestCandidates
+
+    def _lookup(self, f):
+        if isinstance(f, EQFilter) and f.getField() in self._hashFields:
+            return self._getIndex( f.getField(), HashIndex ).lookup( f.getValues() )
+
+        if isinstance(f, RangeFilter) and f.getField() in self._sortedFields:
+            values = f.getValues()
+            if len(values) == 0:
+                return None
+            return self._getIndex( f.getField(), SortedIndex ).lookup( f.getOpString(), values[0] )
+
+        return None
+
+    def _getIndex(self, field, indexClass):
+        index = self._indexes.get(field, None)
+        if index is None:
+            index = indexClass(field)
+            if isinstance(index, SortedIndex):
+                index.build(self._rows)
+            else:
+                for ordinal, row in self._rows.items():
+                    index.add(ordinal, row)
+            self._indexes[field] = index
+
+        return index
+
+    def _index(self, ordinal, row):
+        for index in self._indexes.values():
+            index.add(ordinal, row)
+
+    def _unindex(self, ordinal, row):
+        for index in self._indexes.values():
+            index.remove(ordinal, row)
+
+    @contextmanager
+    def _writing(self):
+        """
+        Changes rows in block, which saves the change before it completes.
+        Rows are read again from file when changes failed partway.
+        """
+        with self._lock:
+            self._refresh()
+            try:
+                yield
+            except BaseException:
+                self._signature = None
+                raise
+
+    def _save(self, change):
+        """
+        Saves change made to rows to file
+
+        Args:
+            change(dict): describes change by op, being one of 'insert', 'update' and 'delete'
+        Returns:
+            None
+        """
+        content = json_codec.dumps( list( self._rows.values() ) )
+        with self._path.open('wb') as f:
+            f.write(content)
+        self._signature = self._stat()
+        self._syncedAt = time.time_ns()
+        self._checksum = zlib.crc32(content)
+
+    def _refresh(self):
+        signature = self._stat()
+        isRacy = signature[0] >= self._syncedAt - self.RACY_WINDOW_NS
+        if signature == self._signature and not isRacy:
+            return
+
+        syncedAt = time.time_ns()
+        with self._path.open('rb') as f:
+            content = f.read()
+        checksum = zlib.crc32(content)
+        self._syncedAt = syncedAt
+        if signature == self._signature and checksum == self._checksum:
+            # racy file still holds rows read or written last, keep rows and indexes
+            return
+
+        self._setRows( json_codec.loads(content) )
+        self._signature = signature
+        self._checksum = checksum
+
+    def _setRows(self, rows):
+        self._rows = dict( enumerate(rows) )
+        self._nextOrdinal = len(rows)
+        self._indexes = {}
+
+    def _stat(self):
+        stat = os.stat(self._path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class LogFileTable(FileTable):
+    """
+    Same as FileTable, but changes are appended to a JSON lines log next to the file,
+    named like posts.json.log, instead of writing the whole file on every change.
+
+    Log starts with a header that identifies the file it applies to by checksum,
+    followed by a line for each change.
+    Rows are read from file and changes in log are replayed on them on first use.
+    A log that does not apply to the file is ignored,
+    as is a line left partially written by a process that died while writing it.
+
+    Changes are written to the log right away and survive the process dying.
+    To survive losing power as well, they are synced to disk in batches of:
+        - fsyncEvery
+            amount of changes
+        - fsyncInterval
+            seconds since the last sync, changes left unsynced at the end of a burst
+            are synced by a timer once it elapses
+    Once log holds compactEvery changes, rows are written to a temporary file
+    that replaces the file, and log is started over.
+
+    Only this table is expected to write the file and log,
+    which are read again when their modification time, size or inode changes.
+    """
+    DEFAULT_COMPACT_EVERY = 1000
+    DEFAULT_FSYNC_EVERY = 100
+    DEFAULT_FSYNC_INTERVAL = 1.0
+
+    def __init__(
+        self, path, hashFields=(), sortedFields=(),
+        compactEvery=DEFAULT_COMPACT_EVERY, fsyncEvery=DEFAULT_FSYNC_EVERY,
+        fsyncInterval=DEFAULT_FSYNC_INTERVAL, clock=time.monotonic,
+    ):
+        super().__init__(path, hashFields=hashFields, sortedFields=sortedFields)
+        self._logPath = path.with_name(path.name + '.log')
+        self._compactEvery = compactEvery
+        self._fsyncEvery = fsyncEvery
+        self._fsyncInterval = fsyncInterval
+        self._clock = clock
+        self._logFile = None
+        self._logSignature = None
+        # byte offset where the last complete line in log ends, None when log does not apply
+        self._logEnd = None
+        self._header = None
+        self._changeCount = 0
+        self._unsyncedCount = 0
+        self._lastFsyncAt = clock()
+        self._syncTimer = None
+
+    def compact(self):
+        """
+        Writes rows to file and starts log over
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        with self._writing():
+            self._compact()
+
+    def flush(self):
+        """
+        Syncs changes in log to disk
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        with self._lock:
+            self._sync()
+
+    def _save(self, change):
+        line = json_codec.dumps(change) + b'\n'
+        logFile = self._openLog()
+        logFile.write(line)
+        logFile.flush()
+        self._logEnd += len(line)
+        self._changeCount += 1
+        self._unsyncedCount += 1
+
+        isBatchFull = self._unsyncedCount >= self._fsyncEvery
+        if isBatchFull or self._clock() - self._lastFsyncAt >= self._fsyncInterval:
+            self._sync()
+        else:
+            self._scheduleSync()
+        self._logSignature = self._statLog()
+
+        if self._changeCount >= self._compactEvery:
+            self._compact()
+
+    def _refresh(self):
+        signature, logSignature = self._stat(), self._statLog()
+        if signature == self._signature and logSignature == self._logSignature:
+            return
+
+        self._closeLog()
+        with self._path.open('rb') as f:
+            content = f.read()
+        self._setRows( json_codec.loads(content) )
+        self._header = self._createHeader(content)
+        self._replayLog()
+        self._signature = signature
+        self._logSignature = logSignature
+
+    def _replayLog(self):
+        """
+        Applies changes in log that were made to rows read from file
+        """
+        self._logEnd = None
+        self._changeCount = 0
+        try:
+            logFile = self._logPath.open('rb')
+        except FileNotFoundError:
+            return
+
+        with logFile:
+            headerLine = logFile.readline()
+            if not self._isHeaderOf(headerLine):
+                logger.warning(f'Ignoring {self._logPath}, which does not apply to {self._path}')
+                return
+
+            logEnd = len(headerLine)
+            for line in logFile:
+                try:
+                    change = json_codec.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    change = None
+                if change is None:
+                    logger.warning(f'Ignoring broken {self._logPath} from byte {logEnd} on')
+                    break
+
+                self._applyChange(change)
+                self._changeCount += 1
+                logEnd += len(line)
+
+        self._logEnd = logEnd
+
+    def _applyChange(self, change):
+        op = change['op']
+        if op == 'insert':
+            self._rows[self._nextOrdinal] = change['row']
+            self._nextOrdinal += 1
+        elif op == 'update':
+            for ordinal, row in zip(change['ordinals'], change['rows']):
+                self._rows[ordinal] = row
+        elif op == 'delete':
+            for ordinal in change['ordinals']:
+                self._rows.pop(ordinal, None)
+
+    def _openLog(self):
+        if self._logFile is not None:
+            return self._logFile
+
+        if self._logEnd is None:
+            self._writeAtomically(self._logPath, self._header + b'\n')
+            self._logEnd = len(self._header) + 1
+            self._changeCount = 0
+
+        self._logFile = self._logPath.open('ab')
+        # drops partially written line left behind, so that changes are appended after
+        # the last complete line
+        self._logFile.truncate(self._logEnd)
+        return self._logFile
+
+    def _compact(self):
+        content = json_codec.dumps( list( self._rows.values() ) )
+        header = self._createHeader(content)
+        # once file is replaced, log that is left behind by dying in between
+        # does not apply to file anymore, and is ignored
+        self._closeLog()
+        self._writeAtomically(self._path, content)
+        self._writeAtomically(self._logPath, header + b'\n')
+
+        self._setRows( list( self._rows.values() ) )
+        self._header = header
+        self._logEnd = len(header) + 1
+        self._changeCount = 0
+        self._signature = self._stat()
+        self._logSignature = self._statLog()
+
+    def _sync(self):
+        if self._logFile is not None:
+            os.fsync( self._logFile.fileno() )
+        self._unsyncedCount = 0
+        self._lastFsyncAt = self._clock()
+
+    def _scheduleSync(self):
+        """
+        Starts timer that syncs log once fsyncInterval elapsed since the last sync,
+        unless one is running already
+        """
+        if self._syncTimer is not None:
+            return
+
+        delay = max(self._fsyncInterval - (self._clock() - self._lastFsyncAt), 0.0)
+        self._syncTimer = threading.Timer(delay, self._syncUnsynced)
+        self._syncTimer.daemon = True
+        self._syncTimer.start()
+
+    def _syncUnsynced(self):
+        with self._lock:
+            self._syncTimer = None
+            if self._unsyncedCount > 0:
+                self._sync()
+
+    def _closeLog(self):
+        if self._logFile is None:
+            return
+
+        try:
+            self._sync()
+            self._logFile.close()
+        finally:
+            self._logFile = None
+
+    def _writeAtomically(self, path, content):
+        temporaryPath = path.with_name(path.name + '.tmp')
+        with temporaryPath.open('wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync( f.fileno() )
+        os.replace(temporaryPath, path)
+        self._syncDirectory()
+
+    def _syncDirectory(self):
+        # makes rename survive losing power, directories can not be opened on some platforms
+        try:
+            fd = os.open(self._path.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _isHeaderOf(self, headerLine):
+        return headerLine.endswith(b'\n') and headerLine[:-1] == self._header
+
+    @staticmethod
+    def _createHeader(content):
+        return json_codec.dumps( dict(checksum=zlib.crc32(content), size=len(content)) )
+
+    def _statLog(self):
+        try:
+            stat = os.stat(self._logPath)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def createFileTable(storage, path, hashFields=(), sortedFields=()):
+    """
+    Creates table by name of the way it stores changes
+
+    Args:
+        storage(str): 'file' to write whole file on each change,
+            'log' to append changes to log
+        path(Path): path to JSON file that holds rows
+        hashFields(list): fields to look up by eq filters
+        sortedFields(list): fields to look up by range filters
+    Returns:
+        FileTable
+    """
+    if storage is None or storage == 'file':
+        return FileTable(path, hashFields=hashFields, sortedFields=sortedFields)
+    if storage == 'log':
+        return LogFileTable(path, hashFields=hashFields, sortedFields=sortedFields)
+
+    raise ValueError(f'Unknown file storage: {storage}')
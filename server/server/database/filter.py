@@ -1,7 +1,86 @@
+import functools
+import operator
+import re
+
 from cerberus import Validator
 
 from server.exceptions import FilterParseError, InvalidFilterOperatorError
 
+# stands for fields missing in entity, as None can be a value of field
+_MISSING = object()
+# number of compiled patterns of regex filters kept by compileRegex()
+REGEX_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compileRegex(pattern):
+    """
+    Compiles regular expression, reusing patterns compiled recently,
+    as the same patterns are searched for by many filters and entities
+
+    Args:
+        pattern(str): regular expression
+    Returns:
+        compiled pattern
+    """
+    return re.compile(pattern)
+
+
+def sortCanonically(items, key=repr):
+    """
+    Orders items in a stable order that does not depend on their original order,
+    even when items are of types that can not be compared with each other
+
+    Args:
+        items(iterable): items to order
+        key(func): creates value to order items by, compared as string
+    Returns:
+        list of ordered items
+    """
+    return sorted(items, key=lambda item: ( type(item).__name__, key(item) ))
+
+
+def containsValue(values, value):
+    """
+    Determines if values hold value of the same type,
+    so that values like 1 and True, that python regards equal, are told apart
+
+    Args:
+        values(list): values to look in
+        value: value to look for, which may be unhashable
+    Returns:
+        Boolean
+    """
+    return any( type(other) is type(value) and other == value for other in values )
+
+
+def dedupeValues(values):
+    """
+    Removes values equal to and of the same type as a value before them.
+    Unhashable values like lists and dicts are compared one by one.
+
+    Args:
+        values(iterable): values to dedupe
+    Returns:
+        list of values in their original order
+    """
+    deduped = []
+    seen = set()
+    unhashables = []
+    for value in values:
+        try:
+            key = (type(value), value)
+            if key in seen:
+                continue
+            seen.add(key)
+        except TypeError:
+            if containsValue(unhashables, value):
+                continue
+            unhashables.append(value)
+        deduped.append(value)
+
+    return deduped
+
 
 class Filter:
     """
@@ -23,6 +102,17 @@ class Filter:
         formulates a mongo filter that can be used for searching documents
         """
         raise NotImplementedError
+
+    def getSqlFilter(self, table):
+        """
+        formulates a parameterized SQL condition that can be used for searching rows
+
+        Args:
+            table(SqliteTable): table that creates SQL expressions of fields
+        Returns:
+            tuple of SQL condition and list of parameters
+        """
+        raise NotImplementedError
     
     def matches(self, entity):
         """
@@ -30,6 +120,42 @@ class Filter:
         """
         raise NotImplementedError
 
+    def compile(self):
+        """
+        Creates predicate equivalent to matches(), specialized for this filter,
+        for when the same filter is evaluated against many entities.
+        Filter should not be modified while its predicate is in use.
+
+        Returns:
+            function that takes an entity and returns Boolean
+        """
+        raise NotImplementedError
+
+    def normalize(self):
+        """
+        Creates equivalent filter in canonical form, so that filters
+        that match the same entities are written the same way where possible.
+        Filter itself is left unchanged.
+        """
+        raise NotImplementedError
+
+    def getCacheKey(self):
+        """
+        Creates hashable canonical key of filter.
+        Filters that are equal after normalization have equal keys,
+        so that results of searches can be cached by filter.
+        """
+        return self.normalize()._describe()
+
+    def __hash__(self):
+        return hash( self.getCacheKey() )
+
+    def _describe(self):
+        """
+        Creates hashable value that describes structure of filter as is
+        """
+        raise NotImplementedError
+
     @staticmethod
     def createNullFilter():
         """
@@ -114,6 +240,26 @@ class PrimitiveFilter(Filter):
             self._values == other._values,
         ])
 
+    __hash__ = Filter.__hash__
+
+    def getField(self):
+        return self._field
+
+    def getValues(self):
+        return list(self._values)
+
+    def normalize(self):
+        return self.__class__(dict(field=self._field, value=self._normalizeValues()))
+
+    def _normalizeValues(self):
+        """
+        Dedupes values and orders them stably, as their order does not affect matches
+        """
+        return sortCanonically( dedupeValues(self._values) )
+
+    def _describe(self):
+        return (self.getOpString(), self._field, tuple(self._values))
+
     def isFieldInEntity(self, entity):
         return self._field in entity
 
@@ -126,11 +272,15 @@ class FuzzyStringFilter(PrimitiveFilter):
         return 'fuzzy'
 
     def getMongoFilter(self):
-        concattedWithPipe = '|'.join(self._values)
+        # values are searched as plain substrings, same as matches()
+        concattedWithPipe = '|'.join( re.escape(value) for value in self._values )
         return {
             self._field: { '$regex': f'{concattedWithPipe}', '$options': 'i'}
         }
 
+    def getSqlFilter(self, table):
+        return table.createFuzzySql(self._field, self._values)
+
     def matches(self, entity):
         if not self.isFieldInEntity(entity):
             return False
@@ -141,11 +291,61 @@ class FuzzyStringFilter(PrimitiveFilter):
 
         return False
 
+    def compile(self):
+        field = self._field
+        if len(self._values) == 0:
+            return _matchesNothing
 
-class GTFilter(PrimitiveFilter):
+        # single pass over field value finds any of the substrings
+        search = re.compile( '|'.join( re.escape(value) for value in self._values ) ).search
+
+        def matchesSubstring(entity):
+            fieldValue = entity.get(field, _MISSING)
+            return fieldValue is not _MISSING and search(fieldValue) is not None
+
+        return matchesSubstring
+
+
+class RangeFilter(PrimitiveFilter):
+    """
+    Base class for filters that compare field against a single value,
+    like greater than or less than.
+    """
+    def _normalizeValues(self):
+        # only the first value is used
+        # the reasoning is that I felt it makes no sense to OR together
+        # greater than comparison filters
+        # same goes with gte, lt, lte
+        return list( self._values[:1] )
+
+    # function that compares field value against value of filter
+    _compare = None
+    # SQL operator that compares field value against value of filter
+    _sqlOperator = None
+
+    def getSqlFilter(self, table):
+        fieldSql = table.getFieldSql(self._field)
+        return f'{fieldSql} {self._sqlOperator} ?', [ table.toSqlValue(self._values[0]) ]
+
+    def compile(self):
+        field = self._field
+        value = self._values[0]
+        compare = self._compare
+
+        def matchesRange(entity):
+            fieldValue = entity.get(field, _MISSING)
+            return fieldValue is not _MISSING and compare(fieldValue, value)
+
+        return matchesRange
+
+
+class GTFilter(RangeFilter):
     """
     Greater than filter
     """
+    _compare = staticmethod(operator.gt)
+    _sqlOperator = '>'
+
     def getOpString(self):
         return 'gt'
 
@@ -153,18 +353,17 @@ class GTFilter(PrimitiveFilter):
         if not self.isFieldInEntity(entity):
             return False
         
-        # only use the first value
-        # the reasoning is that I felt it makes no sense to OR together
-        # greater than comparison filters
-        # same goes with gte, lt, lte
         fieldValue = self._values[0]
         return entity[self._field] > fieldValue
 
 
-class GTEFilter(PrimitiveFilter):
+class GTEFilter(RangeFilter):
     """
     Greater than or equal to filter
     """
+    _compare = staticmethod(operator.ge)
+    _sqlOperator = '>='
+
     def getOpString(self):
         return 'gte'
 
@@ -176,10 +375,13 @@ class GTEFilter(PrimitiveFilter):
         return entity[self._field] >= fieldValue
 
 
-class LTFilter(PrimitiveFilter):
+class LTFilter(RangeFilter):
     """
     Less than filter
     """
+    _compare = staticmethod(operator.lt)
+    _sqlOperator = '<'
+
     def getOpString(self):
         return 'lt'
 
@@ -191,10 +393,13 @@ class LTFilter(PrimitiveFilter):
         return entity[self._field] < fieldValue
 
 
-class LTEFilter(PrimitiveFilter):
+class LTEFilter(RangeFilter):
     """
     Less than or equal to filter
     """
+    _compare = staticmethod(operator.le)
+    _sqlOperator = '<='
+
     def getOpString(self):
         return 'lte'
 
@@ -218,6 +423,22 @@ class EQFilter(PrimitiveFilter):
             self._field: { '$in': self._values }
         }
 
+    def getSqlFilter(self, table):
+        values = [ table.toSqlValue(value) for value in self._values if value is not None ]
+        conditions = []
+        if len(values) > 0:
+            placeholders = ', '.join( '?' for _ in values )
+            conditions.append( f'{table.getFieldSql(self._field)} IN ({placeholders})' )
+        if len(values) < len(self._values):
+            # SQL NULL does not equal itself, so null is matched by JSON type of field
+            conditions.append( f"{table.getFieldTypeSql(self._field)} = 'null'" )
+
+        if len(conditions) == 0:
+            return '0', []
+        if len(conditions) == 1:
+            return conditions[0], values
+        return '(' + ' OR '.join(conditions) + ')', values
+
     def matches(self, entity):
         if not self.isFieldInEntity(entity):
             return False
@@ -227,12 +448,102 @@ class EQFilter(PrimitiveFilter):
                 return True
 
         return False
+
+    def compile(self):
+        field = self._field
+        if len(self._values) == 1:
+            value = self._values[0]
+
+            def matchesValue(entity):
+                fieldValue = entity.get(field, _MISSING)
+                return fieldValue is not _MISSING and fieldValue == value
+
+            return matchesValue
+
+        try:
+            values = frozenset(self._values)
+        except TypeError:
+            # values that can not be hashed are compared one by one
+            return self.matches
+
+        def matchesAnyValue(entity):
+            fieldValue = entity.get(field, _MISSING)
+            if fieldValue is _MISSING:
+                return False
+            try:
+                return fieldValue in values
+            except TypeError:
+                return any( fieldValue == value for value in values )
+
+        return matchesAnyValue
     
 
 class RegexFilter(PrimitiveFilter):
     """
     Regular expression filter
+    Matches entities whose field contains a match of any of the patterns.
+    Patterns are bounded in number and length, and validated on construction,
+    so that filters do not carry patterns that fail or run long on database.
     """
+    MAX_PATTERNS = 10
+    MAX_PATTERN_LENGTH = 256
+
+    def __init__(self, keyValues):
+        super().__init__(keyValues)
+        self._validatePatterns()
+
+    def getOpString(self):
+        return 'regex'
+
+    def getMongoFilter(self):
+        if len(self._values) == 0:
+            return { self._field: { '$in': [] } }
+
+        concattedWithPipe = '|'.join( f'(?:{pattern})' for pattern in self._values )
+        return {
+            self._field: { '$regex': concattedWithPipe }
+        }
+
+    def getSqlFilter(self, table):
+        if len(self._values) == 0:
+            return '0', []
+
+        # REGEXP is defined by SqliteCrudManager on its connections
+        fieldSql = table.getFieldSql(self._field)
+        conditions = [ f'{fieldSql} REGEXP ?' for _ in self._values ]
+        return '(' + ' OR '.join(conditions) + ')', list(self._values)
+
+    def matches(self, entity):
+        return self.compile()(entity)
+
+    def compile(self):
+        field = self._field
+        if len(self._values) == 0:
+            return _matchesNothing
+
+        searches = [ compileRegex(pattern).search for pattern in self._values ]
+
+        def matchesPattern(entity):
+            fieldValue = entity.get(field, _MISSING)
+            if not isinstance(fieldValue, str):
+                return False
+            return any( search(fieldValue) is not None for search in searches )
+
+        return matchesPattern
+
+    def _validatePatterns(self):
+        if len(self._values) > self.MAX_PATTERNS:
+            raise FilterParseError(f'Regex filter takes at most {self.MAX_PATTERNS} patterns')
+
+        for pattern in self._values:
+            if not isinstance(pattern, str) or len(pattern) > self.MAX_PATTERN_LENGTH:
+                raise FilterParseError(
+                    f'Regex patterns must be at most {self.MAX_PATTERN_LENGTH} characters long'
+                )
+            try:
+                compileRegex(pattern)
+            except re.error:
+                raise FilterParseError(f'Invalid regex pattern {pattern!r}')
 
 
 class NullFilter(Filter):
@@ -248,12 +559,34 @@ class NullFilter(Filter):
 
     def getMongoFilter(self):
         return {}
+
+    def getSqlFilter(self, table):
+        return '1', []
     
     def matches(self, entity):
         return True
 
+    def compile(self):
+        return _matchesEverything
+
+    def normalize(self):
+        return self
+
+    def _describe(self):
+        return ('null',)
+
     def __eq__(self, other):
         if isinstance(other, NullFilter):
             return True
         else:
             return NotImplemented
+
+    __hash__ = Filter.__hash__
+
+
+def _matchesEverything(entity):
+    return True
+
+
+def _matchesNothing(entity):
+    return False
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses classes that generate unique ids of entities in-process.
+Generated ids are strings ordered by time of creation,
+so that sorting by id sorts entities by creation as well,
+and creating entities takes no round trip to allocate ids.
+
+Migration from counter based ids:
+    Ids allocated from counters are numeric strings like '42',
+    which do not sort correctly against each other nor against generated ids.
+    Before switching ID_GENERATOR on a database holding counter based ids,
+    rewrite every id, and every field that references one
+    (userId, postId, threadId, lastPostId), with IdGenerator.convertLegacyId.
+    It left pads numeric ids with zeros to the length of generated ids,
+    so that they keep their relative order and sort before every generated id.
+    Anonymous user keeps id '0', that SessionService.ANONYMOUS_USERID refers to,
+    which convertLegacyId returns unchanged and which still sorts before every id.
+    Session cookies hold ids of signed in users from before the migration,
+    invalidate them by rotating SECRET_KEY, so that users sign in again.
+    Counters collection/file is no longer used once the switch is made.
+"""
+import os
+import threading
+import time
+
+
+class IdGenerator:
+    """
+    defines an interface of IdGenerator concrete classes.
+    """
+    # length of generated ids, legacy ids are padded to this length
+    ID_LENGTH = None
+    # legacy ids left as they are by migration, id of anonymous user
+    RESERVED_IDS = ( '0', )
+
+    def generateId(self, fieldname):
+        """
+        Generates new unique id
+
+        Args:
+            fieldname(str): name of id field like 'userId'
+        Returns:
+            string id
+        """
+        raise NotImplementedError
+
+    def convertLegacyId(self, legacyId):
+        """
+        Converts counter based id so that it sorts before any generated id.
+        Reserved ids are returned unchanged.
+
+        Args:
+            legacyId(str): numeric string id allocated from counter
+        Returns:
+            string id
+        """
+        if legacyId in self.RESERVED_IDS:
+            return legacyId
+        return legacyId.zfill(self.ID_LENGTH)
+
+
+class UlidGenerator(IdGenerator):
+    """
+    Generates ULIDs: 48 bits of milliseconds since unix epoch
+    followed by 80 random bits, encoded in 26 characters of Crockford's base32.
+    Ids generated within the same millisecond increment the random part,
+    so ids generated by this object are strictly increasing.
+    """
+    ID_LENGTH = 26
+    ENCODING = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+    RANDOM_BITS = 80
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lastTimestamp = -1
+        self._lastRandom = 0
+
+    def generateId(self, fieldname):
+        timestamp = int(time.time() * 1000)
+        with self._lock:
+            if timestamp <= self._lastTimestamp:
+                # keep monotonic within the same millisecond, or when clock went back
+                timestamp = self._lastTimestamp
+                random = self._lastRandom + 1
+                if random >> self.RANDOM_BITS:
+                    timestamp += 1
+                    random = self._createRandom()
+            else:
+                random = self._createRandom()
+
+            self._lastTimestamp = timestamp
+            self._lastRandom = random
+
+        return self._encode( (timestamp << self.RANDOM_BITS) | random )
+
+    def _createRandom(self):
+        return int.from_bytes(os.urandom(self.RANDOM_BITS // 8), 'big')
+
+    def _encode(self, value):
+        chars = []
+        for _ in range(self.ID_LENGTH):
+            chars.append( self.ENCODING[value & 0x1f] )
+            value >>= 5
+
+        return ''.join( reversed(chars) )
+
+
+class SnowflakeGenerator(IdGenerator):
+    """
+    Generates Snowflake ids: 41 bits of milliseconds since EPOCH,
+    10 bits of worker id and 12 bits of sequence within the millisecond.
+    Ids are zero padded decimal strings, so that they sort as strings.
+    Each process generating ids concurrently needs its own workerId.
+    """
+    ID_LENGTH = 19
+    # 2020-01-01T00:00:00Z in milliseconds
+    EPOCH = 1577836800000
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+    MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+    def __init__(self, workerId=0):
+        if not 0 <= workerId <= self.MAX_WORKER_ID:
+            raise ValueError(f'workerId must be between 0 and {self.MAX_WORKER_ID}')
+
+        self._workerId = workerId
+        self._lock = threading.Lock()
+        self._lastTimestamp = -1
+        self._sequence = 0
+
+    def generateId(self, fieldname):
+        with self._lock:
+            timestamp = max( self._currentTimestamp(), self._lastTimestamp )
+            if timestamp == self._lastTimestamp:
+                self._sequence = (self._sequence + 1) & self.MAX_SEQUENCE
+                if self._sequence == 0:
+                    # sequence exhausted, borrow from next millisecond
+                    timestamp += 1
+            else:
+                self._sequence = 0
+            self._lastTimestamp = timestamp
+
+            value = timestamp << (self.WORKER_BITS + self.SEQUENCE_BITS)
+            value |= self._workerId << self.SEQUENCE_BITS
+            value |= self._sequence
+
+        return str(value).zfill(self.ID_LENGTH)
+
+    def _currentTimestamp(self):
+        return int(time.time() * 1000) - self.EPOCH
+
+
+def createIdGenerator(name, workerId=0):
+    """
+    Creates id generator by name
+
+    Args:
+        name(str): 'counter'|'ulid'|'snowflake'
+        workerId(int): id of this process among those generating snowflake ids
+    Returns:
+        IdGenerator, or None for 'counter' so that repositories keep using counters
+    """
+    if name is None or name == 'counter':
+        return None
+    if name == 'ulid':
+        return UlidGenerator()
+    if name == 'snowflake':
+        return SnowflakeGenerator(workerId)
+
+    raise ValueError(f'Unknown id generator: {name}')
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses class to manage indexes of mongoDB collections.
+Indexes are declared by each entity class in its _indexes attribute,
+next to _attribute_description.
+
+usage:
+    python -m server.database.index_manager [ensure|diff|report]
+"""
+import argparse
+import logging
+import os
+
+from pymongo import IndexModel
+
+from server.entity import User, Post, Thread
+from server.services.searchfilter_creator import extract_fuzzy_attributes
+
+logger = logging.getLogger(__name__)
+
+# counters collection is not persisting any entity, so its indexes are declared here
+COUNTER_INDEXES = [
+    dict(keys=[ ('fieldname', 1) ], unique=True),
+]
+
+# fields searched by fuzzy filters are covered by a text index of each collection
+TEXT_SEARCH_FIELDS = {
+    'users': extract_fuzzy_attributes(User),
+    'posts': extract_fuzzy_attributes(Post),
+    'threads': extract_fuzzy_attributes(Thread),
+}
+
+
+def createTextIndex(fields):
+    """
+    Declares text index over fields.
+    Fields are ordered by name, same as mongoDB reports them back.
+
+    Args:
+        fields(list): fieldnames to cover
+    Returns:
+        index declaration
+    """
+    return dict(keys=[ (field, 'text') for field in sorted(fields) ])
+
+
+DEFAULT_DECLARATIONS = {
+    'users': User._indexes,
+    'posts': Post._indexes,
+    'threads': Thread._indexes,
+    'counters': COUNTER_INDEXES,
+}
+
+
+def createDeclarations(useTextSearch=False):
+    """
+    Declares indexes of every collection.
+    Text indexes are only declared when fuzzy filters are looked up through them,
+    as they are costly to maintain on every write.
+
+    Args:
+        useTextSearch(bool): whether repo searches through text indexes
+    Returns:
+        dict of lists of index declarations, keyed by collection name
+    """
+    if not useTextSearch:
+        return DEFAULT_DECLARATIONS
+
+    return {
+        collectionName: indexes + (
+            [ createTextIndex(TEXT_SEARCH_FIELDS[collectionName]) ]
+            if collectionName in TEXT_SEARCH_FIELDS else []
+        )
+        for collectionName, indexes in DEFAULT_DECLARATIONS.items()
+    }
+
+
+class MongoIndexManager:
+    """
+    Compares declared indexes against indexes found on a live database,
+    and creates the ones that are missing.
+    """
+    DEFAULT_INDEX_NAME = '_id_'
+
+    def __init__(self, db, declarations=None):
+        self._db = db
+        self._declarations = DEFAULT_DECLARATIONS if declarations is None else declarations
+
+    def diffIndexes(self):
+        """
+        Compares declared indexes against indexes on database
+
+        Args:
+            None
+        Returns:
+            dict keyed by collection name, each value being a dict of:
+                missing: declared indexes not found on database
+                mismatched: declared indexes found on database with different options
+                unexpected: indexes on database that were not declared
+        """
+        diff = {}
+        for collectionName, declared in self._declarations.items():
+            existing = self._getExistingIndexes(collectionName)
+            existingByKeys = { tuple(index['keys']): index for index in existing }
+            declaredKeys = set()
+            missing = []
+            mismatched = []
+
+            for index in declared:
+                keys = tuple(index['keys'])
+                declaredKeys.add(keys)
+                if keys not in existingByKeys:
+                    missing.append(index)
+                elif self._isUnique(existingByKeys[keys]) != self._isUnique(index):
+                    mismatched.append(index)
+
+            unexpected = [
+                index for index in existing
+                if tuple(index['keys']) not in declaredKeys
+            ]
+
+            diff[collectionName] = dict(
+                missing=missing,
+                mismatched=mismatched,
+                unexpected=unexpected,
+            )
+
+        return diff
+
+    def ensureIndexes(self):
+        """
+        Creates declared indexes that are missing on database.
+        Mismatched or unexpected indexes are left untouched,
+        since dropping them may need a decision from operators.
+
+        Args:
+            None
+        Returns:
+            dict keyed by collection name, with list of created index names
+        """
+        created = {}
+        for collectionName, collectionDiff in self.diffIndexes().items():
+            missing = collectionDiff['missing']
+            if len(missing) == 0:
+                created[collectionName] = []
+                continue
+
+            models = [
+                IndexModel(index['keys'], unique=self._isUnique(index))
+                for index in missing
+            ]
+            logger.info('Creating %d indexes on %s', len(models), collectionName)
+            created[collectionName] = self._db[collectionName].create_indexes(models)
+
+        return created
+
+    def report(self):
+        """
+        Creates human readable report of differences between declared and existing indexes
+
+        Args:
+            None
+        Returns:
+            string
+        """
+        lines = []
+        for collectionName, collectionDiff in self.diffIndexes().items():
+            lines.append(f'[{collectionName}]')
+            if not any(collectionDiff.values()):
+                lines.append('    all declared indexes exist')
+                continue
+
+            for status, indexes in collectionDiff.items():
+                for index in indexes:
+                    lines.append(f'    {status:<10} {self._describe(index)}')
+
+        return '\n'.join(lines)
+
+    def warnMissingIndexes(self):
+        """
+        Logs warning for each declared index missing on database.
+        Intended to be called at startup of the app.
+
+        Args:
+            None
+        Returns:
+            Boolean, whether all declared indexes exist
+        """
+        try:
+            diff = self.diffIndexes()
+        except Exception as e:
+            logger.warning('Failed to check indexes on database: %s', e)
+            return False
+
+        isComplete = True
+        for collectionName, collectionDiff in diff.items():
+            for index in collectionDiff['missing'] + collectionDiff['mismatched']:
+                isComplete = False
+                logger.warning(
+                    'Declared index %s on %s is missing on database',
+                    self._describe(index), collectionName
+                )
+
+        return isComplete
+
+    def _getExistingIndexes(self, collectionName):
+        """
+        Reads indexes of collection from database, in the same format as declarations
+        """
+        information = self._db[collectionName].index_information()
+
+        return [
+            dict(keys=self._getKeys(info), unique=info.get('unique', False), name=name)
+            for name, info in information.items()
+            if name != self.DEFAULT_INDEX_NAME
+        ]
+
+    def _getKeys(self, info):
+        """
+        Reads keys of index information.
+        Text indexes are reported with internal keys (_fts, _ftsx),
+        and fields they cover are listed in their weights instead.
+        """
+        if 'weights' in info:
+            return createTextIndex( info['weights'].keys() )['keys']
+        return list(info['key'])
+
+    def _isUnique(self, index):
+        return index.get('unique', False)
+
+    def _describe(self, index):
+        keys = ', '.join(f'{field}:{order}' for field, order in index['keys'])
+        unique = ' unique' if self._isUnique(index) else ''
+        return f'({keys}){unique}'
+
+
+def main():
+    from server.database.mongo_crudmanager import MongoCrudManager
+    from server.services.userauth import PasswordService
+
+    parser = argparse.ArgumentParser(description='Manage indexes of mongoDB collections')
+    parser.add_argument(
+        'command', choices=[ 'ensure', 'diff', 'report' ], default='report', nargs='?'
+    )
+    args = parser.parse_args()
+
+    repo = MongoCrudManager(
+        os.environ.get('MONGO_DBNAME', 'TEST_MYFORUMWEBAPP'), PasswordService,
+        useTextSearch=os.environ.get('MONGO_TEXT_SEARCH', '').lower() in ('1', 'true', 'yes'),
+    )
+    manager = repo.createIndexManager()
+
+    if args.command == 'ensure':
+        for collectionName, names in manager.ensureIndexes().items():
+            print(f'{collectionName}: created {names}')
+    elif args.command == 'diff':
+        print(manager.diffIndexes())
+    else:
+        print(manager.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -8,12 +8,17 @@ import time
 import logging
 from collections import defaultdict
 
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from contextlib import contextmanager
 
 from server.database.sorter import NullSorter
 from server.database.crudmanager import CrudManager
 from server.database.paging import Paging
+from server.database.projection import Projection
+from server.database.index_manager import (
+    MongoIndexManager, TEXT_SEARCH_FIELDS, createDeclarations,
+)
+from server.database.text_search import MongoTextSearch
 import server.exceptions as exceptions
 from server.entity import User, Post, Thread
 
@@ -25,21 +30,58 @@ class MongoCrudManager(CrudManager):
     """
     Implements CrudManager interface to make CRUD operations
     to a mongoDB instance.
+
+    When useFacetSearch is set, searches retrieve the page of documents and
+    the total matched count in a single aggregation ($match -> $facet),
+    instead of issuing find() and count_documents() separately.
+    Keyset pages are still counted by count_documents(), as the page is sought
+    through index by its own aggregation ($match -> $sort -> $limit).
+
+    When idGenerator is set, ids of created entities are generated in-process
+    instead of being allocated from counters collection.
+
+    When executor is set, searches that are not made through $facet aggregation
+    run find() and count_documents() concurrently.
+
+    When useTextSearch is set, fuzzy filters of searches are looked up through
+    text indexes with $text, see MongoTextSearch, and RelevanceSorter sorts by textScore.
+    Text indexes are declared in index_manager.py and have to exist on database.
+    Deletes and updates keep matching fuzzy filters by $regex.
     """
-    def __init__(self, dbname, userauth):
+    def __init__(
+        self, dbname, userauth, useFacetSearch=False, idGenerator=None, executor=None,
+        useTextSearch=False,
+    ):
         hostname = os.getenv('MONGO_HOSTNAME')
         port = int( os.getenv('MONGO_PORT') )
         
         self._client = MongoClient(hostname, port)
         self._db = self._client[dbname]
         self._userauth = userauth
+        self._useFacetSearch = useFacetSearch
+        self._idGenerator = idGenerator
+        self._executor = executor
+        self._textSearch = MongoTextSearch(TEXT_SEARCH_FIELDS) if useTextSearch else None
+
+    def createIndexManager(self):
+        """
+        Creates object to manage indexes of collections used by this class
+        
+        Args:
+            None
+        Returns:
+            MongoIndexManager
+        """
+        return MongoIndexManager(
+            self._db, createDeclarations(useTextSearch=self._textSearch is not None)
+        )
 
     def createUser(self, user):
         attrs = user.to_create()
         attrs['password'] = self._userauth.hashPassword( attrs['password'] )
 
         with self._mongoOperationHandling('Failed to create attrs'):
-            nextUserId = str( self._getCounterAndIncrement('userId') )
+            nextUserId = self._generateId('userId')
             attrs['userId'] = nextUserId
             self._db['users'].insert_one(attrs)
 
@@ -49,27 +91,24 @@ class MongoCrudManager(CrudManager):
         )
 
     def searchUser(self, searchFilter, **options):
-        self._setDefaultSearchOptions(options)
-        paging = options.get('paging')
-        sorter = options.get('sorter')
-        query = {} if searchFilter is None else searchFilter.getMongoFilter()
-
         with self._mongoOperationHandling('Failed to search user'):
-            users = list( paging.slice( sorter.sortMongoCursor( self._db['users'].find(query) ) ) )
-            matchedCount = self._db['users'].count_documents(query)
+            users, matchedCount, nextCursor = self._searchDocuments(
+                'users', User, 'userId', searchFilter, options
+            )
             
         # convert dictionary to User object
         self._convertInnerIdToStr(users)
-        users = [ User(user) for user in users ]
+        users = [ User.from_storage(user) for user in users ]
 
         return {
             'users': users,
             'returnCount': len(users),
             'matchedCount': matchedCount,
+            'nextCursor': nextCursor,
         }
 
     def deleteUser(self, searchFilter):
-        userQuery = searchFilter.getMongoFilter()
+        userQuery = self._createMongoQuery(searchFilter)
 
         with self._mongoOperationHandling('Failed to delete user'):
             result = self._db['users'].delete_many(userQuery)
@@ -79,7 +118,7 @@ class MongoCrudManager(CrudManager):
     def updateUser(self, searchFilter, user):
         attrs = user.to_update()
         attrs['password'] = self._userauth.hashPassword( attrs['password'] )
-        query = searchFilter.getMongoFilter()
+        query = self._createMongoQuery(searchFilter)
         update = self._createMongoUpdate(attrs)
         
         with self._mongoOperationHandling('Failed to update attrs'):
@@ -94,7 +133,7 @@ class MongoCrudManager(CrudManager):
         attrs = post.to_create()
         
         with self._mongoOperationHandling('Failed to create post'):
-            nextPostId = str( self._getCounterAndIncrement('postId') )
+            nextPostId = self._generateId('postId')
             attrs['postId'] = nextPostId
             self._db['posts'].insert_one(attrs)
 
@@ -104,26 +143,23 @@ class MongoCrudManager(CrudManager):
         )
     
     def searchPost(self, searchFilter, **options):
-        self._setDefaultSearchOptions(options)
-        paging = options.get('paging')
-        sorter = options.get('sorter')
-        query = {} if searchFilter is None else searchFilter.getMongoFilter()
-
         with self._mongoOperationHandling('Failed to search post'):
-            posts = list( paging.slice( sorter.sortMongoCursor( self._db['posts'].find(query) ) ) )
-            matchedCount = self._db['posts'].count_documents(query)
+            posts, matchedCount, nextCursor = self._searchDocuments(
+                'posts', Post, 'postId', searchFilter, options
+            )
 
         self._convertInnerIdToStr(posts)
-        posts = [ Post(post) for post in posts ]
+        posts = [ Post.from_storage(post) for post in posts ]
 
         return {
             'posts': posts,
             'returnCount': len(posts),
             'matchedCount': matchedCount,
+            'nextCursor': nextCursor,
         }
 
     def deletePost(self, searchFilter):
-        query = searchFilter.getMongoFilter()
+        query = self._createMongoQuery(searchFilter)
 
         with self._mongoOperationHandling('Failed to create post'):
             result = self._db['posts'].delete_many(query)
@@ -132,7 +168,7 @@ class MongoCrudManager(CrudManager):
 
     def updatePost(self, searchFilter, post):
         attrs = post.to_update()
-        query = searchFilter.getMongoFilter()
+        query = self._createMongoQuery(searchFilter)
         update = self._createMongoUpdate(attrs)
 
         with self._mongoOperationHandling('Failed to update post'):
@@ -147,7 +183,7 @@ class MongoCrudManager(CrudManager):
         attrs = thread.to_create()
 
         with self._mongoOperationHandling('Failed to create new thread'):
-            nextThreadId = str( self._getCounterAndIncrement('threadId') )
+            nextThreadId = self._generateId('threadId')
             attrs['threadId'] = nextThreadId
             attrs['createdAt'] = time.time()
             self._db['threads'].insert_one(attrs)
@@ -158,28 +194,57 @@ class MongoCrudManager(CrudManager):
         )
 
     def searchThread(self, searchFilter, **options):
+        with self._mongoOperationHandling('Failed to search for threads'):
+            threads, matchedCount, nextCursor = self._searchDocuments(
+                'threads', Thread, 'threadId', searchFilter, options
+            )
+
+        self._convertInnerIdToStr(threads)
+        threads = [ Thread.from_storage(thread) for thread in threads ]
+
+        return dict(
+            threads=threads,
+            matchedCount=matchedCount,
+            returnCount=len(threads),
+            nextCursor=nextCursor,
+        )
+
+    def searchThreadWithRelations(self, searchFilter, **options):
+        """
+        Searches for threads and joins owner and last post (with its owner)
+        to each of them on database side, using $lookup in a single aggregation.
+        Returned threads have the same shape as SearchService's joins would produce.
+
+        Args:
+            searchFilter(Filter): filter to apply to threads
+            options: search options like paging and sorter
+        Returns:
+            dict: same as searchThread
+        """
         self._setDefaultSearchOptions(options)
-        paging = options.get('paging')
-        sorter = options.get('sorter')
-        query = {} if searchFilter is None else searchFilter.getMongoFilter()
+        projection = options['projection']
+        # keep fields that relate thread to owner and last post
+        options['projection'] = projection.withRequiredFields('userId', 'lastPostId')
 
         with self._mongoOperationHandling('Failed to search for threads'):
-            threads = list( paging.slice( sorter.sortMongoCursor( self._db['threads'].find(query) ) ) )
-            matchedCount = self._db['threads'].count_documents(query)
+            threads, matchedCount, nextCursor = self._searchDocuments(
+                'threads', Thread, 'threadId', searchFilter, options,
+                joinStages=self._createThreadJoinStages(projection)
+            )
 
-        self._convertInnerIdToStr(threads)
-        threads = [ Thread(thread) for thread in threads ]
+        threads = [ self._hydrateThreadRelations(thread) for thread in threads ]
 
         return dict(
             threads=threads,
             matchedCount=matchedCount,
             returnCount=len(threads),
+            nextCursor=nextCursor,
         )
 
     def updateThread(self, searchFilter, thread):
         attrs = thread.to_update()
 
-        fil = searchFilter.getMongoFilter()
+        fil = self._createMongoQuery(searchFilter)
         update = self._createMongoUpdate(attrs)
         with self._mongoOperationHandling('Failed to update thread'):
             result = self._db['threads'].update_many(fil, update)
@@ -189,8 +254,32 @@ class MongoCrudManager(CrudManager):
             updatedCount=result.modified_count,
         )
 
+    def incrementThreadViews(self, viewCounts):
+        """
+        Adds view counts to threads with a single unordered bulk write
+
+        Args:
+            viewCounts(dict): number of views to add, keyed by threadId
+        Returns:
+            dict: matched and updated count of threads
+        """
+        operations = [
+            UpdateOne({ 'threadId': { '$eq': threadId } }, { '$inc': { 'views': count } })
+            for threadId, count in viewCounts.items()
+        ]
+        if len(operations) == 0:
+            return dict(matchedCount=0, updatedCount=0)
+
+        with self._mongoOperationHandling('Failed to increment thread views'):
+            result = self._db['threads'].bulk_write(operations, ordered=False)
+
+        return dict(
+            matchedCount=result.matched_count,
+            updatedCount=result.modified_count,
+        )
+
     def deleteThread(self, searchFilter):
-        query = searchFilter.getMongoFilter()
+        query = self._createMongoQuery(searchFilter)
         with self._mongoOperationHandling('Failed to delete thread'):
             result = self._db['threads'].delete_many(query)
 
@@ -198,6 +287,239 @@ class MongoCrudManager(CrudManager):
             deleteCount=result.deleted_count,
         )
 
+    def _searchDocuments(
+        self, collectionName, entityClass, idField, searchFilter, options, joinStages=None
+    ):
+        """
+        Searches documents in collection and counts all documents that matched.
+        
+        Args:
+            collectionName(str): name of collection to search
+            entityClass(class): entity class that describes attributes of documents
+            idField(str): fieldname that uniquely identifies documents in collection
+            searchFilter(Filter): filter to apply, None would match all documents
+            options(dict): search options like paging, sorter and projection
+            joinStages(list): aggregation stages applied to documents in page,
+                which forces the search to run as a single aggregation
+        Returns:
+            tuple of list of documents in page, total matched count and cursor to next page
+        """
+        self._setDefaultSearchOptions(options)
+        paging = options.get('paging')
+        sorter = options.get('sorter')
+        projection = options.get('projection').getMongoProjection(
+            entityClass, [ idField ] + sorter.getSortFields()
+        )
+        query, usesTextSearch = self._createSearchQuery(collectionName, searchFilter)
+        # relevance is only known to $text, and can not locate keyset of documents
+        sortsByTextScore = (
+            usesTextSearch and sorter.sortsByRelevance() and not paging.usesKeyset()
+        )
+        collection = self._db[collectionName]
+
+        def countDocuments():
+            return collection.count_documents(query)
+
+        if (self._useFacetSearch or joinStages) and not paging.usesKeyset():
+            pipeline = self._createFacetSearchPipeline(
+                query, paging, sorter, idField, projection, joinStages,
+                sortsByTextScore=sortsByTextScore,
+            )
+            result = next( collection.aggregate(pipeline) )
+            documents = result['data']
+            total = result['total']
+            matchedCount = total[0]['count'] if len(total) > 0 else 0
+        else:
+            if self._useFacetSearch or joinStages:
+                # keyset pages are sought through index by their own aggregation,
+                # as total of $facet would only count documents after the keyset
+                def findDocuments():
+                    return list( collection.aggregate( self._createKeysetSearchPipeline(
+                        query, paging, sorter, idField, projection, joinStages
+                    ) ) )
+            else:
+                def findDocuments():
+                    cursor = collection.find(
+                        self._createPageQuery(query, paging, sorter, idField), projection
+                    )
+                    if paging.usesKeyset():
+                        cursor.sort( sorter.getKeysetSortSpec(idField) )
+                    elif sortsByTextScore:
+                        cursor.sort( list( MongoTextSearch.TEXT_SCORE_SORT.items() ) )
+                    else:
+                        sorter.sortMongoCursor(cursor)
+                    return list( paging.slice(cursor) )
+
+            if self._executor is None:
+                documents, matchedCount = findDocuments(), countDocuments()
+            else:
+                documents, matchedCount = self._executor.gather([ findDocuments, countDocuments ])
+
+        nextCursor = paging.createNextCursor(documents, sorter, idField)
+
+        return documents, matchedCount, nextCursor
+
+    def _createMongoQuery(self, searchFilter):
+        """
+        Creates mongo query from normalized filter,
+        so that redundant aggregates are not sent to database
+        """
+        return searchFilter.normalize().getMongoFilter()
+
+    def _createSearchQuery(self, collectionName, searchFilter):
+        """
+        Creates mongo query of search, looking up fuzzy filters through $text
+        when text search is enabled
+
+        Returns:
+            tuple of mongo query and Boolean, whether query uses $text
+        """
+        if searchFilter is None:
+            return {}, False
+        if self._textSearch is None:
+            return self._createMongoQuery(searchFilter), False
+
+        return self._textSearch.createQuery(collectionName, searchFilter.normalize())
+
+    def _createPageQuery(self, query, paging, sorter, idField):
+        """
+        Creates query that narrows down search to documents in the page.
+        For keyset paging, only documents positioned after the keyset are matched.
+        """
+        keyset = paging.getKeyset()
+        if keyset is None:
+            return query
+
+        keysetQuery = sorter.createKeysetMongoFilter(keyset, idField)
+        return { '$and': [ query, keysetQuery ] } if query else keysetQuery
+
+    def _createFacetSearchPipeline(
+        self, query, paging, sorter, idField, projection, joinStages=None,
+        sortsByTextScore=False,
+    ):
+        """
+        Creates aggregation pipeline that returns a page of documents
+        together with total count of matched documents, in one document of shape:
+            { data: [ ...documents ], total: [ { count: <int> } ] }
+        Sub-pipelines of $facet can not use indexes, so matched documents are
+        sorted before $facet, where $match and $sort can be served by indexes.
+        joinStages are run after paging, so that only documents in page are joined.
+        When sortsByTextScore is set, matched documents are sorted by relevance,
+        where textScore of $text is available.
+        Keyset paging is not supported, see _createKeysetSearchPipeline.
+        """
+        if sortsByTextScore:
+            sortStages = [ { '$sort': MongoTextSearch.TEXT_SCORE_SORT } ]
+        else:
+            sortStages = sorter.getMongoPipeline()
+
+        return [
+            { '$match': query },
+            *sortStages,
+            { '$facet': {
+                'data': self._createPageStages(paging, projection, joinStages),
+                'total': [ { '$count': 'count' } ],
+            } },
+        ]
+
+    def _createKeysetSearchPipeline(
+        self, query, paging, sorter, idField, projection, joinStages=None
+    ):
+        """
+        Creates aggregation pipeline that returns documents in the page after keyset.
+        Keyset is matched and sorted by at the start of pipeline,
+        so that the page is sought through index without scanning documents before it.
+        Matched documents are not counted, count them separately.
+        """
+        return [
+            { '$match': self._createPageQuery(query, paging, sorter, idField) },
+            { '$sort': dict( sorter.getKeysetSortSpec(idField) ) },
+            *self._createPageStages(paging, projection, joinStages),
+        ]
+
+    def _createPageStages(self, paging, projection, joinStages=None):
+        """
+        Creates aggregation stages that page sorted documents, project and join them
+        """
+        stages = [ *paging.getMongoPipeline(), { '$project': projection } ]
+        if joinStages:
+            stages.extend(joinStages)
+        return stages
+
+    def _createThreadJoinStages(self, projection):
+        """
+        Creates $lookup stages that join thread -> owner
+        and thread -> lastPost -> owner, for relations included in projection.
+        Owner of last post is looked up into a separate field,
+        to be nested under its post while hydrating.
+        Fields hidden on serialization are removed from joined documents.
+        """
+        stages = []
+        hiddenFields = []
+        if projection.includes('owner'):
+            stages.append({ '$lookup': {
+                'from': 'users',
+                'localField': 'userId',
+                'foreignField': 'userId',
+                'as': 'owner',
+            } })
+            hiddenFields += self._createHiddenFieldPaths(User, 'owner')
+
+        if projection.includes('lastPost'):
+            stages += [
+                { '$lookup': {
+                    'from': 'posts',
+                    'localField': 'lastPostId',
+                    'foreignField': 'postId',
+                    'as': 'lastPost',
+                } },
+                # lastPostId is unique, so at most one post was joined
+                { '$addFields': {
+                    'lastPostUserId': { '$arrayElemAt': [ '$lastPost.userId', 0 ] },
+                } },
+                { '$lookup': {
+                    'from': 'users',
+                    'localField': 'lastPostUserId',
+                    'foreignField': 'userId',
+                    'as': 'lastPostOwner',
+                } },
+            ]
+            hiddenFields += self._createHiddenFieldPaths(Post, 'lastPost')
+            hiddenFields += self._createHiddenFieldPaths(User, 'lastPostOwner')
+
+        if len(hiddenFields) > 0:
+            stages.append({ '$project': { field: 0 for field in hiddenFields } })
+
+        return stages
+
+    def _createHiddenFieldPaths(self, entityClass, relationName):
+        return [
+            f'{relationName}.{field}'
+            for field in Projection.getHiddenFields(entityClass)
+        ]
+
+    def _hydrateThreadRelations(self, thread):
+        """
+        Converts thread document joined by _createThreadJoinStages
+        into Thread with nested User and Post entities
+        """
+        thread.pop('lastPostUserId', None)
+        lastPostOwners = self._createEntities(User, thread.pop('lastPostOwner', []))
+        lastPosts = self._createEntities(Post, thread.get('lastPost', []))
+        for post in lastPosts:
+            post.owner = [ user for user in lastPostOwners if user.userId == post.userId ]
+        if 'owner' in thread:
+            thread['owner'] = self._createEntities(User, thread['owner'])
+        if 'lastPost' in thread:
+            thread['lastPost'] = lastPosts
+
+        self._convertInnerIdToStr([ thread ])
+        return Thread.from_storage(thread)
+
+    def _createEntities(self, entityClass, documents):
+        self._convertInnerIdToStr(documents)
+        return [ entityClass.from_storage(document) for document in documents ]
+
     def _createMongoUpdate(self, updateProps):
         update = defaultdict(lambda: defaultdict(int))
         fieldUpdates = updateProps.copy()
@@ -215,6 +537,12 @@ class MongoCrudManager(CrudManager):
             fieldname={ '$eq': fieldname }
         )
 
+    def _generateId(self, fieldname):
+        if self._idGenerator is not None:
+            return self._idGenerator.generateId(fieldname)
+
+        return str( self._getCounterAndIncrement(fieldname) )
+
     def _getCounterAndIncrement(self, fieldname):
         counterQuery = self._createCounterQuery(fieldname)
         update = { '$inc': { 'value': 1 } }
@@ -226,6 +554,8 @@ class MongoCrudManager(CrudManager):
     def _mongoOperationHandling(self, errormsg):
         try:
             yield
+        except exceptions.OperationTimeoutError:
+            raise
         except Exception as e:
             logger.error(e)
             raise exceptions.FailedMongoOperation(errormsg)
@@ -235,7 +565,10 @@ class MongoCrudManager(CrudManager):
             options['paging'] = Paging()
         if 'sorter' not in options:
             options['sorter'] = NullSorter()
+        if 'projection' not in options:
+            options['projection'] = Projection()
 
     def _convertInnerIdToStr(self, entities):
         for entity in entities:
-            entity['_id'] = str(entity['_id'])
+            if '_id' in entity:
+                entity['_id'] = str(entity['_id'])
@@ -3,8 +3,21 @@
 This file houses a class to declare paging options for database requests
 """
 
+import base64
+import binascii
+import json
+import logging
+
 from cerberus import Validator
 
+from server.exceptions import InvalidPagingCursorError
+
+logger = logging.getLogger(__name__)
+
+
+# types of values that keysets decoded from paging cursors may hold
+CURSOR_VALUE_TYPES = (str, int, float, type(None))
+
 
 class Paging:
     """
@@ -39,12 +52,99 @@ class Paging:
         self._offset = parsed['offset']
         self._limit = parsed['limit']
 
+    def getCacheKey(self):
+        """
+        Creates hashable value that identifies records in the page
+        """
+        keyset = self.getKeyset()
+        keysetKey = None if keyset is None else tuple(keyset)
+        return (self.__class__.__name__, self._offset, self._limit, keysetKey)
+
     def slice(self, list):
         start = self._offset
         end = start + self._limit
 
         return list[start:end]
 
+    def getEnd(self):
+        """
+        Returns number of records up to the end of the page,
+        which is how many leading records have to be sorted to slice it.
+        None when page is not limited.
+        """
+        return self._offset + self._limit
+
+    def getMongoPipeline(self):
+        """
+        Creates aggregation stages that apply this paging.
+        Equivalent of slicing a mongo cursor, for use inside aggregation pipelines.
+        
+        Args:
+            None
+        Returns:
+            list of aggregation stages
+        """
+        # always emit $skip so the result can stand as a non-empty sub-pipeline
+        stages = [ { '$skip': self._offset } ]
+        if self._limit == 0:
+            # $limit does not accept 0; match nothing instead to return an empty page
+            stages.append({ '$match': { '$expr': False } })
+        elif self._limit is not None:
+            stages.append({ '$limit': self._limit })
+
+        return stages
+
+    def getSqlLimit(self):
+        """
+        Creates SQL LIMIT clause that applies this paging.
+        Equivalent of slicing rows returned by query.
+        
+        Args:
+            None
+        Returns:
+            tuple of SQL clause and list of parameters
+        """
+        # negative limit stands for no limit in SQLite
+        limit = -1 if self._limit is None else self._limit
+        return 'LIMIT ? OFFSET ?', [ limit, self._offset ]
+
+    def usesKeyset(self):
+        """
+        Determines if this paging is keyset based,
+        in which case repositories should use getKeyset() to locate the page
+        instead of skipping records by offset.
+        
+        Args:
+            None
+        Returns:
+            Boolean
+        """
+        return False
+
+    def getKeyset(self):
+        """
+        Returns the keyset of the last record in the previous page
+        
+        Args:
+            None
+        Returns:
+            list of [ sortValue, idValue ], or None when no records to skip
+        """
+        return None
+
+    def createNextCursor(self, documents, sorter, idField):
+        """
+        Creates an opaque token that points to the page after documents
+        
+        Args:
+            documents(list): documents in the current page, in sorted order
+            sorter(Sorter): sorter used to retrieve documents
+            idField(str): fieldname that uniquely identifies each document
+        Returns:
+            string token, or None when next page is not available
+        """
+        return None
+
     def _parseKeyValues(self, keyValues):
         copy = keyValues.copy()
         v = Validator(schema=self._schema, allow_unknown=True)
@@ -68,3 +168,90 @@ class PagingNoLimit(Paging):
 
     def slice(self, list):
         return list[self._offset:]
+
+    def getEnd(self):
+        return None
+
+
+class CursorPaging(Paging):
+    """
+    Keyset based pagination.
+    Instead of offset, page is located by an opaque token 'after' that encodes
+    the sort key and id of the last record of the previous page.
+    This allows repositories to seek directly to the page,
+    so that retrieving page N costs the same as page 1.
+    Pagination consists of 2 elements:
+        - after
+            token returned as nextCursor of the previous page, empty for the first page
+        - limit
+            amount of records to display in 1 page
+    """
+    _schema = {
+        **Paging._schema,
+        'after': {
+            'type': 'string',
+            'default': '',
+        },
+    }
+
+    def __init__(self, keyValues=None):
+        if keyValues is None:
+            keyValues = {}
+        parsed = self._parseKeyValues(keyValues)
+        # records are skipped by keyset, so offset is always ignored
+        self._offset = self.DEFAULT_OFFSET
+        self._limit = parsed['limit']
+        self._keyset = self.decodeCursor(parsed['after']) if parsed['after'] else None
+
+    def usesKeyset(self):
+        return True
+
+    def getKeyset(self):
+        return self._keyset
+
+    def createNextCursor(self, documents, sorter, idField):
+        if self._limit == 0 or len(documents) < self._limit:
+            return None
+
+        return self.encodeCursor( sorter.extractKeyset(documents[-1], idField) )
+
+    @staticmethod
+    def encodeCursor(keyset):
+        """
+        Encodes keyset into an opaque url-safe token
+        
+        Args:
+            keyset(list): [ sortValue, idValue ]
+        Returns:
+            string token
+        """
+        serialized = json.dumps(keyset, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(serialized).decode('ascii')
+
+    @staticmethod
+    def decodeCursor(token):
+        """
+        Decodes token created by encodeCursor()
+        
+        Args:
+            token(str): token to decode
+        Returns:
+            keyset as list of [ sortValue, idValue ]
+        """
+        try:
+            keyset = json.loads( base64.urlsafe_b64decode(token.encode('ascii')) )
+        except (ValueError, binascii.Error) as e:
+            logger.error(e)
+            raise InvalidPagingCursorError('Failed to parse paging cursor')
+
+        if not isinstance(keyset, list) or len(keyset) != 2:
+            logger.error('Paging cursor did not contain a valid keyset')
+            raise InvalidPagingCursorError('Failed to parse paging cursor')
+
+        # only scalars are accepted, as keysets are put into queries of backends as is
+        for value in keyset:
+            if isinstance(value, bool) or not isinstance(value, CURSOR_VALUE_TYPES):
+                logger.error('Paging cursor contained a value that is not a scalar')
+                raise InvalidPagingCursorError('Failed to parse paging cursor')
+
+        return keyset
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses a class to declare which fields to fetch on database requests
+"""
+
+
+class Projection:
+    """
+    Class that holds information about fields to retrieve on search.
+    Projection consists of 2 elements:
+        - fields
+            names of attributes requested, None to request every attribute
+        - includeHidden
+            names of attributes hidden on serialization to retrieve anyway,
+            for services that need them like password on login
+
+    Attributes hidden on serialization, like password and _id,
+    are never fetched unless they are listed in includeHidden.
+    """
+    FIELD_SEPARATOR = ','
+
+    def __init__(self, keyValues=None, includeHidden=()):
+        if keyValues is None:
+            keyValues = {}
+        self._fields = self.parseFields( keyValues.get('fields', None) )
+        self._includeHidden = tuple(includeHidden)
+        self._requiredFields = ()
+
+    @classmethod
+    def parseFields(cls, value):
+        """
+        Parses comma separated fieldnames, as passed in fields= query parameter
+
+        Args:
+            value(str|list): fieldnames to parse
+        Returns:
+            list of fieldnames, or None when no fieldname was found
+        """
+        if value is None:
+            return None
+
+        if isinstance(value, str):
+            value = value.split(cls.FIELD_SEPARATOR)
+        fields = [ field.strip() for field in value if field.strip() ]
+
+        return fields if len(fields) > 0 else None
+
+    @classmethod
+    def getHiddenFields(cls, entityClass):
+        """
+        Returns fieldnames of entity hidden on serialization
+
+        Args:
+            entityClass(class): entity class that describes attributes
+        Returns:
+            list of fieldnames
+        """
+        description = entityClass._attribute_description
+        return [ field for field in description.keys() if cls._isHidden(description, field) ]
+
+    def isSparse(self):
+        """
+        Determines if only part of attributes were requested
+        """
+        return self._fields is not None
+
+    def getRequestedFields(self):
+        """
+        Returns fieldnames requested, or None when every attribute was requested
+        """
+        return None if self._fields is None else list(self._fields)
+
+    def includes(self, field):
+        """
+        Determines if field was requested
+
+        Args:
+            field(str): fieldname to check
+        Returns:
+            Boolean
+        """
+        return self._fields is None or field in self._fields
+
+    def withRequiredFields(self, *fields):
+        """
+        Creates projection that additionally fetches fields,
+        like ones needed to relate entities in joins
+
+        Args:
+            fields(str): fieldnames to fetch
+        Returns:
+            Projection
+        """
+        projection = Projection(includeHidden=self._includeHidden)
+        projection._fields = self._fields
+        projection._requiredFields = self._requiredFields + fields
+        return projection
+
+    def getFields(self, entityClass, requiredFields=()):
+        """
+        Determines fieldnames of entity to fetch
+
+        Args:
+            entityClass(class): entity class that describes attributes
+            requiredFields(list): fieldnames the repository needs regardless of request,
+                like ids and fields to sort by
+        Returns:
+            list of fieldnames
+        """
+        description = entityClass._attribute_description
+        fields = [
+            field for field in description.keys()
+            if self.includes(field) and not self._isHidden(description, field)
+        ]
+        for field in self._includeHidden + self._requiredFields + tuple(requiredFields):
+            if field not in fields:
+                fields.append(field)
+
+        return fields
+
+    def getMongoProjection(self, entityClass, requiredFields=()):
+        """
+        Creates projection document for mongo queries
+
+        Args:
+            entityClass(class): entity class that describes attributes
+            requiredFields(list): fieldnames the repository needs regardless of request
+        Returns:
+            dict of projection
+        """
+        fields = self.getFields(entityClass, requiredFields)
+        projection = { field: 1 for field in fields }
+        if '_id' not in fields:
+            # _id is fetched by mongo unless excluded explicitly
+            projection['_id'] = 0
+
+        return projection
+
+    def project(self, entity, entityClass, requiredFields=()):
+        """
+        Applies projection to raw entity
+
+        Args:
+            entity(dict): raw entity
+            entityClass(class): entity class that describes attributes
+            requiredFields(list): fieldnames the repository needs regardless of request
+        Returns:
+            dict with only the projected fields
+        """
+        fields = self.getFields(entityClass, requiredFields)
+        return { field: entity[field] for field in fields if field in entity }
+
+    @staticmethod
+    def _isHidden(description, field):
+        return description[field]['conversion_rules']['to_serialize']['hide']
+
+    def getCacheKey(self):
+        """
+        Creates hashable value that equals among projections that fetch the same fields
+        """
+        fields, includeHidden, requiredFields = self._describe()
+        return (None if fields is None else tuple(fields), includeHidden, requiredFields)
+
+    def __eq__(self, other):
+        if not isinstance(other, Projection):
+            return NotImplemented
+
+        return self._describe() == other._describe()
+
+    def _describe(self):
+        return (self._fields, self._includeHidden, self._requiredFields)
@@ -2,25 +2,45 @@
 """
 This file houses class that defines how to sort entities during search retrieval
 """
+import heapq
 import logging
+from contextlib import contextmanager
+from operator import itemgetter
 
-from server.exceptions import FieldNotFoundInEntityError
+from server.exceptions import FieldNotFoundInEntityError, InvalidPagingCursorError
 
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def _keysetComparisonHandling():
+    """
+    Converts failures to compare entities with keyset into InvalidPagingCursorError,
+    as keysets come from cursors passed by client, that may be stale or crafted,
+    like a cursor of a search sorted by another field
+    """
+    try:
+        yield
+    except TypeError as e:
+        logger.error(f'Unable to compare entity with keyset: {e}')
+        raise InvalidPagingCursorError('Paging cursor does not match sort order')
+
+
 class Sorter:
     """
     defines an interface of Sorter concrete classes.
     """
-    def sort(self, entities):
+    def sort(self, entities, limit=None):
         """
-        Sorts raw entity objects
+        Sorts raw entity objects.
+        With limit, only the first limit entities are selected in sorted order,
+        which takes O(n log limit) instead of sorting all of them.
         
         Args:
             entities(list): entities to sort
+            limit(int): number of leading entities needed, None for all
         Returns:
-            list of sorted entities
+            list of sorted entities, including at least the first limit of them
         """
         raise NotImplementedError
 
@@ -35,29 +55,248 @@ class Sorter:
         """
         raise NotImplementedError
 
+    def getMongoPipeline(self):
+        """
+        Creates aggregation stages that apply this sort
+        
+        Args:
+            None
+        Returns:
+            list of aggregation stages
+        """
+        raise NotImplementedError
+
+    def getSqlOrderBy(self, table):
+        """
+        Creates terms of SQL ORDER BY clause that apply this sort
+        
+        Args:
+            table(SqliteTable): table that creates SQL expressions of fields
+        Returns:
+            list of SQL terms, empty when rows are not sorted
+        """
+        raise NotImplementedError
+
+    def getSortFields(self):
+        """
+        Returns fieldnames this sorter reads from entities,
+        so that they are retrieved even when projection leaves them out
+        
+        Args:
+            None
+        Returns:
+            list of fieldnames
+        """
+        raise NotImplementedError
+
+    def extractKeyset(self, entity, idField):
+        """
+        Extracts values that locates entity in the sorted order.
+        Used for keyset pagination.
+        
+        Args:
+            entity(dict): raw entity
+            idField(str): fieldname that uniquely identifies entity
+        Returns:
+            list of [ sortValue, idValue ]
+        """
+        raise NotImplementedError
+
+    def sortKeyset(self, entities, idField, limit=None):
+        """
+        Sorts raw entities, breaking ties by idField so the order is total
+        
+        Args:
+            entities(list): entities to sort
+            idField(str): fieldname that uniquely identifies entity
+            limit(int): number of leading entities needed, None for all
+        Returns:
+            list of sorted entities, including at least the first limit of them
+        """
+        raise NotImplementedError
+
+    def getKeysetSortSpec(self, idField):
+        """
+        Creates mongo sort specification that breaks ties by idField
+        
+        Args:
+            idField(str): fieldname that uniquely identifies entity
+        Returns:
+            list of tuple (fieldname, order)
+        """
+        raise NotImplementedError
+
+    def createKeysetMongoFilter(self, keyset, idField):
+        """
+        Creates mongo filter that matches documents positioned after keyset
+        
+        Args:
+            keyset(list): [ sortValue, idValue ] returned from extractKeyset()
+            idField(str): fieldname that uniquely identifies entity
+        Returns:
+            dict expressing mongo filter
+        """
+        raise NotImplementedError
+
+    def getKeysetSqlOrderBy(self, table, idField):
+        """
+        Creates terms of SQL ORDER BY clause that break ties by idField
+        
+        Args:
+            table(SqliteTable): table that creates SQL expressions of fields
+            idField(str): fieldname that uniquely identifies entity
+        Returns:
+            list of SQL terms
+        """
+        raise NotImplementedError
+
+    def createKeysetSqlFilter(self, keyset, idField, table):
+        """
+        Creates parameterized SQL condition that matches rows positioned after keyset
+        
+        Args:
+            keyset(list): [ sortValue, idValue ] returned from extractKeyset()
+            idField(str): fieldname that uniquely identifies entity
+            table(SqliteTable): table that creates SQL expressions of fields
+        Returns:
+            tuple of SQL condition and list of parameters
+        """
+        raise NotImplementedError
+
+    def isAfterKeyset(self, entity, keyset, idField):
+        """
+        Determines if raw entity is positioned after keyset in the sorted order
+        
+        Args:
+            entity(dict): raw entity
+            keyset(list): [ sortValue, idValue ] returned from extractKeyset()
+            idField(str): fieldname that uniquely identifies entity
+        Returns:
+            Boolean
+        """
+        raise NotImplementedError
+
+    def getCacheKey(self):
+        """
+        Creates hashable value that equals among sorters that sort the same way
+        """
+        raise NotImplementedError
+
+    def sortsByRelevance(self):
+        """
+        Determines if entities should be sorted by relevance to text search,
+        which is only known to repositories that search through text indexes
+        
+        Args:
+            None
+        Returns:
+            Boolean
+        """
+        return False
+
 
-class AscendingSorter(Sorter):
+class FieldSorter(Sorter):
     """
-    Sorts entities in ascending order
+    Base class for sorters that sort entities by a single field.
+    Implements keyset related operations shared among concrete classes.
     """
-    _order = 1
+    _order = None
 
     def __init__(self, field):
         self._field = field
 
-    def sort(self, entities):
+    def getSortFields(self):
+        return [ self._field ]
+
+    def getCacheKey(self):
+        return ('field', self._field, self._order)
+
+    def extractKeyset(self, entity, idField):
+        with self._fieldAccessHandling():
+            return [ entity[self._field], entity[idField] ]
+
+    def sort(self, entities, limit=None):
+        return self._sortByKey(entities, itemgetter(self._field), limit)
+
+    def sortKeyset(self, entities, idField, limit=None):
+        return self._sortByKey(entities, itemgetter(self._field, idField), limit)
+
+    def getKeysetSortSpec(self, idField):
+        return [ (self._field, self._order), (idField, self._order) ]
+
+    def createKeysetMongoFilter(self, keyset, idField):
+        sortValue, idValue = keyset
+        op = '$gt' if self._order == 1 else '$lt'
+        return {
+            '$or': [
+                { self._field: { op: sortValue } },
+                { self._field: sortValue, idField: { op: idValue } },
+            ]
+        }
+
+    def getSqlOrderBy(self, table):
+        return [ self._getSqlTerm(table, self._field) ]
+
+    def getKeysetSqlOrderBy(self, table, idField):
+        return [ self._getSqlTerm(table, self._field), self._getSqlTerm(table, idField) ]
+
+    def createKeysetSqlFilter(self, keyset, idField, table):
+        sortValue, idValue = keyset
+        op = '>' if self._order == 1 else '<'
+        fieldSql = table.getFieldSql(self._field)
+        idSql = table.getFieldSql(idField)
+        return (
+            f'({fieldSql} {op} ? OR ({fieldSql} = ? AND {idSql} {op} ?))',
+            [ sortValue, sortValue, idValue ],
+        )
+
+    def _getSqlTerm(self, table, field):
+        return table.getFieldSql(field) + (' ASC' if self._order == 1 else ' DESC')
+
+    def isAfterKeyset(self, entity, keyset, idField):
+        sortValue, idValue = keyset
+        with self._fieldAccessHandling():
+            entityKey = ( entity[self._field], entity[idField] )
+
+        with _keysetComparisonHandling():
+            if self._order == 1:
+                return entityKey > ( sortValue, idValue )
+            else:
+                return entityKey < ( sortValue, idValue )
+
+    def _sortByKey(self, entities, key, limit):
+        """
+        Sorts entities in order of this sorter by key,
+        selecting only the first limit entities through a heap when limit is given
+        """
+        with self._fieldAccessHandling():
+            if limit is None:
+                return sorted(entities, key=key, reverse=self._order == -1)
+            if self._order == 1:
+                return heapq.nsmallest(limit, entities, key=key)
+            return heapq.nlargest(limit, entities, key=key)
+
+    @contextmanager
+    def _fieldAccessHandling(self):
         try:
-            return sorted(
-                entities,
-                key=lambda entity: entity[self._field],
-            )
+            yield
         except KeyError:
             logger.error(f'Unable to find field {self._field} in entity; failed to sort')
             raise FieldNotFoundInEntityError('Failed to sort entity')
 
+
+class AscendingSorter(FieldSorter):
+    """
+    Sorts entities in ascending order
+    """
+    _order = 1
+
     def sortMongoCursor(self, cursor):
         cursor.sort([ (self._field, self._order) ])
         return cursor
+
+    def getMongoPipeline(self):
+        return [ { '$sort': { self._field: self._order } } ]
     
     def __eq__(self, other):
         if isinstance(other, AscendingSorter):
@@ -68,30 +307,19 @@ class AscendingSorter(Sorter):
         return NotImplemented
 
 
-class DescendingSorter(Sorter):
+class DescendingSorter(FieldSorter):
     """
     Sorts entities in descending order
     """
     _order = -1
 
-    def __init__(self, field):
-        self._field = field
-
-    def sort(self, entities):
-        try:
-            return sorted(
-                entities,
-                key=lambda entity: entity[self._field],
-                reverse=True
-            )
-        except KeyError:
-            logger.error(f'Unable to find field {self._field} in entity; failed to sort')
-            raise FieldNotFoundInEntityError('Failed to sort entity')
-
     def sortMongoCursor(self, cursor):
         cursor.sort([ (self._field, self._order) ])
         return cursor
 
+    def getMongoPipeline(self):
+        return [ { '$sort': { self._field: self._order } } ]
+
     def __eq__(self, other):
         if isinstance(other, DescendingSorter):
             return all([
@@ -106,13 +334,79 @@ class NullSorter(Sorter):
     Sorter class that does no sorting whatsoever
     A null object pattern
     """
-    def sort(self, entities):
+    def sort(self, entities, limit=None):
         return entities
     
     def sortMongoCursor(self, cursor):
         return cursor
 
+    def getMongoPipeline(self):
+        return []
+
+    def getSortFields(self):
+        return []
+
+    def getCacheKey(self):
+        return ('null',)
+
+    def extractKeyset(self, entity, idField):
+        try:
+            return [ None, entity[idField] ]
+        except KeyError:
+            logger.error(f'Unable to find field {idField} in entity; failed to sort')
+            raise FieldNotFoundInEntityError('Failed to sort entity')
+
+    def sortKeyset(self, entities, idField, limit=None):
+        # without sort field, entities are paged in order of their ids
+        try:
+            if limit is None:
+                return sorted(entities, key=itemgetter(idField))
+            return heapq.nsmallest(limit, entities, key=itemgetter(idField))
+        except KeyError:
+            logger.error(f'Unable to find field {idField} in entity; failed to sort')
+            raise FieldNotFoundInEntityError('Failed to sort entity')
+
+    def getKeysetSortSpec(self, idField):
+        return [ (idField, 1) ]
+
+    def createKeysetMongoFilter(self, keyset, idField):
+        _, idValue = keyset
+        return { idField: { '$gt': idValue } }
+
+    def getSqlOrderBy(self, table):
+        return []
+
+    def getKeysetSqlOrderBy(self, table, idField):
+        return [ table.getFieldSql(idField) + ' ASC' ]
+
+    def createKeysetSqlFilter(self, keyset, idField, table):
+        _, idValue = keyset
+        return f'{table.getFieldSql(idField)} > ?', [ idValue ]
+
+    def isAfterKeyset(self, entity, keyset, idField):
+        _, idValue = keyset
+        with _keysetComparisonHandling():
+            return idField in entity and entity[idField] > idValue
+
     def __eq__(self, other):
         if isinstance(other, NullSorter):
             return True
         return NotImplemented
+
+
+class RelevanceSorter(NullSorter):
+    """
+    Sorts entities by relevance to text search, most relevant first.
+    Repositories that do not search through text indexes,
+    or page by keyset, leave entities unsorted same as NullSorter.
+    """
+    def sortsByRelevance(self):
+        return True
+
+    def getCacheKey(self):
+        return ('relevance',)
+
+    def __eq__(self, other):
+        if isinstance(other, Sorter):
+            return isinstance(other, RelevanceSorter)
+        return NotImplemented
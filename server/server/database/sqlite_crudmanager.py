@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses the class SqliteCrudManager.
+It implements the CrudManager class to make CRUD operations to a SQLite database,
+for deployments that do not run a mongoDB instance.
+"""
+import time
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import server.json_codec as json_codec
+from server.database.sorter import NullSorter
+from server.database.crudmanager import CrudManager
+from server.database.paging import Paging
+from server.database.projection import Projection
+from server.database.filter import compileRegex
+from server.database.sqlite_table import SqliteTable
+import server.exceptions as exceptions
+from server.entity import User, Post, Thread
+
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteCrudManager(CrudManager):
+    """
+    Implements CrudManager interface to make CRUD operations
+    to a SQLite database file.
+
+    Entities are stored as JSON documents, see SqliteTable for how they are laid out.
+    Filters, sorters and paging are translated into parameterized SQL,
+    so that SQLite narrows down and pages rows using indexes declared by entities.
+
+    Database is opened in WAL mode, so that searches are not blocked by writes.
+    Each thread uses its own connection, which caches statements it prepared.
+
+    When idGenerator is set, ids of created entities are generated in-process
+    instead of being allocated from counters table.
+    """
+    DEFAULT_STATEMENT_CACHE_SIZE = 256
+    # milliseconds to wait for other connections to finish writing
+    BUSY_TIMEOUT = 5000
+
+    # fields searched by fuzzy filters, indexed by FTS5 tables
+    USERS_TEXT_FIELDS = [ 'userName', 'displayName' ]
+    POSTS_TEXT_FIELDS = [ 'content' ]
+    THREADS_TEXT_FIELDS = [ 'title', 'subject' ]
+
+    USERS_TABLE = SqliteTable('users', indexes=User._indexes, textFields=USERS_TEXT_FIELDS)
+    POSTS_TABLE = SqliteTable('posts', indexes=Post._indexes, textFields=POSTS_TEXT_FIELDS)
+    THREADS_TABLE = SqliteTable(
+        'threads', indexes=Thread._indexes, textFields=THREADS_TEXT_FIELDS
+    )
+
+    def __init__(
+        self, databasePath, userauth, idGenerator=None,
+        statementCacheSize=DEFAULT_STATEMENT_CACHE_SIZE,
+    ):
+        self._databasePath = str(databasePath)
+        self._userauth = userauth
+        self._idGenerator = idGenerator
+        self._statementCacheSize = statementCacheSize
+        self._local = threading.local()
+
+        with self._sqliteOperationHandling('Failed to create tables'):
+            self._createSchema()
+
+    def createUser(self, user):
+        attrs = user.to_create()
+        attrs['createdAt'] = time.time()
+        attrs['password'] = self._userauth.hashPassword( attrs['password'] )
+
+        with self._sqliteOperationHandling('Failed to create user'):
+            createdId = self._insertDocument(self.USERS_TABLE, 'userId', attrs)
+
+        return dict(
+            createdCount=1,
+            createdId=createdId,
+        )
+
+    def searchUser(self, searchFilter, **options):
+        with self._sqliteOperationHandling('Failed to search user'):
+            users, matchedCount, nextCursor = self._searchDocuments(
+                self.USERS_TABLE, User, 'userId', searchFilter, options
+            )
+
+        users = [ User.from_storage(user) for user in users ]
+
+        return {
+            'users': users,
+            'returnCount': len(users),
+            'matchedCount': matchedCount,
+            'nextCursor': nextCursor,
+        }
+
+    def deleteUser(self, searchFilter):
+        with self._sqliteOperationHandling('Failed to delete user'):
+            deleteCount = self._deleteDocuments(self.USERS_TABLE, searchFilter)
+
+        return dict(deleteCount=deleteCount)
+
+    def updateUser(self, searchFilter, user):
+        attrs = user.to_update()
+        if 'password' in attrs:
+            attrs['password'] = self._userauth.hashPassword( attrs['password'] )
+
+        with self._sqliteOperationHandling('Failed to update user'):
+            return self._updateDocuments(self.USERS_TABLE, searchFilter, attrs)
+
+    def createPost(self, post):
+        attrs = post.to_create()
+        attrs['createdAt'] = time.time()
+
+        with self._sqliteOperationHandling('Failed to create post'):
+            createdId = self._insertDocument(self.POSTS_TABLE, 'postId', attrs)
+
+        return dict(
+            createdCount=1,
+            createdId=createdId,
+        )
+
+    def searchPost(self, searchFilter, **options):
+        with self._sqliteOperationHandling('Failed to search post'):
+            posts, matchedCount, nextCursor = self._searchDocuments(
+                self.POSTS_TABLE, Post, 'postId', searchFilter, options
+            )
+
+        posts = [ Post.from_storage(post) for post in posts ]
+
+        return {
+            'posts': posts,
+            'returnCount': len(posts),
+            'matchedCount': matchedCount,
+            'nextCursor': nextCursor,
+        }
+
+    def deletePost(self, searchFilter):
+        with self._sqliteOperationHandling('Failed to delete post'):
+            deleteCount = self._deleteDocuments(self.POSTS_TABLE, searchFilter)
+
+        return dict(deleteCount=deleteCount)
+
+    def updatePost(self, searchFilter, post):
+        attrs = post.to_update()
+
+        with self._sqliteOperationHandling('Failed to update post'):
+            return self._updateDocuments(self.POSTS_TABLE, searchFilter, attrs)
+
+    def createThread(self, thread):
+        attrs = thread.to_create()
+        attrs['createdAt'] = time.time()
+
+        with self._sqliteOperationHandling('Failed to create new thread'):
+            createdId = self._insertDocument(self.THREADS_TABLE, 'threadId', attrs)
+
+        return dict(
+            createdCount=1,
+            createdId=createdId,
+        )
+
+    def searchThread(self, searchFilter, **options):
+        with self._sqliteOperationHandling('Failed to search for threads'):
+            threads, matchedCount, nextCursor = self._searchDocuments(
+                self.THREADS_TABLE, Thread, 'threadId', searchFilter, options
+            )
+
+        threads = [ Thread.from_storage(thread) for thread in threads ]
+
+        return dict(
+            threads=threads,
+            matchedCount=matchedCount,
+            returnCount=len(threads),
+            nextCursor=nextCursor,
+        )
+
+    def updateThread(self, searchFilter, thread):
+        attrs = thread.to_update()
+
+        with self._sqliteOperationHandling('Failed to update thread'):
+            return self._updateDocuments(self.THREADS_TABLE, searchFilter, attrs)
+
+    def incrementThreadViews(self, viewCounts):
+        """
+        Adds view counts to threads with a single transaction
+
+        Args:
+            viewCounts(dict): number of views to add, keyed by threadId
+        Returns:
+            dict: matched and updated count of threads
+        """
+        if len(viewCounts) == 0:
+            return dict(matchedCount=0, updatedCount=0)
+
+        table = self.THREADS_TABLE
+        viewsSql = table.getFieldSql('views')
+        statement = (
+            f"UPDATE {table.getName()} SET doc = json_set(doc, '$.views', "
+            f'coalesce({viewsSql}, 0) + ?) '
+            f"WHERE {table.getFieldSql('threadId')} = ?"
+        )
+        with self._sqliteOperationHandling('Failed to increment thread views'):
+            with self._transaction(write=True) as connection:
+                cursor = connection.executemany(
+                    statement, [ (count, threadId) for threadId, count in viewCounts.items() ]
+                )
+                matchedCount = cursor.rowcount
+
+        return dict(
+            matchedCount=matchedCount,
+            updatedCount=matchedCount,
+        )
+
+    def deleteThread(self, searchFilter):
+        with self._sqliteOperationHandling('Failed to delete thread'):
+            deleteCount = self._deleteDocuments(self.THREADS_TABLE, searchFilter)
+
+        return dict(deleteCount=deleteCount)
+
+    def _searchDocuments(self, table, entityClass, idField, searchFilter, options):
+        """
+        Searches documents in table and counts all documents that matched.
+        Both are read in a single transaction, so that they agree with each other.
+
+        Args:
+            table(SqliteTable): table to search
+            entityClass(class): entity class that describes attributes of documents
+            idField(str): fieldname that uniquely identifies documents in table
+            searchFilter(Filter): filter to apply, None would match all documents
+            options(dict): search options like paging, sorter and projection
+        Returns:
+            tuple of list of documents in page, total matched count and cursor to next page
+        """
+        self._setDefaultSearchOptions(options)
+        paging = options.get('paging')
+        sorter = options.get('sorter')
+        projection = options.get('projection')
+
+        where, params = self._createWhere(table, searchFilter)
+        pageWhere, pageParams = where, params
+        if paging.usesKeyset():
+            keyset = paging.getKeyset()
+            if keyset is not None:
+                keysetWhere, keysetParams = sorter.createKeysetSqlFilter(keyset, idField, table)
+                pageWhere = f'({where}) AND {keysetWhere}'
+                pageParams = params + keysetParams
+            orderBy = sorter.getKeysetSqlOrderBy(table, idField)
+        else:
+            # rows that are not sorted are returned in order of insertion
+            orderBy = sorter.getSqlOrderBy(table) or [ 'rowid' ]
+        limit, limitParams = paging.getSqlLimit()
+
+        with self._transaction() as connection:
+            rows = connection.execute(
+                f'SELECT doc FROM {table.getName()} WHERE {pageWhere} '
+                f'ORDER BY {", ".join(orderBy)} {limit}',
+                pageParams + limitParams,
+            ).fetchall()
+            matchedCount, = connection.execute(
+                f'SELECT count(*) FROM {table.getName()} WHERE {where}', params
+            ).fetchone()
+
+        documents = [ json_codec.loads(doc) for doc, in rows ]
+        nextCursor = paging.createNextCursor(documents, sorter, idField)
+        # keep the same fields as MongoCrudManager, which needs them to create cursors
+        requiredFields = [ idField ] + sorter.getSortFields()
+        documents = [
+            projection.project(document, entityClass, requiredFields)
+            for document in documents
+        ]
+
+        return documents, matchedCount, nextCursor
+
+    def _insertDocument(self, table, idField, attrs):
+        with self._transaction(write=True) as connection:
+            attrs[idField] = self._generateId(connection, idField)
+            connection.execute(
+                f'INSERT INTO {table.getName()} (doc) VALUES (?)', [ self._encode(attrs) ]
+            )
+
+        return attrs[idField]
+
+    def _deleteDocuments(self, table, searchFilter):
+        where, params = self._createWhere(table, searchFilter)
+        with self._transaction(write=True) as connection:
+            cursor = connection.execute(f'DELETE FROM {table.getName()} WHERE {where}', params)
+            return cursor.rowcount
+
+    def _updateDocuments(self, table, searchFilter, updateProps):
+        """
+        Sets fields of documents that matched filter in a single statement.
+        Field named by 'increment' is incremented instead of being set,
+        same as MongoCrudManager.
+        """
+        fieldUpdates = updateProps.copy()
+        incrementField = fieldUpdates.pop('increment', None)
+
+        assignments = []
+        params = []
+        for field, value in fieldUpdates.items():
+            assignments.append( f"'$.{table.validateIdentifier(field)}', json(?)" )
+            params.append( self._encode(value) )
+        if incrementField is not None:
+            assignments.append(
+                f"'$.{table.validateIdentifier(incrementField)}', "
+                f'coalesce({table.getFieldSql(incrementField)}, 0) + 1'
+            )
+        update = 'doc' if len(assignments) == 0 else f'json_set(doc, {", ".join(assignments)})'
+
+        where, whereParams = self._createWhere(table, searchFilter)
+        with self._transaction(write=True) as connection:
+            cursor = connection.execute(
+                f'UPDATE {table.getName()} SET doc = {update} WHERE {where}',
+                params + whereParams,
+            )
+            matchedCount = cursor.rowcount
+
+        return dict(
+            matchedCount=matchedCount,
+            updatedCount=matchedCount,
+        )
+
+    def _createWhere(self, table, searchFilter):
+        """
+        Creates SQL condition from normalized filter,
+        so that redundant aggregates are not sent to database
+        """
+        if searchFilter is None:
+            return '1', []
+        return searchFilter.normalize().getSqlFilter(table)
+
+    def _generateId(self, connection, fieldname):
+        if self._idGenerator is not None:
+            return self._idGenerator.generateId(fieldname)
+
+        counterValue, = connection.execute(
+            'INSERT INTO counters (fieldname, value) VALUES (?, 1) '
+            'ON CONFLICT (fieldname) DO UPDATE SET value = value + 1 '
+            'RETURNING value - 1',
+            [ fieldname ],
+        ).fetchone()
+        return str(counterValue)
+
+    def _createSchema(self):
+        with self._transaction(write=True) as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS counters '
+                '(fieldname TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+            )
+            for table in [ self.USERS_TABLE, self.POSTS_TABLE, self.THREADS_TABLE ]:
+                for statement in table.getSchemaSql():
+                    connection.execute(statement)
+
+    def _getConnection(self):
+        """
+        Returns connection of the current thread, opening it on first use.
+        sqlite3 connections must not be shared among threads,
+        and each keeps its own cache of prepared statements.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # transactions are begun explicitly by _transaction()
+            connection = sqlite3.connect(
+                self._databasePath,
+                isolation_level=None,
+                cached_statements=self._statementCacheSize,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA busy_timeout={self.BUSY_TIMEOUT}')
+            # SQLite declares REGEXP operator, but leaves it to applications to define
+            connection.create_function('regexp', 2, _regexp, deterministic=True)
+            self._local.connection = connection
+
+        return connection
+
+    @contextmanager
+    def _transaction(self, write=False):
+        """
+        Runs statements in a transaction of the current thread's connection.
+        Write transactions take the write lock up front,
+        so that they do not fail to upgrade from read lock midway.
+        """
+        connection = self._getConnection()
+        connection.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        try:
+            yield connection
+        except BaseException:
+            # some errors roll back transaction on their own
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _encode(self, value):
+        return json_codec.dumps(value).decode('utf-8')
+
+    @contextmanager
+    def _sqliteOperationHandling(self, errormsg):
+        try:
+            yield
+        except sqlite3.Error as e:
+            logger.error(e)
+            raise exceptions.FailedSqliteOperation(errormsg)
+
+    def _setDefaultSearchOptions(self, options):
+        if 'paging' not in options:
+            options['paging'] = Paging()
+        if 'sorter' not in options:
+            options['sorter'] = NullSorter()
+        if 'projection' not in options:
+            options['projection'] = Projection()
+
+
+def _regexp(pattern, value):
+    """
+    Implements 'value REGEXP pattern' same as RegexFilter.matches()
+    """
+    return isinstance(value, str) and compileRegex(pattern).search(value) is not None
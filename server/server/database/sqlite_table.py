@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses class that describes how entities are stored in SQLite tables.
+Each entity is stored as a JSON document in column doc,
+and fields are read out of documents with json_extract().
+Indexes are created on the same json_extract() expressions,
+so that SQLite uses them for filters and sorts on those fields.
+Text fields searched by fuzzy filters are copied into an FTS5 table
+by triggers, to look up substrings through trigram index.
+"""
+import re
+
+import server.json_codec as json_codec
+from server.exceptions import FilterParseError
+
+# fields are embedded into SQL as JSON paths, so only plain identifiers are accepted
+_FIELDNAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class SqliteTable:
+    """
+    Describes a table of JSON documents, and creates SQL expressions on its fields.
+    Passed to filters and sorters to create SQL in terms of this table.
+    """
+    # trigram index can only look up substrings of at least this many characters
+    MIN_TRIGRAM_LENGTH = 3
+
+    def __init__(self, name, indexes=(), textFields=()):
+        """
+        Args:
+            name(str): name of table
+            indexes(list): index declarations same as _indexes of entity classes
+            textFields(list): fields to look up by FTS5 table in fuzzy filters
+        """
+        self._name = self.validateIdentifier(name)
+        self._indexes = list(indexes)
+        self._textFields = [ self.validateIdentifier(field) for field in textFields ]
+
+    @staticmethod
+    def validateIdentifier(name):
+        """
+        Validates that name can be embedded into SQL as is
+
+        Args:
+            name(str): name of table or field
+        Returns:
+            name
+        """
+        if not isinstance(name, str) or _FIELDNAME_PATTERN.match(name) is None:
+            raise FilterParseError(f'Field {name!r} can not be searched')
+        return name
+
+    def getName(self):
+        return self._name
+
+    def getFtsName(self):
+        return f'{self._name}_fts'
+
+    def getFieldSql(self, field, document='doc'):
+        """
+        Creates SQL expression that reads field from document
+
+        Args:
+            field(str): fieldname
+            document(str): column or row reference of document
+        Returns:
+            SQL expression
+        """
+        return f"json_extract({document}, '$.{self.validateIdentifier(field)}')"
+
+    def getFieldTypeSql(self, field):
+        """
+        Creates SQL expression that reads JSON type of field,
+        which is NULL when field is missing and 'null' when field is null
+        """
+        return f"json_type(doc, '$.{self.validateIdentifier(field)}')"
+
+    @staticmethod
+    def toSqlValue(value):
+        """
+        Converts value of filter to value comparable to field read by json_extract(),
+        which reads arrays and objects as JSON text
+        """
+        if isinstance(value, (list, dict)):
+            return json_codec.dumps(value).decode('utf-8')
+        return value
+
+    def createFuzzySql(self, field, values):
+        """
+        Creates SQL condition that matches documents whose field contains any of values.
+        Looked up through FTS5 table when field is indexed there
+        and all values are long enough for trigram index,
+        otherwise field of each document is searched.
+        Matches are case insensitive, same as fuzzy filters on mongoDB.
+
+        Args:
+            field(str): fieldname
+            values(list): substrings to look for
+        Returns:
+            tuple of SQL condition and list of parameters
+        """
+        if len(values) == 0:
+            return '0', []
+
+        values = [ str(value) for value in values ]
+        usesFts = field in self._textFields and all(
+            len(value) >= self.MIN_TRIGRAM_LENGTH for value in values
+        )
+        if usesFts:
+            phrases = ' OR '.join(
+                '"' + value.replace('"', '""') + '"' for value in values
+            )
+            ftsName = self.getFtsName()
+            return (
+                f'rowid IN (SELECT rowid FROM {ftsName} WHERE {ftsName} MATCH ?)',
+                [ f'{field} : ({phrases})' ],
+            )
+
+        fieldSql = self.getFieldSql(field)
+        conditions = [ f'instr(lower({fieldSql}), lower(?)) > 0' for _ in values ]
+        return '(' + ' OR '.join(conditions) + ')', values
+
+    def getSchemaSql(self):
+        """
+        Creates statements that create table, its indexes, FTS5 table and triggers
+        when they do not exist yet
+
+        Args:
+            None
+        Returns:
+            list of SQL statements
+        """
+        statements = [
+            f'CREATE TABLE IF NOT EXISTS {self._name} (doc TEXT NOT NULL)',
+        ]
+        for index in self._indexes:
+            statements.append( self._createIndexSql(index) )
+
+        if len(self._textFields) > 0:
+            statements += self._createFtsSql()
+
+        return statements
+
+    def _createIndexSql(self, index):
+        keys = [ (self.validateIdentifier(field), order) for field, order in index['keys'] ]
+        indexName = '_'.join([ self._name ] + [ field for field, _ in keys ])
+        columns = ', '.join(
+            self.getFieldSql(field) + ('' if order == 1 else ' DESC')
+            for field, order in keys
+        )
+        unique = 'UNIQUE ' if index.get('unique', False) else ''
+        return f'CREATE {unique}INDEX IF NOT EXISTS {indexName} ON {self._name} ({columns})'
+
+    def _createFtsSql(self):
+        ftsName = self.getFtsName()
+        columns = ', '.join(self._textFields)
+        newFields = ', '.join( self.getFieldSql(field, 'new.doc') for field in self._textFields )
+        assignments = ', '.join(
+            f"{field} = {self.getFieldSql(field, 'new.doc')}" for field in self._textFields
+        )
+        return [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {ftsName} '
+            f"USING fts5({columns}, tokenize='trigram')",
+            f'CREATE TRIGGER IF NOT EXISTS {ftsName}_insert '
+            f'AFTER INSERT ON {self._name} BEGIN '
+            f'INSERT INTO {ftsName} (rowid, {columns}) VALUES (new.rowid, {newFields}); '
+            'END',
+            f'CREATE TRIGGER IF NOT EXISTS {ftsName}_update '
+            f'AFTER UPDATE OF doc ON {self._name} BEGIN '
+            f'UPDATE {ftsName} SET {assignments} WHERE rowid = new.rowid; '
+            'END',
+            f'CREATE TRIGGER IF NOT EXISTS {ftsName}_delete '
+            f'AFTER DELETE ON {self._name} BEGIN '
+            f'DELETE FROM {ftsName} WHERE rowid = old.rowid; '
+            'END',
+        ]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses class that searches fuzzy filters through text indexes of mongoDB.
+Fuzzy filters are sent to mongoDB as case insensitive unanchored $regex,
+which can not use any index and scans the whole collection.
+Search box creates fuzzy filters on all fuzzy searchable fields of an entity,
+OR-ed together with the same terms, which is what a $text query on a text index
+over those fields looks up.
+"""
+from server.database.filter import FuzzyStringFilter
+from server.database.aggregate_filter import AndFilter, OrFilter
+
+
+class MongoTextSearch:
+    """
+    Creates mongo queries that look up fuzzy filters through $text.
+
+    Only fuzzy filters that search all text indexed fields of collection with the same terms
+    are looked up through $text, as $text searches all of them at once.
+    mongoDB allows a single $text in a query, at its top level,
+    so only the filter itself or one of its top level AND-ed filters is converted.
+    Other fuzzy filters are left to $regex.
+
+    Note that $text matches words and their stems instead of substrings,
+    so the same terms may match different documents than $regex would.
+    """
+    # sort specification that orders documents by relevance to $text
+    TEXT_SCORE_SORT = { 'score': { '$meta': 'textScore' } }
+
+    def __init__(self, textFields):
+        """
+        Args:
+            textFields(dict): list of text indexed fields, keyed by collection name
+        """
+        self._textFields = { name: set(fields) for name, fields in textFields.items() }
+
+    def createQuery(self, collectionName, searchFilter):
+        """
+        Creates mongo query of filter, looking up fuzzy filters through $text where possible
+
+        Args:
+            collectionName(str): name of collection to search
+            searchFilter(Filter): normalized filter
+        Returns:
+            tuple of mongo query and Boolean, whether query uses $text
+        """
+        fields = self._textFields.get(collectionName, set())
+        if len(fields) == 0:
+            return searchFilter.getMongoFilter(), False
+
+        if self._isTextSearchable(searchFilter, fields):
+            return self._createTextFilter(searchFilter), True
+
+        if isinstance(searchFilter, AndFilter):
+            filters = searchFilter.getFilters()
+            for idx, f in enumerate(filters):
+                if self._isTextSearchable(f, fields):
+                    others = filters[:idx] + filters[idx + 1:]
+                    return {
+                        '$and': [ self._createTextFilter(f) ] + [
+                            other.getMongoFilter() for other in others
+                        ]
+                    }, True
+
+        return searchFilter.getMongoFilter(), False
+
+    @staticmethod
+    def createSearchString(values):
+        """
+        Creates $search string that matches any of values.
+        Quotes and leading hyphens are removed,
+        as $search reads them as phrases and negations.
+
+        Args:
+            values(list): terms to search for
+        Returns:
+            string, empty when no terms are left
+        """
+        terms = []
+        for value in values:
+            for term in str(value).replace('"', ' ').split():
+                term = term.lstrip('-')
+                if term:
+                    terms.append(term)
+
+        return ' '.join(terms)
+
+    def _isTextSearchable(self, searchFilter, fields):
+        fuzzyFilters = self._getFuzzyFilters(searchFilter)
+        if fuzzyFilters is None:
+            return False
+
+        values = fuzzyFilters[0].getValues()
+        return all([
+            all( f.getValues() == values for f in fuzzyFilters ),
+            set( f.getField() for f in fuzzyFilters ) == fields,
+            self.createSearchString(values) != '',
+        ])
+
+    def _getFuzzyFilters(self, searchFilter):
+        """
+        Lists fuzzy filters that filter is made of, None when it contains other filters
+        """
+        if isinstance(searchFilter, FuzzyStringFilter):
+            return [ searchFilter ]
+
+        if isinstance(searchFilter, OrFilter):
+            filters = searchFilter.getFilters()
+            if len(filters) > 0 and all( isinstance(f, FuzzyStringFilter) for f in filters ):
+                return filters
+
+        return None
+
+    def _createTextFilter(self, searchFilter):
+        values = self._getFuzzyFilters(searchFilter)[0].getValues()
+        return { '$text': { '$search': self.createSearchString(values) } }
@@ -2,28 +2,104 @@
 """
 This file houses Base Entity class
 """
+from collections import namedtuple
+from types import MappingProxyType
+
 from server.exceptions import EntityValidationError
 
+OPERATIONS = ('to_serialize', 'to_create', 'to_update')
+# marks attributes that are not set on an entity
+_MISSING = object()
+
+# describes how an entity is converted to a dictionary for an operation
+#   hidden: frozenset of attributes removed from the dictionary
+#   required: tuple of attributes that have to be in the dictionary
+#   entities: frozenset of attributes holding lists of nested entities
+ConversionPlan = namedtuple('ConversionPlan', ['hidden', 'required', 'entities'])
+
 
-class Entity:
+def create_conversion_plan(attribute_description, operation):
+    """
+    Helper function to precompute how entities are converted for an operation
+    
+    Args:
+        attribute_description(dict):
+            description of allowed attributes predefined in each concrete entity class
+        operation(string): 'to_serialize'|'to_create'|'to_update'
+    Returns:
+        ConversionPlan
+    """
+    rules = {
+        attr_name: attr['conversion_rules'][operation]
+        for attr_name, attr in attribute_description.items()
+    }
+
+    return ConversionPlan(
+        hidden=frozenset( attr for attr, rule in rules.items() if rule['hide'] ),
+        required=tuple( attr for attr, rule in rules.items() if rule['required'] ),
+        entities=frozenset( attr for attr, rule in rules.items() if rule.get('entity', False) ),
+    )
+
+
+class EntityMeta(type):
+    """
+    Prepares entity classes from their _attribute_description once, when they are defined:
+        - instances store described attributes in __slots__ instead of __dict__
+        - conversion plans of each operation are precomputed
+    """
+    def __new__(mcs, name, bases, namespace):
+        description = namespace.get('_attribute_description', {})
+        namespace['__slots__'] = tuple(description.keys())
+        namespace['_attribute_names'] = tuple(description.keys())
+        namespace['_conversion_plans'] = MappingProxyType({
+            operation: create_conversion_plan(description, operation)
+            for operation in OPERATIONS
+        })
+
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class Entity(metaclass=EntityMeta):
     """
     Base class that defines operations common to all entities in this app
     """
 
     def __init__(self, object=None, **kwargs):
         sanitized = self._sanitize_attributes(object, **kwargs)
-        self.__dict__.update(sanitized)
+        for attr, value in sanitized.items():
+            setattr(self, attr, value)
 
-    def to_serialize(self):
+    @classmethod
+    def from_storage(cls, row):
+        """
+        Creates entity from a row read from persistent storage.
+        Rows were validated when this app wrote them, so validation is skipped.
+        Intended for repositories only, request payloads must use the constructor.
+
+        Args:
+            row(dict): attributes read from storage
+        Returns:
+            entity, with attributes unknown to its class dropped
+        """
+        entity = cls.__new__(cls)
+        description = cls._attribute_description
+        for attr, value in row.items():
+            if attr in description:
+                setattr(entity, attr, value)
+
+        return entity
+
+    def to_serialize(self, fields=None):
         """
         Creates a dictionary of attributes so that self could be sent over the wire.
         
         Args:
-            None
+            fields(list): names of attributes to serialize, as requested by sparse fieldsets.
+                Required attributes are only checked among these. None serializes all.
         Returns:
             Dict of attributes
         """
-        return self._convert_dict_for('to_serialize')
+        return self._convert_dict_for('to_serialize', fields)
 
     def to_create(self):
         """
@@ -62,19 +138,20 @@ class Entity:
         
         normalized = self._validator.normalized(to_add)
 
-        if not self._validator.validate(normalized):
+        errors = self._validator.find_errors(normalized)
+        if errors:
             self._logger.error('Failed validation in %s creation', self.__class__.__name__)
-            for attr, reason in self._validator.errors.items():
+            for attr, reason in errors.items():
                 self._logger.error(
                     '{ attribute: %s,  value: %s, reason: %s }',
-                    attr, normalized[attr], reason
+                    attr, normalized.get(attr, None), reason
                 )
 
             raise EntityValidationError(f'Failed to validate {self.__class__.__name__}')
         
         return normalized
 
-    def _convert_dict_for(self, operation):
+    def _convert_dict_for(self, operation, fields=None):
         """
         Creates a dictionary suited for the specified operation.
         Removes what needes to be hidden,
@@ -82,59 +159,63 @@ class Entity:
         
         Args:
             operation(string): 'to_serialize'|'to_create'|'to_update'
+            fields(list): names of attributes to restrict to, None for all attributes
         Returns:
             dictionary of attributes
         """
-        attrs = self._create_attrs_for(operation)
-        self._validate_required_for(attrs, operation)
-        self._recursively_convert_dict_for(attrs, operation)
+        plan = self._conversion_plans[operation]
+        if fields is not None:
+            fields = frozenset(fields)
 
-        return attrs
+        attrs = {}
+        for attr in self._attribute_names:
+            if attr in plan.hidden or (fields is not None and attr not in fields):
+                continue
+            value = getattr(self, attr, _MISSING)
+            if value is _MISSING:
+                continue
+            attrs[attr] = value
 
-    def _create_attrs_for(self, operation):
-        attrs = self.__dict__.copy()
-        hidden_attrs = [
-            attr for attr in self._attribute_description.keys()
-            if self._attribute_description[attr]['conversion_rules'][operation]['hide']
-        ]
+        self._validate_required_for(attrs, operation, plan, fields)
 
-        for hidden_attr in hidden_attrs:
-            attrs.pop(hidden_attr, None)
+        # convert nested entities to dict
+        for attr in plan.entities:
+            if attr in attrs:
+                attrs[attr] = [ entity._convert_dict_for(operation) for entity in attrs[attr] ]
 
         return attrs
 
-    def _validate_required_for(self, attrs, operation):
-        required_attrs = [
-            attr for attr in self._attribute_description.keys()
-            if self._attribute_description[attr]['conversion_rules'][operation]['required']
-        ]
+    def _get_attrs(self):
+        """
+        Creates a dictionary of attributes set on self
+        """
+        attrs = {}
+        for attr in self._attribute_names:
+            value = getattr(self, attr, _MISSING)
+            if value is not _MISSING:
+                attrs[attr] = value
+
+        return attrs
 
-        for required_attr in required_attrs:
+    def _validate_required_for(self, attrs, operation, plan, fields=None):
+        for required_attr in plan.required:
+            if fields is not None and required_attr not in fields:
+                continue
             if required_attr not in attrs:
                 self._logger.error('Failed validation in %s', operation)
                 self._logger.error('Missing required attribute: %s', required_attr)
                 raise EntityValidationError(f'Failed to validate {self.__class__.__name__}')
 
-    def _recursively_convert_dict_for(self, attrs, operation):
-        for attr in attrs.keys():
-            conversion_rules = self._attribute_description[attr]['conversion_rules']
-            is_entity = conversion_rules[operation].get('entity', False)
-            if is_entity is False:
-                continue
-
-            # convert entities to serializable dict
-            attrs[attr] = [ entity._convert_dict_for(operation) for entity in attrs[attr] ]
-
 
 def extract_schema(attribute_description):
     """
-    Helper function to extract a valid cerberus schema
+    Helper function to extract a schema to be compiled by schema_compiler.compile_schema
     
     Args:
         attribute_description(dict):
             description of allowed attributes predefined in each concrete entity class
     Returns:
-        a valid cerberus schema
+        a schema of validation rules
     """
     schema = {}
 
@@ -4,9 +4,8 @@ This file houses classes that define contextual user state
 """
 import logging
 
-from cerberus import Validator, TypeDefinition
-
 from server.entity import Entity, extract_schema
+from server.entity.schema_compiler import compile_schema, register_type
 
 
 class NewPost:
@@ -31,7 +30,7 @@ class NewPost:
             'required': False,
         }
     }
-    _validator = Validator(_schema, allow_unknown=False)
+    _validator = compile_schema(_schema)
 
     @classmethod
     def validate(cls, newPost):
@@ -52,7 +51,7 @@ class UpdatePost:
             'required': False,
         },
     }
-    _validator = Validator(_schema, allow_unknown=False)
+    _validator = compile_schema(_schema)
 
     @classmethod
     def validate(cls, updatePost):
@@ -147,6 +146,25 @@ class Post(Entity):
                 },
             },
         },
+        'threadId': {
+            'validation_rules': {
+                'type': 'string',
+            },
+            'conversion_rules': {
+                'to_serialize': {
+                    'required': False,
+                    'hide': False,
+                },
+                'to_create': {
+                    'required': False,
+                    'hide': False,
+                },
+                'to_update': {
+                    'required': False,
+                    'hide': True,
+                },
+            },
+        },
         'content': {
             'validation_rules': {
                 'type': 'string',
@@ -172,6 +190,7 @@ class Post(Entity):
         'owner': {
             'validation_rules': {
                 'type': 'list',
+                'schema': { 'type': 'User' },
             },
             'conversion_rules': {
                 'to_serialize': {
@@ -228,11 +247,16 @@ class Post(Entity):
             },
         },
     }
+    # indexes to declare on collection that persists this entity
+    _indexes = [
+        dict(keys=[ ('postId', 1) ], unique=True),
+        dict(keys=[ ('threadId', 1), ('createdAt', 1) ]),
+        dict(keys=[ ('userId', 1) ]),
+    ]
     _schema = extract_schema(_attribute_description)
-    _validator = Validator(_schema, purge_unknown=True)
+    _validator = compile_schema(_schema, purge_unknown=True)
     _logger = logging.getLogger(__name__)
 
 
-# adds custom type checking for validator
-post_type = TypeDefinition('Post', (Post,), ())
-Validator.types_mapping['Post'] = post_type
+# makes entity available to type rule of schemas
+register_type('Post', Post)
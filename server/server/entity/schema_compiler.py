@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses compiler that turns validation rules of entities
+into plain python functions, once when entity classes are defined.
+Compiled validators return errors instead of keeping them as state,
+so a single validator can be shared among threads of a threaded WSGI server.
+
+Supported rules follow semantics and error messages of cerberus:
+    - type: 'string'|'integer'|'float'|'list', or entity types added by register_type()
+    - nullable: allows None, which skips other rules
+    - regex: pattern that the whole string has to match
+    - allowed: list of allowed values
+    - required: field has to be present in document
+    - schema: rules applied to each item of a list, like lists of nested entities
+"""
+import re
+from collections.abc import Sequence
+
+# type name -> (included classes, excluded classes)
+_types = {
+    'string': ((str,), ()),
+    'integer': ((int,), ()),
+    'float': ((float, int), ()),
+    'list': ((Sequence,), (str,)),
+}
+
+
+def register_type(name, *classes):
+    """
+    Makes entity classes available to type rule
+
+    Args:
+        name(str): type name to refer to in rules, like 'User'
+        classes(class): classes whose instances are of the type
+    Returns:
+        None
+    """
+    _types[name] = (classes, ())
+
+
+class SchemaValidator:
+    """
+    Validator compiled from a schema by compile_schema().
+    Immutable once compiled.
+    """
+    __slots__ = ('_fields', '_required', '_allow_unknown', '_purge_unknown')
+
+    def __init__(self, fields, required, allow_unknown, purge_unknown):
+        self._fields = fields
+        self._required = required
+        self._allow_unknown = allow_unknown
+        self._purge_unknown = purge_unknown
+
+    def normalized(self, document):
+        """
+        Creates copy of document, without unknown fields when purge_unknown was set
+
+        Args:
+            document(dict): attributes to normalize
+        Returns:
+            new dict of attributes
+        """
+        if not self._purge_unknown:
+            return dict(document)
+
+        fields = self._fields
+        return { field: value for field, value in document.items() if field in fields }
+
+    def find_errors(self, document):
+        """
+        Validates document against compiled schema
+
+        Args:
+            document(dict): attributes to validate
+        Returns:
+            dict of fieldname and list of error messages, empty when document is valid
+        """
+        errors = {}
+        fields = self._fields
+        for field, value in document.items():
+            validate_field = fields.get(field, None)
+            if validate_field is None:
+                if not (self._allow_unknown or self._purge_unknown):
+                    errors[field] = [ 'unknown field' ]
+                continue
+
+            messages = validate_field(value)
+            if messages:
+                errors[field] = messages
+
+        for field in self._required:
+            if field not in document:
+                errors[field] = [ 'required field' ]
+
+        return errors
+
+    def validate(self, document):
+        """
+        Returns True when document is valid
+        """
+        return not self.find_errors(document)
+
+
+def compile_schema(schema, allow_unknown=False, purge_unknown=False):
+    """
+    Compiles schema into validator
+
+    Args:
+        schema(dict): fieldname and its rules
+        allow_unknown(bool): whether fields missing in schema are valid
+        purge_unknown(bool): whether fields missing in schema are removed on normalization
+    Returns:
+        SchemaValidator
+    """
+    fields = { field: _compile_field(rules) for field, rules in schema.items() }
+    required = tuple( field for field, rules in schema.items() if rules.get('required', False) )
+
+    return SchemaValidator(fields, required, allow_unknown, purge_unknown)
+
+
+def _compile_field(rules):
+    """
+    Compiles rules of a single field into function
+    that returns list of error messages for a value
+    """
+    nullable = rules.get('nullable', False)
+    check_type = _compile_type(rules['type']) if 'type' in rules else None
+    checks = []
+    if 'regex' in rules:
+        checks.append( _compile_regex(rules['regex']) )
+    if 'allowed' in rules:
+        checks.append( _compile_allowed(rules['allowed']) )
+    if 'schema' in rules:
+        checks.append( _compile_items(rules['schema']) )
+    checks = tuple(checks)
+
+    def validate_field(value):
+        if value is None:
+            return [] if nullable else [ 'null value not allowed' ]
+        if check_type is not None:
+            message = check_type(value)
+            if message is not None:
+                # like cerberus, other rules are skipped for values of wrong type
+                return [ message ]
+
+        messages = []
+        for check in checks:
+            message = check(value)
+            if message is not None:
+                messages.append(message)
+
+        return messages
+
+    return validate_field
+
+
+def _compile_type(name):
+    message = f'must be of {name} type'
+
+    def check_type(value):
+        # entity types may be registered after schemas referring them are compiled
+        included, excluded = _types[name]
+        if isinstance(value, included) and not isinstance(value, excluded):
+            return None
+        return message
+
+    return check_type
+
+
+def _compile_regex(pattern):
+    # cerberus anchors the pattern at both ends
+    compiled = re.compile(pattern if pattern.endswith('$') else pattern + '$')
+    message = f"value does not match regex '{pattern}'"
+
+    def check_regex(value):
+        if not isinstance(value, str) or compiled.match(value):
+            return None
+        return message
+
+    return check_regex
+
+
+def _compile_allowed(allowed):
+    allowed = tuple(allowed)
+
+    def check_allowed(value):
+        if value in allowed:
+            return None
+        return f'unallowed value {value}'
+
+    return check_allowed
+
+
+def _compile_items(item_rules):
+    validate_item = _compile_field(item_rules)
+
+    def check_items(value):
+        errors = {}
+        for idx, item in enumerate(value):
+            messages = validate_item(item)
+            if messages:
+                errors[idx] = messages
+
+        return errors or None
+
+    return check_items
@@ -4,9 +4,8 @@ This file defines entity thread
 """
 import logging
 
-from cerberus import Validator, TypeDefinition
-
 from server.entity import Entity, extract_schema
+from server.entity.schema_compiler import compile_schema, register_type
 
 
 class NewThread:
@@ -46,7 +45,7 @@ class NewThread:
         },
     }
 
-    _validator = Validator(_schema, allow_unknown=False)
+    _validator = compile_schema(_schema)
 
     @classmethod
     def validate(cls, newThread):
@@ -87,7 +86,7 @@ class UpdateThread:
         },
     }
 
-    _validator = Validator(_schema, allow_unknown=False)
+    _validator = compile_schema(_schema)
 
     @classmethod
     def validate(cls, updateThread):
@@ -219,12 +218,14 @@ class Thread(Entity):
         },
         'owner': {
             'validation_rules': {
-                'type': 'list'
+                'type': 'list',
+                'schema': { 'type': 'User' },
             },
             'conversion_rules': {
                 'to_serialize': {
                     'required': True,
                     'hide': False,
+                    'entity': True,
                 },
                 'to_create': {
                     'required': False,
@@ -238,12 +239,14 @@ class Thread(Entity):
         },
         'lastPost': {
             'validation_rules': {
-                'type': 'list'
+                'type': 'list',
+                'schema': { 'type': 'Post' },
             },
             'conversion_rules': {
                 'to_serialize': {
                     'required': True,
                     'hide': False,
+                    'entity': True,
                 },
                 'to_create': {
                     'required': False,
@@ -398,11 +401,16 @@ class Thread(Entity):
             },
         },
     }
+    # indexes to declare on collection that persists this entity
+    _indexes = [
+        dict(keys=[ ('threadId', 1) ], unique=True),
+        dict(keys=[ ('boardId', 1), ('createdAt', 1) ]),
+        dict(keys=[ ('userId', 1) ]),
+    ]
     _schema = extract_schema(_attribute_description)
-    _validator = Validator(_schema, purge_unknown=True)
+    _validator = compile_schema(_schema, purge_unknown=True)
     _logger = logging.getLogger(__name__)
 
 
-# adds custom type checking for validator
-thread_type = TypeDefinition('Thread', (Thread,), ())
-Validator.types_mapping['Thread'] = thread_type
+# makes entity available to type rule of schemas
+register_type('Thread', Thread)
@@ -5,9 +5,8 @@ This file houses class that defines contextual user state
 
 import logging
 
-from cerberus import Validator, TypeDefinition
-
 from server.entity import Entity, extract_schema
+from server.entity.schema_compiler import compile_schema, register_type
 
 
 class NewUser:
@@ -41,7 +40,7 @@ class NewUser:
             'required': True,
         },
     }
-    _validator = Validator(_schema, allow_unknown=False)
+    _validator = compile_schema(_schema)
 
     @classmethod
     def validate(cls, newUser):
@@ -66,7 +65,7 @@ class UpdateUser:
             'required': False,
         },
     }
-    _validator = Validator(_schema, allow_unknown=False)
+    _validator = compile_schema(_schema)
 
     @classmethod
     def validate(cls, updateUser):
@@ -266,11 +265,15 @@ class User(Entity):
             },
         },
     }
+    # indexes to declare on collection that persists this entity
+    _indexes = [
+        dict(keys=[ ('userId', 1) ], unique=True),
+        dict(keys=[ ('userName', 1) ], unique=True),
+    ]
     _schema = extract_schema(_attribute_description)
-    _validator = Validator(_schema, purge_unknown=True)
+    _validator = compile_schema(_schema, purge_unknown=True)
     _logger = logging.getLogger(__name__)
 
 
-# adds custom type checking for validator
-user_type = TypeDefinition('User', (User,), ())
-Validator.types_mapping['User'] = user_type
+# makes entity available to type rule of schemas
+register_type('User', User)
@@ -63,6 +63,15 @@ class RequestDataTypeMismatchError(MyAppException):
         return 400
 
 
+class InvalidPagingCursorError(MyAppException):
+    """
+    Raised when paging cursor passed from client could not be decoded
+    """
+    @classmethod
+    def getStatusCode(cls):
+        return 400
+
+
 class InvalidUserCredentials(MyAppException):
     """
     Raised when provided user credential in request was invalid
@@ -136,6 +145,15 @@ class FailedMongoOperation(MyAppException):
         return 500
 
 
+class FailedSqliteOperation(MyAppException):
+    """
+    Failed to perform CRUD operation on SQLite database
+    """
+    @classmethod
+    def getStatusCode(cls):
+        return 500
+
+
 class DuplicateUserError(MyAppException):
     """
     User was found when signup
@@ -145,6 +163,15 @@ class DuplicateUserError(MyAppException):
         return 500
 
 
+class OperationTimeoutError(MyAppException):
+    """
+    Operation did not complete within its time limit
+    """
+    @classmethod
+    def getStatusCode(cls):
+        return 504
+
+
 class FailedAWSOperation(MyAppException):
     """
     Operation on external AWS service failed
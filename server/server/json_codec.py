@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses JSON codec shared by routes and file-based database.
+Uses orjson when it is installed, and falls back to stdlib json otherwise.
+Both backends encode straight to compact utf-8 bytes,
+so output does not depend on which backend is in use.
+
+orjson is an optional dependency and is not part of Pipfile,
+install it into the environment to enable it:
+    pipenv run pip install orjson
+BACKEND tells which backend is in use.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'json' if orjson is None else 'orjson'
+
+
+def _default(obj):
+    """
+    Encodes objects unknown to backends, like entities that were not serialized yet
+    """
+    if hasattr(obj, 'to_serialize'):
+        return obj.to_serialize()
+
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
+def _stdlibDumps(obj):
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _orjsonDumps(obj):
+    return orjson.dumps(obj, default=_default)
+
+
+_dumps = _stdlibDumps if orjson is None else _orjsonDumps
+_loads = json.loads if orjson is None else orjson.loads
+
+
+def dumps(obj):
+    """
+    Encodes object to JSON
+
+    Args:
+        obj: dicts, lists, strings, numbers, booleans, None or entities
+    Returns:
+        utf-8 encoded bytes
+    """
+    return _dumps(obj)
+
+
+def loads(data):
+    """
+    Decodes JSON
+
+    Args:
+        data(bytes|str): JSON document
+    Returns:
+        decoded object
+    """
+    return _loads(data)
+
+
+def dump(obj, f):
+    """
+    Encodes object to JSON and writes it to file
+
+    Args:
+        obj: anything accepted by dumps()
+        f: file object opened in binary write mode
+    Returns:
+        None
+    """
+    f.write( dumps(obj) )
+
+
+def load(f):
+    """
+    Reads file and decodes its JSON content
+
+    Args:
+        f: file object opened in binary read mode
+    Returns:
+        decoded object
+    """
+    return loads( f.read() )
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses the pipeline that adds top-level keys to response envelopes.
+Middlewares register themselves per request, typically in before_request,
+and route_utils.createJSONResponse applies them before the envelope is encoded,
+so that response bodies are serialized exactly once.
+"""
+from flask import g
+
+ENVELOPE_MIDDLEWARES_KEY = 'envelope_middlewares'
+
+
+def addEnvelopeMiddleware(middleware):
+    """
+    Registers middleware to be applied to JSON responses of current request
+
+    Args:
+        middleware(func): receives envelope dict, and adds keys to it in place
+    Returns:
+        None
+    """
+    g.setdefault(ENVELOPE_MIDDLEWARES_KEY, []).append(middleware)
+
+
+def applyEnvelopeMiddlewares(envelope):
+    """
+    Applies middlewares registered in current request, in registration order
+
+    Args:
+        envelope(dict): top-level object of response body, before encoding
+    Returns:
+        the same envelope, updated in place
+    """
+    for middleware in g.get(ENVELOPE_MIDDLEWARES_KEY, ()):
+        middleware(envelope)
+
+    return envelope
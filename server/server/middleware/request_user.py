@@ -2,7 +2,7 @@
 """
 This file houses middleware to make session user info available to each requests
 """
-import json
+from server.middleware.envelope import addEnvelopeMiddleware
 
 
 class RequestUserManager:
@@ -15,7 +15,8 @@ class RequestUserManager:
 
     def setCurrentUser(self):
         """
-        Places information of session user in global
+        Places information of session user in global,
+        and registers it to be added to JSON responses of the request.
         Intended to be called in before_request.
         
         Args:
@@ -23,20 +24,17 @@ class RequestUserManager:
             None
         """
         self._session.populate_request_user()
+        addEnvelopeMiddleware(self.addCurrentUserToEnvelope)
 
-    def addCurrentUserToResponse(self, response):
+    def addCurrentUserToEnvelope(self, envelope):
         """
         Add user information to response data that is sent back to client.
-        Intended to be called in after_request.
+        Applied by route_utils.createJSONResponse before the envelope is encoded.
         
         Args:
-            response: response object of flask
+            envelope(dict): top-level object of response body
         Returns:
-            updated response object
+            None
         """
         current_user = self._session.get_user()
-        response_data = json.loads( response.get_data() )
-        response_data[self._session.REQUEST_USER_KEY] = current_user.to_serialize()
-
-        response.set_data( json.dumps(response_data) )
-        return response
+        envelope[self._session.REQUEST_USER_KEY] = current_user.to_serialize()
@@ -17,8 +17,10 @@ routes = Blueprint('postRoutes', __name__)
 def searchPostsv1():
     try:
         search = Config.getSearchService(current_app)
-        result = search.searchPostsByKeyValues( request.args.to_dict(flat=True) )
-        result['posts'] = [ post.to_serialize() for post in result['posts'] ]
+        keyValues = request.args.to_dict(flat=True)
+        fields = route_utils.getRequestedFields(keyValues)
+        result = search.searchPostsByKeyValues(keyValues)
+        result['posts'] = [ post.to_serialize(fields) for post in result['posts'] ]
         return route_utils.createResultResponse(result)
     except MyAppException as e:
         return route_utils.createJSONErrorResponse(e)
@@ -28,8 +30,11 @@ def searchPostsv1():
 def searchPostsByIdv1(postId):
     try:
         search = Config.getSearchService(current_app)
-        result = search.searchPostsByKeyValues(dict(postId=postId))
-        result['posts'] = [ post.to_serialize() for post in result['posts'] ]
+        fields = route_utils.getRequestedFields(request.args)
+        result = search.searchPostsByKeyValues(
+            dict(postId=postId, **route_utils.getFieldsKeyValues(request.args))
+        )
+        result['posts'] = [ post.to_serialize(fields) for post in result['posts'] ]
         return route_utils.createResultResponse(result)
     except MyAppException as e:
         return route_utils.createJSONErrorResponse(e)
@@ -70,13 +75,3 @@ def deletePostByIdv1(postId):
 @routes.before_request
 def apply_middlewares_before():
     Config.getRequestUserManager(current_app).setCurrentUser()
-
-
-@routes.after_request
-def apply_middleware_after(response):
-    try:
-        requestuser_manager = Config.getRequestUserManager(current_app)
-        updated_response = requestuser_manager.addCurrentUserToResponse(response)
-        return updated_response
-    except MyAppException as e:
-        return route_utils.createJSONErrorResponse(e)
@@ -3,11 +3,12 @@
 This file houses utility logic used by various routes
 """
 
-import json
-
 from flask import make_response, request
 
-from server.exceptions import RequestDataTypeMismatchError
+import server.json_codec as json_codec
+from server.exceptions import MyAppException, RequestDataTypeMismatchError
+from server.middleware.envelope import applyEnvelopeMiddlewares
+from server.database.projection import Projection
 
 
 def getJsonFromRequest(req):
@@ -17,6 +18,34 @@ def getJsonFromRequest(req):
     return jsonData
 
 
+def getRequestedFields(keyValues):
+    """
+    Extracts fieldnames requested by fields= query parameter,
+    to be passed to Entity.to_serialize for sparse fieldsets
+    
+    Args:
+        keyValues(dict): query parameters
+    Returns:
+        list of fieldnames, or None when all fields were requested
+    """
+    return Projection.parseFields( keyValues.get('fields', None) )
+
+
+def getFieldsKeyValues(keyValues):
+    """
+    Extracts fields= query parameter, to forward it to services
+    
+    Args:
+        keyValues(dict): query parameters
+    Returns:
+        dict with 'fields' key, or empty dict when it was not requested
+    """
+    if 'fields' not in keyValues:
+        return {}
+
+    return dict(fields=keyValues['fields'])
+
+
 def createPostsObject(posts):
     return {
         'posts': posts
@@ -33,7 +62,8 @@ def createResultResponse(result, status_code=200):
     return createJSONResponse([ dict(result=result) ], status_code)
 
 
-def createJSONErrorResponse(error, datas=[], additionalHeaders={}):
+def createJSONErrorResponse(error, datas=None, additionalHeaders={}):
+    datas = [] if datas is None else list(datas)
     datas.append({
         'error': {
             'description': error.getErrorMsg()
@@ -44,10 +74,37 @@ def createJSONErrorResponse(error, datas=[], additionalHeaders={}):
 
 
 def createJSONResponse(datas, statusCode, additionalHeaders={}):
+    """
+    Merges datas into a single envelope, lets middlewares registered in
+    the current request add their keys, then encodes the envelope once.
+    When a middleware fails, its error is sent without applying middlewares.
+    
+    Args:
+        datas(list): dicts whose keys become top-level keys of response body
+        statusCode(int): http status code
+        additionalHeaders(dict): headers to add to response
+    Returns:
+        response object
+    """
     responseBody = {}
     for data in datas:
         responseBody.update(data)
-    jsonBody = json.dumps(responseBody)
+
+    try:
+        applyEnvelopeMiddlewares(responseBody)
+    except MyAppException as e:
+        responseBody = {
+            'error': {
+                'description': e.getErrorMsg()
+            }
+        }
+        statusCode = e.getStatusCode()
+
+    return _createEncodedJSONResponse(responseBody, statusCode, additionalHeaders)
+
+
+def _createEncodedJSONResponse(responseBody, statusCode, additionalHeaders):
+    jsonBody = json_codec.dumps(responseBody)
 
     headers = {'Content-Type': 'application/json'}
     headers.update(additionalHeaders)
@@ -18,8 +18,9 @@ def searchThreadsv1():
     try:
         search = Config.getSearchService(current_app)
         keyValues = request.args.to_dict(flat=True)
+        fields = route_utils.getRequestedFields(keyValues)
         result = search.searchThreadsByKeyValues(keyValues)
-        result['threads'] = [ thread.to_serialize() for thread in result['threads'] ]
+        result['threads'] = [ thread.to_serialize(fields) for thread in result['threads'] ]
         return route_utils.createResultResponse(result)
     except MyAppException as e:
         return route_utils.createJSONErrorResponse(e)
@@ -29,8 +30,11 @@ def searchThreadsv1():
 def searchThreadByIdv1(threadId):
     try:
         search = Config.getSearchService(current_app)
-        result = search.searchThreadByExplicitId(threadId)
-        result['threads'] = [ thread.to_serialize() for thread in result['threads'] ]
+        fields = route_utils.getRequestedFields(request.args)
+        result = search.searchThreadByExplicitId(
+            threadId, **route_utils.getFieldsKeyValues(request.args)
+        )
+        result['threads'] = [ thread.to_serialize(fields) for thread in result['threads'] ]
         return route_utils.createResultResponse(result)
     except MyAppException as e:
         return route_utils.createJSONErrorResponse(e)
@@ -72,13 +76,3 @@ def deleteThreadByIdv1(threadId):
 @routes.before_request
 def apply_middlewares_before():
     Config.getRequestUserManager(current_app).setCurrentUser()
-
-
-@routes.after_request
-def apply_middleware_after(response):
-    try:
-        requestuser_manager = Config.getRequestUserManager(current_app)
-        updated_response = requestuser_manager.addCurrentUserToResponse(response)
-        return updated_response
-    except MyAppException as e:
-        return route_utils.createJSONErrorResponse(e)
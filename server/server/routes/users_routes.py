@@ -17,8 +17,10 @@ routes = Blueprint('userRoutes', __name__)
 def searchUserv1():
     try:
         search = Config.getSearchService(current_app)
-        result = search.searchUsersByKeyValues( request.args.to_dict(flat=True) )
-        result['users'] = [ user.to_serialize() for user in result['users'] ]
+        keyValues = request.args.to_dict(flat=True)
+        fields = route_utils.getRequestedFields(keyValues)
+        result = search.searchUsersByKeyValues(keyValues)
+        result['users'] = [ user.to_serialize(fields) for user in result['users'] ]
         return route_utils.createResultResponse(result)
     except MyAppException as e:
         return route_utils.createJSONErrorResponse(e)
@@ -28,8 +30,11 @@ def searchUserv1():
 def searchUserByIDv1(userId):
     try:
         search = Config.getSearchService(current_app)
-        result = search.searchUsersByKeyValues( dict(userId=userId) )
-        result['users'] = [ user.to_serialize() for user in result['users'] ]
+        fields = route_utils.getRequestedFields(request.args)
+        result = search.searchUsersByKeyValues(
+            dict(userId=userId, **route_utils.getFieldsKeyValues(request.args))
+        )
+        result['users'] = [ user.to_serialize(fields) for user in result['users'] ]
         return route_utils.createResultResponse(result)
     except MyAppException as e:
         return route_utils.createJSONErrorResponse(e)
@@ -95,13 +100,3 @@ def getSessionUserv1():
 @routes.before_request
 def apply_middlewares_before():
     Config.getRequestUserManager(current_app).setCurrentUser()
-
-
-@routes.after_request
-def apply_middleware_after(response):
-    try:
-        requestuser_manager = Config.getRequestUserManager(current_app)
-        updated_response = requestuser_manager.addCurrentUserToResponse(response)
-        return updated_response
-    except MyAppException as e:
-        return route_utils.createJSONErrorResponse(e)
@@ -1,3 +1,5 @@
+import atexit
+
 from flask import Flask
 from server.config import Config
 
@@ -16,4 +18,26 @@ def setupApp():
 
     app.config.from_object(Config)
 
+    index_manager = Config.getIndexManager(app)
+    if app.config['CHECK_DB_INDEXES'] and index_manager is not None:
+        index_manager.warnMissingIndexes()
+
+    # anonymous user is served to requests without session, without querying repo
+    if app.config['PRELOAD_ANONYMOUS_USER']:
+        Config.getSessionService(app).load_anonymous_user()
+
+    # syncs writes buffered by repo on shutdown,
+    # registered first so that it runs after view counter has flushed into repo
+    atexit.register( Config.getDB(app).flush )
+
+    # flushes buffered thread views periodically, and on shutdown
+    view_counter = Config.getViewCounter(app)
+    if view_counter is not None:
+        view_counter.start()
+
+    # indexes posts and threads in repo for search, when search index is enabled
+    search_index = Config.getSearchIndex(app)
+    if search_index is not None:
+        search_index.build( Config.getDB(app) )
+
     return app
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses loader that batches searches of related entities,
+so that joining relations takes a single search per relation
+"""
+from server.database.paging import PagingNoLimit
+
+
+class BatchLoader:
+    """
+    Loads entities by key field in batches, like users by userId.
+    Keys are collected with request(), and dispatch() searches every key
+    that was not loaded yet with a single 'eq' filter, which is $in for mongo.
+    Loaded entities are indexed by key, so joins are hash lookups.
+
+    Loaded entities are never invalidated, so loaders are meant to live
+    as long as a single request.
+    """
+
+    def __init__(self, search, resultKey, keyField, filterClass):
+        """
+        Args:
+            search(func): search method of repository, like CrudManager.searchUser
+            resultKey(str): key of entities in result of search, like 'users'
+            keyField(str): field to load entities by, like 'userId'
+            filterClass(class): class to create 'eq' filter from
+        """
+        self._search = search
+        self._resultKey = resultKey
+        self._keyField = keyField
+        self._filter = filterClass
+        # dict keeps order of requested keys and dedupes them
+        self._pendingKeys = {}
+        self._loaded = {}
+
+    def request(self, keys):
+        """
+        Registers keys to be loaded on next dispatch
+
+        Args:
+            keys(iterable): values of key field, None is ignored
+        Returns:
+            None
+        """
+        for key in keys:
+            if key is not None and key not in self._loaded:
+                self._pendingKeys[key] = None
+
+    def dispatch(self):
+        """
+        Loads all pending keys with a single search
+
+        Args:
+            None
+        Returns:
+            list of entities loaded by this dispatch
+        """
+        if len(self._pendingKeys) == 0:
+            return []
+
+        keys = list(self._pendingKeys)
+        self._pendingKeys = {}
+        searchFilter = self._filter.createFilter(dict(
+            field=self._keyField,
+            operator='eq',
+            value=keys,
+        ))
+        entities = self._search(searchFilter, paging=PagingNoLimit())[self._resultKey]
+
+        for key in keys:
+            self._loaded[key] = []
+        for entity in entities:
+            self._loaded.setdefault(getattr(entity, self._keyField), []).append(entity)
+
+        return entities
+
+    def get(self, key):
+        """
+        Returns list of loaded entities that has the key
+        """
+        return list( self._loaded.get(key, []) )
+
+    def join(self, entities, foreignField, relationName):
+        """
+        Adds loaded entities to relation of each entity, by hash lookup of key
+
+        Args:
+            entities(list): entities to add relation to, like threads
+            foreignField(str): field of entities that refers to key, like 'lastPostId'
+            relationName(str): attribute to put related entities under, like 'lastPost'
+        Returns:
+            None
+        """
+        for entity in entities:
+            relation = getattr(entity, relationName, [])
+            relation.extend( self.get( getattr(entity, foreignField, None) ) )
+            setattr(entity, relationName, relation)
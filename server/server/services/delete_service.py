@@ -17,9 +17,11 @@ class DeleteService:
     Includes most of the business logic that is associated
     with deleting entities like users, threads etc.
     """
-    def __init__(self, repo, session):
+    def __init__(self, repo, session, userCache=None, searchIndex=None):
         self._repo = repo
         self._session = session
+        self._userCache = userCache
+        self._searchIndex = searchIndex
 
     def deleteUserById(self, id):
         """
@@ -37,7 +39,11 @@ class DeleteService:
         self._authorizeDelete(id)
         searchFilter = self._createEqFilterForId(id, 'userId')
         
-        return self._repo.deleteUser(searchFilter)
+        result = self._repo.deleteUser(searchFilter)
+        if self._userCache is not None:
+            self._userCache.invalidate(id)
+
+        return result
 
     def deletePostById(self, id):
         """
@@ -55,7 +61,11 @@ class DeleteService:
         searchFilter = self._createEqFilterForId(id, 'postId')
         self._authorizeDeletePost(searchFilter)
         
-        return self._repo.deletePost(searchFilter)
+        result = self._repo.deletePost(searchFilter)
+        if self._searchIndex is not None:
+            self._searchIndex.remove('posts', id)
+
+        return result
 
     def deleteThreadById(self, id):
         """
@@ -73,7 +83,11 @@ class DeleteService:
         searchFilter = self._createEqFilterForId(id, 'threadId')
         self._authorizeDeleteThread(searchFilter)
 
-        return self._repo.deleteThread(searchFilter)
+        result = self._repo.deleteThread(searchFilter)
+        if self._searchIndex is not None:
+            self._searchIndex.remove('threads', id)
+
+        return result
 
     def _createSearchFilterFromKeyValuesForField(self, keyValues, fieldname):
         """
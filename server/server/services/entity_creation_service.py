@@ -13,10 +13,12 @@ logger = logging.getLogger(__name__)
 class EntityCreationService:
     GENERIC_PORTRAIT_IMAGE_URL = 'https://www.seekpng.com/png/detail/365-3651600_default-portrait-image-generic-profile.png'
 
-    def __init__(self, repo, filterClass, session):
+    def __init__(self, repo, filterClass, session, searchIndex=None):
         self._repo = repo
         self._filter = filterClass
         self._session = session
+        # indexes text of new posts and threads for search when set
+        self._searchIndex = searchIndex
 
     def signup(self, user):
         """
@@ -41,6 +43,8 @@ class EntityCreationService:
         """
         result = self._createPost(post)
         self._updateThreadForNewPost(post, result['createdId'])
+        if self._searchIndex is not None:
+            self._searchIndex.add('posts', result['createdId'], post)
         return result
 
     def createNewThread(self, thread):
@@ -52,7 +56,10 @@ class EntityCreationService:
         Returns:
             dictionary that reports result of operation
         """
-        return self._createThread(thread)
+        result = self._createThread(thread)
+        if self._searchIndex is not None:
+            self._searchIndex.add('threads', result['createdId'], thread)
+        return result
 
     def _checkUserExists(self, user):
         try:
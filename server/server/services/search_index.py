@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses in-process inverted index that ranks posts and threads
+by relevance to search terms, so that search= queries do not scan the repo.
+Fuzzy searchable fields of each entity are split into terms:
+    - words for latin and other space separated scripts
+    - character bigrams for CJK, which is written without spaces
+and entities that contain any of the terms are ranked by BM25.
+"""
+import logging
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from heapq import nlargest
+from itertools import accumulate
+from operator import itemgetter
+
+from server.database.paging import PagingNoLimit
+from server.database.projection import Projection
+from server.services.searchfilter_creator import SearchFilterCreator
+
+logger = logging.getLogger(__name__)
+
+# hiragana, katakana, CJK ideographs and hangul
+_CJK_CHARACTERS = '々぀-ヿ㐀-䶿一-鿿豈-﫿가-힯'
+_TOKEN_PATTERN = re.compile(
+    f'(?P<cjk>[{_CJK_CHARACTERS}]+)|(?P<word>[^\\W_{_CJK_CHARACTERS}]+)'
+)
+
+
+def tokenize(text, withUnigrams=False):
+    """
+    Splits text into terms of inverted index.
+    Text is normalized by NFKC and casefolded first,
+    so that full width and half width forms, and cases, match each other.
+    Runs of CJK characters are split into overlapping bigrams,
+    other scripts are split into words.
+    Documents are indexed with CJK unigrams as well,
+    so that single character queries match characters inside longer runs.
+
+    Args:
+        text(str): text to split
+        withUnigrams(bool): whether to add each character of CJK runs to terms
+    Returns:
+        list of terms in string
+    """
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    terms = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        if match.lastgroup == 'cjk' and len(token) > 1:
+            terms.extend( token[i:i + 2] for i in range(len(token) - 1) )
+            if withUnigrams:
+                terms.extend(token)
+        else:
+            terms.append(token)
+
+    return terms
+
+
+class PostingList:
+    """
+    Ordinals of documents that contain a term, with frequencies of the term in each.
+    Ordinals are appended in ascending order and stored as deltas from the previous one,
+    in arrays of machine integers instead of lists of int objects.
+    """
+    __slots__ = ('_deltas', '_frequencies', '_lastOrdinal')
+
+    # frequencies are stored in unsigned shorts
+    MAX_FREQUENCY = 0xFFFF
+
+    def __init__(self):
+        self._deltas = array('I')
+        self._frequencies = array('H')
+        self._lastOrdinal = 0
+
+    def append(self, ordinal, frequency):
+        """
+        Adds document to list
+
+        Args:
+            ordinal(int): ordinal of document, not less than the last appended one
+            frequency(int): number of times term occurs in document
+        Returns:
+            None
+        """
+        if ordinal < self._lastOrdinal:
+            raise ValueError(f'ordinal {ordinal} was appended after {self._lastOrdinal}')
+
+        self._deltas.append(ordinal - self._lastOrdinal)
+        self._frequencies.append( min(frequency, self.MAX_FREQUENCY) )
+        self._lastOrdinal = ordinal
+
+    def __iter__(self):
+        """
+        Decodes deltas, yielding tuples of ordinal and frequency in ascending order
+        """
+        return zip(accumulate(self._deltas), self._frequencies)
+
+    def __len__(self):
+        return len(self._deltas)
+
+
+class InvertedIndex:
+    """
+    Inverted index of documents, that ranks documents by BM25.
+
+    Documents get a new ordinal each time they are added, so that posting lists
+    are only appended to. Removed documents are left in posting lists
+    and skipped on search, until they make up maxDeletedRatio of all ordinals,
+    when posting lists are rebuilt without them.
+    Same as Lucene, document frequencies count removed documents until then.
+    Not thread safe, SearchIndex serializes access to it.
+    """
+    DEFAULT_K1 = 1.2
+    DEFAULT_B = 0.75
+    DEFAULT_MAX_DELETED_RATIO = 0.25
+
+    def __init__(self, k1=DEFAULT_K1, b=DEFAULT_B, maxDeletedRatio=DEFAULT_MAX_DELETED_RATIO):
+        self._k1 = k1
+        self._b = b
+        self._maxDeletedRatio = maxDeletedRatio
+        self._postings = {}
+        # id of document by ordinal, None once removed
+        self._ids = []
+        self._ordinals = {}
+        self._lengths = array('I')
+        self._totalLength = 0
+        self._deletedCount = 0
+
+    def add(self, documentId, text):
+        """
+        Indexes text of document, replacing text indexed for it before
+
+        Args:
+            documentId(str): id of document
+            text(str): text to index
+        Returns:
+            None
+        """
+        self.remove(documentId)
+
+        terms = tokenize(text, withUnigrams=True)
+        ordinal = len(self._ids)
+        self._ids.append(documentId)
+        self._ordinals[documentId] = ordinal
+        self._lengths.append( len(terms) )
+        self._totalLength += len(terms)
+
+        for term, frequency in Counter(terms).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = PostingList()
+            postings.append(ordinal, frequency)
+
+    def remove(self, documentId):
+        """
+        Removes document from index, does nothing when it was not indexed
+
+        Args:
+            documentId(str): id of document
+        Returns:
+            None
+        """
+        ordinal = self._ordinals.pop(documentId, None)
+        if ordinal is None:
+            return
+
+        self._ids[ordinal] = None
+        self._totalLength -= self._lengths[ordinal]
+        self._deletedCount += 1
+        if self._deletedCount > len(self._ids) * self._maxDeletedRatio:
+            self._compact()
+
+    def search(self, text, limit=None):
+        """
+        Ranks documents that contain any term of text by BM25
+
+        Args:
+            text(str): search terms
+            limit(int): maximum number of documents to return, None for all
+        Returns:
+            tuple of list of tuples of document id and score, most relevant first,
+            and number of all documents that matched
+        """
+        liveCount = len(self._ordinals)
+        if liveCount == 0:
+            return [], 0
+
+        ordinalCount = len(self._ids)
+        k1 = self._k1
+        # length normalization of BM25 is normBase + normScale * length of document
+        normBase = k1 * (1.0 - self._b)
+        normScale = k1 * self._b / max(self._totalLength / liveCount, 1.0)
+        lengths = self._lengths
+        ids = self._ids
+        hasDeleted = self._deletedCount > 0
+        scores = {}
+        for term in dict.fromkeys( tokenize(text) ):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+
+            df = len(postings)
+            weight = math.log(1.0 + (ordinalCount - df + 0.5) / (df + 0.5)) * (k1 + 1.0)
+            for ordinal, frequency in postings:
+                if hasDeleted and ids[ordinal] is None:
+                    continue
+                score = weight * frequency / (frequency + normBase + normScale * lengths[ordinal])
+                scores[ordinal] = scores.get(ordinal, 0.0) + score
+
+        if limit is None:
+            ranked = sorted(scores.items(), key=itemgetter(1), reverse=True)
+        else:
+            ranked = nlargest(limit, scores.items(), key=itemgetter(1))
+
+        return [ (ids[ordinal], score) for ordinal, score in ranked ], len(scores)
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def _compact(self):
+        """
+        Renumbers documents left in index and rebuilds posting lists without removed ones
+        """
+        newOrdinals = {}
+        ids = []
+        lengths = array('I')
+        for ordinal, documentId in enumerate(self._ids):
+            if documentId is None:
+                continue
+            newOrdinals[ordinal] = len(ids)
+            ids.append(documentId)
+            lengths.append(self._lengths[ordinal])
+
+        postings = {}
+        for term, oldPostings in self._postings.items():
+            newPostings = PostingList()
+            for ordinal, frequency in oldPostings:
+                newOrdinal = newOrdinals.get(ordinal)
+                if newOrdinal is not None:
+                    newPostings.append(newOrdinal, frequency)
+            if len(newPostings) > 0:
+                postings[term] = newPostings
+
+        self._postings = postings
+        self._ids = ids
+        self._ordinals = { documentId: ordinal for ordinal, documentId in enumerate(ids) }
+        self._lengths = lengths
+        self._deletedCount = 0
+
+
+class SearchIndex:
+    """
+    Keeps an inverted index of fuzzy searchable fields of posts and threads in memory.
+    Built from repo once by build(), and kept up to date by services
+    that create, update and delete entities through add() and remove().
+    Entities written to repo by other processes are not indexed until next build().
+
+    Words are matched as a whole, unlike fuzzy filters that match any substring.
+    """
+    # ids returned by search() unless limit is given
+    DEFAULT_MAX_RESULTS = 1000
+
+    # fieldname of id, fuzzy searchable fields and search method of repo, by entity type
+    ENTITY_TYPES = dict(
+        posts=(
+            'postId', SearchFilterCreator.post_fuzzysearchable_attributes, 'searchPost',
+        ),
+        threads=(
+            'threadId', SearchFilterCreator.thread_fuzzysearchable_attributes, 'searchThread',
+        ),
+    )
+
+    def __init__(self, maxResults=DEFAULT_MAX_RESULTS):
+        """
+        Args:
+            maxResults(int): maximum number of ids returned by search()
+        """
+        self._maxResults = maxResults
+        self._indexes = { entityType: InvertedIndex() for entityType in self.ENTITY_TYPES }
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def build(self, repo):
+        """
+        Indexes all posts and threads in repo, replacing what was indexed before.
+        Searches fall back to repo until the first build finishes.
+
+        Args:
+            repo(CrudManager): repo to read entities from
+        Returns:
+            None
+        """
+        for entityType, (idField, fields, searchMethod) in self.ENTITY_TYPES.items():
+            projection = Projection(dict(fields=[ idField ] + fields))
+            entities = getattr(repo, searchMethod)(
+                None, paging=PagingNoLimit(), projection=projection
+            )[entityType]
+
+            index = InvertedIndex()
+            for entity in entities:
+                index.add( getattr(entity, idField), self._extractText(entityType, entity) )
+
+            with self._lock:
+                self._indexes[entityType] = index
+            logger.info('Indexed %d %s for search', len(index), entityType)
+
+        self._ready = True
+
+    def isReady(self):
+        return self._ready
+
+    def getIdField(self, entityType):
+        return self.ENTITY_TYPES[entityType][0]
+
+    def coversUpdate(self, entityType, entity):
+        """
+        Returns whether entity, used to update repo, updates any indexed field
+        """
+        return any( hasattr(entity, field) for field in self.ENTITY_TYPES[entityType][1] )
+
+    def add(self, entityType, entityId, entity):
+        """
+        Indexes fuzzy searchable fields of entity, replacing what was indexed for it
+
+        Args:
+            entityType(str): 'posts' or 'threads'
+            entityId(str): id of entity
+            entity(Entity): entity with fields to index
+        Returns:
+            None
+        """
+        text = self._extractText(entityType, entity)
+        with self._lock:
+            self._indexes[entityType].add(entityId, text)
+
+    def remove(self, entityType, entityId):
+        """
+        Removes entity from index
+
+        Args:
+            entityType(str): 'posts' or 'threads'
+            entityId(str): id of entity
+        Returns:
+            None
+        """
+        with self._lock:
+            self._indexes[entityType].remove(entityId)
+
+    def search(self, entityType, terms, limit=None):
+        """
+        Ranks entities that contain any of terms
+
+        Args:
+            entityType(str): 'posts' or 'threads'
+            terms(list): search terms
+            limit(int): maximum number of ids to return, None for maxResults
+        Returns:
+            tuple of list of ids, most relevant first,
+            and number of all entities that matched, which may exceed the ids returned
+        """
+        limit = self._maxResults if limit is None else limit
+        with self._lock:
+            results, matchedCount = self._indexes[entityType].search(' '.join(terms), limit)
+
+        return [ entityId for entityId, _ in results ], matchedCount
+
+    def _extractText(self, entityType, entity):
+        values = ( getattr(entity, field, None) for field in self.ENTITY_TYPES[entityType][1] )
+        return ' '.join( str(value) for value in values if value is not None )
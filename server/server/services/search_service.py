@@ -2,8 +2,15 @@
 """
 This file houses business logic for searches made by apis
 """
-from server.database.sorter import AscendingSorter, DescendingSorter, NullSorter
+from server.database.sorter import (
+    AscendingSorter, DescendingSorter, NullSorter, RelevanceSorter,
+)
+from server.database.filter import NullFilter
+from server.database.paging import CursorPaging, PagingNoLimit
+from server.database.projection import Projection
 from server.entity import Thread
+from server.services.batch_loader import BatchLoader
+from server.services.searchfilter_creator import sanitize_search_terms
 
 
 class SearchService:
@@ -11,23 +18,37 @@ class SearchService:
     Provides methods to search for entities.
     Contains most of the search related business logic.
     """
+    # sortBy value that sorts entities by relevance to search terms
+    RELEVANCE_SORT = 'relevance'
 
     # TODO
     # sanitization of args
 
-    def __init__(self, repo, searchFilterCreator, filterClass, aggregateFilterClass, pagingClass):
+    def __init__(
+        self, repo, searchFilterCreator, filterClass, aggregateFilterClass, pagingClass,
+        viewCounter=None, searchIndex=None
+    ):
         self._repo = repo
         self._searchFilterCreator = searchFilterCreator
         self._filter = filterClass
         self._aggregate = aggregateFilterClass
         self._paging = pagingClass
+        # backends able to join relations on their side save round trips per search
+        self._canSearchThreadWithRelations = hasattr(repo, 'searchThreadWithRelations')
+        # buffers view increments when set, instead of updating repo on each read
+        self._viewCounter = viewCounter
+        # looks up search terms of posts and threads in memory when set
+        self._searchIndex = searchIndex
 
     def searchUsersByKeyValues(self, keyValues):
         searchFilter = self._searchFilterCreator.create_usersearch(keyValues)
         paging = self._paging(keyValues)
         sorter = self._createSorterFromKeyValues(keyValues)
+        projection = self._createProjectionFromKeyValues(keyValues)
         
-        result = self._repo.searchUser(searchFilter, paging=paging, sorter=sorter)
+        result = self._repo.searchUser(
+            searchFilter, **self._createSearchOptions(paging, sorter, projection)
+        )
 
         return dict(
             users=result['users'],
@@ -37,16 +58,30 @@ class SearchService:
 
     def searchPostsByKeyValues(self, keyValues):
         searchFilter = self._searchFilterCreator.create_postsearch(keyValues)
-        paging = self._paging(keyValues)
+        paging = self._createPagingFromKeyValues(keyValues)
         sorter = self._createSorterFromKeyValues(keyValues)
+        projection = self._createProjectionFromKeyValues(keyValues)
+        joinsOwner = self._includesRelation(projection, 'owner')
+        if joinsOwner:
+            projection = self._requireFields(projection, 'userId')
         
-        result = self._repo.searchPost(searchFilter, paging=paging, sorter=sorter)
-        self._joinOwner(result['posts'])
+        if self._searchesIndex(keyValues):
+            result = self._searchThroughIndex(
+                'posts', keyValues, self._searchFilterCreator.create_postsearch,
+                self._repo.searchPost, paging, sorter, projection,
+            )
+        else:
+            result = self._repo.searchPost(
+                searchFilter, **self._createSearchOptions(paging, sorter, projection)
+            )
+        if joinsOwner:
+            self._joinRelations(result['posts'], joinsOwner=True)
 
         return dict(
             posts=result['posts'],
             returnCount=result['returnCount'],
             matchedCount=result['matchedCount'],
+            nextCursor=result.get('nextCursor', None),
         )
 
     def searchThreadsByKeyValues(self, keyValues):
@@ -59,25 +94,51 @@ class SearchService:
             dict: result of search operation
         """
         searchFilter = self._searchFilterCreator.create_threadsearch(keyValues)
-        paging = self._paging(keyValues)
+        paging = self._createPagingFromKeyValues(keyValues)
         sorter = self._createSorterFromKeyValues(keyValues)
+        projection = self._createProjectionFromKeyValues(keyValues)
+        options = self._createSearchOptions(paging, sorter, projection)
+
+        if self._canSearchThreadWithRelations:
+            if self._searchesIndex(keyValues):
+                result = self._searchThroughIndex(
+                    'threads', keyValues, self._searchFilterCreator.create_threadsearch,
+                    self._repo.searchThreadWithRelations, paging, sorter, projection,
+                )
+            else:
+                result = self._repo.searchThreadWithRelations(searchFilter, **options)
+        else:
+            joinsOwner = self._includesRelation(projection, 'owner')
+            joinsLastPost = self._includesRelation(projection, 'lastPost')
+            if joinsOwner:
+                projection = self._requireFields(projection, 'userId')
+            if joinsLastPost:
+                projection = self._requireFields(projection, 'lastPostId')
+            options = self._createSearchOptions(paging, sorter, projection)
 
-        result = self._repo.searchThread(searchFilter, paging=paging, sorter=sorter)
-        self._joinOwner(result['threads'])
-        self._joinLastPost(result['threads'])
+            if self._searchesIndex(keyValues):
+                result = self._searchThroughIndex(
+                    'threads', keyValues, self._searchFilterCreator.create_threadsearch,
+                    self._repo.searchThread, paging, sorter, projection,
+                )
+            else:
+                result = self._repo.searchThread(searchFilter, **options)
+            self._joinRelations(result['threads'], joinsOwner, joinsLastPost)
         
         return dict(
             threads=result['threads'],
             returnCount=result['returnCount'],
             matchedCount=result['matchedCount'],
+            nextCursor=result.get('nextCursor', None),
         )
 
-    def searchThreadByExplicitId(self, threadId):
+    def searchThreadByExplicitId(self, threadId, fields=None):
         """
         Searches for thread based on threadId
         
         Args:
             threadId(string): Id of thread to search
+            fields(str): comma separated fieldnames to retrieve, None for all
         Returns:
             dict: result of search operation
         """
@@ -85,13 +146,19 @@ class SearchService:
             dict(threadId=threadId)
         )
         paging = self._paging()
+        projection = self._createProjectionFromKeyValues(dict(fields=fields))
+        joinsOwner = self._includesRelation(projection, 'owner')
+        if joinsOwner:
+            projection = self._requireFields(projection, 'userId')
+        options = dict(paging=paging)
+        if projection is not None:
+            options['projection'] = projection
 
-        result = self._repo.searchThread(searchFilter, paging=paging)
-        self._joinOwner(result['threads'])
+        result = self._repo.searchThread(searchFilter, **options)
+        if joinsOwner:
+            self._joinRelations(result['threads'], joinsOwner=True)
 
-        updateThread = Thread()
-        updateThread.increment = 'views'
-        self._repo.updateThread(searchFilter, updateThread)
+        self._countView(threadId, searchFilter)
 
         return dict(
             threads=result['threads'],
@@ -99,90 +166,223 @@ class SearchService:
             matchedCount=result['matchedCount'],
         )
 
-    def _createFilter(self, fieldname, operator, values):
-        return self._filter.createFilter(dict(
-            field=fieldname,
-            operator=operator,
-            value=values
-        ))
+    def _searchesIndex(self, keyValues):
+        """
+        Determines if search terms in keyValues are looked up through search index
+        """
+        if self._searchIndex is None or not keyValues.get('search', None):
+            return False
+
+        return self._searchIndex.isReady()
+
+    def _searchThroughIndex(
+        self, entityType, keyValues, createFilter, search, paging, sorter, projection
+    ):
+        """
+        Searches entities that contain search terms in keyValues through search index,
+        and fetches them from repo by their ids in a single eq filter,
+        along with the rest of criterias in keyValues.
+        
+        Without sortBy or with sortBy=relevance, entities are ranked by search index,
+        and only entities in the page of ids are fetched.
+        When other criterias narrow the search, ids of narrowed entities are fetched first.
+        Otherwise repo sorts and pages the entities same as any other search.
+        Searches that need every matched id, that is sorted, keyset paged or narrowed ones,
+        fall back to fuzzy filters of repo when more than maxResults entities matched,
+        so that matches beyond them are not dropped.
+        
+        Args:
+            entityType(str): 'posts' or 'threads'
+            keyValues(dict): criterias to search
+            createFilter(function): creates filter from keyValues
+            search(function): searches entities of entityType from repo
+            paging(Paging): paging of search
+            sorter(Sorter): sorter of search
+            projection(Projection): fields to retrieve, None for all
+        Returns:
+            dict: result of search operation
+        """
+        idField = self._searchIndex.getIdField(entityType)
+        terms = sanitize_search_terms(keyValues['search'])
+        narrowingFilter = createFilter(
+            { key: value for key, value in keyValues.items() if key != 'search' }
+        ).normalize()
+        ranksByIndex = isinstance(sorter, NullSorter) and not paging.usesKeyset()
+        narrows = not isinstance(narrowingFilter, NullFilter)
+
+        if ranksByIndex and not narrows and paging.getEnd() is not None:
+            # ids up to the end of page are enough to slice it
+            rankedIds, matchedCount = self._searchIndex.search(
+                entityType, terms, limit=paging.getEnd()
+            )
+            entities = self._searchRankedEntities(
+                entityType, idField, paging.slice(rankedIds), rankedIds,
+                narrowingFilter, search, projection,
+            )
+            return self._createIndexResult(entityType, entities, matchedCount)
+
+        rankedIds, matchedCount = self._searchIndex.search(entityType, terms)
+        if matchedCount > len(rankedIds):
+            searchFilter = createFilter(keyValues)
+            return search(searchFilter, **self._createSearchOptions(paging, sorter, projection))
+
+        if not ranksByIndex:
+            searchFilter = self._aggregate.createFilter('and', [
+                narrowingFilter, self._createIdFilter(idField, rankedIds)
+            ]).normalize()
+            return search(searchFilter, **self._createSearchOptions(paging, sorter, projection))
+
+        if narrows:
+            # only ids of narrowed entities are fetched, so that just the page is hydrated
+            matchedIds = [
+                getattr(entity, idField) for entity in self._searchRankedEntities(
+                    entityType, idField, rankedIds, rankedIds, narrowingFilter, search,
+                    Projection(dict(fields=[ idField ])),
+                )
+            ]
+        else:
+            matchedIds = rankedIds
+        entities = self._searchRankedEntities(
+            entityType, idField, paging.slice(matchedIds), rankedIds,
+            narrowingFilter, search, projection,
+        )
+        return self._createIndexResult(entityType, entities, len(matchedIds))
+
+    def _searchRankedEntities(
+        self, entityType, idField, candidateIds, rankedIds, narrowingFilter, search, projection
+    ):
+        """
+        Searches entities of candidateIds that match narrowingFilter in a single search,
+        ordered by their rank in rankedIds
+        """
+        if len(candidateIds) == 0:
+            return []
+
+        searchFilter = self._aggregate.createFilter('and', [
+            narrowingFilter, self._createIdFilter(idField, candidateIds)
+        ]).normalize()
+        entities = search(searchFilter, **self._createSearchOptions(
+            PagingNoLimit(), NullSorter(), self._requireFields(projection, idField)
+        ))[entityType]
+
+        ranks = { entityId: rank for rank, entityId in enumerate(rankedIds) }
+        entities.sort( key=lambda entity: ranks.get(getattr(entity, idField, None), len(ranks)) )
+        return entities
+
+    def _createIndexResult(self, entityType, entities, matchedCount):
+        return {
+            entityType: entities,
+            'returnCount': len(entities),
+            'matchedCount': matchedCount,
+        }
+
+    def _createIdFilter(self, idField, ids):
+        return self._filter.createFilter(dict(field=idField, operator='eq', value=list(ids)))
 
-    def _joinOwner(self, entities):
+    def _countView(self, threadId, searchFilter):
         """
-        add owner user information to each entity document
-        by searching for it in repo
+        Adds a view to thread, through view counter when available
         
         Args:
-            entities(list): documents of entities like posts
+            threadId(string): Id of viewed thread
+            searchFilter(Filter): filter that matches the viewed thread
         Returns:
             None
         """
-        if len(entities) == 0:
+        if self._viewCounter is not None:
+            self._viewCounter.increment(threadId)
             return
 
-        userSearchFilter = self._createEqFiltersFromRelatedFieldnames('userId', 'userId', entities)
-        users = self._repo.searchUser(userSearchFilter)['users']
-        self._joinDocuments(entities, users, 'userId', 'userId', 'owner')
+        updateThread = Thread()
+        updateThread.increment = 'views'
+        self._repo.updateThread(searchFilter, updateThread)
 
-    def _joinLastPost(self, entities):
+    def _joinRelations(self, entities, joinsOwner=False, joinsLastPost=False):
         """
-        add last post information to each entity document
-        by searching for it in repo
+        Adds owner users and last posts to each entity by searching for them in repo.
+        Each relation is searched once, and owners of last posts are searched
+        along with owners of entities, so joins take at most 2 searches.
         
         Args:
-            entities(list): documents of entities like threads
+            entities(list): entities like threads or posts
+            joinsOwner(bool): whether to add owner users
+            joinsLastPost(bool): whether to add last posts, along with their owners
         Returns:
             None
         """
         if len(entities) == 0:
-            return 0
+            return
 
-        postSearchFilter = self._createEqFiltersFromRelatedFieldnames('postId', 'lastPostId', entities)
-        posts = self._repo.searchPost(postSearchFilter)['posts']
-        self._joinOwner(posts)
-        self._joinDocuments(entities, posts, 'lastPostId', 'postId', 'lastPost')
+        users = BatchLoader(self._repo.searchUser, 'users', 'userId', self._filter)
+        posts = BatchLoader(self._repo.searchPost, 'posts', 'postId', self._filter)
+        if joinsOwner:
+            users.request( getattr(entity, 'userId', None) for entity in entities )
+        if joinsLastPost:
+            posts.request( getattr(entity, 'lastPostId', None) for entity in entities )
 
-    def _createEqFiltersFromRelatedFieldnames(self, filterFieldname, entityFieldname, entities):
-        value = [
-            getattr(entity, entityFieldname)
-            for entity in entities
-            if getattr(entity, entityFieldname, None) is not None
-        ]
+        lastPosts = posts.dispatch()
+        users.request( getattr(post, 'userId', None) for post in lastPosts )
+        users.dispatch()
 
-        return self._createFilter(filterFieldname, 'eq', value)
+        if joinsOwner:
+            users.join(entities, 'userId', 'owner')
+        users.join(lastPosts, 'userId', 'owner')
+        if joinsLastPost:
+            posts.join(entities, 'lastPostId', 'lastPost')
 
-    def _joinDocuments(
-        self, primaryDocs, secondaryDocs, primaryField, secondaryField, newRelationName
-    ):
+    def _createPagingFromKeyValues(self, keyValues):
         """
-        Join two sets of documents by specified fieldnames.
-        When specified field value matches, secondary document is inserted into primary.
-        
+        Constructs appropriate Paging object from keyValues
+        Produces keyset based CursorPaging when 'after' field was found,
+        which may be empty to request the first page.
+
         Args:
-            primaryDocs(list): inject secondary document to this if possible
-            secondaryDocs(list): documents to inject
-            primaryField(string): fieldname in primary to relate
-            secondaryField(string): fieldname in secondary to relate
-            newRelationName(string): new fieldname created in primary to put secondary under
+            keyValues(dict)
         Returns:
-            None
+            Paging object
+        """
+        if 'after' in keyValues:
+            return CursorPaging(keyValues)
+
+        return self._paging(keyValues)
+
+    def _createProjectionFromKeyValues(self, keyValues):
+        """
+        Constructs Projection from 'fields' in keyValues
+        Produces None if no fields were requested,
+        so that repo falls back to its default projection
+
+        Args:
+            keyValues(dict)
+        Returns:
+            Projection object or None
         """
-        for pdoc in primaryDocs:
-            p_fieldvalue = getattr(pdoc, primaryField)
-            p_relation = getattr(pdoc, newRelationName, [])
+        if keyValues.get('fields', None) is None:
+            return None
+
+        return Projection(keyValues)
+
+    def _includesRelation(self, projection, relationName):
+        return projection is None or projection.includes(relationName)
+
+    def _requireFields(self, projection, *fields):
+        if projection is None:
+            return None
 
-            for sdoc in secondaryDocs:
-                s_fieldvalue = getattr(sdoc, secondaryField)
-                if not p_fieldvalue == s_fieldvalue:
-                    continue
+        return projection.withRequiredFields(*fields)
 
-                p_relation.append(sdoc)
+    def _createSearchOptions(self, paging, sorter, projection):
+        options = dict(paging=paging, sorter=sorter)
+        if projection is not None:
+            options['projection'] = projection
 
-            setattr(pdoc, newRelationName, p_relation)
+        return options
 
     def _createSorterFromKeyValues(self, keyValues):
         """
         Constructs appropriate Sorter class from keyValues
         Produces NullSorter if no 'sortBy' field was found'
+        Produces RelevanceSorter if 'sortBy' is 'relevance'
 
         Args:
             keyValues(dict)
@@ -192,6 +392,8 @@ class SearchService:
         sortField = keyValues.get('sortBy', None)
         if sortField is None:
             return NullSorter()
+        if sortField == self.RELEVANCE_SORT:
+            return RelevanceSorter()
 
         order = keyValues.get('order', None)
         if order == 'desc':
@@ -8,6 +8,10 @@ from server.database.filter import PrimitiveFilter
 from server.database.aggregate_filter import AggregateFilter
 from server.entity import User, Post, Thread
 
+# bounds of search terms taken from a single search query
+MAX_SEARCH_TERMS = 10
+MAX_SEARCH_TERM_LENGTH = 64
+
 
 def extract_fuzzy_attributes(entity):
     """
@@ -31,6 +35,30 @@ def extract_fuzzy_attributes(entity):
     return fuzzy_attributes
 
 
+def sanitize_search_terms(
+    search_value, max_terms=MAX_SEARCH_TERMS, max_length=MAX_SEARCH_TERM_LENGTH
+):
+    """
+    Splits search query into terms, bounding the cost of searching for them:
+        - empty terms left by repeated whitespaces are dropped
+        - terms are truncated to max_length characters
+        - duplicated terms are dropped, keeping the first
+        - terms after the first max_terms are dropped
+    Terms are searched for as plain substrings, filters escape them where needed
+    
+    Args:
+        search_value(str): search query typed by user
+        max_terms(int): maximum number of terms to keep
+        max_length(int): maximum number of characters of each term
+    Returns:
+        list of terms in string
+    """
+    terms = dict.fromkeys(
+        term[:max_length] for term in str(search_value).split()
+    )
+    return list(terms)[:max_terms]
+
+
 class SearchFilterCreator:
     """
     The intent of this class was to break off filter creating logic that was inside
@@ -91,7 +119,7 @@ class SearchFilterCreator:
     def _extract_search_term(cls, keyvalues):
         search_value = keyvalues.get('search', None)
         if search_value:
-            return search_value.split(' ')
+            return sanitize_search_terms(search_value)
         else:
             return []
 
@@ -17,9 +17,33 @@ class SessionService:
     REQUEST_USER_KEY = 'currentUser'
     ANONYMOUS_USERID = '0'
 
-    def __init__(self, repo, flask_context):
+    def __init__(self, repo, flask_context, user_cache=None):
         self._repo = repo
         self._context = flask_context
+        # when set, users are resolved from cache before querying repo
+        self._user_cache = user_cache
+        # set by load_anonymous_user(), served to every request without session
+        self._anonymous_user = None
+
+    def load_anonymous_user(self):
+        """
+        Reads anonymous user from repo once, so that requests without session
+        are served it without querying repo nor user cache.
+        Anonymous user is looked up on each request when it is not found.
+        Changes to anonymous user are not reflected until the app restarts.
+        
+        Args:
+            None
+        Returns:
+            None
+        """
+        logger.info('Loading anonymous user')
+        users = self._search_users(self.ANONYMOUS_USERID)
+        if len(users) == 0:
+            logger.warning('Anonymous user was not found in repo')
+            return
+
+        self._anonymous_user = users[0]
 
     def set_user(self, user):
         """
@@ -81,7 +105,30 @@ class SessionService:
         self._context.write_global(self.REQUEST_USER_KEY, user)
 
     def _find_user(self, userid):
+        if userid == self.ANONYMOUS_USERID and self._anonymous_user is not None:
+            return self._anonymous_user
+
+        generation = None
+        if self._user_cache is not None:
+            cached_user = self._user_cache.get(userid)
+            if cached_user is not None:
+                return cached_user
+            # read before searching, so that user changed meanwhile is not cached
+            generation = self._user_cache.getGeneration(userid)
+
+        user = self._search_users(userid)[0]
+
+        if self._user_cache is not None:
+            if userid == self.ANONYMOUS_USERID:
+                # anonymous user is shared by every request without session
+                self._user_cache.pin(user, generation)
+            else:
+                self._user_cache.put(user, generation)
+
+        return user
+
+    def _search_users(self, userid):
         search_filter = PrimitiveFilter.createFilter(dict(
             field='userId', operator='eq', value=[ userid ]
         ))
-        return self._repo.searchUser(search_filter)['users'][0]
+        return self._repo.searchUser(search_filter)['users']
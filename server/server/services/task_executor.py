@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses executor that runs independent calls concurrently,
+so that a request waits for its slowest repository call instead of the sum of them
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import server.exceptions as exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class TaskExecutor:
+    """
+    Runs calls on a bounded pool of threads and gathers their results.
+    The pool is meant to be owned by the app and shared among requests,
+    so the number of threads does not grow with the number of requests.
+
+    Calls run outside of flask contexts, so they should not rely on flask.g or request.
+    Calls gathered from inside a worker of this executor run inline on that worker,
+    so that nested gathers can not exhaust the pool and wait on each other.
+    """
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_TIMEOUT = 10.0
+
+    def __init__(self, maxWorkers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            maxWorkers(int): maximum number of threads in pool
+            timeout(float): default seconds each call is allowed to take, None for no limit
+        """
+        self._timeout = timeout
+        self._pool = ThreadPoolExecutor(
+            max_workers=maxWorkers, thread_name_prefix='TaskExecutor'
+        )
+        self._local = threading.local()
+
+    def gather(self, calls, timeout=None):
+        """
+        Runs calls concurrently and returns their results in order of calls.
+        Waits for every call to complete, unless one of them fails or times out.
+        MyAppException raised by a call propagates as is,
+        and other exceptions are raised as ServerMiscError.
+
+        Args:
+            calls(iterable): functions that take no arguments
+            timeout(float): seconds each call is allowed to take since it was submitted,
+                defaults to timeout of executor
+        Returns:
+            list of results of calls
+        """
+        calls = list(calls)
+        if timeout is None:
+            timeout = self._timeout
+
+        if len(calls) < 2 or self._isWorker():
+            return [ self._runInline(call) for call in calls ]
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = [ self._pool.submit(self._runOnWorker, call) for call in calls ]
+        try:
+            return [ self._waitForResult(future, deadline) for future in futures ]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        """
+        Waits for running calls to complete and releases threads of pool
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        self._pool.shutdown(wait=True)
+
+    def _waitForResult(self, future, deadline):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return future.result(timeout=remaining)
+        except TimeoutError:
+            raise exceptions.OperationTimeoutError('Operation timed out')
+        except exceptions.MyAppException:
+            raise
+        except Exception as e:
+            logger.error(e)
+            raise exceptions.ServerMiscError('Failed to complete operation')
+
+    def _runInline(self, call):
+        try:
+            return call()
+        except exceptions.MyAppException:
+            raise
+        except Exception as e:
+            logger.error(e)
+            raise exceptions.ServerMiscError('Failed to complete operation')
+
+    def _runOnWorker(self, call):
+        self._local.isWorker = True
+        try:
+            return call()
+        finally:
+            self._local.isWorker = False
+
+    def _isWorker(self):
+        return getattr(self._local, 'isWorker', False)
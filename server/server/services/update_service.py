@@ -15,10 +15,12 @@ class UpdateService:
     Class that provides methods to update entities.
     Includes most of the business logic related to update operations.
     """
-    def __init__(self, repo, PrimitiveFilter, session):
+    def __init__(self, repo, PrimitiveFilter, session, userCache=None, searchIndex=None):
         self._repo = repo
         self._filter = PrimitiveFilter
         self._session = session
+        self._userCache = userCache
+        self._searchIndex = searchIndex
 
     def updateUser(self, user):
         """
@@ -32,7 +34,11 @@ class UpdateService:
         searchFilter = self._create_eqfilter(user, 'userId')
         self._authorizeUpdateUser(searchFilter)
 
-        return self._repo.updateUser(searchFilter, user)
+        result = self._repo.updateUser(searchFilter, user)
+        if self._userCache is not None:
+            self._userCache.invalidate(user.userId)
+
+        return result
 
     def updatePost(self, post):
         """
@@ -46,7 +52,10 @@ class UpdateService:
         searchFilter = self._create_eqfilter(post, 'postId')
         self._authorizeUpdatePost(searchFilter)
 
-        return self._repo.updatePost(searchFilter, post)
+        result = self._repo.updatePost(searchFilter, post)
+        self._reindex('posts', post, searchFilter, self._repo.searchPost)
+
+        return result
 
     def updateThread(self, thread):
         """
@@ -60,7 +69,31 @@ class UpdateService:
         searchFilter = self._create_eqfilter(thread, 'threadId')
         self._authorizeUpdateThread(searchFilter)
 
-        return self._repo.updateThread(searchFilter, thread)
+        result = self._repo.updateThread(searchFilter, thread)
+        self._reindex('threads', thread, searchFilter, self._repo.searchThread)
+
+        return result
+
+    def _reindex(self, entityType, update, searchFilter, search):
+        """
+        Indexes updated entities again for search,
+        when update changed any of their indexed fields.
+        Entities are searched from repo, as update may only hold some of those fields.
+        
+        Args:
+            entityType(str): 'posts' or 'threads'
+            update(entity): entity object used to update repository
+            searchFilter(PrimitiveFilter): filter that matched updated entities
+            search(function): searches entities of entityType from repo
+        Returns:
+            None
+        """
+        if self._searchIndex is None or not self._searchIndex.coversUpdate(entityType, update):
+            return
+
+        idField = self._searchIndex.getIdField(entityType)
+        for entity in search(searchFilter)[entityType]:
+            self._searchIndex.add(entityType, getattr(entity, idField), entity)
 
     def _create_eqfilter(self, entity, fieldname):
         try:
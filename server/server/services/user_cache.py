@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses process-local cache of user entities,
+so that resolving session user of each request does not query repo
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class UserCache:
+    """
+    Caches users by userId, bounded by both time and size.
+        - ttl
+            seconds an entry is served before it has to be read from repo again
+        - maxSize
+            amount of entries kept, least recently used entry is evicted beyond it
+
+    Pinned users, like the anonymous user, never expire nor get evicted.
+    Services that change users must call invalidate() with their userId.
+
+    Users read from repo on a miss may be changed before they are cached.
+    Callers read getGeneration() before searching repo and pass it to put(),
+    which drops users invalidated in between instead of caching the stale ones.
+    """
+    DEFAULT_TTL = 60.0
+    DEFAULT_MAX_SIZE = 10000
+
+    def __init__(self, ttl=DEFAULT_TTL, maxSize=DEFAULT_MAX_SIZE, clock=time.monotonic):
+        self._ttl = ttl
+        self._maxSize = maxSize
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # incremented on each invalidate(), per userId
+        self._generations = Counter()
+
+    def get(self, userId):
+        """
+        Reads user from cache
+
+        Args:
+            userId(str): id of user to read
+        Returns:
+            User, or None when user is not cached or expired
+        """
+        with self._lock:
+            if userId in self._pinned:
+                self._hits += 1
+                return self._pinned[userId]
+
+            entry = self._entries.get(userId, None)
+            if entry is None or entry[1] <= self._clock():
+                self._entries.pop(userId, None)
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(userId)
+            self._hits += 1
+            return entry[0]
+
+    def getGeneration(self, userId):
+        """
+        Returns number of times user was invalidated,
+        to be read before searching repo for the user to put()
+
+        Args:
+            userId(str): id of user
+        Returns:
+            int
+        """
+        with self._lock:
+            return self._generations[userId]
+
+    def put(self, user, generation=None):
+        """
+        Caches user until ttl elapses
+
+        Args:
+            user(User): user to cache, keyed by its userId
+            generation(int): getGeneration() read before user was searched,
+                user is not cached when it was invalidated since then
+        Returns:
+            None
+        """
+        with self._lock:
+            if user.userId in self._pinned or self._isStale(user.userId, generation):
+                return
+
+            self._entries[user.userId] = (user, self._clock() + self._ttl)
+            self._entries.move_to_end(user.userId)
+            while len(self._entries) > self._maxSize:
+                self._entries.popitem(last=False)
+
+    def pin(self, user, generation=None):
+        """
+        Caches user permanently
+
+        Args:
+            user(User): user to cache, keyed by its userId
+            generation(int): same as put()
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._isStale(user.userId, generation):
+                return
+
+            self._entries.pop(user.userId, None)
+            self._pinned[user.userId] = user
+
+    def invalidate(self, userId):
+        """
+        Removes user from cache, including pinned ones
+
+        Args:
+            userId(str): id of user that was changed
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.pop(userId, None)
+            self._pinned.pop(userId, None)
+            self._generations[userId] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+
+    def getStats(self):
+        """
+        Reports effectiveness of cache
+
+        Args:
+            None
+        Returns:
+            dict of hits, misses and number of cached users
+        """
+        with self._lock:
+            return dict(
+                hits=self._hits,
+                misses=self._misses,
+                size=len(self._entries) + len(self._pinned),
+            )
+
+    def _isStale(self, userId, generation):
+        return generation is not None and generation != self._generations[userId]
@@ -8,6 +8,7 @@ import logging
 from passlib.context import CryptContext
 
 import server.exceptions as exceptions
+from server.database.projection import Projection
 
 logger = logging.getLogger(__name__)
 
@@ -100,7 +101,10 @@ class UserAuthenticationService:
             field='userName', operator='eq', value=[userName]
         ))
         
-        result = self._repo.searchUser(searchFilter)
+        # password is hidden from searches by default, but needed to verify credential
+        result = self._repo.searchUser(
+            searchFilter, projection=Projection(includeHidden=[ 'password' ])
+        )
         try:
             return result['users'][0]
         except Exception as e:
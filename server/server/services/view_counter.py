@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses class that buffers view counts of threads,
+so that reading a thread does not write to repo on each request
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountAggregator:
+    """
+    Collects view increments per threadId in memory
+    and writes them behind to repo in a single batch.
+
+    Increments are flushed when either:
+        - flushInterval seconds elapsed, once start() was called
+        - flushSize increments are pending
+        - stop() is called, which also happens on interpreter shutdown
+    """
+    DEFAULT_FLUSH_INTERVAL = 5.0
+    DEFAULT_FLUSH_SIZE = 1000
+
+    def __init__(self, repo, flushInterval=DEFAULT_FLUSH_INTERVAL, flushSize=DEFAULT_FLUSH_SIZE):
+        self._repo = repo
+        self._flushInterval = flushInterval
+        self._flushSize = flushSize
+        self._counts = Counter()
+        self._pendingCount = 0
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._flusher = None
+
+    def increment(self, threadId):
+        """
+        Adds a view to thread, to be written on next flush
+
+        Args:
+            threadId(str): id of thread that was viewed
+        Returns:
+            None
+        """
+        with self._lock:
+            self._counts[threadId] += 1
+            self._pendingCount += 1
+            shouldFlush = self._pendingCount >= self._flushSize
+
+        if shouldFlush:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all pending increments to repo.
+        Increments are put back when repo fails, to be retried on next flush.
+
+        Args:
+            None
+        Returns:
+            dict: result of repo operation, None when nothing was pending
+        """
+        with self._lock:
+            counts = self._counts
+            self._counts = Counter()
+            self._pendingCount = 0
+
+        if len(counts) == 0:
+            return None
+
+        try:
+            return self._repo.incrementThreadViews(dict(counts))
+        except Exception as e:
+            logger.error('Failed to flush view counts of %d threads: %s', len(counts), e)
+            with self._lock:
+                self._counts.update(counts)
+                self._pendingCount += sum(counts.values())
+            return None
+
+    def getPendingCount(self):
+        """
+        Returns number of increments that are not written to repo yet
+        """
+        with self._lock:
+            return self._pendingCount
+
+    def start(self):
+        """
+        Starts background thread that flushes every flushInterval seconds.
+        Pending increments are flushed on interpreter shutdown as well.
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        if self._flusher is not None:
+            return
+
+        self._stopEvent.clear()
+        self._flusher = threading.Thread(
+            target=self._flushPeriodically, name='ViewCountFlusher', daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Stops background thread and flushes pending increments
+
+        Args:
+            None
+        Returns:
+            None
+        """
+        if self._flusher is not None:
+            self._stopEvent.set()
+            self._flusher.join()
+            self._flusher = None
+            atexit.unregister(self.stop)
+
+        self.flush()
+
+    def _flushPeriodically(self):
+        while not self._stopEvent.wait(self._flushInterval):
+            self.flush()
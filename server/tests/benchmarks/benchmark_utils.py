@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses helpers shared among benchmark scripts
+"""
+import statistics
+import time
+
+
+def measure(func, repeat=10, warmup=1):
+    """
+    Calls func repeatedly and measures elapsed time of each call
+    
+    Args:
+        func(callable): function to measure, called without arguments
+        repeat(int): number of measured calls
+        warmup(int): number of calls made before measuring
+    Returns:
+        list of elapsed seconds
+    """
+    for _ in range(warmup):
+        func()
+
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed.append(time.perf_counter() - start)
+
+    return elapsed
+
+
+def report(label, elapsed):
+    """
+    Prints summary of measured elapsed times in milliseconds
+    
+    Args:
+        label(str): name of the measurement
+        elapsed(list): elapsed seconds returned from measure()
+    Returns:
+        None
+    """
+    ms = [ e * 1000 for e in elapsed ]
+    print(
+        f'{label:<50} '
+        f'median {statistics.median(ms):9.2f}ms  '
+        f'min {min(ms):9.2f}ms  '
+        f'max {max(ms):9.2f}ms'
+    )
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of thread search latency over a high-latency database link.
+Repository calls are simulated to take a fixed round trip each,
+and threads are searched with their owners and last posts joined.
+Owners of threads and of last posts are loaded in one user query,
+so a search takes three round trips however many threads it returns.
+
+usage:
+    python -m tests.benchmarks.concurrent_search_benchmark [latency_ms]
+"""
+import sys
+import time
+
+import tests.mocks as mocks
+from server.database.filter import PrimitiveFilter
+from server.database.aggregate_filter import AggregateFilter
+from server.database.paging import Paging
+from server.entity import User, Post, Thread
+from server.services.search_service import SearchService
+from server.services.searchfilter_creator import SearchFilterCreator
+from tests.benchmarks.benchmark_utils import measure, report
+
+DEFAULT_LATENCY_MS = 20
+THREADCOUNT = 20
+REPEAT = 20
+
+
+def create_result(entities, resultKey):
+    return {
+        resultKey: entities,
+        'returnCount': len(entities),
+        'matchedCount': len(entities),
+        'nextCursor': None,
+    }
+
+
+def create_slow_search(latency, entityClass, resultKey, createAttrs):
+    def search(searchFilter, **options):
+        time.sleep(latency)
+        keys = next( iter( searchFilter.getMongoFilter().values() ) )['$in']
+        return create_result(
+            [ entityClass.from_storage( createAttrs(key) ) for key in keys ], resultKey
+        )
+
+    return search
+
+
+def create_slow_repo(latency):
+    repo = mocks.createMockRepo()
+    del repo.searchThreadWithRelations
+    threads = [
+        Thread.from_storage(dict(
+            threadId=str(idx), userId=f'owner{idx}', lastPostId=str(idx), title=f'thread {idx}'
+        ))
+        for idx in range(THREADCOUNT)
+    ]
+
+    def searchThread(searchFilter, **options):
+        time.sleep(latency)
+        return create_result(list(threads), 'threads')
+
+    repo.searchThread.side_effect = searchThread
+    repo.searchPost.side_effect = create_slow_search(
+        latency, Post, 'posts', lambda postId: dict(postId=postId, userId=f'owner{postId}')
+    )
+    repo.searchUser.side_effect = create_slow_search(
+        latency, User, 'users', lambda userId: dict(userId=userId, displayName=userId)
+    )
+
+    return repo
+
+
+def count_round_trips(repo):
+    return repo.searchThread.call_count + repo.searchPost.call_count + repo.searchUser.call_count
+
+
+def run_benchmark(latency):
+    repo = create_slow_repo(latency)
+    service = SearchService(repo, SearchFilterCreator, PrimitiveFilter, AggregateFilter, Paging)
+    report(
+        f'search {THREADCOUNT} threads with relations',
+        measure(lambda: service.searchThreadsByKeyValues({}), repeat=REPEAT),
+    )
+    print(f'round trips per search: {count_round_trips(repo) / repo.searchThread.call_count:g}')
+
+
+if __name__ == '__main__':
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LATENCY_MS) / 1000
+    run_benchmark(latency)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of entity memory footprint and conversion throughput.
+Measures memory allocated per post hydrated from storage,
+and time to serialize a page of threads with owners and last posts joined.
+
+usage:
+    python -m tests.benchmarks.entity_conversion_benchmark [threadcount]
+"""
+import sys
+import time
+import tracemalloc
+
+from server.entity import User, Post, Thread
+from tests.benchmarks.benchmark_utils import measure, report
+
+DEFAULT_THREADCOUNT = 50
+MEMORY_POSTCOUNT = 10000
+REPEAT = 200
+
+
+def create_user(idx, now):
+    return User.from_storage(dict(
+        userId=str(idx),
+        userName=f'user{idx}@example.com',
+        displayName=f'benchmark user {idx}',
+        password='benchmarkpassword',
+        imageUrl=f'https://example.com/images/{idx}.jpg',
+        createdAt=now,
+        updatedAt=now,
+    ))
+
+
+def create_post_row(idx, now):
+    return dict(
+        _id=f'{idx:024x}',
+        postId=str(idx),
+        userId=str(idx + 1),
+        threadId=str(idx),
+        content=f'benchmark post number {idx}',
+        createdAt=now + idx,
+        updatedAt=now + idx,
+    )
+
+
+def create_threads(threadcount):
+    now = time.time()
+    threads = []
+    for idx in range(threadcount):
+        post = Post.from_storage( create_post_row(idx, now) )
+        post.owner = [ create_user(idx + 1, now) ]
+        threads.append(Thread.from_storage(dict(
+            threadId=str(idx),
+            userId=str(idx),
+            boardId='0',
+            lastPostId=post.postId,
+            title=f'benchmark thread {idx}',
+            subject=f'subject of benchmark thread {idx}',
+            views=idx * 10,
+            postCount=idx,
+            createdAt=now + idx,
+            updatedAt=now + idx,
+            owner=[ create_user(idx, now) ],
+            lastPost=[ post ],
+        )))
+
+    return threads
+
+
+def measure_memory_per_post(postcount):
+    now = time.time()
+    rows = [ create_post_row(idx, now) for idx in range(postcount) ]
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    posts = [ Post.from_storage(row) for row in rows ]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return (after - before) / len(posts)
+
+
+def run_benchmark(threadcount):
+    bytesPerPost = measure_memory_per_post(MEMORY_POSTCOUNT)
+    print(f'Memory per post hydrated from storage: {bytesPerPost:.0f} bytes')
+
+    threads = create_threads(threadcount)
+    report(
+        f'to_serialize {threadcount} threads with owner and last post',
+        measure(lambda: [ thread.to_serialize() for thread in threads ], repeat=REPEAT),
+    )
+    report(
+        f'to_update {threadcount} threads',
+        measure(lambda: [ thread.to_update() for thread in threads ], repeat=REPEAT),
+    )
+
+
+if __name__ == '__main__':
+    threadcount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THREADCOUNT
+    run_benchmark(threadcount)
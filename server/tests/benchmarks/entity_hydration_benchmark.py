@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of hydrating entities from rows read from repository,
+comparing validated construction against Entity.from_storage.
+
+usage:
+    python -m tests.benchmarks.entity_hydration_benchmark [postcount]
+"""
+import sys
+import time
+
+from server.entity import Post
+from tests.benchmarks.benchmark_utils import measure, report
+
+DEFAULT_POSTCOUNT = 10000
+USER_COUNT = 100
+THREAD_COUNT = 1000
+
+
+def create_rows(postcount):
+    now = time.time()
+    return [
+        dict(
+            _id=f'{idx:024x}',
+            postId=str(idx),
+            userId=str(idx % USER_COUNT),
+            threadId=str(idx % THREAD_COUNT),
+            content=f'benchmark post number {idx}',
+            createdAt=now + idx,
+            updatedAt=now + idx,
+        )
+        for idx in range(postcount)
+    ]
+
+
+def run_benchmark(postcount):
+    rows = create_rows(postcount)
+
+    print(f'Hydrating {postcount} posts')
+    hydrations = [
+        ('Post(row), validated', lambda: [ Post(row) for row in rows ]),
+        ('Post.from_storage(row), trusted', lambda: [ Post.from_storage(row) for row in rows ]),
+    ]
+    for name, hydrate in hydrations:
+        report(name, measure(hydrate, repeat=5))
+
+
+if __name__ == '__main__':
+    postcount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_POSTCOUNT
+    run_benchmark(postcount)
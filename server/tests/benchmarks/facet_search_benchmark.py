@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark comparing searches of MongoCrudManager
+with find() + count_documents() against a single $facet aggregation.
+
+Requires a running mongoDB pointed by MONGO_HOSTNAME and MONGO_PORT.
+usage:
+    python -m tests.benchmarks.facet_search_benchmark [postcount]
+"""
+import os
+import sys
+import time
+
+from pymongo import MongoClient
+
+from server.database.mongo_crudmanager import MongoCrudManager
+from server.database.filter import PrimitiveFilter
+from server.database.paging import Paging
+from server.database.sorter import DescendingSorter
+from tests.benchmarks.benchmark_utils import measure, report
+import tests.mocks as mocks
+
+BENCHMARK_DBNAME = 'benchmark_facet_search'
+DEFAULT_POSTCOUNT = 1000000
+THREAD_COUNT = 1000
+USER_COUNT = 100
+INSERT_BATCHSIZE = 10000
+
+
+def populate_posts(db, postcount):
+    print(f'Inserting {postcount} posts into {BENCHMARK_DBNAME}')
+    db['posts'].delete_many({})
+    now = time.time()
+    batch = []
+    for idx in range(postcount):
+        batch.append(dict(
+            postId=str(idx),
+            userId=str(idx % USER_COUNT),
+            threadId=str(idx % THREAD_COUNT),
+            content=f'benchmark post number {idx}',
+            createdAt=now + idx,
+        ))
+        if len(batch) == INSERT_BATCHSIZE:
+            db['posts'].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db['posts'].insert_many(batch, ordered=False)
+
+
+def run_benchmark(postcount):
+    hostname = os.getenv('MONGO_HOSTNAME')
+    port = int( os.getenv('MONGO_PORT') )
+    client = MongoClient(hostname, port)
+    populate_posts(client[BENCHMARK_DBNAME], postcount)
+
+    password = mocks.createMockPassword()
+    repos = [
+        ('find + count_documents', MongoCrudManager(BENCHMARK_DBNAME, password)),
+        ('$facet', MongoCrudManager(BENCHMARK_DBNAME, password, useFacetSearch=True)),
+    ]
+    threadFilter = PrimitiveFilter.createFilter(dict(
+        field='threadId', operator='eq', value=[ '7' ]
+    ))
+    scenarios = [
+        ('all posts, first page', None, {}),
+        ('all posts, page 100', None, dict(offset=5000)),
+        ('posts in thread, sorted desc', threadFilter, {}),
+    ]
+
+    for scenarioName, searchFilter, pagingParams in scenarios:
+        for repoName, repo in repos:
+            elapsed = measure(lambda: repo.searchPost(
+                searchFilter,
+                paging=Paging(pagingParams),
+                sorter=DescendingSorter('createdAt'),
+            ))
+            report(f'{scenarioName} [{repoName}]', elapsed)
+
+    client.drop_database(BENCHMARK_DBNAME)
+    client.close()
+
+
+if __name__ == '__main__':
+    postcount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_POSTCOUNT
+    run_benchmark(postcount)
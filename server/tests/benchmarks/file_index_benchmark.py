@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of FileCrudManager searches served by in-memory indexes.
+Compares searches of posts against reading the file and scanning every post,
+as FileCrudManager did before rows were kept in memory.
+
+usage:
+    python -m tests.benchmarks.file_index_benchmark [entitycount]
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+import server.json_codec as json_codec
+import tests.mocks as mocks
+from server.database.file_crudmanager import FileCrudManager
+from server.database.paging import Paging
+from server.services.searchfilter_creator import SearchFilterCreator
+from tests.benchmarks.benchmark_utils import measure, report
+from tests.benchmarks.filter_compile_benchmark import create_posts
+
+DEFAULT_ENTITYCOUNT = 100000
+REPEAT = 10
+
+KEYVALUES = [
+    ('post by id', dict(postId='4242')),
+    ('posts of thread', dict(threadId='7')),
+    ('posts of thread and owner', dict(threadId='7', userId='3')),
+    ('search term, not indexed', dict(search='number 42')),
+]
+
+
+def read_and_scan(postsFile, searchFilter):
+    with postsFile.open('rb') as f:
+        posts = json_codec.load(f)
+    matches = searchFilter.compile()
+    return [ post for post in posts if matches(post) ]
+
+
+def search_repo(repo, searchFilter):
+    return repo.searchPost(searchFilter, paging=Paging())
+
+
+def run_benchmark(entitycount):
+    with tempfile.TemporaryDirectory() as directory:
+        saveLocation = Path(directory)
+        postsFile = saveLocation / FileCrudManager.POSTS_FILENAME
+        with postsFile.open('wb') as f:
+            json_codec.dump(create_posts(entitycount), f)
+        repo = FileCrudManager(saveLocation, mocks.createMockPassword())
+
+        for label, keyValues in KEYVALUES:
+            searchFilter = SearchFilterCreator.create_postsearch(keyValues)
+            assert search_repo(repo, searchFilter)['matchedCount'] == \
+                len( read_and_scan(postsFile, searchFilter) )
+
+            report(
+                f'{label}, read file and scan',
+                measure(lambda: read_and_scan(postsFile, searchFilter), repeat=REPEAT),
+            )
+            report(
+                f'{label}, FileCrudManager',
+                measure(lambda: search_repo(repo, searchFilter), repeat=REPEAT, warmup=2),
+            )
+
+
+if __name__ == '__main__':
+    entitycount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ENTITYCOUNT
+    run_benchmark(entitycount)
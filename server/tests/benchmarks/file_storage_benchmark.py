@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of writes to file-based tables.
+Updates posts one by one, with whole file written on each change,
+and with changes appended to log.
+
+usage:
+    python -m tests.benchmarks.file_storage_benchmark [entitycount]
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+import server.json_codec as json_codec
+from server.database.file_table import createFileTable
+from server.database.filter import PrimitiveFilter
+from tests.benchmarks.benchmark_utils import measure, report
+from tests.benchmarks.filter_compile_benchmark import create_posts
+
+DEFAULT_ENTITYCOUNT = 100000
+UPDATECOUNT = 20
+REPEAT = 3
+
+
+def update_posts(table):
+    def changeContent(post):
+        post['content'] = 'updated'
+
+    for idx in range(UPDATECOUNT):
+        searchFilter = PrimitiveFilter.createFilter(
+            dict(field='postId', operator='eq', value=[ str(idx) ])
+        )
+        table.update(searchFilter, changeContent)
+
+
+def run_benchmark(entitycount):
+    posts = create_posts(entitycount)
+    for storage in [ 'file', 'log' ]:
+        with tempfile.TemporaryDirectory() as directory:
+            postsFile = Path(directory) / 'posts.json'
+            with postsFile.open('wb') as f:
+                json_codec.dump(posts, f)
+            table = createFileTable(storage, postsFile, hashFields=[ 'postId' ])
+
+            report(
+                f'{UPDATECOUNT} updates, {storage} storage',
+                measure(lambda: update_posts(table), repeat=REPEAT),
+            )
+
+
+if __name__ == '__main__':
+    entitycount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ENTITYCOUNT
+    run_benchmark(entitycount)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of in-memory filter evaluation, as done by FileCrudManager.
+Scans raw posts with filters SearchFilterCreator typically produces,
+through Filter.matches() and through the predicate created by Filter.compile().
+
+usage:
+    python -m tests.benchmarks.filter_compile_benchmark [entitycount]
+"""
+import sys
+
+from server.services.searchfilter_creator import SearchFilterCreator
+from tests.benchmarks.benchmark_utils import measure, report
+
+DEFAULT_ENTITYCOUNT = 1000000
+REPEAT = 3
+
+KEYVALUES = [
+    ('no criteria', dict()),
+    ('thread of post', dict(threadId='7')),
+    ('thread and owner of post', dict(threadId='7', userId='3')),
+    ('search term', dict(search='number 42')),
+    ('search term in thread', dict(search='number 42', threadId='7')),
+]
+
+
+def create_posts(entitycount):
+    return [
+        dict(
+            postId=str(idx),
+            userId=str(idx % 100),
+            threadId=str(idx % 1000),
+            content=f'benchmark post number {idx}',
+            createdAt=float(idx),
+            updatedAt=float(idx),
+        )
+        for idx in range(entitycount)
+    ]
+
+
+def scan_with_matches(searchFilter, posts):
+    return [ post for post in posts if searchFilter.matches(post) ]
+
+
+def scan_with_compile(searchFilter, posts):
+    matches = searchFilter.compile()
+    return [ post for post in posts if matches(post) ]
+
+
+def run_benchmark(entitycount):
+    posts = create_posts(entitycount)
+    for label, keyValues in KEYVALUES:
+        searchFilter = SearchFilterCreator.create_postsearch(keyValues)
+        assert scan_with_matches(searchFilter, posts) == scan_with_compile(searchFilter, posts)
+
+        report(
+            f'{label}, matches()',
+            measure(lambda: scan_with_matches(searchFilter, posts), repeat=REPEAT, warmup=0),
+        )
+        report(
+            f'{label}, compile()',
+            measure(lambda: scan_with_compile(searchFilter, posts), repeat=REPEAT, warmup=0),
+        )
+
+
+if __name__ == '__main__':
+    entitycount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ENTITYCOUNT
+    run_benchmark(entitycount)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of serializing a thread listing into a response body,
+comparing stdlib json with re-encoding by middleware (previous behavior)
+against json_codec with each of its backends.
+
+The listing has 50 threads, each joined with its owner and last post.
+usage:
+    python -m tests.benchmarks.json_codec_benchmark [threadcount]
+"""
+import json
+import sys
+import time
+
+import server.json_codec as json_codec
+from server.entity import User, Post, Thread
+from tests.benchmarks.benchmark_utils import measure, report
+
+DEFAULT_THREADCOUNT = 50
+REPEAT = 200
+
+
+def create_user(idx, now):
+    return User(
+        userId=str(idx),
+        userName=f'user{idx}@example.com',
+        displayName=f'benchmark user {idx}',
+        password='benchmarkpassword',
+        imageUrl=f'https://example.com/images/{idx}.jpg',
+        createdAt=now,
+        updatedAt=now,
+    )
+
+
+def create_listing(threadcount):
+    now = time.time()
+    threads = []
+    for idx in range(threadcount):
+        post = Post(
+            postId=str(idx),
+            userId=str(idx + 1),
+            threadId=str(idx),
+            content=f'last post of benchmark thread {idx} ' * 5,
+            owner=[ create_user(idx + 1, now) ],
+            createdAt=now + idx,
+            updatedAt=now + idx,
+        )
+        threads.append(Thread(
+            threadId=str(idx),
+            userId=str(idx),
+            boardId='0',
+            lastPostId=post.postId,
+            title=f'benchmark thread {idx}',
+            subject=f'subject of benchmark thread {idx} ' * 10,
+            views=idx * 10,
+            postCount=idx,
+            createdAt=now + idx,
+            updatedAt=now + idx,
+            owner=[ create_user(idx, now) ],
+            lastPost=[ post ],
+        ))
+
+    return dict(
+        result=dict(
+            threads=[ thread.to_serialize() for thread in threads ],
+            matchedCount=threadcount,
+            returnCount=threadcount,
+            nextCursor=None,
+        ),
+    )
+
+
+def serialize_with_stdlib_roundtrip(listing, currentUser):
+    """
+    Previous behavior: route encodes, then middleware decodes,
+    adds current user and encodes again
+    """
+    body = json.dumps(listing, default=lambda entity: entity.to_serialize())
+    envelope = json.loads(body)
+    envelope['currentUser'] = currentUser
+    return json.dumps(envelope).encode('utf-8')
+
+
+def serialize_with(dumps):
+    def serialize(listing, currentUser):
+        envelope = dict(listing)
+        envelope['currentUser'] = currentUser
+        return dumps(envelope)
+
+    return serialize
+
+
+def run_benchmark(threadcount):
+    listing = create_listing(threadcount)
+    currentUser = create_user(0, time.time()).to_serialize()
+
+    serializers = [
+        ('stdlib json, re-encoded by middleware', serialize_with_stdlib_roundtrip),
+        ('json_codec, stdlib backend', serialize_with(json_codec._stdlibDumps)),
+    ]
+    if json_codec.orjson is not None:
+        serializers.append(('json_codec, orjson backend', serialize_with(json_codec._orjsonDumps)))
+    else:
+        print('orjson is not installed, skipping its backend')
+
+    print(f'Serializing {threadcount} threads with owner and last post joined')
+    for name, serialize in serializers:
+        size = len( serialize(listing, currentUser) )
+        elapsed = measure(lambda: serialize(listing, currentUser), repeat=REPEAT)
+        report(f'{name} ({size} bytes)', elapsed)
+
+
+if __name__ == '__main__':
+    threadcount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THREADCOUNT
+    run_benchmark(threadcount)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of board listing throughput with and without CachingCrudManager.
+Repository calls are simulated to take a fixed round trip each,
+and threads are listed 100 times for each thread that is updated.
+
+usage:
+    python -m tests.benchmarks.repository_cache_benchmark [latency_ms]
+"""
+import sys
+import time
+
+import tests.mocks as mocks
+from server.database.caching_crudmanager import CachingCrudManager
+from server.database.paging import Paging
+from server.database.sorter import DescendingSorter
+from server.entity import Thread
+from tests.benchmarks.benchmark_utils import measure, report
+
+DEFAULT_LATENCY_MS = 2
+THREADCOUNT = 50
+READS_PER_WRITE = 100
+REPEAT = 5
+
+
+def create_slow_repo(latency):
+    repo = mocks.createMockRepo()
+    threads = [
+        Thread.from_storage(dict(threadId=str(idx), userId='1', title=f'thread {idx}'))
+        for idx in range(THREADCOUNT)
+    ]
+
+    def searchThread(searchFilter, **options):
+        time.sleep(latency)
+        return dict(
+            threads=list(threads), returnCount=len(threads), matchedCount=len(threads),
+            nextCursor=None,
+        )
+
+    def updateThread(searchFilter, thread):
+        time.sleep(latency)
+        return dict(matchedCount=1, updatedCount=1)
+
+    repo.searchThread.side_effect = searchThread
+    repo.updateThread.side_effect = updateThread
+    return repo
+
+
+def list_board(repo):
+    for _ in range(READS_PER_WRITE):
+        repo.searchThread(
+            None, paging=Paging(), sorter=DescendingSorter('updatedAt')
+        )
+    repo.updateThread(None, Thread())
+
+
+def run_benchmark(latency):
+    for label, repo in [
+        ('without cache', create_slow_repo(latency)),
+        ('with CachingCrudManager', CachingCrudManager( create_slow_repo(latency) )),
+    ]:
+        report(
+            f'{READS_PER_WRITE} listings and 1 update, {label}',
+            measure(lambda: list_board(repo), repeat=REPEAT),
+        )
+
+
+if __name__ == '__main__':
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LATENCY_MS) / 1000
+    run_benchmark(latency)
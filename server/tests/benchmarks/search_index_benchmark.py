@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of search terms looked up in SearchIndex.
+Compares ranking posts in the inverted index against scanning every post
+with fuzzy filters created for the same search terms.
+
+usage:
+    python -m tests.benchmarks.search_index_benchmark [entitycount]
+"""
+import sys
+
+from server.entity import Post
+from server.services.search_index import SearchIndex
+from server.services.searchfilter_creator import SearchFilterCreator, sanitize_search_terms
+from tests.benchmarks.benchmark_utils import measure, report
+from tests.benchmarks.filter_compile_benchmark import create_posts, scan_with_compile
+
+DEFAULT_ENTITYCOUNT = 100000
+REPEAT = 10
+
+SEARCHES = [
+    ('rare term', '4242'),
+    ('common term', 'benchmark'),
+    ('rare and common terms', 'number 4242'),
+]
+
+
+def build_index(posts):
+    searchIndex = SearchIndex()
+    for post in posts:
+        searchIndex.add('posts', post['postId'], Post(post))
+    return searchIndex
+
+
+def run_benchmark(entitycount):
+    posts = create_posts(entitycount)
+    searchIndex = build_index(posts)
+
+    for label, search in SEARCHES:
+        terms = sanitize_search_terms(search)
+        searchFilter = SearchFilterCreator.create_postsearch(dict(search=search))
+
+        report(
+            f'{label}, scan fuzzy filters',
+            measure(lambda: scan_with_compile(searchFilter, posts), repeat=REPEAT),
+        )
+        report(
+            f'{label}, SearchIndex',
+            measure(lambda: searchIndex.search('posts', terms), repeat=REPEAT),
+        )
+
+
+if __name__ == '__main__':
+    entitycount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ENTITYCOUNT
+    run_benchmark(entitycount)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of sorters selecting only the entities up to the end of page.
+Compares sorting every entity before slicing the page
+against selecting leading entities through a heap.
+
+usage:
+    python -m tests.benchmarks.sort_window_benchmark [entitycount]
+"""
+import random
+import sys
+
+from server.database.paging import Paging
+from server.database.sorter import AscendingSorter, DescendingSorter
+from tests.benchmarks.benchmark_utils import measure, report
+from tests.benchmarks.filter_compile_benchmark import create_posts
+
+DEFAULT_ENTITYCOUNT = 1000000
+REPEAT = 5
+
+PAGINGS = [
+    ('page 1', Paging(dict(offset=0, limit=50))),
+    ('page 20', Paging(dict(offset=950, limit=50))),
+]
+
+
+def sort_all(sorter, paging, posts):
+    return paging.slice( sorter.sort(posts) )
+
+
+def sort_window(sorter, paging, posts):
+    return paging.slice( sorter.sort(posts, paging.getEnd()) )
+
+
+def run_benchmark(entitycount):
+    posts = create_posts(entitycount)
+    random.Random(0).shuffle(posts)
+
+    for sorter in [ AscendingSorter('createdAt'), DescendingSorter('createdAt') ]:
+        for label, paging in PAGINGS:
+            label = f'{label}, {sorter.__class__.__name__}'
+            assert sort_all(sorter, paging, posts) == sort_window(sorter, paging, posts)
+
+            report(
+                f'{label}, sort all',
+                measure(lambda: sort_all(sorter, paging, posts), repeat=REPEAT),
+            )
+            report(
+                f'{label}, sort page window',
+                measure(lambda: sort_window(sorter, paging, posts), repeat=REPEAT),
+            )
+
+
+if __name__ == '__main__':
+    entitycount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ENTITYCOUNT
+    run_benchmark(entitycount)
@@ -2,9 +2,14 @@
 """
 This file defines common test fixtures and hooks used across the project
 """
+import os
+
 import pytest
 
-from server import server
+# tests replace repo of app with mocks, after the app is set up
+os.environ.setdefault('PRELOAD_ANONYMOUS_USER', 'false')
+
+from server import server  # noqa: E402
 
 
 @pytest.fixture(scope='module')
@@ -6,8 +6,9 @@ This file houses tests for aggregate_filter.py
 import pytest
 from unittest.mock import create_autospec
 
-from server.database.filter import Filter
+from server.database.filter import Filter, PrimitiveFilter, NullFilter
 import server.database.aggregate_filter as aggregates
+from server.services.searchfilter_creator import SearchFilterCreator
 
 
 class TestAndFilter:
@@ -237,7 +238,232 @@ class TestOrFilter:
             assert result == expected
 
 
+class TestAggregateNormalization:
+    ENTITIES = [
+        dict(userId='1', boardId='1', title='hello world'),
+        dict(userId='2', boardId='1', title='goodbye'),
+        dict(userId='3', boardId='2', title='hello again'),
+        dict(boardId='2', title='no owner'),
+    ]
+
+    def test_normalizeShouldRemoveEmptyAggregates(self):
+        agg = createAggregate('and', [
+            createAggregate('or', []),
+            createAggregate('and', []),
+        ])
+
+        assert agg.normalize() == NullFilter()
+        assert agg.normalize().getMongoFilter() == {}
+
+    def test_normalizeShouldReplaceAggregateOfSingleFilterWithTheFilter(self):
+        eq = createPrimitive('eq', 'userId', '1')
+        agg = createAggregate('and', [
+            createAggregate('or', []),
+            createAggregate('and', [ eq ]),
+        ])
+
+        assert agg.normalize() == eq
+
+    def test_normalizeShouldFlattenNestedAggregatesOfSameType(self):
+        fuzzy = createPrimitive('fuzzy', 'title', 'hello')
+        eq = createPrimitive('eq', 'userId', '1')
+        gt = createPrimitive('gt', 'views', 10)
+        agg = createAggregate('and', [
+            createAggregate('and', [ fuzzy, createAggregate('and', [ eq ]) ]),
+            gt,
+        ])
+
+        normalized = agg.normalize()
+
+        assert isinstance(normalized, aggregates.AndFilter)
+        assert len(normalized) == 3
+        assert normalized == createAggregate('and', [ eq, fuzzy, gt ]).normalize()
+
+    def test_normalizeShouldNotFlattenAggregatesOfOtherType(self):
+        agg = createAggregate('and', [
+            createAggregate('or', [
+                createPrimitive('fuzzy', 'title', 'hello'),
+                createPrimitive('fuzzy', 'subject', 'hello'),
+            ]),
+            createPrimitive('eq', 'boardId', '1'),
+        ])
+
+        normalized = agg.normalize()
+
+        assert len(normalized) == 2
+        assert normalized.getMongoFilter()['$and'][1] == {
+            '$or': [
+                { 'subject': { '$regex': 'hello', '$options': 'i' } },
+                { 'title': { '$regex': 'hello', '$options': 'i' } },
+            ]
+        }
+
+    def test_normalizeShouldMergeEQFiltersOnSameFieldUnderOr(self):
+        agg = createAggregate('or', [
+            createPrimitive('eq', 'userId', '1'),
+            createPrimitive('eq', 'userId', '3', '1'),
+        ])
+
+        assert agg.normalize().getMongoFilter() == { 'userId': { '$in': [ '1', '3' ] } }
+
+    def test_normalizeShouldNarrowEQFiltersOnSameFieldUnderAndToSubset(self):
+        agg = createAggregate('and', [
+            createPrimitive('eq', 'userId', '1', '2'),
+            createPrimitive('eq', 'userId', '2'),
+            createPrimitive('eq', 'boardId', '1'),
+        ])
+
+        assert agg.normalize().getMongoFilter() == {
+            '$and': [
+                { 'boardId': { '$in': [ '1' ] } },
+                { 'userId': { '$in': [ '2' ] } },
+            ]
+        }
+
+    def test_normalizeShouldKeepEQFiltersUnderAndWithoutSubset(self):
+        # on mongoDB, array field like [ '1', '3' ] matches both, with no value in both
+        agg = createAggregate('and', [
+            createPrimitive('eq', 'tags', '1', '2'),
+            createPrimitive('eq', 'tags', '3'),
+        ])
+
+        normalized = agg.normalize()
+
+        assert normalized.getMongoFilter() == {
+            '$and': [
+                { 'tags': { '$in': [ '1', '2' ] } },
+                { 'tags': { '$in': [ '3' ] } },
+            ]
+        }
+
+    def test_normalizeShouldNotNarrowEQFiltersUnderAndToValuesOfOtherType(self):
+        agg = createAggregate('and', [
+            createPrimitive('eq', 'views', 1),
+            createPrimitive('eq', 'views', True),
+        ])
+
+        assert len( agg.normalize() ) == 2
+
+    def test_orShouldMatchEverythingWhenContainingEmptyAggregate(self):
+        agg = createAggregate('or', [
+            createAggregate('and', []),
+            createPrimitive('eq', 'userId', '1'),
+        ])
+
+        assert agg.normalize() == NullFilter()
+
+    @pytest.mark.parametrize('keyValues', [
+        dict(),
+        dict(search='hello'),
+        dict(search='hello world', boardId='1'),
+        dict(userId='1', boardId='1'),
+        dict(userId='nonexistant'),
+    ])
+    def test_normalizedFilterShouldMatchSameEntities(self, keyValues):
+        agg = SearchFilterCreator.create_threadsearch(keyValues)
+
+        normalized = agg.normalize()
+
+        assert [ normalized.matches(entity) for entity in self.ENTITIES ] == \
+            [ agg.matches(entity) for entity in self.ENTITIES ]
+
+    def test_normalizeShouldNotChangeAggregate(self):
+        agg = SearchFilterCreator.create_threadsearch(dict(search='hello', userId='1'))
+        original = agg.getMongoFilter()
+
+        agg.normalize()
+
+        assert agg.getMongoFilter() == original
+
+    def test_filtersEquivalentAfterNormalizationShouldHaveSameKeyAndHash(self):
+        agg1 = createAggregate('and', [
+            createAggregate('or', []),
+            createAggregate('and', [
+                createPrimitive('eq', 'userId', '1'),
+                createPrimitive('eq', 'boardId', '2'),
+            ]),
+        ])
+        agg2 = createAggregate('and', [
+            createPrimitive('eq', 'boardId', '2'),
+            createPrimitive('eq', 'userId', '1'),
+        ])
+
+        assert agg1.getCacheKey() == agg2.getCacheKey()
+        assert hash(agg1) == hash(agg2)
+        assert { agg1.normalize(): 'cached' }[ agg2.normalize() ] == 'cached'
+
+    def test_filtersNotEquivalentShouldHaveDifferentKeys(self):
+        eqs = [ createPrimitive('eq', 'userId', '1'), createPrimitive('eq', 'boardId', '2') ]
+
+        assert createAggregate('and', eqs).getCacheKey() != \
+            createAggregate('or', eqs).getCacheKey()
+
+
+class TestAggregateCompilation:
+    ENTITIES = TestAggregateNormalization.ENTITIES
+
+    @pytest.mark.parametrize('keyValues', [
+        dict(),
+        dict(search='hello'),
+        dict(search='hello world', boardId='1'),
+        dict(userId='1', boardId='1'),
+        dict(userId='nonexistant'),
+    ])
+    def test_compiledFilterShouldMatchSameEntities(self, keyValues):
+        agg = SearchFilterCreator.create_threadsearch(keyValues)
+
+        predicate = agg.compile()
+
+        assert [ predicate(entity) for entity in self.ENTITIES ] == \
+            [ agg.matches(entity) for entity in self.ENTITIES ]
+
+    @pytest.mark.parametrize('op', [ 'and', 'or' ])
+    @pytest.mark.parametrize('count', [ 2, 3 ])
+    def test_compiledAggregateShouldMatchSameEntities(self, op, count):
+        filters = [
+            createPrimitive('eq', 'userId', '1', '3'),
+            createPrimitive('fuzzy', 'title', 'hello'),
+            createPrimitive('eq', 'boardId', '2'),
+        ][:count]
+        agg = createAggregate(op, filters)
+
+        predicate = agg.compile()
+
+        assert [ predicate(entity) for entity in self.ENTITIES ] == \
+            [ agg.matches(entity) for entity in self.ENTITIES ]
+
+    @pytest.mark.parametrize('op, firstResult', [ ('and', False), ('or', True) ])
+    def test_compiledAggregateShouldShortCircuit(self, op, firstResult):
+        first = create_autospec(Filter)
+        first.normalize.return_value = first
+        first.compile.return_value = lambda entity: firstResult
+        first._describe.return_value = ('first',)
+        second = create_autospec(Filter)
+        second.normalize.return_value = second
+        second._describe.return_value = ('second',)
+        agg = createAggregate(op, [ first, second ])
+
+        agg.compile()( dict(userId='1') )
+
+        assert second.compile.return_value.call_count == 0
+
+    def test_compiledEmptyAggregatesShouldMatchEverything(self):
+        agg = SearchFilterCreator.create_threadsearch({})
+
+        predicate = agg.compile()
+
+        assert all( predicate(entity) for entity in self.ENTITIES )
+
+
 # helper functions
+def createPrimitive(op, field, *values):
+    return PrimitiveFilter.createFilter(dict(operator=op, field=field, value=list(values)))
+
+
+def createAggregate(op, filters):
+    return aggregates.AggregateFilter.createFilter(op, filters)
+
+
 def createMockFilters(n):
     return [
         create_autospec(Filter) for n in range(n)
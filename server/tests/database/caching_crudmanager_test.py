@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for caching_crudmanager.py
+"""
+import pytest
+
+import tests.mocks as mocks
+from server.database.caching_crudmanager import CachingCrudManager
+from server.database.filter import PrimitiveFilter
+from server.database.aggregate_filter import AggregateFilter
+from server.database.paging import Paging
+from server.database.sorter import AscendingSorter, DescendingSorter
+from server.database.projection import Projection
+from server.entity import User, Post, Thread
+from server.exceptions import FailedMongoOperation
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def createSearchFilter(field, values):
+    return AggregateFilter.createFilter('and', [
+        PrimitiveFilter.createFilter(dict(field=field, operator='eq', value=values)),
+    ])
+
+
+def createResult(entities, resultKey):
+    return {
+        resultKey: entities,
+        'returnCount': len(entities),
+        'matchedCount': len(entities),
+        'nextCursor': None,
+    }
+
+
+@pytest.fixture(scope='function')
+def repo():
+    repo = mocks.createMockRepo()
+    repo.searchUser.side_effect = lambda *args, **kwargs: createResult(
+        [ User.from_storage( dict(userId='1', displayName='alice') ) ], 'users'
+    )
+    repo.searchPost.side_effect = lambda *args, **kwargs: createResult(
+        [ Post.from_storage( dict(postId='1', userId='1', content='content') ) ], 'posts'
+    )
+    repo.searchThread.side_effect = lambda *args, **kwargs: createResult(
+        [ Thread.from_storage( dict(threadId='1', userId='1', title='title') ) ], 'threads'
+    )
+    return repo
+
+
+@pytest.fixture(scope='function')
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(scope='function')
+def cache(repo, clock):
+    return CachingCrudManager(repo, clock=clock)
+
+
+class TestCachedSearch:
+    def test_searchShouldReadRepoOnceForSameSearch(self, cache, repo):
+        first = cache.searchPost(createSearchFilter('postId', [ '1' ]), paging=Paging())
+        second = cache.searchPost(createSearchFilter('postId', [ '1' ]), paging=Paging())
+
+        assert repo.searchPost.call_count == 1
+        assert second['matchedCount'] == first['matchedCount']
+        assert [ post._get_attrs() for post in second['posts'] ] == \
+            [ post._get_attrs() for post in first['posts'] ]
+        assert cache.getStats() == dict(hits=1, misses=1, size=1)
+
+    @pytest.mark.parametrize('otherFilter, otherOptions', [
+        ( createSearchFilter('postId', [ '2' ]), dict(paging=Paging()) ),
+        ( createSearchFilter('userId', [ '1' ]), dict(paging=Paging()) ),
+        ( createSearchFilter('postId', [ '1' ]), dict(paging=Paging( dict(offset=50) )) ),
+        ( createSearchFilter('postId', [ '1' ]), dict(paging=Paging(), sorter=AscendingSorter('createdAt')) ),
+        ( createSearchFilter('postId', [ '1' ]), dict(paging=Paging(), projection=Projection( dict(fields='postId') )) ),
+        ( None, dict(paging=Paging()) ),
+    ])
+    def test_searchShouldReadRepoForDifferentSearch(self, cache, repo, otherFilter, otherOptions):
+        cache.searchPost(createSearchFilter('postId', [ '1' ]), paging=Paging())
+
+        cache.searchPost(otherFilter, **otherOptions)
+
+        assert repo.searchPost.call_count == 2
+
+    def test_searchShouldTellApartSortOrder(self, cache, repo):
+        cache.searchThread(None, sorter=AscendingSorter('createdAt'))
+        cache.searchThread(None, sorter=DescendingSorter('createdAt'))
+
+        assert repo.searchThread.call_count == 2
+
+    def test_searchShouldTellApartEntityTypes(self, cache, repo):
+        cache.searchUser(createSearchFilter('userId', [ '1' ]))
+        cache.searchPost(createSearchFilter('userId', [ '1' ]))
+
+        assert repo.searchUser.call_count == 1
+        assert repo.searchPost.call_count == 1
+
+    def test_searchShouldReturnCopiesOfCachedEntities(self, cache):
+        first = cache.searchPost(createSearchFilter('postId', [ '1' ]))
+        first['posts'][0].owner = [ User.from_storage( dict(userId='1') ) ]
+
+        second = cache.searchPost(createSearchFilter('postId', [ '1' ]))
+        second['posts'][0].content = 'changed'
+        third = cache.searchPost(createSearchFilter('postId', [ '1' ]))
+
+        assert not hasattr(second['posts'][0], 'owner')
+        assert third['posts'][0].content == 'content'
+
+    def test_searchShouldReadRepoAgainOnceTtlElapsed(self, repo, clock):
+        cache = CachingCrudManager(repo, ttls=dict(users=60.0, posts=5.0), clock=clock)
+        cache.searchUser(None)
+        cache.searchPost(None)
+
+        clock.now = 10.0
+        cache.searchUser(None)
+        cache.searchPost(None)
+
+        assert repo.searchUser.call_count == 1
+        assert repo.searchPost.call_count == 2
+
+    def test_searchShouldEvictLeastRecentlyUsedResultBeyondMaxSize(self, repo, clock):
+        cache = CachingCrudManager(repo, maxSize=2, clock=clock)
+        cache.searchPost(createSearchFilter('postId', [ '1' ]))
+        cache.searchPost(createSearchFilter('postId', [ '2' ]))
+        cache.searchPost(createSearchFilter('postId', [ '1' ]))
+
+        cache.searchPost(createSearchFilter('postId', [ '3' ]))
+        cache.searchPost(createSearchFilter('postId', [ '1' ]))
+        cache.searchPost(createSearchFilter('postId', [ '2' ]))
+
+        assert repo.searchPost.call_count == 4
+        assert cache.getStats()['size'] == 2
+
+    def test_searchShouldNotCacheResultWhenWrittenWhileSearching(self, cache, repo):
+        def searchWhileUpdating(*args, **kwargs):
+            cache.updatePost(createSearchFilter('postId', [ '1' ]), Post())
+            return createResult([], 'posts')
+        repo.searchPost.side_effect = searchWhileUpdating
+
+        cache.searchPost(None)
+        cache.searchPost(None)
+
+        assert repo.searchPost.call_count == 2
+
+    def test_searchShouldNotCacheWhenRepoFailed(self, cache, repo):
+        repo.searchPost.side_effect = FailedMongoOperation('Failed to search post')
+
+        with pytest.raises(FailedMongoOperation):
+            cache.searchPost(None)
+
+        assert cache.getStats()['size'] == 0
+
+
+class TestInvalidation:
+    @pytest.mark.parametrize('write, searchName', [
+        ( lambda cache: cache.createUser( User() ), 'searchUser' ),
+        ( lambda cache: cache.updateUser( None, User() ), 'searchUser' ),
+        ( lambda cache: cache.deleteUser( None ), 'searchUser' ),
+        ( lambda cache: cache.createPost( Post() ), 'searchPost' ),
+        ( lambda cache: cache.updatePost( None, Post() ), 'searchPost' ),
+        ( lambda cache: cache.deletePost( None ), 'searchPost' ),
+        ( lambda cache: cache.createThread( Thread() ), 'searchThread' ),
+        ( lambda cache: cache.updateThread( None, Thread() ), 'searchThread' ),
+        ( lambda cache: cache.incrementThreadViews({ '1': 1 }), 'searchThread' ),
+        ( lambda cache: cache.deleteThread( None ), 'searchThread' ),
+    ])
+    def test_writeShouldEvictOnlyResultsOfWrittenEntityType(self, cache, repo, write, searchName):
+        searchNames = [ 'searchUser', 'searchPost', 'searchThread' ]
+        for name in searchNames:
+            getattr(cache, name)(None)
+
+        write(cache)
+        for name in searchNames:
+            getattr(cache, name)(None)
+
+        for name in searchNames:
+            expectedCount = 2 if name == searchName else 1
+            assert getattr(repo, name).call_count == expectedCount
+
+    def test_writeShouldBeDelegatedToRepo(self, cache, repo):
+        repo.createPost.return_value = dict(createdCount=1, createdId='2')
+        post = Post()
+
+        result = cache.createPost(post)
+
+        repo.createPost.assert_called_once_with(post)
+        assert result == dict(createdCount=1, createdId='2')
+
+    def test_failedWriteShouldStillEvictResults(self, cache, repo):
+        repo.updatePost.side_effect = FailedMongoOperation('Failed to update post')
+        cache.searchPost(None)
+
+        with pytest.raises(FailedMongoOperation):
+            cache.updatePost(None, Post())
+        cache.searchPost(None)
+
+        assert repo.searchPost.call_count == 2
+
+
+class TestSearchThreadWithRelations:
+    @pytest.fixture(scope='function')
+    def joiningRepo(self):
+        repo = mocks.createMockJoiningRepo()
+        repo.searchThreadWithRelations.side_effect = lambda *args, **kwargs: createResult(
+            [ Thread.from_storage( dict(
+                threadId='1', owner=[ User.from_storage( dict(userId='1') ) ],
+            ) ) ],
+            'threads'
+        )
+        return repo
+
+    def test_cacheShouldNotProvideJoinsWhenRepoDoesNot(self, cache):
+        assert not hasattr(cache, 'searchThreadWithRelations')
+
+    @pytest.mark.parametrize('write', [
+        lambda cache: cache.updateThread( None, Thread() ),
+        lambda cache: cache.updatePost( None, Post() ),
+        lambda cache: cache.updateUser( None, User() ),
+    ])
+    def test_writeOfRelationShouldEvictJoinedThreads(self, joiningRepo, write):
+        cache = CachingCrudManager(joiningRepo)
+        cache.searchThreadWithRelations(None)
+
+        write(cache)
+        cache.searchThreadWithRelations(None)
+
+        assert joiningRepo.searchThreadWithRelations.call_count == 2
+
+    def test_joinedRelationsShouldBeCopied(self, joiningRepo):
+        cache = CachingCrudManager(joiningRepo)
+        cache.searchThreadWithRelations(None)
+
+        first = cache.searchThreadWithRelations(None)
+        first['threads'][0].owner.append( User.from_storage( dict(userId='2') ) )
+        second = cache.searchThreadWithRelations(None)
+
+        assert len(second['threads'][0].owner) == 1
+
+
+class TestCacheKeys:
+    def test_equalFiltersShouldHaveEqualKeys(self):
+        assert createSearchFilter('postId', [ '1', '2' ]).getCacheKey() == \
+            createSearchFilter('postId', [ '1', '2' ]).getCacheKey()
+
+    def test_keysShouldBeHashable(self):
+        keys = {
+            createSearchFilter('postId', [ '1' ]).getCacheKey(),
+            PrimitiveFilter.createNullFilter().getCacheKey(),
+            Paging().getCacheKey(),
+            AscendingSorter('createdAt').getCacheKey(),
+            Projection( dict(fields='postId,content') ).getCacheKey(),
+        }
+
+        assert len(keys) == 5
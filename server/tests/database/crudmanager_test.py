@@ -1,16 +1,21 @@
 # -*- coding: utf-8 -*-
 """
-This file houses tests for file_crudmanager.py and mongo_crudmanager.py
+This file houses tests for file_crudmanager.py, mongo_crudmanager.py and sqlite_crudmanager.py
 """
 
 import pytest
 
 from server.database.sorter import DescendingSorter
-from tests.database.setup_crudmanager import Setup_FileCrudManager, Setup_MongoCrudManager
+from tests.database.setup_crudmanager import (
+    Setup_FileCrudManager, Setup_MongoCrudManager, Setup_MongoFacetCrudManager,
+    Setup_FileUlidCrudManager, Setup_MongoSnowflakeCrudManager, Setup_MongoConcurrentCrudManager,
+    Setup_CachingFileCrudManager, Setup_LogFileCrudManager, Setup_SqliteCrudManager,
+)
 from tests.database.datacreator import DataCreator
 from server.database.filter import PrimitiveFilter
 from server.database.aggregate_filter import AggregateFilter
-from server.database.paging import Paging
+from server.database.paging import Paging, CursorPaging
+from server.database.projection import Projection
 from server.entity.post import UpdatePost
 from server.exceptions import EntityValidationError
 from server.services.entity_creation_service import EntityCreationService
@@ -18,7 +23,10 @@ from server.entity import User, Post, Thread
 
 
 @pytest.mark.slow
-@pytest.mark.parametrize('createDB', [Setup_FileCrudManager, Setup_MongoCrudManager], indirect=True)
+@pytest.mark.parametrize(
+    'createDB', [Setup_FileCrudManager, Setup_MongoCrudManager, Setup_SqliteCrudManager],
+    indirect=True
+)
 class TestFixture:
     def test_fixtureCreatedUsers(self, setupDB):
         setupDB.validateCreatedUsers()
@@ -31,7 +39,14 @@ class TestFixture:
 
 
 @pytest.mark.slow
-@pytest.mark.parametrize('createDB', [Setup_FileCrudManager, Setup_MongoCrudManager], indirect=True)
+@pytest.mark.parametrize(
+    'createDB',
+    [
+        Setup_FileCrudManager, Setup_MongoCrudManager, Setup_MongoFacetCrudManager,
+        Setup_CachingFileCrudManager, Setup_LogFileCrudManager, Setup_SqliteCrudManager,
+    ],
+    indirect=True
+)
 class TestUserCRUD:
     DEFAULT_NEW_USER = {
         'displayName': 'Timmy',
@@ -194,6 +209,31 @@ class TestUserCRUD:
         assert result['matchedCount'] == 1
         assert result['returnCount'] == 1
 
+    def test_searchUserShouldNotFetchHiddenFieldsByDefault(self, setupDB):
+        result = setupDB.getRepo().searchUser(None)
+
+        for user in result['users']:
+            assert not hasattr(user, 'password')
+            assert not hasattr(user, '_id')
+
+    def test_searchUserShouldFetchHiddenFieldsWhenAskedFor(self, setupDB):
+        projection = Projection(includeHidden=[ 'password' ])
+
+        result = setupDB.getRepo().searchUser(None, projection=projection)
+
+        assert len(result['users']) > 0
+        for user in result['users']:
+            assert hasattr(user, 'password')
+
+    def test_searchUserWithProjectionShouldOnlyFetchRequestedFieldsAndId(self, setupDB):
+        projection = Projection(dict(fields='displayName'))
+
+        result = setupDB.getRepo().searchUser(None, projection=projection)
+
+        assert len(result['users']) > 0
+        for user in result['users']:
+            assert set(user._get_attrs().keys()) == { 'displayName', 'userId' }
+
     def test_searchUserByNonExistantUserIdShouldReturnZeroUsersFromDB(self, setupDB):
         userIdsToSearch = ['non_existant']
         searchFilter = createSearchFilter('userId', 'eq', userIdsToSearch)
@@ -369,7 +409,15 @@ class TestUserCRUD:
 
 
 @pytest.mark.slow
-@pytest.mark.parametrize('createDB', [Setup_FileCrudManager, Setup_MongoCrudManager], indirect=True)
+@pytest.mark.parametrize(
+    'createDB',
+    [
+        Setup_FileCrudManager, Setup_MongoCrudManager, Setup_MongoFacetCrudManager,
+        Setup_MongoConcurrentCrudManager, Setup_CachingFileCrudManager,
+        Setup_LogFileCrudManager, Setup_SqliteCrudManager,
+    ],
+    indirect=True
+)
 class TestPostCRUD:
     DEFAULT_NEW_POST = {
         'userId': '1',
@@ -518,6 +566,22 @@ class TestPostCRUD:
         assert result['returnCount'] == 1
         assert result['matchedCount'] == 1
 
+    def test_searchPostShouldHydratePostsWithoutValidation(self, setupDB, monkeypatch):
+        def failValidation(*args, **kwargs):
+            raise AssertionError('stored posts should not be validated')
+        monkeypatch.setattr(Post, '_sanitize_attributes', failValidation)
+        postIdsToSearch = [
+            post['postId'] for post in setupDB.getOriginalPosts()[:2]
+        ]
+        searchFilter = createSearchFilter('postId', 'eq', postIdsToSearch)
+
+        posts = setupDB.getRepo().searchPost(searchFilter)['posts']
+
+        assert len(posts) == 2
+        for post in posts:
+            assert isinstance(post, Post)
+            assert post.postId in postIdsToSearch
+
     def test_searchPostByMultiplePostIdsShouldReturnPostFromDB(self, setupDB):
         postIdsToSearch = [
             post['postId'] for post in setupDB.getOriginalPosts()[:2]
@@ -636,6 +700,41 @@ class TestPostCRUD:
         for result_post, expected_post in zip(result['posts'], expectedPosts):
             assert result_post.postId == expected_post['postId']
 
+    def test_searchPostByCursorPagingShouldWalkThroughAllPostsInSortedOrder(self, setupDB):
+        sorter = DescendingSorter('createdAt')
+        expectedPostIds = [
+            post['postId']
+            for post in sorter.sortKeyset(setupDB.getOriginalPosts(), 'postId')
+        ]
+        pagedPostIds = []
+        paging = CursorPaging(dict(limit=40, after=''))
+
+        while True:
+            result = setupDB.getRepo().searchPost(None, paging=paging, sorter=sorter)
+            assert result['matchedCount'] == len(expectedPostIds)
+            pagedPostIds.extend([ post.postId for post in result['posts'] ])
+            if result['nextCursor'] is None:
+                break
+            paging = CursorPaging(dict(limit=40, after=result['nextCursor']))
+
+        assert pagedPostIds == expectedPostIds
+
+    def test_searchPostByCursorPagingShouldStartAfterKeyset(self, setupDB):
+        sorter = DescendingSorter('createdAt')
+        sortedPosts = sorter.sortKeyset(setupDB.getOriginalPosts(), 'postId')
+        after = CursorPaging.encodeCursor( sorter.extractKeyset(sortedPosts[9], 'postId') )
+        paging = CursorPaging(dict(limit=5, after=after))
+
+        result = setupDB.getRepo().searchPost(None, paging=paging, sorter=sorter)
+
+        assert [ post.postId for post in result['posts'] ] == [
+            post['postId'] for post in sortedPosts[10:15]
+        ]
+        assert result['returnCount'] == 5
+        assert result['nextCursor'] == CursorPaging.encodeCursor(
+            sorter.extractKeyset(sortedPosts[14], 'postId')
+        )
+
     def test_updatePostShouldUpdatePostOnDB(self, setupDB):
         postIdsToUpdate = [ post['postId'] for post in setupDB.getOriginalPosts()[:2] ]
         searchFilter = createSearchFilter('postId', 'eq', postIdsToUpdate)
@@ -691,7 +790,14 @@ class TestPostCRUD:
 
 
 @pytest.mark.slow
-@pytest.mark.parametrize('createDB', [Setup_FileCrudManager, Setup_MongoCrudManager], indirect=True)
+@pytest.mark.parametrize(
+    'createDB',
+    [
+        Setup_FileCrudManager, Setup_MongoCrudManager, Setup_MongoFacetCrudManager,
+        Setup_CachingFileCrudManager, Setup_LogFileCrudManager, Setup_SqliteCrudManager,
+    ],
+    indirect=True
+)
 class TestThreadCRUD:
     DEFAULT_NEW_THREAD = dict(
         boardId='1',
@@ -875,6 +981,19 @@ class TestThreadCRUD:
         assert result['returnCount'] == DataCreator.THREAD_COUNT
         assert result['matchedCount'] == DataCreator.THREAD_COUNT
 
+    def test_searchThreadWithProjectionShouldKeepSortFieldForCursor(self, setupDB):
+        projection = Projection(dict(fields='title'))
+        sorter = DescendingSorter('createdAt')
+        paging = CursorPaging(dict(limit=2))
+
+        result = setupDB.getRepo().searchThread(
+            None, paging=paging, sorter=sorter, projection=projection
+        )
+
+        assert result['nextCursor'] is not None
+        for thread in result['threads']:
+            assert set(thread._get_attrs().keys()) == { 'title', 'threadId', 'createdAt' }
+
     def test_searchThreadByPassingSorterShouldSortSearchResult(self, setupDB):
         threadIdsToSearch = [
             thread['threadId'] for thread in setupDB.getOriginalThreads()[1:3]
@@ -923,6 +1042,23 @@ class TestThreadCRUD:
         for thread in updatedThreads:
             assert thread['views'] == incrementCount
 
+    def test_incrementThreadViewsShouldAddCountsToEachThread(self, setupDB):
+        threadIds = [ thread['threadId'] for thread in setupDB.getOriginalThreads()[:3] ]
+        viewCounts = { threadId: idx + 1 for idx, threadId in enumerate(threadIds) }
+        viewCounts['nonexistant_id'] = 5
+
+        result = setupDB.getRepo().incrementThreadViews(viewCounts)
+
+        assert result == dict(matchedCount=len(threadIds), updatedCount=len(threadIds))
+        updatedThreads = setupDB.findThreads(createSearchFilter('threadId', 'eq', threadIds))
+        for thread in updatedThreads:
+            assert thread['views'] == viewCounts[thread['threadId']]
+
+    def test_incrementThreadViewsShouldDoNothingWhenNoCounts(self, setupDB):
+        result = setupDB.getRepo().incrementThreadViews({})
+
+        assert result['updatedCount'] == 0
+
     def test_updateThreadShouldReturnUpdateResult(self, setupDB):
         mock = setupDB.getMockPassword()
         mock.hashPassword.return_value = 'hashed'
@@ -1011,6 +1147,137 @@ class TestThreadCRUD:
         assert result['deleteCount'] == len(threadIdsToDelete)
 
 
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    'createDB', [Setup_MongoCrudManager, Setup_MongoFacetCrudManager], indirect=True
+)
+class TestThreadWithRelationsSearch:
+    def test_searchThreadWithRelationsShouldJoinOwnerAndLastPost(self, setupDB):
+        originalThreads = setupDB.getOriginalThreads()[:3]
+        searchFilter = createSearchFilter(
+            'threadId', 'eq', [ thread['threadId'] for thread in originalThreads ]
+        )
+
+        result = setupDB.getRepo().searchThreadWithRelations(searchFilter)
+
+        assert result['returnCount'] == len(originalThreads)
+        assert result['matchedCount'] == len(originalThreads)
+        for thread in result['threads']:
+            assert isinstance(thread, Thread)
+            assert len(thread.owner) == 1
+            assert isinstance(thread.owner[0], User)
+            assert thread.owner[0].userId == thread.userId
+            assert len(thread.lastPost) == 1
+            assert isinstance(thread.lastPost[0], Post)
+            assert thread.lastPost[0].postId == thread.lastPostId
+            assert thread.lastPost[0].owner[0].userId == thread.lastPost[0].userId
+
+    def test_searchThreadWithRelationsShouldHydrateEntitiesWithoutValidation(self, setupDB, monkeypatch):
+        def failValidation(*args, **kwargs):
+            raise AssertionError('stored documents should not be validated')
+        for entityClass in [ User, Post, Thread ]:
+            monkeypatch.setattr(entityClass, '_sanitize_attributes', failValidation)
+
+        result = setupDB.getRepo().searchThreadWithRelations(None)
+
+        assert result['returnCount'] > 0
+        for thread in result['threads']:
+            assert isinstance(thread, Thread)
+            assert isinstance(thread.owner[0], User)
+
+    def test_searchThreadWithRelationsShouldApplyPagingAndSorter(self, setupDB):
+        paging = Paging(dict(offset=1, limit=2))
+        sorter = DescendingSorter('threadId')
+
+        result = setupDB.getRepo().searchThreadWithRelations(None, paging=paging, sorter=sorter)
+        expected = setupDB.getRepo().searchThread(None, paging=paging, sorter=sorter)
+
+        assert [ thread.threadId for thread in result['threads'] ] == [
+            thread.threadId for thread in expected['threads']
+        ]
+        assert result['matchedCount'] == DataCreator.THREAD_COUNT
+
+    def test_searchThreadWithRelationsShouldNotFetchHiddenFieldsOfJoinedUsers(self, setupDB):
+        result = setupDB.getRepo().searchThreadWithRelations(None)
+
+        for thread in result['threads']:
+            for user in thread.owner + thread.lastPost[0].owner:
+                assert not hasattr(user, 'password')
+                assert not hasattr(user, '_id')
+
+    def test_searchThreadWithRelationsShouldOnlyJoinRequestedRelations(self, setupDB):
+        projection = Projection(dict(fields='title,owner'))
+
+        result = setupDB.getRepo().searchThreadWithRelations(None, projection=projection)
+
+        for thread in result['threads']:
+            assert len(thread.owner) == 1
+            assert not hasattr(thread, 'lastPost')
+            assert not hasattr(thread, 'subject')
+
+    def test_searchThreadWithRelationsShouldLeaveRelationsEmptyWhenNotFound(self, setupDB):
+        repo = setupDB.getRepo()
+        createdId = repo.createThread(Thread(dict(
+            boardId='1', userId='does_not_exist', lastPostId=None,
+            title='orphan', subject='orphan', views=0, postCount=0,
+        )))['createdId']
+        searchFilter = createSearchFilter('threadId', 'eq', [ createdId ])
+
+        result = repo.searchThreadWithRelations(searchFilter)
+
+        assert result['threads'][0].owner == []
+        assert result['threads'][0].lastPost == []
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    'createDB', [Setup_FileUlidCrudManager, Setup_MongoSnowflakeCrudManager], indirect=True
+)
+class TestGeneratedIds:
+    def createNewThread(self):
+        return Thread(dict(
+            boardId='1', userId='1', lastPostId=None,
+            title='test_thread_title', subject='test_thread_subject', views=0, postCount=0,
+        ))
+
+    def test_createShouldNotUseCounters(self, setupDB):
+        mockuserauth = setupDB.getMockPassword()
+        mockuserauth.hashPassword.return_value = 'hashed'
+        counters = { field: setupDB.getCounter(field) for field in [ 'userId', 'threadId' ] }
+        repo = setupDB.getRepo()
+
+        createdUserId = repo.createUser(User(
+            userName='generated@example.com', displayName='generated', password='12345678'
+        ))['createdId']
+        createdThreadId = repo.createThread( self.createNewThread() )['createdId']
+
+        for field, value in counters.items():
+            assert setupDB.getCounter(field) == value
+        assert len( setupDB.findUsers(createSearchFilter('userId', 'eq', [ createdUserId ])) ) == 1
+        assert len(
+            setupDB.findThreads(createSearchFilter('threadId', 'eq', [ createdThreadId ]))
+        ) == 1
+
+    def test_generatedIdsShouldPageInOrderOfCreation(self, setupDB):
+        repo = setupDB.getRepo()
+        createdIds = [
+            repo.createThread( self.createNewThread() )['createdId']
+            for _ in range(5)
+        ]
+        searchFilter = createSearchFilter('threadId', 'eq', createdIds)
+
+        pageIds = []
+        paging = CursorPaging(dict(limit=2, after=''))
+        while True:
+            result = repo.searchThread(searchFilter, paging=paging)
+            pageIds += [ thread.threadId for thread in result['threads'] ]
+            if result['nextCursor'] is None:
+                break
+            paging = CursorPaging(dict(limit=2, after=result['nextCursor']))
+
+        assert pageIds == createdIds
+
+
 ### utility functions here
 
 def createNewProps(defaultProps, **kwargs):
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for file_table.py
+"""
+import os
+import threading
+
+import pytest
+
+import server.json_codec as json_codec
+from server.database.file_table import FileTable, LogFileTable, createFileTable
+from server.database.filter import PrimitiveFilter
+from server.database.aggregate_filter import AggregateFilter
+
+ROWS = [
+    dict(postId='0', userId='1', threadId='1', createdAt=10.0),
+    dict(postId='1', userId='2', threadId='1', createdAt=20.0),
+    dict(postId='2', userId='1', threadId='2', createdAt=30.0),
+    dict(postId='3', userId='3', threadId='2', createdAt=40.0),
+    dict(postId='4', userId='1', threadId='3', createdAt=50.0, tags=[ 'a' ]),
+    dict(postId='5', userId=[ '1' ], threadId='3', createdAt=45.0),
+    dict(postId='6', threadId='3'),
+]
+
+
+def createPrimitive(field, operator, values):
+    return PrimitiveFilter.createFilter(dict(field=field, operator=operator, value=values))
+
+
+def createAnd(filters):
+    return AggregateFilter.createFilter('and', filters)
+
+
+def writeRows(path, rows):
+    with path.open('wb') as f:
+        json_codec.dump(rows, f)
+
+
+def readRows(path):
+    with path.open('rb') as f:
+        return json_codec.load(f)
+
+
+@pytest.fixture(scope='function')
+def path(tmp_path):
+    path = tmp_path / 'posts.json'
+    writeRows(path, ROWS)
+    return path
+
+
+@pytest.fixture(scope='function')
+def table(path):
+    return FileTable(path, hashFields=[ 'postId', 'userId' ], sortedFields=[ 'createdAt' ])
+
+
+def selectPostIds(table, searchFilter):
+    return [ row['postId'] for row in table.select(searchFilter) ]
+
+
+class TestSelect:
+    @pytest.mark.parametrize('searchFilter', [
+        createPrimitive('userId', 'eq', [ '1' ]),
+        createPrimitive('userId', 'eq', [ '3', '2' ]),
+        createPrimitive('userId', 'eq', [ 'missing' ]),
+        createPrimitive('createdAt', 'gt', [ 20.0 ]),
+        createPrimitive('createdAt', 'gte', [ 20.0 ]),
+        createPrimitive('createdAt', 'lt', [ 40.0 ]),
+        createPrimitive('createdAt', 'lte', [ 40 ]),
+        createPrimitive('threadId', 'eq', [ '3' ]),
+        createAnd([
+            createPrimitive('userId', 'eq', [ '1' ]),
+            createPrimitive('createdAt', 'gte', [ 30.0 ]),
+        ]),
+        createAnd([
+            createPrimitive('threadId', 'eq', [ '2' ]),
+            createPrimitive('postId', 'eq', [ '3', '4' ]),
+        ]),
+        AggregateFilter.createFilter('or', [
+            createPrimitive('userId', 'eq', [ '2' ]),
+            createPrimitive('threadId', 'eq', [ '3' ]),
+        ]),
+    ])
+    def test_selectShouldFindRowsThatMatchFilterInFileOrder(self, table, searchFilter):
+        expected = [
+            row['postId'] for row in ROWS
+            if searchFilter.matches(row)
+        ]
+
+        assert selectPostIds(table, searchFilter) == expected
+
+    def test_selectShouldFindAllRowsWithoutFilter(self, table):
+        assert selectPostIds(table, None) == [ row['postId'] for row in ROWS ]
+
+    @pytest.mark.parametrize('searchFilter', [
+        createPrimitive('userId', 'eq', [ '1' ]),
+        createPrimitive('createdAt', 'lt', [ 25.0 ]),
+        createAnd([
+            createPrimitive('threadId', 'eq', [ '1' ]),
+            createPrimitive('postId', 'eq', [ '1' ]),
+        ]),
+    ])
+    def test_planShouldPickIndexThatServesFilter(self, table, searchFilter):
+        table.select(None)
+
+        candidates = table._plan( searchFilter.normalize() )
+
+        assert candidates is not None
+        assert len(candidates) < len(ROWS)
+
+    def test_planShouldPickIndexLeavingFewestRows(self, table):
+        searchFilter = createAnd([
+            createPrimitive('userId', 'eq', [ '1' ]),
+            createPrimitive('postId', 'eq', [ '2' ]),
+        ])
+        table.select(None)
+
+        assert len( table._plan( searchFilter.normalize() ) ) == 1
+
+    @pytest.mark.parametrize('searchFilter', [
+        createPrimitive('threadId', 'eq', [ '1' ]),
+        createPrimitive('postId', 'fuzzy', [ '1' ]),
+        createPrimitive('createdAt', 'gt', [ 'text' ]),
+        AggregateFilter.createFilter('or', [
+            createPrimitive('userId', 'eq', [ '2' ]),
+            createPrimitive('postId', 'eq', [ '3' ]),
+        ]),
+    ])
+    def test_planShouldScanWhenNoIndexServesFilter(self, table, searchFilter):
+        table.select(None)
+
+        assert table._plan( searchFilter.normalize() ) is None
+
+    def test_rangeSelectShouldSkipRowsWithoutNumber(self, path):
+        writeRows(path, ROWS + [ dict(postId='7', createdAt='not a number') ])
+        table = FileTable(path, sortedFields=[ 'createdAt' ])
+
+        assert selectPostIds(table, createPrimitive('createdAt', 'gt', [ 42.0 ])) == [ '4', '5' ]
+
+    def test_selectShouldReadFileAgainWhenChangedBySomeoneElse(self, table, path):
+        table.select( createPrimitive('userId', 'eq', [ '1' ]) )
+
+        writeRows(path, ROWS + [ dict(postId='7', userId='1', createdAt=60.0) ])
+
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '1' ])) == \
+            [ '0', '2', '4', '7' ]
+
+
+class TestWrite:
+    def test_insertShouldBeWrittenAndIndexed(self, table, path):
+        table.select( createPrimitive('postId', 'eq', [ '0' ]) )
+
+        table.insert( dict(postId='7', userId='4', createdAt=60.0) )
+
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '4' ])) == [ '7' ]
+        assert selectPostIds(table, createPrimitive('createdAt', 'gt', [ 55.0 ])) == [ '7' ]
+        assert readRows(path)[-1]['postId'] == '7'
+
+    def test_updateShouldReindexChangedFields(self, table, path):
+        table.select( createPrimitive('userId', 'eq', [ '1' ]) )
+
+        def changeOwner(row):
+            row['userId'] = '9'
+            row['createdAt'] = 5.0
+
+        updatedCount = table.update( createPrimitive('postId', 'eq', [ '2' ]), changeOwner )
+
+        assert updatedCount == 1
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '1' ])) == [ '0', '4' ]
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '9' ])) == [ '2' ]
+        assert selectPostIds(table, createPrimitive('createdAt', 'lt', [ 10.0 ])) == [ '2' ]
+        assert readRows(path)[2]['userId'] == '9'
+
+    def test_deleteShouldRemoveRowsFromIndexes(self, table, path):
+        table.select( createPrimitive('userId', 'eq', [ '1' ]) )
+
+        deleteCount = table.delete( createPrimitive('userId', 'eq', [ '1' ]) )
+
+        assert deleteCount == 3
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '1' ])) == []
+        assert selectPostIds(table, createPrimitive('createdAt', 'gte', [ 0 ])) == [ '1', '3', '5' ]
+        assert [ row['postId'] for row in readRows(path) ] == [ '1', '3', '5', '6' ]
+
+    def test_writeOfManyRowsShouldKeepSelectCorrect(self, path):
+        rows = [
+            dict(postId=str(idx), userId=str(idx % 2), createdAt=float(idx))
+            for idx in range(300)
+        ]
+        writeRows(path, rows)
+        table = FileTable(path, hashFields=[ 'userId' ], sortedFields=[ 'createdAt' ])
+        table.select( createPrimitive('userId', 'eq', [ '0' ]) )
+
+        def changeOwner(row):
+            row['userId'] = '2'
+
+        table.update( createPrimitive('userId', 'eq', [ '0' ]), changeOwner )
+        table.delete( createPrimitive('createdAt', 'lt', [ 100.0 ]) )
+
+        assert len( table.select( createPrimitive('userId', 'eq', [ '2' ]) ) ) == 100
+        assert len( table.select( createPrimitive('userId', 'eq', [ '1' ]) ) ) == 100
+
+    def test_failedUpdateShouldLeaveFileAndTableUnchanged(self, table, path):
+        def failPartway(row):
+            if row['postId'] == '2':
+                raise ValueError('failed to update')
+            row['userId'] = '9'
+
+        with pytest.raises(ValueError):
+            table.update( createPrimitive('userId', 'eq', [ '1' ]), failPartway )
+
+        assert readRows(path) == ROWS
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '9' ])) == []
+
+    def test_selectRightAfterWriteShouldKeepIndexes(self, table):
+        table.RACY_WINDOW_NS = 10 ** 12
+        table.select( createPrimitive('userId', 'eq', [ '1' ]) )
+        table.insert( dict(postId='7', userId='1', createdAt=60.0) )
+        index = table._indexes['userId']
+
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '1' ])) == \
+            [ '0', '2', '4', '7' ]
+        assert table._indexes['userId'] is index
+
+    def test_racyChangeBySomeoneElseShouldBeRead(self, table, path):
+        table.RACY_WINDOW_NS = 10 ** 12
+        table.insert( dict(postId='7', userId='1', createdAt=60.0) )
+        stat = os.stat(path)
+
+        # same size, modification time and inode as the file written by table
+        writeRows(path, ROWS + [ dict(postId='8', userId='1', createdAt=60.0) ])
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert selectPostIds(table, createPrimitive('userId', 'eq', [ '1' ]))[-1] == '8'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def createLogTable(path, **options):
+    return LogFileTable(path, hashFields=[ 'postId', 'userId' ], **options)
+
+
+def logPathOf(path):
+    return path.with_name(path.name + '.log')
+
+
+class TestLogFileTable:
+    def changeRows(self, table):
+        table.insert( dict(postId='7', userId='4') )
+
+        def changeOwner(row):
+            row['userId'] = '9'
+
+        table.update( createPrimitive('postId', 'eq', [ '2' ]), changeOwner )
+        table.delete( createPrimitive('userId', 'eq', [ '3' ]) )
+
+    def test_changesShouldBeAppendedToLogLeavingFileUnchanged(self, path):
+        table = createLogTable(path)
+
+        self.changeRows(table)
+
+        assert readRows(path) == ROWS
+        assert len( logPathOf(path).read_bytes().splitlines() ) == 4
+
+    def test_logShouldBeReplayedOnStartup(self, path):
+        table = createLogTable(path)
+        self.changeRows(table)
+        expected = table.select(None)
+
+        replayed = createLogTable(path)
+
+        assert replayed.select(None) == expected
+        assert selectPostIds(replayed, createPrimitive('userId', 'eq', [ '9' ])) == [ '2' ]
+
+    def test_changesShouldBeAppendedAfterReplayedChanges(self, path):
+        self.changeRows( createLogTable(path) )
+        table = createLogTable(path)
+
+        table.delete( createPrimitive('postId', 'eq', [ '7' ]) )
+
+        assert selectPostIds(createLogTable(path), None) == [ '0', '1', '2', '4', '5', '6' ]
+
+    def test_logShouldBeCompactedIntoFile(self, path):
+        table = createLogTable(path, compactEvery=3)
+
+        self.changeRows(table)
+
+        assert readRows(path) == table.select(None)
+        assert len( logPathOf(path).read_bytes().splitlines() ) == 1
+        assert createLogTable(path).select(None) == table.select(None)
+
+    def test_partiallyWrittenChangeShouldBeIgnored(self, path):
+        self.changeRows( createLogTable(path) )
+        with logPathOf(path).open('ab') as f:
+            f.write(b'{"op":"insert","row":{"postId"')
+
+        table = createLogTable(path)
+        table.insert( dict(postId='8') )
+
+        assert selectPostIds(createLogTable(path), None) == \
+            [ '0', '1', '2', '4', '5', '6', '7', '8' ]
+
+    def test_logShouldBeIgnoredOnceFileIsReplaced(self, path):
+        self.changeRows( createLogTable(path) )
+
+        writeRows(path, ROWS[:2])
+
+        assert selectPostIds(createLogTable(path), None) == [ '0', '1' ]
+
+    def test_logShouldBeSyncedInBatches(self, path, monkeypatch):
+        clock = FakeClock()
+        table = createLogTable(path, fsyncEvery=3, fsyncInterval=10.0, clock=clock)
+        table.insert( dict(postId='7') )
+        synced = []
+        monkeypatch.setattr('server.database.file_table.os.fsync', synced.append)
+
+        table.insert( dict(postId='8') )
+        assert len(synced) == 0
+        table.insert( dict(postId='9') )
+        assert len(synced) == 1
+        clock.now = 20.0
+        table.insert( dict(postId='10') )
+        assert len(synced) == 2
+
+    def test_lastChangesOfBurstShouldBeSyncedOnceIntervalElapsed(self, path, monkeypatch):
+        table = createLogTable(path, fsyncEvery=100, fsyncInterval=0.05)
+        table.insert( dict(postId='7') )
+        synced = threading.Event()
+        monkeypatch.setattr('server.database.file_table.os.fsync', lambda fd: synced.set())
+
+        table.insert( dict(postId='8') )
+
+        assert synced.wait(5.0)
+        assert table._unsyncedCount == 0
+
+    def test_flushShouldSyncUnsyncedChanges(self, path, monkeypatch):
+        table = createLogTable(path, fsyncEvery=100, fsyncInterval=10.0)
+        table.insert( dict(postId='7') )
+        synced = []
+        monkeypatch.setattr('server.database.file_table.os.fsync', synced.append)
+
+        table.flush()
+
+        assert len(synced) == 1
+        assert table._unsyncedCount == 0
+
+
+def test_createFileTableShouldRejectUnknownStorage(path):
+    with pytest.raises(ValueError):
+        createFileTable('unknown', path)
@@ -13,6 +13,7 @@ from server.database.filter import GTEFilter
 from server.database.filter import LTFilter
 from server.database.filter import LTEFilter
 from server.database.filter import NullFilter
+from server.database.filter import RegexFilter
 from server.exceptions import FilterParseError, InvalidFilterOperatorError
 
 
@@ -332,3 +333,166 @@ class TestFilterComparison:
 
         assert null != eqfilter
         assert null != fuzzyfilter
+
+
+class TestFilterNormalization:
+    def createFilter(self, op, *values, field='default_field'):
+        return PrimitiveFilter.createFilter(dict(operator=op, field=field, value=list(values)))
+
+    @pytest.mark.parametrize('op', [ 'eq', 'fuzzy' ])
+    def test_normalizeShouldDedupeAndOrderValues(self, op):
+        normalized = self.createFilter(op, 'b', 'a', 'b').normalize()
+
+        assert normalized == self.createFilter(op, 'a', 'b')
+
+    @pytest.mark.parametrize('op', [ 'gt', 'gte', 'lt', 'lte' ])
+    def test_normalizeShouldLeaveOnlyFirstValueOfRangeFilters(self, op):
+        normalized = self.createFilter(op, 3, 1, 2).normalize()
+
+        assert normalized == self.createFilter(op, 3)
+
+    def test_normalizeShouldNotChangeFilter(self):
+        f = self.createFilter('eq', 'b', 'a')
+
+        f.normalize()
+
+        assert f.getValues() == [ 'b', 'a' ]
+
+    def test_normalizeShouldOrderValuesOfMixedTypes(self):
+        normalized1 = self.createFilter('eq', 'a', 1, None, 2.5).normalize()
+        normalized2 = self.createFilter('eq', 2.5, None, 1, 'a').normalize()
+
+        assert normalized1 == normalized2
+
+    def test_normalizeShouldDedupeUnhashableValues(self):
+        normalized = self.createFilter('eq', [ 'a' ], { 'b': 1 }, [ 'a' ]).normalize()
+
+        assert normalized.getValues() == [ { 'b': 1 }, [ 'a' ] ]
+
+    def test_normalizeShouldNotMergeEqualValuesOfOtherTypes(self):
+        normalized = self.createFilter('eq', 1, True, 1).normalize()
+
+        assert [ type(value) for value in normalized.getValues() ] == [ bool, int ]
+
+    def test_filtersDifferingInOrderOfValuesShouldHaveSameKeyAndHash(self):
+        f1 = self.createFilter('eq', '1', '2')
+        f2 = self.createFilter('eq', '2', '1', '1')
+
+        assert f1.getCacheKey() == f2.getCacheKey()
+        assert hash(f1) == hash(f2)
+
+    def test_filtersShouldBeUsableAsDictKeys(self):
+        cached = {
+            self.createFilter('eq', '1'): 'eq',
+            self.createFilter('fuzzy', '1'): 'fuzzy',
+            PrimitiveFilter.createNullFilter(): 'null',
+        }
+
+        assert cached[ self.createFilter('eq', '1') ] == 'eq'
+        assert cached[ self.createFilter('fuzzy', '1') ] == 'fuzzy'
+        assert cached[ NullFilter() ] == 'null'
+
+    def test_nullFilterShouldNormalizeToItself(self):
+        null = PrimitiveFilter.createNullFilter()
+
+        assert null.normalize() == null
+
+
+class TestFilterCompilation:
+    ENTITIES = [
+        dict(field='hello world', number=1),
+        dict(field='goodbye', number=5),
+        dict(field='', number=10),
+        dict(field=None, number=None),
+        dict(number=3),
+        dict(),
+    ]
+
+    @pytest.mark.parametrize('op, values', [
+        ( 'eq', [ 'hello world' ] ),
+        ( 'eq', [ 'hello world', 'goodbye', 'other' ] ),
+        ( 'eq', [ None ] ),
+        ( 'eq', [] ),
+        ( 'eq', [ [ 'unhashable' ], 'goodbye' ] ),
+        ( 'fuzzy', [ 'world' ] ),
+        ( 'fuzzy', [ 'o w', 'bye' ] ),
+        ( 'fuzzy', [ '.*', '(' ] ),
+        ( 'fuzzy', [] ),
+    ])
+    def test_compiledFilterShouldMatchSameEntitiesAsFilter(self, op, values):
+        f = PrimitiveFilter.createFilter(dict(operator=op, field='field', value=values))
+        entities = [ entity for entity in self.ENTITIES if isinstance(entity.get('field', ''), str) ]
+
+        predicate = f.compile()
+
+        assert [ predicate(entity) for entity in entities ] == \
+            [ f.matches(entity) for entity in entities ]
+
+    @pytest.mark.parametrize('op', [ 'gt', 'gte', 'lt', 'lte' ])
+    @pytest.mark.parametrize('value', [ 1, 5, 10 ])
+    def test_compiledRangeFilterShouldMatchSameEntitiesAsFilter(self, op, value):
+        f = PrimitiveFilter.createFilter(dict(operator=op, field='number', value=[ value, 100 ]))
+        entities = [ entity for entity in self.ENTITIES if entity.get('number', 0) is not None ]
+
+        predicate = f.compile()
+
+        assert [ predicate(entity) for entity in entities ] == \
+            [ f.matches(entity) for entity in entities ]
+
+    def test_compiledNullFilterShouldMatchEverything(self):
+        predicate = PrimitiveFilter.createNullFilter().compile()
+
+        assert all( predicate(entity) for entity in self.ENTITIES )
+
+    def test_compiledEQFilterShouldMatchUnhashableFieldValue(self):
+        f = PrimitiveFilter.createFilter(dict(operator='eq', field='field', value=[ [ 1 ], 2 ]))
+
+        predicate = f.compile()
+
+        assert predicate( dict(field=[ 1 ]) ) is True
+        assert predicate( dict(field=[ 2 ]) ) is False
+
+
+class TestRegexFilter:
+    def createFilter(self, values):
+        return PrimitiveFilter.createFilter(dict(operator='regex', field='field', value=values))
+
+    def test_createRegex(self):
+        f = self.createFilter([ '^he' ])
+
+        assert isinstance(f, RegexFilter)
+        assert f.getOpString() == 'regex'
+
+    def test_regexShouldMatchAnyPatternAnywhereInField(self):
+        f = self.createFilter([ '^he', 'by+e$' ])
+
+        assert f.matches(dict(field='hello')) is True
+        assert f.matches(dict(field='goodbyye')) is True
+        assert f.matches(dict(field='the')) is False
+        assert f.matches(dict(field=123)) is False
+        assert f.matches(dict()) is False
+        assert self.createFilter([]).matches(dict(field='hello')) is False
+
+    @pytest.mark.parametrize('values', [
+        [ '(' ],
+        [ 'a' * (RegexFilter.MAX_PATTERN_LENGTH + 1) ],
+        [ 'a' ] * (RegexFilter.MAX_PATTERNS + 1),
+        [ 1 ],
+    ])
+    def test_invalidPatternsShouldRaise(self, values):
+        with pytest.raises(FilterParseError):
+            self.createFilter(values)
+
+    def test_mongoFilterShouldGroupEachPattern(self):
+        f = self.createFilter([ 'a|b', 'c' ])
+
+        assert f.getMongoFilter() == { 'field': { '$regex': '(?:a|b)|(?:c)' } }
+
+
+class TestFuzzyStringMongoFilter:
+    def test_valuesShouldBeEscaped(self):
+        f = PrimitiveFilter.createFilter(dict(operator='fuzzy', field='field', value=[ '(a+)+$', 'b.c' ]))
+
+        assert f.getMongoFilter() == {
+            'field': { '$regex': r'\(a\+\)\+\$|b\.c', '$options': 'i' }
+        }
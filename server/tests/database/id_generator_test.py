@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for id_generator.py
+"""
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from server.database.id_generator import (
+    UlidGenerator, SnowflakeGenerator, createIdGenerator
+)
+from server.services.session import SessionService
+
+GENERATORS = [ UlidGenerator, SnowflakeGenerator ]
+
+
+@pytest.mark.parametrize('generatorClass', GENERATORS)
+class TestIdGenerator:
+    def test_generateIdShouldReturnFixedLengthString(self, generatorClass):
+        generator = generatorClass()
+
+        generatedId = generator.generateId('userId')
+
+        assert isinstance(generatedId, str)
+        assert len(generatedId) == generatorClass.ID_LENGTH
+
+    def test_generatedIdsShouldBeStrictlyIncreasing(self, generatorClass):
+        generator = generatorClass()
+
+        ids = [ generator.generateId('postId') for _ in range(10000) ]
+
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    def test_generatedIdsShouldBeOrderedByTime(self, generatorClass):
+        generator = generatorClass()
+        with patch('server.database.id_generator.time.time', return_value=1700000000.0):
+            earlier = generator.generateId('threadId')
+        later = generatorClass().generateId('threadId')
+
+        assert earlier < later
+
+    def test_generateIdShouldStayIncreasingWhenClockGoesBack(self, generatorClass):
+        generator = generatorClass()
+        first = generator.generateId('threadId')
+        with patch('server.database.id_generator.time.time', return_value=1700000000.0):
+            second = generator.generateId('threadId')
+
+        assert first < second
+
+    def test_generateIdShouldBeUniqueAcrossThreads(self, generatorClass):
+        generator = generatorClass()
+        ids = []
+
+        def generate():
+            generated = [ generator.generateId('userId') for _ in range(2000) ]
+            ids.extend(generated)
+
+        threads = [ threading.Thread(target=generate) for _ in range(4) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(ids)) == 8000
+
+    def test_convertLegacyIdShouldKeepOrderAndSortBeforeGeneratedIds(self, generatorClass):
+        generator = generatorClass()
+        legacyIds = [ '1', '2', '9', '10', '100', '12345' ]
+
+        converted = [ generator.convertLegacyId(legacyId) for legacyId in legacyIds ]
+
+        assert converted == sorted(converted)
+        assert max(converted) < generator.generateId('userId')
+
+    def test_convertLegacyIdShouldKeepAnonymousUserId(self, generatorClass):
+        generator = generatorClass()
+
+        converted = generator.convertLegacyId(SessionService.ANONYMOUS_USERID)
+
+        assert converted == SessionService.ANONYMOUS_USERID
+        assert converted < generator.convertLegacyId('1')
+
+
+class TestSnowflakeGenerator:
+    def test_generatedIdShouldContainWorkerId(self):
+        generatedId = SnowflakeGenerator(workerId=5).generateId('userId')
+
+        workerId = (int(generatedId) >> SnowflakeGenerator.SEQUENCE_BITS) & 0x3ff
+        assert workerId == 5
+
+    def test_constructionShouldRejectOutOfRangeWorkerId(self):
+        with pytest.raises(ValueError):
+            SnowflakeGenerator(workerId=1024)
+
+
+class TestCreateIdGenerator:
+    def test_createIdGeneratorShouldReturnNoneForCounter(self):
+        assert createIdGenerator('counter') is None
+        assert createIdGenerator(None) is None
+
+    def test_createIdGeneratorShouldCreateGeneratorByName(self):
+        assert isinstance(createIdGenerator('ulid'), UlidGenerator)
+        assert isinstance(createIdGenerator('snowflake', workerId=3), SnowflakeGenerator)
+
+    def test_createIdGeneratorShouldRaiseOnUnknownName(self):
+        with pytest.raises(ValueError):
+            createIdGenerator('uuid')
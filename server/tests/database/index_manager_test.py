@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for index_manager.py
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from server.database.index_manager import (
+    MongoIndexManager, TEXT_SEARCH_FIELDS, createTextIndex, createDeclarations,
+)
+from server.entity import User, Post, Thread
+
+DECLARATIONS = {
+    'users': [
+        dict(keys=[ ('userId', 1) ], unique=True),
+        dict(keys=[ ('userName', 1) ], unique=True),
+    ],
+    'posts': [
+        dict(keys=[ ('threadId', 1), ('createdAt', 1) ]),
+    ],
+}
+
+
+def create_index_information(*indexes):
+    information = {
+        '_id_': dict(key=[ ('_id', 1) ], v=2),
+    }
+    for index in indexes:
+        name = '_'.join(f'{field}_{order}' for field, order in index['keys'])
+        info = dict(key=index['keys'], v=2)
+        if index.get('unique', False):
+            info['unique'] = True
+        information[name] = info
+
+    return information
+
+
+@pytest.fixture(scope='function')
+def mockDB():
+    collections = { name: MagicMock() for name in DECLARATIONS.keys() }
+    for collection in collections.values():
+        collection.index_information.return_value = create_index_information()
+        collection.create_indexes.side_effect = lambda models: [
+            model.document['name'] for model in models
+        ]
+
+    db = MagicMock()
+    db.__getitem__.side_effect = lambda name: collections[name]
+    return db
+
+
+class TestMongoIndexManager:
+    def test_diffIndexesShouldReportAllDeclaredIndexesMissingOnEmptyCollection(self, mockDB):
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        diff = manager.diffIndexes()
+
+        for collectionName, declared in DECLARATIONS.items():
+            assert diff[collectionName]['missing'] == declared
+            assert diff[collectionName]['mismatched'] == []
+            assert diff[collectionName]['unexpected'] == []
+
+    def test_diffIndexesShouldReportMismatchedAndUnexpectedIndexes(self, mockDB):
+        mockDB['users'].index_information.return_value = create_index_information(
+            dict(keys=[ ('userId', 1) ], unique=True),
+            dict(keys=[ ('userName', 1) ]),
+            dict(keys=[ ('displayName', 1) ]),
+        )
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        diff = manager.diffIndexes()['users']
+
+        assert diff['missing'] == []
+        assert diff['mismatched'] == [ DECLARATIONS['users'][1] ]
+        assert len(diff['unexpected']) == 1
+        assert diff['unexpected'][0]['keys'] == [ ('displayName', 1) ]
+
+    def test_ensureIndexesShouldOnlyCreateMissingIndexes(self, mockDB):
+        mockDB['users'].index_information.return_value = create_index_information(
+            DECLARATIONS['users'][0],
+        )
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        created = manager.ensureIndexes()
+
+        assert created['users'] == [ 'userName_1' ]
+        assert created['posts'] == [ 'threadId_1_createdAt_1' ]
+        models = mockDB['users'].create_indexes.call_args[0][0]
+        assert models[0].document['unique'] is True
+
+    def test_ensureIndexesShouldNotCallDBWhenAllIndexesExist(self, mockDB):
+        for collectionName, declared in DECLARATIONS.items():
+            mockDB[collectionName].index_information.return_value = create_index_information(
+                *declared
+            )
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        created = manager.ensureIndexes()
+
+        assert all( len(names) == 0 for names in created.values() )
+        for collectionName in DECLARATIONS.keys():
+            assert mockDB[collectionName].create_indexes.call_count == 0
+
+    def test_existingTextIndexShouldBeReadFromItsWeights(self, mockDB):
+        declarations = { 'users': [ createTextIndex([ 'userName', 'displayName' ]) ] }
+        information = create_index_information()
+        information['userName_text_displayName_text'] = dict(
+            key=[ ('_fts', 'text'), ('_ftsx', 1) ], weights=dict(displayName=1, userName=1), v=2,
+        )
+        mockDB['users'].index_information.return_value = information
+        manager = MongoIndexManager(mockDB, declarations)
+
+        diff = manager.diffIndexes()['users']
+
+        assert diff == dict(missing=[], mismatched=[], unexpected=[])
+
+    def test_warnMissingIndexesShouldReturnFalseWhenIndexIsMissing(self, mockDB):
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        assert manager.warnMissingIndexes() is False
+
+    def test_warnMissingIndexesShouldReturnFalseWhenDBFails(self, mockDB):
+        mockDB['users'].index_information.side_effect = Exception('connection refused')
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        assert manager.warnMissingIndexes() is False
+
+    def test_reportShouldListEachMissingIndex(self, mockDB):
+        manager = MongoIndexManager(mockDB, DECLARATIONS)
+
+        report = manager.report()
+
+        assert '(userName:1) unique' in report
+        assert '(threadId:1, createdAt:1)' in report
+
+
+class TestEntityIndexDeclarations:
+    def getTextIndexes(self, indexes):
+        return [
+            index for index in indexes
+            if any( order == 'text' for _, order in index['keys'] )
+        ]
+
+    @pytest.mark.parametrize('entity', [ User, Post, Thread ])
+    def test_declaredIndexesShouldOnlyReferenceDescribedAttributes(self, entity):
+        for index in entity._indexes:
+            for field, _ in index['keys']:
+                assert field in entity._attribute_description
+
+    @pytest.mark.parametrize('collectionName', [ 'users', 'posts', 'threads' ])
+    def test_textIndexShouldCoverFuzzySearchableFields(self, collectionName):
+        textIndexes = self.getTextIndexes(
+            createDeclarations(useTextSearch=True)[collectionName]
+        )
+
+        assert len(textIndexes) == 1
+        assert sorted( field for field, _ in textIndexes[0]['keys'] ) == sorted(
+            TEXT_SEARCH_FIELDS[collectionName]
+        )
+
+    def test_textIndexesShouldNotBeDeclaredWithoutTextSearch(self):
+        for indexes in createDeclarations(useTextSearch=False).values():
+            assert self.getTextIndexes(indexes) == []
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for aggregation pipelines built by mongo_crudmanager.py
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from server.database.mongo_crudmanager import MongoCrudManager
+from server.database.paging import Paging, CursorPaging
+from server.database.sorter import DescendingSorter
+
+
+def getStageNames(pipeline):
+    return [ next(iter(stage)) for stage in pipeline ]
+
+
+@pytest.fixture(scope='function')
+def repo():
+    repo = MongoCrudManager('test_pipeline', MagicMock(), useFacetSearch=True)
+    repo._db = MagicMock()
+    collection = repo._db.__getitem__.return_value
+    collection.aggregate.return_value = iter([ dict(data=[], total=[]) ])
+    collection.count_documents.return_value = 0
+    return repo
+
+
+def searchPostByKeyset(repo, sorter):
+    repo._db.__getitem__.return_value.aggregate.return_value = iter([])
+    cursor = CursorPaging.encodeCursor([ 100, '5' ])
+    repo.searchPost(None, paging=CursorPaging(dict(after=cursor, limit=5)), sorter=sorter)
+
+
+def getAggregatedPipeline(repo):
+    return repo._db.__getitem__.return_value.aggregate.call_args[0][0]
+
+
+class TestSearchPipeline:
+    def test_facetSearchShouldMatchAndSortBeforeFacet(self, repo):
+        repo.searchPost(
+            None, paging=Paging(dict(offset=10, limit=5)), sorter=DescendingSorter('createdAt')
+        )
+
+        pipeline = getAggregatedPipeline(repo)
+        assert getStageNames(pipeline) == [ '$match', '$sort', '$facet' ]
+        assert pipeline[1] == { '$sort': { 'createdAt': -1 } }
+        facet = pipeline[2]['$facet']
+        assert getStageNames(facet['data']) == [ '$skip', '$limit', '$project' ]
+        assert facet['total'] == [ { '$count': 'count' } ]
+
+    def test_facetSearchShouldJoinOnlyInsideData(self, repo):
+        repo.searchThreadWithRelations(None, paging=Paging(dict(offset=0, limit=5)))
+
+        pipeline = getAggregatedPipeline(repo)
+        assert getStageNames(pipeline) == [ '$match', '$facet' ]
+        assert '$lookup' in getStageNames(pipeline[1]['$facet']['data'])
+
+    def test_keysetSearchShouldSeekPageBeforeSortingAndLimiting(self, repo):
+        sorter = DescendingSorter('createdAt')
+
+        searchPostByKeyset(repo, sorter)
+
+        pipeline = getAggregatedPipeline(repo)
+        assert getStageNames(pipeline) == [ '$match', '$sort', '$skip', '$limit', '$project' ]
+        assert pipeline[0] == { '$match': sorter.createKeysetMongoFilter([ 100, '5' ], 'postId') }
+        assert pipeline[1] == { '$sort': { 'createdAt': -1, 'postId': -1 } }
+        assert pipeline[3] == { '$limit': 5 }
+
+    def test_keysetSearchShouldCountWithoutKeyset(self, repo):
+        searchPostByKeyset(repo, DescendingSorter('createdAt'))
+
+        collection = repo._db.__getitem__.return_value
+        collection.count_documents.assert_called_once_with({})
@@ -5,7 +5,9 @@ This file houses tests for paging.py
 
 import pytest
 
-from server.database.paging import Paging, PagingNoLimit
+from server.database.paging import Paging, PagingNoLimit, CursorPaging
+from server.database.sorter import DescendingSorter
+from server.exceptions import InvalidPagingCursorError
 
 TEST_OFFSET_VALUE = 118
 TEST_LIMIT_VALUE = 32
@@ -185,3 +187,107 @@ class TestPagingMethods:
             paging = PagingNoLimit(param)
 
             assert expected == paging.slice(somelist)
+
+    def test_pagingGetMongoPipelineShouldSkipOffsetAndLimit(self, paging):
+        stages = paging.getMongoPipeline()
+
+        assert stages == [
+            { '$skip': self.DEFAULT_OFFSET },
+            { '$limit': self.DEFAULT_LIMIT },
+        ]
+
+    def test_pagingGetMongoPipelineShouldMatchNothingWhen0Limit(self):
+        paging = Paging(dict(offset=0, limit=0))
+
+        stages = paging.getMongoPipeline()
+
+        assert stages == [
+            { '$skip': 0 },
+            { '$match': { '$expr': False } },
+        ]
+
+    def test_pagingNoLimitGetMongoPipelineShouldOnlySkipOffset(self, nolimit):
+        stages = nolimit.getMongoPipeline()
+
+        assert stages == [ { '$skip': self.DEFAULT_OFFSET } ]
+
+    def test_getEndShouldReturnNumberOfRecordsUpToEndOfPage(self, paging, nolimit):
+        assert paging.getEnd() == self.DEFAULT_OFFSET + self.DEFAULT_LIMIT
+        assert nolimit.getEnd() is None
+        assert CursorPaging(dict(offset=10, limit=5)).getEnd() == 5
+
+
+class TestCursorPaging:
+    def test_constructCursorPagingWithoutAfterShouldHaveNoKeyset(self):
+        p = CursorPaging(dict(limit=TEST_LIMIT_VALUE))
+
+        assert p.usesKeyset()
+        assert p.getKeyset() is None
+        assert p._limit == TEST_LIMIT_VALUE
+
+    def test_constructCursorPagingShouldIgnoreOffset(self):
+        p = CursorPaging(dict(offset=TEST_OFFSET_VALUE, after=''))
+
+        assert p._offset == 0
+
+    def test_constructCursorPagingShouldDecodeAfterIntoKeyset(self):
+        keysets = [
+            [ 1602907037.2172842, '272' ],
+            [ 'some_name', '1' ],
+            [ None, '0' ],
+        ]
+
+        for keyset in keysets:
+            p = CursorPaging(dict(after=CursorPaging.encodeCursor(keyset)))
+
+            assert p.getKeyset() == keyset
+
+    def test_constructCursorPagingShouldRaiseExceptionWhenAfterIsMalformed(self):
+        malformed_tokens = [
+            'not_base64!!',
+            CursorPaging.encodeCursor({ 'not': 'a list' }),
+            CursorPaging.encodeCursor([ 1, 2, 3 ]),
+            'ユーザ',
+        ]
+
+        for token in malformed_tokens:
+            with pytest.raises(InvalidPagingCursorError):
+                CursorPaging(dict(after=token))
+
+    @pytest.mark.parametrize('keyset', [
+        [ { '$where': 'sleep(1000)' }, '1' ],
+        [ 10.0, { '$regex': '.*' } ],
+        [ [ 1 ], '1' ],
+        [ True, '1' ],
+    ])
+    def test_constructCursorPagingShouldRaiseExceptionWhenKeysetIsNotScalar(self, keyset):
+        with pytest.raises(InvalidPagingCursorError):
+            CursorPaging(dict(after=CursorPaging.encodeCursor(keyset)))
+
+    def test_createNextCursorShouldEncodeKeysetOfLastDocumentWhenPageIsFull(self):
+        p = CursorPaging(dict(limit=2))
+        documents = [
+            dict(postId='1', createdAt=20.0),
+            dict(postId='2', createdAt=10.0),
+        ]
+
+        token = p.createNextCursor(documents, DescendingSorter('createdAt'), 'postId')
+
+        assert CursorPaging.decodeCursor(token) == [ 10.0, '2' ]
+
+    def test_createNextCursorShouldReturnNoneWhenPageIsNotFull(self):
+        p = CursorPaging(dict(limit=3))
+        documents = [
+            dict(postId='1', createdAt=20.0),
+            dict(postId='2', createdAt=10.0),
+        ]
+
+        assert p.createNextCursor(documents, DescendingSorter('createdAt'), 'postId') is None
+
+    def test_offsetPagingShouldNotCreateNextCursor(self):
+        p = Paging(dict(limit=1))
+        documents = [ dict(postId='1', createdAt=20.0) ]
+
+        assert not p.usesKeyset()
+        assert p.getKeyset() is None
+        assert p.createNextCursor(documents, DescendingSorter('createdAt'), 'postId') is None
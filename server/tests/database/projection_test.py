@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for projection.py
+"""
+
+import pytest
+
+from server.database.projection import Projection
+from server.entity import User, Post, Thread
+
+
+class TestProjectionConstruction:
+    @pytest.mark.parametrize('value, expected', [
+        (None, None),
+        ('', None),
+        (' , ', None),
+        ('title', [ 'title' ]),
+        ('title, subject,,views', [ 'title', 'subject', 'views' ]),
+        ([ 'title', ' subject ' ], [ 'title', 'subject' ]),
+    ])
+    def test_parseFields(self, value, expected):
+        assert Projection.parseFields(value) == expected
+
+    def test_constructProjectionFromKeyValues(self):
+        projection = Projection(dict(fields='userId,displayName', limit=5))
+
+        assert projection.isSparse()
+        assert projection.getRequestedFields() == [ 'userId', 'displayName' ]
+        assert projection.includes('userId')
+        assert not projection.includes('userName')
+
+    def test_constructProjectionWithoutFieldsIncludesEverything(self):
+        projection = Projection()
+
+        assert not projection.isSparse()
+        assert projection.getRequestedFields() is None
+        assert projection.includes('anything')
+
+
+class TestProjectionFields:
+    def test_getFieldsShouldNotIncludeHiddenFieldsByDefault(self):
+        fields = Projection().getFields(User)
+
+        assert 'password' not in fields
+        assert '_id' not in fields
+        assert 'userName' in fields
+        assert 'displayName' in fields
+
+    def test_getFieldsShouldIncludeHiddenFieldsWhenAskedFor(self):
+        fields = Projection(includeHidden=[ 'password' ]).getFields(User)
+
+        assert 'password' in fields
+        assert '_id' not in fields
+
+    def test_getFieldsShouldNotIncludeHiddenFieldsEvenWhenRequested(self):
+        fields = Projection(dict(fields='userId,password')).getFields(User)
+
+        assert fields == [ 'userId' ]
+
+    def test_getFieldsShouldIgnoreUnknownFields(self):
+        fields = Projection(dict(fields='title,unknown')).getFields(Thread)
+
+        assert fields == [ 'title' ]
+
+    def test_getFieldsShouldIncludeRequiredFields(self):
+        projection = Projection(dict(fields='content')).withRequiredFields('userId')
+
+        assert projection.getFields(Post, [ 'postId' ]) == [ 'content', 'userId', 'postId' ]
+
+    def test_withRequiredFieldsShouldNotChangeRequestedFields(self):
+        projection = Projection(dict(fields='content'))
+
+        required = projection.withRequiredFields('userId')
+
+        assert required.getRequestedFields() == [ 'content' ]
+        assert not required.includes('userId')
+        assert projection.getFields(Post) == [ 'content' ]
+
+    def test_getMongoProjectionShouldExcludeIdUnlessAskedFor(self):
+        assert Projection(dict(fields='title')).getMongoProjection(Thread) == dict(
+            title=1, _id=0
+        )
+        assert Projection(dict(fields='title'), includeHidden=[ '_id' ]).getMongoProjection(
+            Thread
+        ) == dict(title=1, _id=1)
+
+    def test_projectShouldOnlyKeepProjectedFields(self):
+        user = dict(_id='abc', userId='1', userName='name', password='hash', displayName='d')
+
+        projected = Projection(dict(fields='displayName')).project(user, User, [ 'userId' ])
+
+        assert projected == dict(displayName='d', userId='1')
+
+    def test_projectionsShouldBeComparable(self):
+        assert Projection(dict(fields='title')) == Projection(dict(fields='title'))
+        assert Projection(dict(fields='title')) != Projection()
+        assert Projection(includeHidden=[ 'password' ]) != Projection()
@@ -7,12 +7,19 @@ testing database CRUD management classes
 import os
 import json
 import shutil
+import sqlite3
+import tempfile
 from pathlib import Path
 
 from pymongo import MongoClient
 
 from server.database.file_crudmanager import FileCrudManager
+from server.database.file_table import LogFileTable
 from server.database.mongo_crudmanager import MongoCrudManager
+from server.database.caching_crudmanager import CachingCrudManager
+from server.database.sqlite_crudmanager import SqliteCrudManager
+from server.database.id_generator import createIdGenerator
+from server.services.task_executor import TaskExecutor
 import tests.mocks as mocks
 
 PROJECT_DIR = Path(__file__).resolve().parents[3]
@@ -20,6 +27,12 @@ TESTDATA = PROJECT_DIR / 'server' / 'tests' / 'database' / 'testdata.json'
 
 
 class SetupCrudManager:
+    # name of id generator to pass to repository, None to use counters
+    ID_GENERATOR = None
+
+    def createIdGenerator(self):
+        return createIdGenerator(self.ID_GENERATOR)
+
     def setup(self):
         """
         Method to setup database management class
@@ -161,6 +174,9 @@ class SetupCrudManager:
 
 
 class Setup_FileCrudManager(SetupCrudManager):
+    # how repository stores changes to files
+    STORAGE = 'file'
+
     def __init__(self):
         self._saveLocation = Path(__file__).resolve().parents[0] / 'temp'
         self._usersFile = self._saveLocation / FileCrudManager.USERS_FILENAME
@@ -169,7 +185,10 @@ class Setup_FileCrudManager(SetupCrudManager):
         self._countersFile = self._saveLocation / FileCrudManager.COUNTERS_FILENAME
         self._testdata = self._readTestData()
         self._password = mocks.createMockPassword()
-        self._repo = FileCrudManager(self._saveLocation, self._password)
+        self._repo = FileCrudManager(
+            self._saveLocation, self._password, idGenerator=self.createIdGenerator(),
+            storage=self.STORAGE,
+        )
 
     def setup(self):
         self._saveLocation.mkdir(exist_ok=True)
@@ -272,12 +291,21 @@ class Setup_FileCrudManager(SetupCrudManager):
 class Setup_MongoCrudManager(SetupCrudManager):
     TEST_DBNAME = 'test_mongo'
 
+    USE_FACET_SEARCH = False
+    # whether to run find() and count_documents() of searches concurrently
+    USE_EXECUTOR = False
+
     def __init__(self, dbname=None):
         if dbname is None:
             dbname = self.TEST_DBNAME
         self._dbname = dbname
         self._password = mocks.createMockPassword()
-        self._repo = MongoCrudManager(dbname, self._password)
+        self._executor = TaskExecutor(maxWorkers=2) if self.USE_EXECUTOR else None
+        self._repo = MongoCrudManager(
+            dbname, self._password,
+            useFacetSearch=self.USE_FACET_SEARCH, idGenerator=self.createIdGenerator(),
+            executor=self._executor,
+        )
 
         hostname = os.getenv('MONGO_HOSTNAME')
         port = int( os.getenv('MONGO_PORT') )
@@ -301,6 +329,8 @@ class Setup_MongoCrudManager(SetupCrudManager):
     def teardown(self):
         self._mongo.drop_database(self._dbname)
         self._mongo.close()
+        if self._executor is not None:
+            self._executor.shutdown()
 
     def validateCreatedUsers(self):
         assert len(self.getAllUsers()) == len(self.getOriginalUsers())
@@ -368,3 +398,159 @@ class Setup_MongoCrudManager(SetupCrudManager):
 
     def _getDB(self):
         return self._mongo[self._dbname]
+
+
+class Setup_MongoFacetCrudManager(Setup_MongoCrudManager):
+    """
+    Same as Setup_MongoCrudManager, but searches are made through $facet aggregation
+    """
+    TEST_DBNAME = 'test_mongo_facet'
+    USE_FACET_SEARCH = True
+
+
+class Setup_MongoConcurrentCrudManager(Setup_MongoCrudManager):
+    """
+    Same as Setup_MongoCrudManager, but documents and counts are searched concurrently
+    """
+    TEST_DBNAME = 'test_mongo_concurrent'
+    USE_EXECUTOR = True
+
+
+class Setup_SqliteCrudManager(SetupCrudManager):
+    DATABASE_FILENAME = 'test.sqlite3'
+
+    def __init__(self):
+        self._directory = Path( tempfile.mkdtemp() )
+        self._databasePath = self._directory / self.DATABASE_FILENAME
+        self._password = mocks.createMockPassword()
+        self._repo = SqliteCrudManager(
+            self._databasePath, self._password, idGenerator=self.createIdGenerator()
+        )
+        self._connection = sqlite3.connect(self._databasePath, isolation_level=None)
+        self._testdata = self._readJson(TESTDATA)
+
+    def setup(self):
+        with self._connection:
+            for tableName in [ 'users', 'posts', 'threads' ]:
+                self._connection.executemany(
+                    f'INSERT INTO {tableName} (doc) VALUES (?)',
+                    [ (json.dumps(document),) for document in self._testdata[tableName] ]
+                )
+            self._connection.executemany(
+                'INSERT INTO counters (fieldname, value) VALUES (?, ?)',
+                [ (counter['fieldname'], counter['value']) for counter in self._testdata['counters'] ]
+            )
+
+    def cleanup(self):
+        with self._connection:
+            for tableName in [ 'users', 'posts', 'threads', 'counters' ]:
+                self._connection.execute(f'DELETE FROM {tableName}')
+
+    def teardown(self):
+        self._connection.close()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def validateCreatedUsers(self):
+        assert len(self.getAllUsers()) == len(self.getOriginalUsers())
+
+    def validateCreatedPosts(self):
+        assert len(self.getAllPosts()) == len(self.getOriginalPosts())
+
+    def validateCreatedThreads(self):
+        assert len( self.getAllThreads() ) == len( self.getOriginalThreads() )
+
+    def getAllUsers(self):
+        return self._readTable('users')
+
+    def getUserCount(self):
+        return len( self.getAllUsers() )
+
+    def getOriginalUsers(self):
+        return self._testdata['users']
+
+    def findUsers(self, searchFilter):
+        return [ user for user in self.getAllUsers() if searchFilter.matches(user) ]
+
+    def getAllPosts(self):
+        return self._readTable('posts')
+
+    def getPostCount(self):
+        return len( self.getAllPosts() )
+
+    def findPosts(self, searchFilter):
+        return [ post for post in self.getAllPosts() if searchFilter.matches(post) ]
+
+    def getOriginalPosts(self):
+        return self._testdata['posts']
+
+    def getAllThreads(self):
+        return self._readTable('threads')
+
+    def getThreadCount(self):
+        return len( self.getAllThreads() )
+
+    def findThreads(self, searchFilter):
+        return [ thread for thread in self.getAllThreads() if searchFilter.matches(thread) ]
+
+    def getOriginalThreads(self):
+        return self._testdata['threads']
+
+    def getRepo(self):
+        return self._repo
+
+    def getCounter(self, fieldname):
+        row = self._connection.execute(
+            'SELECT value FROM counters WHERE fieldname = ?', [ fieldname ]
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def getMockPassword(self):
+        return self._password
+
+    def _readTable(self, tableName):
+        rows = self._connection.execute(f'SELECT doc FROM {tableName} ORDER BY rowid')
+        return [ json.loads(doc) for doc, in rows ]
+
+    def _readJson(self, filepath):
+        with filepath.open('r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+class Setup_CachingFileCrudManager(Setup_FileCrudManager):
+    """
+    Same as Setup_FileCrudManager, but searches are cached by CachingCrudManager
+    """
+    def __init__(self):
+        super().__init__()
+        self._repo = CachingCrudManager(self._repo)
+
+    def setup(self):
+        super().setup()
+        # test data is written to files directly, bypassing the cache
+        self._repo.clear()
+
+
+class Setup_LogFileCrudManager(Setup_FileCrudManager):
+    """
+    Same as Setup_FileCrudManager, but changes are appended to logs next to files
+    """
+    STORAGE = 'log'
+
+    def _readJson(self, filepath):
+        # changes in log are replayed on rows in file, as repository does on startup
+        return LogFileTable(filepath).select(None)
+
+
+class Setup_FileUlidCrudManager(Setup_FileCrudManager):
+    """
+    Same as Setup_FileCrudManager, but ids are generated as ULIDs
+    """
+    ID_GENERATOR = 'ulid'
+
+
+class Setup_MongoSnowflakeCrudManager(Setup_MongoCrudManager):
+    """
+    Same as Setup_MongoCrudManager, but ids are generated as Snowflake ids
+    """
+    TEST_DBNAME = 'test_mongo_snowflake'
+    ID_GENERATOR = 'snowflake'
@@ -6,8 +6,8 @@ from unittest.mock import MagicMock
 
 import pytest
 
-from server.exceptions import FieldNotFoundInEntityError
-from server.database.sorter import AscendingSorter, DescendingSorter, NullSorter
+from server.exceptions import FieldNotFoundInEntityError, InvalidPagingCursorError
+from server.database.sorter import AscendingSorter, DescendingSorter, NullSorter, RelevanceSorter
 
 
 def create_testdata():
@@ -78,6 +78,16 @@ class TestAscendingSorter:
             assert cursor == mockCursor
             mockCursor.sort.assert_called_with([ (fieldname, 1) ])
 
+    def test_getMongoPipelineShouldReturnSortStageWith1(self):
+        sorter = AscendingSorter('username')
+
+        assert sorter.getMongoPipeline() == [ { '$sort': { 'username': 1 } } ]
+
+    def test_getSortFieldsShouldReturnSortField(self):
+        sorter = AscendingSorter('username')
+
+        assert sorter.getSortFields() == [ 'username' ]
+
     def test_comparingEqualityOfSortersShouldProduceFalseWhenFieldsNotMatch(self):
         sorter1 = AscendingSorter('username')
         fieldnames = [
@@ -138,6 +148,11 @@ class TestDescendingSorter:
 
             assert cursor == mockCursor
             mockCursor.sort.assert_called_with([ (fieldname, -1) ])
+
+    def test_getMongoPipelineShouldReturnSortStageWithMinus1(self):
+        sorter = DescendingSorter('username')
+
+        assert sorter.getMongoPipeline() == [ { '$sort': { 'username': -1 } } ]
     
     def test_comparingEqualityOfSortersShouldProduceFalseWhenFieldsNotMatch(self):
         sorter1 = DescendingSorter('username')
@@ -181,6 +196,16 @@ class TestNullSorter:
         assert cursor == mockCursor
         assert mockCursor.sort.call_count == 0
 
+    def test_getMongoPipelineShouldReturnNoStages(self):
+        sorter = NullSorter()
+
+        assert sorter.getMongoPipeline() == []
+
+    def test_getSortFieldsShouldReturnNoFields(self):
+        sorter = NullSorter()
+
+        assert sorter.getSortFields() == []
+
     def test_shouldCompareTrueWhenOtherIsNullSorter(self):
         sorter1 = NullSorter()
         sorter2 = NullSorter()
@@ -194,3 +219,125 @@ class TestNullSorter:
 
         assert not sorter1 == sorter2
         assert not sorter1 == sorter3
+
+
+class TestSortWithLimit:
+    ENTITIES = [
+        dict(id=str(idx), age=(idx * 7) % 5) for idx in range(20)
+    ]
+
+    @pytest.mark.parametrize('sorter', [
+        AscendingSorter('age'), DescendingSorter('age'), NullSorter(),
+    ])
+    @pytest.mark.parametrize('limit', [ 0, 1, 3, 20, 25 ])
+    def test_sortShouldReturnSameLeadingEntitiesAsFullSort(self, sorter, limit):
+        sorted_entity = sorter.sort(self.ENTITIES, limit)
+
+        assert sorted_entity[:limit] == sorter.sort(self.ENTITIES)[:limit]
+
+    @pytest.mark.parametrize('sorter', [
+        AscendingSorter('age'), DescendingSorter('age'), NullSorter(),
+    ])
+    @pytest.mark.parametrize('limit', [ 0, 1, 3, 20, 25 ])
+    def test_sortKeysetShouldReturnSameLeadingEntitiesAsFullSort(self, sorter, limit):
+        sorted_entity = sorter.sortKeyset(self.ENTITIES, 'id', limit)
+
+        assert sorted_entity == sorter.sortKeyset(self.ENTITIES, 'id')[:limit]
+
+    def test_sortShouldOnlyReturnLimitEntities(self):
+        assert len( AscendingSorter('age').sort(self.ENTITIES, 3) ) == 3
+
+    def test_sortWithLimitShouldRaiseExceptionWhenKeyNotExist(self):
+        with pytest.raises(FieldNotFoundInEntityError):
+            DescendingSorter('non_exist').sort(self.ENTITIES, 3)
+
+
+class TestKeyset:
+    ENTITIES = [
+        dict(id='1', age=23),
+        dict(id='2', age=24),
+        dict(id='3', age=23),
+        dict(id='4', age=25),
+    ]
+
+    def test_sortKeysetShouldBreakTiesByIdInAscendingOrder(self):
+        sorter = AscendingSorter('age')
+
+        sorted_entity = sorter.sortKeyset(self.ENTITIES, 'id')
+
+        assert [ e['id'] for e in sorted_entity ] == [ '1', '3', '2', '4' ]
+
+    def test_sortKeysetShouldBreakTiesByIdInDescendingOrder(self):
+        sorter = DescendingSorter('age')
+
+        sorted_entity = sorter.sortKeyset(self.ENTITIES, 'id')
+
+        assert [ e['id'] for e in sorted_entity ] == [ '4', '2', '3', '1' ]
+
+    def test_sortKeysetOfNullSorterShouldSortById(self):
+        sorter = NullSorter()
+
+        sorted_entity = sorter.sortKeyset(list(reversed(self.ENTITIES)), 'id')
+
+        assert [ e['id'] for e in sorted_entity ] == [ '1', '2', '3', '4' ]
+
+    def test_isAfterKeysetShouldMatchEntitiesFollowingKeysetInSortedOrder(self):
+        sorters = [ AscendingSorter('age'), DescendingSorter('age'), NullSorter() ]
+
+        for sorter in sorters:
+            sorted_entity = sorter.sortKeyset(self.ENTITIES, 'id')
+            keyset = sorter.extractKeyset(sorted_entity[1], 'id')
+
+            after = [ e for e in self.ENTITIES if sorter.isAfterKeyset(e, keyset, 'id') ]
+
+            assert sorter.sortKeyset(after, 'id') == sorted_entity[2:]
+
+    @pytest.mark.parametrize('sorter, keyset', [
+        (DescendingSorter('age'), [ 'x', '1' ]),
+        (AscendingSorter('age'), [ { 'a': 1 }, '1' ]),
+        (NullSorter(), [ None, 1 ]),
+    ])
+    def test_isAfterKeysetShouldRaiseExceptionWhenKeysetTypeMismatches(self, sorter, keyset):
+        with pytest.raises(InvalidPagingCursorError):
+            sorter.isAfterKeyset(self.ENTITIES[0], keyset, 'id')
+
+    def test_createKeysetMongoFilterShouldCompareSortFieldThenId(self):
+        keyset = [ 23, '3' ]
+
+        assert AscendingSorter('age').createKeysetMongoFilter(keyset, 'id') == {
+            '$or': [
+                { 'age': { '$gt': 23 } },
+                { 'age': 23, 'id': { '$gt': '3' } },
+            ]
+        }
+        assert DescendingSorter('age').createKeysetMongoFilter(keyset, 'id') == {
+            '$or': [
+                { 'age': { '$lt': 23 } },
+                { 'age': 23, 'id': { '$lt': '3' } },
+            ]
+        }
+        assert NullSorter().createKeysetMongoFilter(keyset, 'id') == { 'id': { '$gt': '3' } }
+
+    def test_getKeysetSortSpecShouldIncludeIdAsTiebreaker(self):
+        assert AscendingSorter('age').getKeysetSortSpec('id') == [ ('age', 1), ('id', 1) ]
+        assert DescendingSorter('age').getKeysetSortSpec('id') == [ ('age', -1), ('id', -1) ]
+        assert NullSorter().getKeysetSortSpec('id') == [ ('id', 1) ]
+
+    def test_extractKeysetShouldRaiseExceptionWhenKeyNotExist(self):
+        with pytest.raises(FieldNotFoundInEntityError):
+            AscendingSorter('non_exist').extractKeyset(self.ENTITIES[0], 'id')
+
+    def test_relevanceSorterShouldNotEqualNullSorter(self):
+        assert RelevanceSorter() == RelevanceSorter()
+        assert RelevanceSorter() != NullSorter()
+        assert NullSorter() != RelevanceSorter()
+        assert RelevanceSorter().getCacheKey() != NullSorter().getCacheKey()
+
+    def test_relevanceSorterShouldPageKeysetById(self):
+        sorter = RelevanceSorter()
+
+        sorted_entity = sorter.sortKeyset(list(reversed(self.ENTITIES)), 'id')
+
+        assert sorter.sortsByRelevance() is True
+        assert NullSorter().sortsByRelevance() is False
+        assert [ e['id'] for e in sorted_entity ] == [ '1', '2', '3', '4' ]
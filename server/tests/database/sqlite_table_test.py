@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for sqlite_table.py,
+and SQL created by filters, sorters and paging against it
+"""
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from server.database.sqlite_table import SqliteTable
+from server.database.sqlite_crudmanager import SqliteCrudManager, _regexp
+from server.database.filter import PrimitiveFilter, NullFilter
+from server.database.aggregate_filter import AggregateFilter
+from server.database.sorter import AscendingSorter, DescendingSorter, NullSorter
+from server.database.paging import Paging, PagingNoLimit
+from server.exceptions import FilterParseError
+from server.entity import Post
+import tests.mocks as mocks
+
+ROWS = [
+    dict(postId='0', userId='1', content='Hello World', createdAt=10.0),
+    dict(postId='1', userId='2', content='say "hi"', createdAt=20.0),
+    dict(postId='2', userId='1', content='hello again', createdAt=30.0),
+    dict(postId='3', userId=None, content='こんにちは世界', createdAt=30.0),
+    dict(postId='4', userId='3', content='bye', createdAt=50.0),
+]
+
+
+def createPrimitive(field, operator, values):
+    return PrimitiveFilter.createFilter(dict(field=field, operator=operator, value=values))
+
+
+@pytest.fixture(scope='function')
+def table():
+    return SqliteTable('posts', indexes=Post._indexes, textFields=[ 'content' ])
+
+
+@pytest.fixture(scope='function')
+def connection(table):
+    connection = sqlite3.connect(':memory:')
+    connection.create_function('regexp', 2, _regexp)
+    for statement in table.getSchemaSql():
+        connection.execute(statement)
+    connection.executemany(
+        'INSERT INTO posts (doc) VALUES (?)', [ (json.dumps(row),) for row in ROWS ]
+    )
+    yield connection
+    connection.close()
+
+
+def selectPostIds(connection, table, searchFilter, orderBy=( 'rowid', ), limit=( '', [] )):
+    where, params = searchFilter.getSqlFilter(table)
+    limitSql, limitParams = limit
+    rows = connection.execute(
+        f'SELECT doc FROM posts WHERE {where} ORDER BY {", ".join(orderBy)} {limitSql}',
+        params + limitParams,
+    )
+    return [ json.loads(doc)['postId'] for doc, in rows ]
+
+
+class TestFilterSql:
+    @pytest.mark.parametrize('searchFilter', [
+        createPrimitive('userId', 'eq', [ '1' ]),
+        createPrimitive('userId', 'eq', [ '3', '2' ]),
+        createPrimitive('userId', 'eq', [ None ]),
+        createPrimitive('userId', 'eq', [ '3', None ]),
+        createPrimitive('postId', 'eq', []),
+        createPrimitive('createdAt', 'gt', [ 20.0 ]),
+        createPrimitive('createdAt', 'gte', [ 30.0 ]),
+        createPrimitive('createdAt', 'lt', [ 30.0 ]),
+        createPrimitive('createdAt', 'lte', [ 30.0 ]),
+        createPrimitive('content', 'fuzzy', [ '"hi"' ]),
+        createPrimitive('content', 'fuzzy', [ 'bye', 'again' ]),
+        createPrimitive('content', 'fuzzy', [ '世界' ]),
+        createPrimitive('content', 'fuzzy', []),
+        createPrimitive('missing', 'eq', [ '1' ]),
+        createPrimitive('content', 'regex', [ '^[Hh]ello', 'e$' ]),
+        AggregateFilter.createFilter('and', [
+            createPrimitive('userId', 'eq', [ '1' ]),
+            createPrimitive('createdAt', 'gt', [ 10.0 ]),
+        ]),
+        AggregateFilter.createFilter('or', [
+            createPrimitive('userId', 'eq', [ '3' ]),
+            AggregateFilter.createFilter('and', [
+                createPrimitive('userId', 'eq', [ '1' ]),
+                createPrimitive('content', 'fuzzy', [ 'again' ]),
+            ]),
+        ]),
+        AggregateFilter.createFilter('or', []),
+        AggregateFilter.createFilter('and', []),
+        NullFilter(),
+    ])
+    def test_sqlFilterShouldMatchSameRowsAsMatches(self, connection, table, searchFilter):
+        expected = [ row['postId'] for row in ROWS if searchFilter.matches(row) ]
+
+        assert selectPostIds(connection, table, searchFilter) == expected
+
+    def test_fuzzyFilterShouldBeCaseInsensitive(self, connection, table):
+        searchFilter = createPrimitive('content', 'fuzzy', [ 'HELLO' ])
+
+        assert selectPostIds(connection, table, searchFilter) == [ '0', '2' ]
+
+    def test_fuzzyFilterShouldLookUpFtsTableForLongValues(self, table):
+        sql, params = createPrimitive('content', 'fuzzy', [ 'hello', 'say "hi"' ]).getSqlFilter(table)
+
+        assert 'posts_fts MATCH ?' in sql
+        assert params == [ 'content : ("hello" OR "say ""hi""")' ]
+
+    def test_fuzzyFilterShouldSearchFieldForShortValues(self, table):
+        sql, params = createPrimitive('content', 'fuzzy', [ 'hello', 'hi' ]).getSqlFilter(table)
+
+        assert 'posts_fts' not in sql
+        assert params == [ 'hello', 'hi' ]
+
+    def test_eqFilterShouldUseIndex(self, connection, table):
+        sql, params = createPrimitive('postId', 'eq', [ '1', '2' ]).getSqlFilter(table)
+
+        plan = connection.execute(f'EXPLAIN QUERY PLAN SELECT doc FROM posts WHERE {sql}', params)
+
+        assert 'USING INDEX posts_postId' in ' '.join( row[3] for row in plan )
+
+    def test_fieldsThatAreNotIdentifiersShouldRaise(self, table):
+        searchFilter = createPrimitive("content') OR 1 --", 'eq', [ '1' ])
+
+        with pytest.raises(FilterParseError):
+            searchFilter.getSqlFilter(table)
+
+    def test_ftsTableShouldFollowUpdatesAndDeletes(self, connection, table):
+        searchFilter = createPrimitive('content', 'fuzzy', [ 'updated' ])
+        connection.execute(
+            "UPDATE posts SET doc = json_set(doc, '$.content', 'updated') "
+            "WHERE json_extract(doc, '$.postId') IN ('1', '4')"
+        )
+        connection.execute("DELETE FROM posts WHERE json_extract(doc, '$.postId') = '4'")
+
+        assert selectPostIds(connection, table, searchFilter) == [ '1' ]
+
+
+class TestSorterAndPagingSql:
+    @pytest.mark.parametrize('sorter', [
+        AscendingSorter('createdAt'), DescendingSorter('createdAt'), NullSorter(),
+    ])
+    def test_keysetShouldPageThroughAllRows(self, connection, table, sorter):
+        expected = [ row['postId'] for row in sorter.sortKeyset(ROWS, 'postId') ]
+        orderBy = sorter.getKeysetSqlOrderBy(table, 'postId')
+
+        postIds = []
+        keyset = None
+        while True:
+            where, params = ('1', []) if keyset is None else sorter.createKeysetSqlFilter(
+                keyset, 'postId', table
+            )
+            rows = connection.execute(
+                f'SELECT doc FROM posts WHERE {where} ORDER BY {", ".join(orderBy)} LIMIT 2',
+                params,
+            ).fetchall()
+            if len(rows) == 0:
+                break
+            documents = [ json.loads(doc) for doc, in rows ]
+            postIds += [ document['postId'] for document in documents ]
+            keyset = sorter.extractKeyset(documents[-1], 'postId')
+
+        assert postIds == expected
+
+    def test_sortedSearchShouldOrderByField(self, connection, table):
+        orderBy = DescendingSorter('createdAt').getSqlOrderBy(table) + [ 'rowid' ]
+
+        assert selectPostIds(connection, table, NullFilter(), orderBy=orderBy) == [
+            '4', '2', '3', '1', '0'
+        ]
+
+    def test_pagingShouldLimitAndOffsetRows(self, connection, table):
+        limit = Paging(dict(offset=1, limit=2)).getSqlLimit()
+
+        assert selectPostIds(connection, table, NullFilter(), limit=limit) == [ '1', '2' ]
+
+    def test_pagingNoLimitShouldReturnRemainingRows(self, connection, table):
+        limit = PagingNoLimit(dict(offset=3)).getSqlLimit()
+
+        assert selectPostIds(connection, table, NullFilter(), limit=limit) == [ '3', '4' ]
+
+
+class TestConnections:
+    def test_eachThreadShouldUseItsOwnConnection(self, tmp_path):
+        repo = SqliteCrudManager(tmp_path / 'test.sqlite3', mocks.createMockPassword())
+        results = []
+
+        def searchPosts():
+            results.append( repo.searchPost(None)['matchedCount'] )
+
+        thread = threading.Thread(target=searchPosts)
+        thread.start()
+        thread.join()
+        searchPosts()
+
+        assert results == [ 0, 0 ]
+
+    def test_databaseShouldBeInWalMode(self, tmp_path):
+        path = tmp_path / 'test.sqlite3'
+        SqliteCrudManager(path, mocks.createMockPassword())
+
+        with sqlite3.connect(path) as connection:
+            assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for text_search.py
+"""
+import pytest
+
+from server.database.text_search import MongoTextSearch
+from server.database.filter import PrimitiveFilter
+from server.database.aggregate_filter import AggregateFilter
+from server.services.searchfilter_creator import SearchFilterCreator
+
+TEXT_FIELDS = {
+    'threads': [ 'title', 'subject' ],
+    'posts': [ 'content' ],
+}
+
+
+def createPrimitive(field, operator, values):
+    return PrimitiveFilter.createFilter(dict(field=field, operator=operator, value=values))
+
+
+@pytest.fixture(scope='function')
+def textSearch():
+    return MongoTextSearch(TEXT_FIELDS)
+
+
+class TestMongoTextSearch:
+    def test_searchBoxFilterShouldBeLookedUpThroughText(self, textSearch):
+        searchFilter = SearchFilterCreator.create_threadsearch(
+            dict(search='hello world', boardId='1')
+        ).normalize()
+
+        query, usesTextSearch = textSearch.createQuery('threads', searchFilter)
+
+        assert usesTextSearch is True
+        assert query == {
+            '$and': [
+                { '$text': { '$search': 'hello world' } },
+                { 'boardId': { '$in': [ '1' ] } },
+            ]
+        }
+
+    def test_fuzzyFilterOnAllTextFieldsShouldBeLookedUpThroughText(self, textSearch):
+        searchFilter = createPrimitive('content', 'fuzzy', [ 'hello' ])
+
+        query, usesTextSearch = textSearch.createQuery('posts', searchFilter)
+
+        assert usesTextSearch is True
+        assert query == { '$text': { '$search': 'hello' } }
+
+    @pytest.mark.parametrize('searchFilter', [
+        # does not cover all text fields, $text would also match the other field
+        createPrimitive('title', 'fuzzy', [ 'hello' ]),
+        # terms differ among fields
+        AggregateFilter.createFilter('or', [
+            createPrimitive('title', 'fuzzy', [ 'hello' ]),
+            createPrimitive('subject', 'fuzzy', [ 'world' ]),
+        ]),
+        # $text can not be nested under $or with other filters
+        AggregateFilter.createFilter('or', [
+            createPrimitive('boardId', 'eq', [ '1' ]),
+            AggregateFilter.createFilter('or', [
+                createPrimitive('title', 'fuzzy', [ 'hello' ]),
+                createPrimitive('subject', 'fuzzy', [ 'hello' ]),
+            ]),
+        ]).normalize(),
+        # nothing left to search once quotes and hyphens are removed
+        AggregateFilter.createFilter('or', [
+            createPrimitive('title', 'fuzzy', [ '"-' ]),
+            createPrimitive('subject', 'fuzzy', [ '"-' ]),
+        ]),
+    ])
+    def test_otherFiltersShouldFallBackToRegex(self, textSearch, searchFilter):
+        query, usesTextSearch = textSearch.createQuery('threads', searchFilter)
+
+        assert usesTextSearch is False
+        assert query == searchFilter.getMongoFilter()
+
+    def test_collectionWithoutTextFieldsShouldFallBackToRegex(self, textSearch):
+        searchFilter = createPrimitive('userName', 'fuzzy', [ 'timmy' ])
+
+        query, usesTextSearch = textSearch.createQuery('users', searchFilter)
+
+        assert usesTextSearch is False
+        assert query == searchFilter.getMongoFilter()
+
+    def test_onlyOneFilterShouldBeLookedUpThroughText(self, textSearch):
+        searchFilter = AggregateFilter.createFilter('and', [
+            createPrimitive('content', 'fuzzy', [ 'hello' ]),
+            createPrimitive('content', 'fuzzy', [ 'world' ]),
+        ])
+
+        query, _ = textSearch.createQuery('posts', searchFilter)
+
+        assert query == {
+            '$and': [
+                { '$text': { '$search': 'hello' } },
+                createPrimitive('content', 'fuzzy', [ 'world' ]).getMongoFilter(),
+            ]
+        }
+
+    def test_createSearchStringShouldRemovePhrasesAndNegations(self):
+        assert MongoTextSearch.createSearchString([ '"hello', '-world', 'a-b c' ]) == (
+            'hello world a-b c'
+        )
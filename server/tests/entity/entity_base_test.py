@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for entity_base.py
+"""
+import pytest
+
+from server.entity import User, Post, Thread
+from server.entity.entity_base import OPERATIONS, create_conversion_plan
+
+ENTITY_CLASSES = [ User, Post, Thread ]
+
+
+def describedAttrs(entityClass, operation, rule):
+    return {
+        attr for attr, description in entityClass._attribute_description.items()
+        if description['conversion_rules'][operation].get(rule, False)
+    }
+
+
+class TestEntitySlots:
+    @pytest.mark.parametrize('entityClass', ENTITY_CLASSES)
+    def test_entityShouldHaveSlotsOfDescribedAttributes(self, entityClass):
+        assert set(entityClass.__slots__) == set(entityClass._attribute_description.keys())
+
+    @pytest.mark.parametrize('entityClass', ENTITY_CLASSES)
+    def test_entityShouldNotHaveDict(self, entityClass):
+        entity = entityClass.from_storage({})
+
+        assert not hasattr(entity, '__dict__')
+
+    def test_settingUndescribedAttributeShouldRaiseAttributeError(self):
+        post = Post.from_storage( dict(postId='1') )
+
+        with pytest.raises(AttributeError):
+            post.undescribed = 'value'
+
+    def test_unsetAttributesShouldNotBeReported(self):
+        post = Post.from_storage( dict(postId='1', content='content') )
+
+        assert not hasattr(post, 'userId')
+        assert post._get_attrs() == dict(postId='1', content='content')
+
+
+class TestConversionPlans:
+    @pytest.mark.parametrize('entityClass', ENTITY_CLASSES)
+    @pytest.mark.parametrize('operation', OPERATIONS)
+    def test_planShouldMatchAttributeDescription(self, entityClass, operation):
+        plan = entityClass._conversion_plans[operation]
+
+        assert plan.hidden == describedAttrs(entityClass, operation, 'hide')
+        assert set(plan.required) == describedAttrs(entityClass, operation, 'required')
+        assert plan.entities == describedAttrs(entityClass, operation, 'entity')
+
+    def test_postPlanShouldConvertOwnerAsNestedEntities(self):
+        assert Post._conversion_plans['to_serialize'].entities == frozenset([ 'owner' ])
+
+    def test_planShouldBeImmutable(self):
+        plan = create_conversion_plan(Post._attribute_description, 'to_serialize')
+
+        with pytest.raises(AttributeError):
+            plan.hidden = frozenset()
+        assert isinstance(plan.hidden, frozenset)
+        assert isinstance(plan.required, tuple)
+        assert isinstance(plan.entities, frozenset)
+
+    def test_planShouldBeSharedAmongInstances(self):
+        post1 = Post.from_storage( dict(postId='1') )
+        post2 = Post.from_storage( dict(postId='2') )
+
+        assert post1._conversion_plans is post2._conversion_plans
@@ -64,6 +64,47 @@ class TestUserCreation:
             with pytest.raises(EntityValidationError):
                 Post(args)
 
+    def test_constructionValidatesOwnerIsListOfUsers(self):
+        args = DEFAULT_ARGS.copy()
+        args.update({ 'owner': [ { 'userId': 'test_user' } ] })
+
+        with pytest.raises(EntityValidationError):
+            Post(args)
+
+
+class TestFromStorage:
+    def test_fromStorageShouldHaveAttributesOfRow(self):
+        post = Post.from_storage(DEFAULT_ARGS)
+
+        assert isinstance(post, Post)
+        for attr_name, attr_value in DEFAULT_ARGS.items():
+            assert getattr(post, attr_name) == attr_value
+
+    def test_fromStorageShouldDropUnknownAttributes(self):
+        post = Post.from_storage({ **DEFAULT_ARGS, 'hello': 'test_value' })
+
+        assert not hasattr(post, 'hello')
+
+    def test_fromStorageShouldNotValidate(self):
+        post = Post.from_storage({ **DEFAULT_ARGS, 'content': 9999 })
+
+        assert post.content == 9999
+
+    def test_fromStorageShouldNotShareAttributesWithRow(self):
+        row = DEFAULT_ARGS.copy()
+        post = Post.from_storage(row)
+
+        post.content = 'updated'
+
+        assert row['content'] == DEFAULT_ARGS['content']
+
+    def test_fromStorageShouldConvertLikeValidatedConstruction(self):
+        stored = Post.from_storage(DEFAULT_ARGS)
+        constructed = Post(DEFAULT_ARGS)
+
+        assert stored.to_serialize() == constructed.to_serialize()
+        assert stored.to_update() == constructed.to_update()
+
 
 class TestConversionMethods:
     MOCK_USER_ATTRS = { 'userID': 'test_user_id' }
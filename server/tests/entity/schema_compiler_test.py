@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for schema_compiler.py
+"""
+import threading
+
+import pytest
+from cerberus import Validator
+
+from server.entity import User, Post, Thread
+from server.entity.schema_compiler import compile_schema
+
+SCHEMA = {
+    'name': {
+        'type': 'string',
+        'required': True,
+        'regex': r'\s*\S+\s*',
+    },
+    'count': {
+        'type': 'integer',
+    },
+    'createdAt': {
+        'type': 'float',
+    },
+    'increment': {
+        'type': 'string',
+        'allowed': [ 'views', 'postCount' ],
+    },
+    'lastPostId': {
+        'type': 'string',
+        'nullable': True,
+    },
+    'tags': {
+        'type': 'list',
+    },
+}
+DOCUMENTS_TO_COMPARE = [
+    dict(name='name'),
+    dict(name='name', count=1, createdAt=1.5, increment='views', lastPostId=None, tags=[ 1 ]),
+    dict(name='name', count=True, createdAt=1),
+    dict(name='name', count=1.5, createdAt='1.5'),
+    dict(name='  spaces  '),
+    dict(name='two words'),
+    dict(name='name\n'),
+    dict(name=''),
+    dict(name=None),
+    dict(name=123),
+    dict(name='name', increment='unknown'),
+    dict(name='name', tags='not a list'),
+    dict(name='name', tags=( 1, 2 )),
+    dict(name='name', unknown='value'),
+    dict(count=1),
+]
+
+
+class TestCompiledSchemaAgainstCerberus:
+    @pytest.mark.parametrize('document', DOCUMENTS_TO_COMPARE)
+    def test_findErrorsShouldReportSameErrorsAsCerberus(self, document):
+        cerberusValidator = Validator(SCHEMA, allow_unknown=False)
+        cerberusValidator.validate(document)
+
+        errors = compile_schema(SCHEMA).find_errors(document)
+
+        assert errors == cerberusValidator.errors
+
+    @pytest.mark.parametrize('document', DOCUMENTS_TO_COMPARE)
+    def test_normalizedShouldPurgeUnknownLikeCerberus(self, document):
+        cerberusValidator = Validator(SCHEMA, purge_unknown=True)
+
+        normalized = compile_schema(SCHEMA, purge_unknown=True).normalized(document)
+
+        assert normalized == cerberusValidator.normalized(document)
+
+
+class TestCompiledSchema:
+    def test_validateShouldReturnTrueForValidDocument(self):
+        assert compile_schema(SCHEMA).validate( dict(name='name', count=1) ) is True
+
+    def test_validateShouldReturnFalseForInvalidDocument(self):
+        assert compile_schema(SCHEMA).validate( dict(name='name', count='1') ) is False
+
+    def test_allowUnknownShouldAcceptUnknownFields(self):
+        validator = compile_schema(SCHEMA, allow_unknown=True)
+
+        assert validator.find_errors( dict(name='name', unknown='value') ) == {}
+
+    def test_normalizedShouldNotModifyDocument(self):
+        document = dict(name='name', unknown='value')
+
+        normalized = compile_schema(SCHEMA, purge_unknown=True).normalized(document)
+
+        assert normalized == dict(name='name')
+        assert document == dict(name='name', unknown='value')
+
+    def test_schemaRuleShouldValidateEachItemOfList(self):
+        validator = compile_schema({
+            'owner': { 'type': 'list', 'schema': { 'type': 'string' } },
+        })
+
+        assert validator.find_errors( dict(owner=[ 'a', 'b' ]) ) == {}
+        assert validator.find_errors( dict(owner=[ 'a', 1 ]) ) == {
+            'owner': [ { 1: [ 'must be of string type' ] } ]
+        }
+
+    def test_entityTypesShouldBeAvailableToSchemaRule(self):
+        owner = User(
+            userId='1', userName='test@example.com', displayName='test',
+            password='password', imageUrl='image.jpg', createdAt=1.0, updatedAt=1.0,
+        )
+        lastPost = Post(userId='1', postId='1', content='content', owner=[ owner ])
+
+        thread = Thread(owner=[ owner ], lastPost=[ lastPost ])
+
+        assert thread.owner == [ owner ]
+        assert thread.lastPost == [ lastPost ]
+
+    def test_findErrorsShouldNotShareErrorsAmongThreads(self):
+        validator = compile_schema(SCHEMA)
+        documents = [ dict(name='name', count=idx) for idx in range(200) ]
+        documents += [ dict(name='name', count=str(idx)) for idx in range(200) ]
+        mismatches = []
+
+        def validate(document):
+            expected = {} if isinstance(document['count'], int) else { 'count': [ 'must be of integer type' ] }
+            for _ in range(50):
+                if validator.find_errors(document) != expected:
+                    mismatches.append(document)
+
+        threads = [ threading.Thread(target=validate, args=(doc,)) for doc in documents ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert mismatches == []
@@ -168,6 +168,18 @@ class TestConversionMethods:
             with pytest.raises(EntityValidationError):
                 thread.to_serialize()
 
+    def test_to_serializeWithFieldsShouldOnlyContainRequestedFields(self, thread):
+        serialized = thread.to_serialize([ 'threadId', 'title', '_id' ])
+
+        assert serialized == dict(threadId='test_id', title=DEFAULT_ARGS['title'])
+
+    def test_to_serializeWithFieldsShouldOnlyValidateRequestedRequiredAttributes(self):
+        thread = Thread(dict(threadId='test_id', title='test_title'))
+
+        assert thread.to_serialize([ 'title' ]) == dict(title='test_title')
+        with pytest.raises(EntityValidationError):
+            thread.to_serialize([ 'title', 'subject' ])
+
     def test_to_createGeneratesDictForCreation(self, thread):
         create_dict = thread.to_create()
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for json_codec.py
+"""
+import json
+
+import pytest
+
+import server.json_codec as json_codec
+from server.entity import User, Thread
+
+DEFAULT_USER_ATTRS = dict(
+    userId='1',
+    userName='test@example.com',
+    displayName='テスト',
+    password='testpassword',
+    imageUrl='www.example.com/image.jpg',
+    createdAt=1600000000.123456,
+    updatedAt=1600000123.654321,
+)
+DEFAULT_THREAD_ATTRS = dict(
+    userId='1',
+    boardId='1',
+    threadId='1',
+    lastPostId='1',
+    title='title',
+    subject='subject',
+    views=10,
+    postCount=3,
+    createdAt=1600000000.123456,
+    updatedAt=1600000123.654321,
+    owner=[],
+    lastPost=[],
+)
+DEFAULT_LISTING = {
+    'result': {
+        'threads': [
+            dict(DEFAULT_THREAD_ATTRS, threadId=str(idx), owner=[ DEFAULT_USER_ATTRS ])
+            for idx in range(3)
+        ],
+        'matchedCount': 3,
+        'returnCount': 3,
+        'nextCursor': None,
+    },
+}
+
+
+@pytest.fixture(scope='function', params=['json', 'orjson'])
+def codec(request, monkeypatch):
+    """
+    Switches json_codec to each of its backends
+    """
+    if request.param == 'json':
+        monkeypatch.setattr(json_codec, '_dumps', json_codec._stdlibDumps)
+        monkeypatch.setattr(json_codec, '_loads', json.loads)
+    else:
+        pytest.importorskip('orjson')
+
+    return json_codec
+
+
+class TestJSONCodec:
+    def test_dumpsShouldReturnBytes(self, codec):
+        assert isinstance(codec.dumps(DEFAULT_LISTING), bytes)
+
+    def test_dumpsShouldRoundTripListing(self, codec):
+        assert codec.loads( codec.dumps(DEFAULT_LISTING) ) == DEFAULT_LISTING
+
+    def test_dumpsShouldKeepFloatTimestampsExact(self, codec):
+        decoded = codec.loads( codec.dumps(DEFAULT_THREAD_ATTRS) )
+
+        assert decoded['createdAt'] == DEFAULT_THREAD_ATTRS['createdAt']
+        assert decoded['updatedAt'] == DEFAULT_THREAD_ATTRS['updatedAt']
+
+    def test_dumpsShouldEncodeCompactUtf8(self, codec):
+        encoded = codec.dumps( dict(displayName='テスト', ids=[1, 2]) )
+
+        assert encoded == '{"displayName":"テスト","ids":[1,2]}'.encode('utf-8')
+
+    def test_dumpsShouldSerializeEntities(self, codec):
+        owner = User(DEFAULT_USER_ATTRS)
+        thread = Thread(DEFAULT_THREAD_ATTRS, owner=[ owner ])
+
+        decoded = codec.loads( codec.dumps( dict(threads=[ thread ]) ) )
+
+        assert decoded['threads'][0]['threadId'] == thread.threadId
+        assert decoded['threads'][0]['owner'] == [ owner.to_serialize() ]
+        assert 'password' not in decoded['threads'][0]['owner'][0]
+
+    def test_dumpsShouldRaiseTypeErrorForUnknownObjects(self, codec):
+        with pytest.raises(TypeError):
+            codec.dumps( dict(unknown=object()) )
+
+    def test_loadsShouldAcceptStr(self, codec):
+        assert codec.loads('{"key":[1,2]}') == dict(key=[1, 2])
+
+    def test_dumpAndLoadShouldRoundTripThroughFile(self, codec, tmp_path):
+        filePath = tmp_path / 'threads.json'
+
+        with filePath.open('wb') as f:
+            codec.dump(DEFAULT_LISTING, f)
+        with filePath.open('rb') as f:
+            assert codec.load(f) == DEFAULT_LISTING
+
+    def test_backendsShouldEncodeListingIdentically(self):
+        pytest.importorskip('orjson')
+
+        assert json_codec._stdlibDumps(DEFAULT_LISTING) == json_codec._orjsonDumps(DEFAULT_LISTING)
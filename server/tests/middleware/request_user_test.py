@@ -2,15 +2,15 @@
 """
 This file houses tests for request_user.py
 """
-import json
-from unittest.mock import MagicMock
-
 import pytest
 
 import tests.mocks as mocks
 from tests.helpers import create_mock_entity_fromattrs
 import server.routes.route_utils as route_utils
+import server.json_codec as json_codec
 from server import server
+from server.exceptions import ServerMiscError
+from server.middleware.envelope import applyEnvelopeMiddlewares
 from server.middleware.request_user import RequestUserManager
 from server.services.session import SessionService
 
@@ -37,51 +37,46 @@ def session_user():
     return RequestUserManager(mock_session)
 
 
-def createMockResponse():
-    mock_response = MagicMock()
-    mock_response.get_data.return_value = json.dumps(DEFAULT_RESPONSE_DATA)
-
-    return mock_response
-
-
 class TestRequestUserManager:
-    def test_setCurrentUserShouldCallPopulateRequestUserOnSession(self, session_user):
+    def test_setCurrentUserShouldCallPopulateRequestUserOnSession(self, session_user, app):
         mock_session = session_user._session
 
-        session_user.setCurrentUser()
+        with app.test_request_context():
+            session_user.setCurrentUser()
 
         assert mock_session.populate_request_user.call_count == 1
 
-    def test_addCurrentUserToResponseShouldRetrieveUserInfoFromRequestContext(self, session_user):
+    def test_setCurrentUserShouldRegisterEnvelopeMiddleware(self, session_user, app):
+        with app.test_request_context():
+            session_user.setCurrentUser()
+            envelope = applyEnvelopeMiddlewares( dict(DEFAULT_RESPONSE_DATA) )
+
+        assert SessionService.REQUEST_USER_KEY in envelope
+
+    def test_addCurrentUserToEnvelopeShouldRetrieveUserInfoFromRequestContext(self, session_user):
         mock_session = session_user._session
-        mock_response = createMockResponse()
 
-        session_user.addCurrentUserToResponse(mock_response)
+        session_user.addCurrentUserToEnvelope( dict(DEFAULT_RESPONSE_DATA) )
 
         assert mock_session.get_user.call_count == 1
 
-    def test_addCurrentUserToResponseShouldCallToJsonOnRequestContextUser(self, session_user):
+    def test_addCurrentUserToEnvelopeShouldCallToJsonOnRequestContextUser(self, session_user):
         mock_user = session_user._session.get_user.return_value
-        mock_response = createMockResponse()
 
-        session_user.addCurrentUserToResponse(mock_response)
+        session_user.addCurrentUserToEnvelope( dict(DEFAULT_RESPONSE_DATA) )
 
         assert mock_user.to_serialize.call_count == 1
 
-    def test_addCurrentUserToResponseShouldUpdateDataWithRequestContextUser(self, session_user):
-        mock_response = createMockResponse()
-
-        session_user.addCurrentUserToResponse(mock_response)
+    def test_addCurrentUserToEnvelopeShouldUpdateDataWithRequestContextUser(self, session_user):
+        envelope = dict(DEFAULT_RESPONSE_DATA)
 
-        mock_response.set_data.assert_called()
-        data_string, *_ = mock_response.set_data.call_args[0]
-        updated_data = json.loads(data_string)
+        session_user.addCurrentUserToEnvelope(envelope)
 
-        assert SessionService.REQUEST_USER_KEY in updated_data
+        assert SessionService.REQUEST_USER_KEY in envelope
         for k, v in DEFAULT_RESPONSE_DATA.items():
-            assert updated_data[k] == v
+            assert envelope[k] == v
         for k, v in DEFAULT_USER_ATTRS.items():
-            assert updated_data[SessionService.REQUEST_USER_KEY][k] == v
+            assert envelope[SessionService.REQUEST_USER_KEY][k] == v
 
 
 class TestRequestUserManagerAgainstRoute:
@@ -109,17 +104,16 @@ class TestRequestUserManagerAgainstRoute:
             assert response.status_code == 200
             assert mock_session.populate_request_user.call_count == 1
 
-    def test_requestWithaddCurrentUserToResponseShouldHaveDefaultUserInResponse(self, session_user, app):
+    def test_requestWithSetCurrentUserShouldHaveDefaultUserInResponse(self, session_user, app):
         path = '/test-route'
 
         @app.route(path, methods=['GET'])
         def some_route():
             return route_utils.createJSONResponse([ DEFAULT_RESPONSE_DATA ], 200)
 
-        @app.after_request
-        def setuser(response):
-            session_user.addCurrentUserToResponse(response)
-            return response
+        @app.before_request
+        def setuser():
+            session_user.setCurrentUser()
 
         with app.test_client() as client:
             response = client.get(path)
@@ -132,3 +126,41 @@ class TestRequestUserManagerAgainstRoute:
                 assert responseJson[k] == v
             for k, v in DEFAULT_USER_ATTRS.items():
                 assert responseJson[SessionService.REQUEST_USER_KEY][k] == v
+
+    def test_requestWithSetCurrentUserShouldEncodeSameBodyAsAddingUserAfterEncoding(self, session_user, app):
+        path = '/test-route'
+
+        @app.route(path, methods=['GET'])
+        def some_route():
+            return route_utils.createJSONResponse([ DEFAULT_RESPONSE_DATA ], 200)
+
+        @app.before_request
+        def setuser():
+            session_user.setCurrentUser()
+
+        expected = dict(DEFAULT_RESPONSE_DATA)
+        expected[SessionService.REQUEST_USER_KEY] = DEFAULT_USER_ATTRS
+
+        with app.test_client() as client:
+            response = client.get(path)
+
+            assert response.get_data() == json_codec.dumps(expected)
+
+    def test_requestWithFailingMiddlewareShouldRespondWithError(self, session_user, app):
+        path = '/test-route'
+        session_user._session.get_user.side_effect = ServerMiscError('some error')
+
+        @app.route(path, methods=['GET'])
+        def some_route():
+            return route_utils.createJSONResponse([ DEFAULT_RESPONSE_DATA ], 200)
+
+        @app.before_request
+        def setuser():
+            session_user.setCurrentUser()
+
+        with app.test_client() as client:
+            response = client.get(path)
+
+            assert response.status_code == ServerMiscError.getStatusCode()
+            assert 'error' in response.get_json()
+            assert SessionService.REQUEST_USER_KEY not in response.get_json()
@@ -8,15 +8,19 @@ from unittest.mock import create_autospec
 from flask import g, request
 
 from server.database.crudmanager import CrudManager
+from server.database.mongo_crudmanager import MongoCrudManager
 from server.database.filter import PrimitiveFilter
 from server.database.aggregate_filter import AggregateFilter
 from server.database.paging import Paging
 from server.services.userauth import UserAuthenticationService, PasswordService
 from server.services.entity_creation_service import EntityCreationService
 from server.services.search_service import SearchService
+from server.services.view_counter import ViewCountAggregator
 from server.services.update_service import UpdateService
 from server.services.delete_service import DeleteService
 from server.services.session import SessionService
+from server.services.user_cache import UserCache
+from server.services.search_index import SearchIndex
 from server.services.flask_context import FlaskContext
 from server.services.image_scaler import ImageScalerBase
 from server.entity import Entity
@@ -28,6 +32,22 @@ def createMockRepo():
     return create_autospec(CrudManager)
 
 
+def createMockJoiningRepo():
+    return create_autospec(MongoCrudManager)
+
+
+def createMockViewCounter():
+    return create_autospec(ViewCountAggregator)
+
+
+def createMockUserCache():
+    return create_autospec(UserCache)
+
+
+def createMockSearchIndex():
+    return create_autospec(SearchIndex)
+
+
 def createMockFilter():
     return create_autospec(PrimitiveFilter)
 
@@ -35,7 +35,6 @@ def mockApp(app):
     app.config['AUTHENTICATION_SERVICE'] = mockUserAuth
 
     mockSessionUser = mocks.createMockRequestUserManager()
-    mockSessionUser.addCurrentUserToResponse.side_effect = lambda response: response
     app.config['REQUESTUSER_MIDDLEWARE'] = mockSessionUser
 
     yield app
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for route_utils.py
+"""
+import server.routes.route_utils as route_utils
+import server.json_codec as json_codec
+from server.exceptions import ServerMiscError
+
+
+class TestJSONResponse:
+    def test_createJSONResponseShouldMergeDatasIntoSingleObject(self, app):
+        with app.test_request_context():
+            response = route_utils.createJSONResponse([ dict(a=1), dict(b=[1.5, 'c']) ], 200)
+
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'application/json'
+        assert response.get_data() == json_codec.dumps( dict(a=1, b=[1.5, 'c']) )
+
+    def test_createJSONErrorResponseShouldNotAccumulateErrorsAcrossCalls(self, app):
+        with app.test_request_context():
+            for _ in range(3):
+                response = route_utils.createJSONErrorResponse( ServerMiscError('some error') )
+
+        assert response.status_code == ServerMiscError.getStatusCode()
+        assert response.get_json() == { 'error': { 'description': 'some error' } }
+
+    def test_createJSONErrorResponseShouldNotModifyPassedDatas(self, app):
+        datas = [ dict(a=1) ]
+
+        with app.test_request_context():
+            response = route_utils.createJSONErrorResponse(ServerMiscError('some error'), datas)
+
+        assert datas == [ dict(a=1) ]
+        assert response.get_json()['a'] == 1
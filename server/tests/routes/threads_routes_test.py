@@ -111,6 +111,29 @@ class TestThreadAPIs:
         for thread in threads:
             assert thread.to_serialize.call_count == 1
 
+    def test_searchThreadShouldSerializeOnlyRequestedFields(self, mockApp, client):
+        search_service = Config.getSearchService(mockApp)
+        threads = search_service.searchThreadsByKeyValues.return_value['threads']
+        url = f'{self.THREAD_API_BASE}'
+
+        client.get(url, query_string=dict(fields='threadId,title'))
+
+        search_service.searchThreadsByKeyValues.assert_called_with(dict(fields='threadId,title'))
+        for thread in threads:
+            thread.to_serialize.assert_called_with([ 'threadId', 'title' ])
+
+    def test_searchThreadByExplicitIdShouldPassRequestedFieldsToService(self, mockApp, client):
+        search_service = Config.getSearchService(mockApp)
+        threads = search_service.searchThreadByExplicitId.return_value['threads']
+        threadId = '1'
+        url = f'{self.THREAD_API_BASE }/{threadId}'
+
+        client.get(url, query_string=dict(fields='title'))
+
+        search_service.searchThreadByExplicitId.assert_called_with(threadId, fields='title')
+        for thread in threads:
+            thread.to_serialize.assert_called_with([ 'title' ])
+
     def test_searchThreadByExplicitIdShouldReturnErrorWhenServiceRaiseException(self, mockApp):
         threadId = '1'
         url = f'{self.THREAD_API_BASE }/{threadId}'
@@ -2,10 +2,12 @@
 """
 This file houses tests for User related routes available for this app
 """
-import json
+from unittest.mock import MagicMock
+
 import pytest
 
 from server.config import Config
+from server.middleware.envelope import addEnvelopeMiddleware
 from server.entity import User
 from tests.helpers import create_mock_entities
 import server.exceptions as exceptions
@@ -378,19 +380,17 @@ class TestUserAPIs:
     def test_sessionShouldReturnResultFromSessionMiddlewareAsData(self, mockApp):
         expectedData = { 'sessionUser': DEFAULT_RETURN_LOGIN }
 
-        def mockAddCurrentUser(response):
-            response.set_data( json.dumps(expectedData) )
-            return response
+        addCurrentUser = MagicMock(side_effect=lambda envelope: envelope.update(expectedData))
 
         mockRequestUser = Config.getRequestUserManager(mockApp)
-        mockRequestUser.addCurrentUserToResponse.side_effect = mockAddCurrentUser
+        mockRequestUser.setCurrentUser.side_effect = lambda: addEnvelopeMiddleware(addCurrentUser)
 
         url = f'{self.USERAPI_BASE_URL}/session'
         with mockApp.test_client() as client:
             response = client.get(url)
 
             assert response.status_code == 200
-            mockRequestUser.addCurrentUserToResponse.assert_called_once()
+            addCurrentUser.assert_called_once()
             assert response.get_json() == expectedData
 
     def test_sessionShouldNotCallSearchService(self, mockApp):
@@ -412,7 +412,8 @@ class TestUserAPIs:
         url = f'{self.USERAPI_BASE_URL}/session'
 
         for e in exceptionsToTest:
-            mockRequestUser.addCurrentUserToResponse.side_effect = e('some error')
+            addCurrentUser = MagicMock(side_effect=e('some error'))
+            mockRequestUser.setCurrentUser.side_effect = lambda: addEnvelopeMiddleware(addCurrentUser)
             with mockApp.test_client() as client:
                 response = client.get(url)
 
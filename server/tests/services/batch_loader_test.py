@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for batch_loader.py
+"""
+import pytest
+
+import tests.mocks as mocks
+from tests.helpers import create_mock_entities
+from server.database.filter import PrimitiveFilter
+from server.database.paging import PagingNoLimit
+from server.services.batch_loader import BatchLoader
+
+MOCK_USER_ATTRSET = [
+    dict(userId='1', displayName='alice'),
+    dict(userId='2', displayName='bobby'),
+    dict(userId='3', displayName='charlie'),
+]
+
+
+def createEqFilter(values):
+    return PrimitiveFilter.createFilter(dict(field='userId', operator='eq', value=values))
+
+
+@pytest.fixture(scope='function')
+def repo():
+    repo = mocks.createMockRepo()
+    repo.searchUser.return_value = dict(
+        users=create_mock_entities(MOCK_USER_ATTRSET), returnCount=3, matchedCount=3
+    )
+
+    return repo
+
+
+@pytest.fixture(scope='function')
+def loader(repo):
+    return BatchLoader(repo.searchUser, 'users', 'userId', PrimitiveFilter)
+
+
+class TestBatchLoader:
+    def test_dispatchShouldSearchRequestedKeysOnceWithoutDuplicates(self, loader, repo):
+        loader.request([ '1', '2', '1' ])
+        loader.request([ '2', '3', None ])
+
+        loader.dispatch()
+
+        assert repo.searchUser.call_count == 1
+        passed_filter, *_ = repo.searchUser.call_args[0]
+        assert passed_filter == createEqFilter([ '1', '2', '3' ])
+        assert isinstance(repo.searchUser.call_args[1]['paging'], PagingNoLimit)
+
+    def test_dispatchShouldNotSearchWhenNothingWasRequested(self, loader, repo):
+        assert loader.dispatch() == []
+        assert repo.searchUser.call_count == 0
+
+    def test_dispatchShouldNotSearchKeysAlreadyLoaded(self, loader, repo):
+        loader.request([ '1', '2' ])
+        loader.dispatch()
+
+        loader.request([ '2', '4' ])
+        loader.dispatch()
+
+        assert repo.searchUser.call_count == 2
+        passed_filter, *_ = repo.searchUser.call_args[0]
+        assert passed_filter == createEqFilter([ '4' ])
+
+    def test_getShouldReturnEntitiesOfKey(self, loader):
+        loader.request([ '1', '2', '3', 'nonexistant' ])
+        loader.dispatch()
+
+        assert [ user.displayName for user in loader.get('2') ] == [ 'bobby' ]
+        assert loader.get('nonexistant') == []
+        assert loader.get(None) == []
+
+    def test_joinShouldAddRelatedEntitiesByKey(self, loader):
+        posts = create_mock_entities([
+            dict(postId='10', userId='1'),
+            dict(postId='11', userId='3'),
+            dict(postId='12', userId='nonexistant'),
+        ])
+        loader.request( post.userId for post in posts )
+        loader.dispatch()
+
+        loader.join(posts, 'userId', 'owner')
+
+        assert [ user.userId for user in posts[0].owner ] == [ '1' ]
+        assert [ user.userId for user in posts[1].owner ] == [ '3' ]
+        assert posts[2].owner == []
+
+    def test_joinShouldNotShareRelationListsAmongEntities(self, loader):
+        posts = create_mock_entities([
+            dict(postId='10', userId='1'),
+            dict(postId='11', userId='1'),
+        ])
+        loader.request([ '1' ])
+        loader.dispatch()
+
+        loader.join(posts, 'userId', 'owner')
+
+        assert posts[0].owner is not posts[1].owner
@@ -39,6 +39,14 @@ class TestUserDeleteService:
         argPassed, *_ = mock_repo.deleteUser.call_args[0]
         assert argPassed == expectedFilter
 
+    def test_deleteUserByIdShouldInvalidateCachedUser(self, delete_service):
+        user_cache = mocks.createMockUserCache()
+        service = DeleteService(delete_service._repo, delete_service._session, user_cache)
+
+        service.deleteUserById(TEST_DEFAULT_USERID)
+
+        user_cache.invalidate.assert_called_once_with(TEST_DEFAULT_USERID)
+
     def test_deleteUserByIdShouldRaiseExceptionWhenNoId(self, delete_service):
         no_id_patterns = [None, '', ]
 
@@ -167,6 +175,16 @@ class TestPostDeleteService:
 
         assert rv == service_return
 
+    def test_deletePostByIdShouldRemovePostFromSearchIndex(self, delete_service):
+        search_index = mocks.createMockSearchIndex()
+        service = DeleteService(
+            delete_service._repo, delete_service._session, searchIndex=search_index
+        )
+
+        service.deletePostById(TEST_DEFAULT_POSTID)
+
+        search_index.remove.assert_called_once_with('posts', TEST_DEFAULT_POSTID)
+
 
 class TestThreadDeleteService:
     THREAD_ATTRSET = [
@@ -249,3 +267,13 @@ class TestThreadDeleteService:
         rv = delete_service.deleteThreadById(TEST_DEFAULT_THREADID)
 
         assert rv == service_return
+
+    def test_deleteThreadByIdShouldRemoveThreadFromSearchIndex(self, delete_service):
+        search_index = mocks.createMockSearchIndex()
+        service = DeleteService(
+            delete_service._repo, delete_service._session, searchIndex=search_index
+        )
+
+        service.deleteThreadById(TEST_DEFAULT_THREADID)
+
+        search_index.remove.assert_called_once_with('threads', TEST_DEFAULT_THREADID)
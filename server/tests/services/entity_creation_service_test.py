@@ -184,6 +184,16 @@ class TestCreateNewPost:
         assert getattr(update_thread, 'increment') == 'postCount'
         assert getattr(update_thread, 'lastPostId') == result['createdId']
 
+    def test_createNewPostShouldIndexPostForSearch(self, service, mock_post):
+        search_index = mocks.createMockSearchIndex()
+        service = EntityCreationService(
+            service._repo, service._filter, service._session, search_index
+        )
+
+        result = service.createNewPost(mock_post)
+
+        search_index.add.assert_called_once_with('posts', result['createdId'], mock_post)
+
 
 class TestCreateNewThread:
     DEFAULT_ATTRS = dict(
@@ -234,3 +244,13 @@ class TestCreateNewThread:
         result = service.createNewThread(mock_thread)
         
         assert result == CREATE_THREAD_RETURN
+
+    def test_createNewThreadShouldIndexThreadForSearch(self, service, mock_thread):
+        search_index = mocks.createMockSearchIndex()
+        service = EntityCreationService(
+            service._repo, service._filter, service._session, search_index
+        )
+
+        result = service.createNewThread(mock_thread)
+
+        search_index.add.assert_called_once_with('threads', result['createdId'], mock_thread)
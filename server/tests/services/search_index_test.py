@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for search_index.py
+"""
+import pytest
+
+from server.services.search_index import tokenize, PostingList, InvertedIndex, SearchIndex
+from server.database.paging import PagingNoLimit
+import tests.mocks as mocks
+from tests.helpers import create_mock_entities, create_mock_entity_fromattrs
+
+
+class TestTokenize:
+    @pytest.mark.parametrize('text, expected', [
+        ('Hello, World!', [ 'hello', 'world' ]),
+        ('snake_case 42', [ 'snake', 'case', '42' ]),
+        ('ＦＵＬＬ width', [ 'full', 'width' ]),
+        ('世界', [ '世界' ]),
+        ('こんにちは', [ 'こん', 'んに', 'にち', 'ちは' ]),
+        ('ｶﾀｶﾅ', [ 'カタ', 'タカ', 'カナ' ]),
+        ('日本語 text', [ '日本', '本語', 'text' ]),
+        ('abc日本', [ 'abc', '日本' ]),
+        ('字', [ '字' ]),
+        ('', []),
+    ])
+    def test_tokenizeShouldSplitWordsAndCjkBigrams(self, text, expected):
+        assert tokenize(text) == expected
+
+    def test_tokenizeShouldAddCjkUnigramsWhenRequested(self):
+        assert tokenize('日本語 text', withUnigrams=True) == [
+            '日本', '本語', '日', '本', '語', 'text'
+        ]
+
+
+class TestPostingList:
+    def test_postingListShouldDecodeAppendedOrdinals(self):
+        postings = PostingList()
+        for ordinal, frequency in [ (0, 1), (3, 2), (10, 1) ]:
+            postings.append(ordinal, frequency)
+
+        assert list(postings) == [ (0, 1), (3, 2), (10, 1) ]
+        assert list(postings._deltas) == [ 0, 3, 7 ]
+
+    def test_postingListShouldRejectDescendingOrdinal(self):
+        postings = PostingList()
+        postings.append(5, 1)
+
+        with pytest.raises(ValueError):
+            postings.append(4, 1)
+
+    def test_postingListShouldCapFrequency(self):
+        postings = PostingList()
+        postings.append(0, PostingList.MAX_FREQUENCY + 1)
+
+        assert list(postings) == [ (0, PostingList.MAX_FREQUENCY) ]
+
+
+class TestInvertedIndex:
+    @pytest.fixture(scope='function')
+    def index(self):
+        index = InvertedIndex()
+        index.add('0', 'hello world')
+        index.add('1', 'hello hello hello')
+        index.add('2', 'goodbye world, and hello to a world of long documents')
+        index.add('3', 'unrelated')
+        return index
+
+    def test_searchShouldRankByTermFrequency(self, index):
+        assert [ documentId for documentId, _ in index.search('hello', 10)[0] ] == [ '1', '0', '2' ]
+
+    def test_searchShouldRankRareTermsHigher(self, index):
+        documents, _ = index.search('goodbye hello', 10)
+
+        assert documents[0][0] == '2'
+
+    def test_searchShouldMatchSingleCjkCharacterInsideLongerRuns(self):
+        index = InvertedIndex()
+        index.add('0', '黒い猫が好き')
+        index.add('1', '犬が好き')
+
+        documents, matchedCount = index.search('猫', 10)
+
+        assert [ documentId for documentId, _ in documents ] == [ '0' ]
+        assert matchedCount == 1
+
+    def test_searchShouldLimitResults(self, index):
+        documents, matchedCount = index.search('hello world', 2)
+
+        assert len(documents) == 2
+        assert matchedCount == 3
+
+    def test_searchShouldReturnNothingForUnknownTerms(self, index):
+        assert index.search('missing', 10) == ([], 0)
+
+    def test_removedDocumentsShouldNotBeFound(self, index):
+        index.remove('1')
+
+        assert [ documentId for documentId, _ in index.search('hello', 10)[0] ] == [ '0', '2' ]
+        assert len(index) == 3
+
+    def test_addShouldReplaceIndexedText(self, index):
+        index.add('0', 'replaced')
+
+        assert [ documentId for documentId, _ in index.search('replaced', 10)[0] ] == [ '0' ]
+        assert '0' not in [ documentId for documentId, _ in index.search('world', 10)[0] ]
+
+    def test_compactShouldDropRemovedDocumentsFromPostings(self, index):
+        index.remove('1')
+        index.remove('3')
+
+        assert index._deletedCount == 0
+        assert index._ids == [ '0', '2' ]
+        assert 'unrelated' not in index._postings
+        assert [ documentId for documentId, _ in index.search('hello', 10)[0] ] == [ '0', '2' ]
+
+
+class TestSearchIndex:
+    POST_ATTRSET = [
+        dict(postId='0', content='hello world'),
+        dict(postId='1', content='こんにちは世界'),
+    ]
+    THREAD_ATTRSET = [
+        dict(threadId='0', title='news', subject='hello'),
+    ]
+
+    @pytest.fixture(scope='function')
+    def repo(self):
+        repo = mocks.createMockRepo()
+        repo.searchPost.return_value = dict(posts=create_mock_entities(self.POST_ATTRSET))
+        repo.searchThread.return_value = dict(threads=create_mock_entities(self.THREAD_ATTRSET))
+        return repo
+
+    def test_buildShouldIndexAllPostsAndThreads(self, repo):
+        searchIndex = SearchIndex()
+
+        searchIndex.build(repo)
+
+        assert searchIndex.isReady()
+        assert searchIndex.search('posts', [ '世界' ]) == ([ '1' ], 1)
+        assert searchIndex.search('threads', [ 'news', 'hello' ]) == ([ '0' ], 1)
+
+    def test_buildShouldOnlyFetchIndexedFields(self, repo):
+        SearchIndex().build(repo)
+
+        options = repo.searchPost.call_args[1]
+        assert isinstance(options['paging'], PagingNoLimit)
+        assert options['projection'].getRequestedFields() == [ 'postId', 'content' ]
+
+    def test_addAndRemoveShouldUpdateIndex(self):
+        searchIndex = SearchIndex()
+        thread = create_mock_entity_fromattrs(dict(title='title', subject='subject'))
+
+        searchIndex.add('threads', '5', thread)
+        found, _ = searchIndex.search('threads', [ 'subject' ])
+        searchIndex.remove('threads', '5')
+
+        assert found == [ '5' ]
+        assert searchIndex.search('threads', [ 'subject' ]) == ([], 0)
+
+    def test_searchShouldReturnAtMostMaxResults(self):
+        searchIndex = SearchIndex(maxResults=2)
+        for postId in range(5):
+            searchIndex.add('posts', str(postId), create_mock_entity_fromattrs(dict(content='a')))
+
+        postIds, matchedCount = searchIndex.search('posts', [ 'a' ])
+
+        assert len(postIds) == 2
+        assert matchedCount == 5
+
+    def test_searchShouldReturnUpToLimitIds(self):
+        searchIndex = SearchIndex(maxResults=2)
+        for postId in range(5):
+            searchIndex.add('posts', str(postId), create_mock_entity_fromattrs(dict(content='a')))
+
+        assert len( searchIndex.search('posts', [ 'a' ], limit=4)[0] ) == 4
+
+    def test_coversUpdateShouldCheckIndexedFields(self):
+        searchIndex = SearchIndex()
+
+        assert searchIndex.coversUpdate('threads', create_mock_entity_fromattrs(dict(title='t')))
+        assert not searchIndex.coversUpdate('threads', create_mock_entity_fromattrs(dict(views=1)))
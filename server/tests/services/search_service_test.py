@@ -2,15 +2,21 @@
 """
 This file houses test code for search_service.py
 """
+
 import pytest
 from unittest.mock import ANY
 
-from server.database.sorter import AscendingSorter, DescendingSorter, NullSorter
+from server.database.sorter import AscendingSorter, DescendingSorter, NullSorter, RelevanceSorter
+from server.database.paging import Paging, CursorPaging, PagingNoLimit
+from server.database.projection import Projection
 from server.services.search_service import SearchService
+from server.services.search_index import SearchIndex
+from server.services.searchfilter_creator import SearchFilterCreator
 from server.database.filter import PrimitiveFilter
 from server.database.aggregate_filter import AggregateFilter
 import tests.mocks as mocks
 from tests.mocks import createMockEntity
+from server.entity import Post, Thread
 from tests.helpers import create_mock_entities
 
 
@@ -90,6 +96,17 @@ class TestSearchUsersByKeyValues:
             ANY, paging=ANY, sorter=expectedSorter
         )
 
+    def test_searchUserByKeyValuesShouldPassRelevanceSorterToRepoWhenSortedByRelevance(self, service):
+        mockRepo = service._repo
+        keyValues = self.DEFAULT_KEYVALUES.copy()
+        keyValues['sortBy'] = 'relevance'
+
+        service.searchUsersByKeyValues(keyValues)
+
+        mockRepo.searchUser.assert_called_with(
+            ANY, paging=ANY, sorter=RelevanceSorter()
+        )
+
     def test_searchUserByKeyValuesShouldPassDescSorterToRepoWhenSpecifiedSortByAndDescOrder(self, service):
         mockRepo = service._repo
         keyValues = self.DEFAULT_KEYVALUES.copy()
@@ -193,6 +210,42 @@ class TestSearchPostsByKeyValues:
             sorter=expectedSorter
         )
 
+    def test_searchPostsByKeyValuesShouldPassCursorPagingWhenAfterInKeyValues(self, service):
+        mockRepo = service._repo
+        keyValues = self.DEFAULT_KEYVALUES.copy()
+        keyValues['after'] = ''
+
+        service.searchPostsByKeyValues(keyValues)
+
+        passed_paging = mockRepo.searchPost.call_args_list[0][1]['paging']
+        assert isinstance(passed_paging, CursorPaging)
+        assert passed_paging.getKeyset() is None
+
+    def test_searchPostsByKeyValuesShouldReturnNextCursor(self, service):
+        repo = service._repo
+        repo.searchPost.return_value['nextCursor'] = 'next_cursor'
+
+        result = service.searchPostsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        assert result['nextCursor'] == 'next_cursor'
+
+    def test_searchPostsByKeyValuesShouldPassProjectionWhenFieldsInKeyValues(self, service):
+        keyValues = dict(fields='content,owner')
+
+        service.searchPostsByKeyValues(keyValues)
+
+        projection = service._repo.searchPost.call_args[1]['projection']
+        assert projection.getRequestedFields() == [ 'content', 'owner' ]
+        assert projection.getFields(Post) == [ 'content', 'owner', 'userId' ]
+
+    def test_searchPostsByKeyValuesShouldNotSearchForOwnerWhenNotRequested(self, service):
+        keyValues = dict(fields='content')
+
+        service.searchPostsByKeyValues(keyValues)
+
+        assert service._repo.searchPost.call_args[1]['projection'] == Projection(keyValues)
+        assert service._repo.searchUser.call_count == 0
+
     def test_searchPostsByKeyValuesSearchesForOwnerId(self, service):
         repo = service._repo
         expected_filter = PrimitiveFilter.createFilter(dict(
@@ -348,6 +401,26 @@ class TestSearchThreadsByKeyValues:
             sorter=expectedSorter
         )
 
+    def test_searchThreadsByKeyValuesShouldPassCursorPagingWhenAfterInKeyValues(self, service):
+        mockRepo = service._repo
+        keyValues = self.DEFAULT_KEYVALUES.copy()
+        keyValues['after'] = CursorPaging.encodeCursor([ 1.0, '2222' ])
+
+        service.searchThreadsByKeyValues(keyValues)
+
+        passed_paging = mockRepo.searchThread.call_args[1]['paging']
+        assert isinstance(passed_paging, CursorPaging)
+        assert passed_paging.getKeyset() == [ 1.0, '2222' ]
+        assert service._paging.call_count == 0
+
+    def test_searchThreadsByKeyValuesShouldReturnNextCursor(self, service):
+        repo = service._repo
+        repo.searchThread.return_value['nextCursor'] = 'next_cursor'
+
+        result = service.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        assert result['nextCursor'] == 'next_cursor'
+
     def test_searchThreadsByKeyValuesShouldNotUpdateThreadViewCount(self, service):
         mockRepo = service._repo
 
@@ -358,7 +431,8 @@ class TestSearchThreadsByKeyValues:
 
     def test_searchThreadsByKeyValuesShouldGenerateSearchForOwnerUser(self, service):
         mockRepo = service._repo
-        owner_ids = [ attrs['userId'] for attrs in self.MOCK_THREAD_ATTRSET ]
+        # owners of last posts are searched along with owners of threads
+        owner_ids = [ attrs['userId'] for attrs in self.MOCK_THREAD_ATTRSET ] + [ '33333333' ]
         expected_filter = PrimitiveFilter.createFilter(dict(
             field='userId',
             operator='eq',
@@ -379,7 +453,7 @@ class TestSearchThreadsByKeyValues:
         ]
         mock_threads = create_mock_entities(thread_attrs)
         repo.searchThread.return_value = create_return_from_repo(mock_threads, 'threads')
-        owner_ids = [ attrs['userId'] for attrs in thread_attrs ]
+        owner_ids = [ attrs['userId'] for attrs in thread_attrs ] + [ '33333333' ]
         expected_filter = PrimitiveFilter.createFilter(dict(
             field='userId',
             operator='eq',
@@ -451,6 +525,50 @@ class TestSearchThreadsByKeyValues:
         passed_filter, *_ = repo.searchPost.call_args_list[0][0]
         assert passed_filter == expected_filter
 
+    def test_searchThreadsByKeyValuesShouldSearchEachRelationOnce(self, service):
+        repo = service._repo
+        thread_attrs = [
+            dict(threadId=f'test_{idx}', userId=f'user_{idx % 3}', lastPostId=f'post_{idx}')
+            for idx in range(50)
+        ]
+        post_attrs = [
+            dict(postId=f'post_{idx}', userId=f'user_{idx % 5}')
+            for idx in range(50)
+        ]
+        repo.searchThread.return_value = create_return_from_repo(
+            create_mock_entities(thread_attrs), 'threads'
+        )
+        repo.searchPost.return_value = create_return_from_repo(
+            create_mock_entities(post_attrs), 'posts'
+        )
+        expected_filter = PrimitiveFilter.createFilter(dict(
+            field='userId',
+            operator='eq',
+            value=[ 'user_0', 'user_1', 'user_2', 'user_3', 'user_4' ]
+        ))
+
+        service.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        assert repo.searchPost.call_count == 1
+        assert repo.searchUser.call_count == 1
+        passed_filter, *_ = repo.searchUser.call_args[0]
+        assert passed_filter == expected_filter
+
+    def test_searchThreadsByKeyValuesShouldSearchRelationsWithoutPagingLimit(self, service):
+        repo = service._repo
+
+        service.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        assert isinstance(repo.searchPost.call_args[1]['paging'], PagingNoLimit)
+        assert isinstance(repo.searchUser.call_args[1]['paging'], PagingNoLimit)
+
+    def test_searchThreadsByKeyValuesShouldJoinOwnerOfLastPost(self, service):
+        result = service.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        lastpost = result['threads'][0].lastPost[0]
+        assert len(lastpost.owner) == 1
+        assert lastpost.owner[0].userId == lastpost.userId
+
     def test_searchThreadsByKeyValuesShouldNotSearchForLastPostOrOwnerWhenNoThreadReturned(self, service):
         repo = service._repo
         repo.searchThread.return_value = create_return_from_repo([], 'threads')
@@ -504,6 +622,35 @@ class TestSearchThreadsByKeyValues:
         for thread in result['threads']:
             lastposts = getattr(thread, 'lastPost')
             assert len(lastposts) == 0
+
+    def test_searchThreadsByKeyValuesShouldOnlyJoinRequestedRelations(self, service):
+        repo = service._repo
+
+        result = service.searchThreadsByKeyValues(dict(fields='title,lastPost'))
+
+        projection = repo.searchThread.call_args[1]['projection']
+        assert projection.getFields(Thread) == [ 'lastPost', 'title', 'lastPostId' ]
+        assert repo.searchPost.call_count == 1
+        # owner of last post is still joined
+        assert repo.searchUser.call_count == 1
+        assert not hasattr(result['threads'][0], 'owner')
+
+    def test_searchThreadsByKeyValuesShouldLetRepoJoinRelationsWhenSupported(self, service):
+        repo = mocks.createMockJoiningRepo()
+        repo.searchThreadWithRelations.return_value = service._repo.searchThread.return_value
+        joiningService = SearchService(
+            repo, service._searchFilterCreator, PrimitiveFilter, AggregateFilter, service._paging
+        )
+
+        result = joiningService.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        repo.searchThreadWithRelations.assert_called_once_with(
+            self.MOCK_SEARCHFILTER, paging=self.MOCKPAGING_DEFAULT_RETURN, sorter=ANY
+        )
+        assert repo.searchThread.call_count == 0
+        assert repo.searchUser.call_count == 0
+        assert repo.searchPost.call_count == 0
+        assert result['returnCount'] == len(self.MOCK_THREAD_ATTRSET)
             
 
 class TestSearchThreadByExplicitId:
@@ -582,6 +729,18 @@ class TestSearchThreadByExplicitId:
         _, update = mockRepo.updateThread.call_args[0]
         assert getattr(update, 'increment') == 'views'
 
+    def test_searchThreadByExplicitIdShouldBufferViewWhenViewCounterGiven(self, service):
+        viewCounter = mocks.createMockViewCounter()
+        bufferingService = SearchService(
+            service._repo, service._searchFilterCreator, PrimitiveFilter, AggregateFilter,
+            service._paging, viewCounter
+        )
+
+        bufferingService.searchThreadByExplicitId(self.DEFAULT_THREAD_ID)
+
+        viewCounter.increment.assert_called_once_with(self.DEFAULT_THREAD_ID)
+        assert service._repo.updateThread.call_count == 0
+
     def test_searchThreadByExplicitIdShouldGenerateSearchForOwnerUser(self, service):
         mockRepo = service._repo
         owner_ids = [ attrs['userId'] for attrs in self.MOCK_THREAD_ATTRSET ]
@@ -630,7 +789,229 @@ class TestSearchThreadByExplicitId:
             assert getattr(owner[0], k) == v
 
 
+class TestSearchThreadsWithLastPostOwners:
+    DEFAULT_KEYVALUES = dict(search='test_search')
+    MOCK_THREAD_ATTRSET = [
+        dict(threadId='2222', userId='11111111', lastPostId='1234'),
+    ]
+    MOCK_POST_ATTRSET = [
+        dict(postId='1234', userId='33333333'),
+    ]
+
+    @pytest.fixture(scope='function')
+    def service(self):
+        mockRepo = mocks.createMockRepo()
+        mockSearchCreator = mocks.createMockSearchFilterCreatorService()
+        mockPaging = mocks.createMockPaging()
+        mockRepo.searchThread.return_value = create_return_from_repo(
+            create_mock_entities(self.MOCK_THREAD_ATTRSET), 'threads'
+        )
+        mockRepo.searchPost.return_value = create_return_from_repo(
+            create_mock_entities(self.MOCK_POST_ATTRSET), 'posts'
+        )
+        mockRepo.searchUser.side_effect = searchMockUsers
+
+        yield SearchService(
+            mockRepo, mockSearchCreator, PrimitiveFilter, AggregateFilter, mockPaging
+        )
+
+    def test_searchThreadsByKeyValuesShouldSearchOwnersOfThreadsAndLastPostsAtOnce(self, service):
+        repo = service._repo
+
+        result = service.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        assert repo.searchUser.call_count == 1
+        passed_filter, *_ = repo.searchUser.call_args[0]
+        assert passed_filter == createUserIdFilter([ '11111111', '33333333' ])
+        thread = result['threads'][0]
+        assert [ user.userId for user in thread.owner ] == [ '11111111' ]
+        assert [ user.userId for user in thread.lastPost[0].owner ] == [ '33333333' ]
+
+    def test_searchThreadsByKeyValuesShouldSearchOwnerSharedWithLastPostOnce(self, service):
+        repo = service._repo
+        repo.searchPost.return_value = create_return_from_repo(
+            create_mock_entities([ dict(postId='1234', userId='11111111') ]), 'posts'
+        )
+
+        result = service.searchThreadsByKeyValues(self.DEFAULT_KEYVALUES)
+
+        assert repo.searchUser.call_count == 1
+        passed_filter, *_ = repo.searchUser.call_args[0]
+        assert passed_filter == createUserIdFilter([ '11111111' ])
+        thread = result['threads'][0]
+        assert [ user.userId for user in thread.lastPost[0].owner ] == [ '11111111' ]
+
+
+class TestSearchThroughSearchIndex:
+    POST_ROWS = [
+        dict(postId='0', threadId='1', userId='1', content='hello world'),
+        dict(postId='1', threadId='1', userId='2', content='hello hello hello'),
+        dict(postId='2', threadId='2', userId='1', content='goodbye world'),
+        dict(postId='3', threadId='2', userId='2', content='こんにちは世界'),
+    ]
+    THREAD_ROWS = [
+        dict(threadId='1', userId='1', title='hello', subject='greetings', lastPostId=None),
+        dict(threadId='2', userId='2', title='world news', subject='hello world', lastPostId=None),
+    ]
+
+    @pytest.fixture(scope='function')
+    def searchIndex(self):
+        searchIndex = SearchIndex()
+        searchIndex.build(self.createRepo(mocks.createMockRepo()))
+        return searchIndex
+
+    @pytest.fixture(scope='function')
+    def service(self, searchIndex):
+        return SearchService(
+            self.createRepo(mocks.createMockRepo()), SearchFilterCreator,
+            PrimitiveFilter, AggregateFilter, Paging, searchIndex=searchIndex,
+        )
+
+    def createRepo(self, repo):
+        repo.searchPost.side_effect = self.createSearch(self.POST_ROWS, 'posts')
+        repo.searchThread.side_effect = self.createSearch(self.THREAD_ROWS, 'threads')
+        repo.searchUser.side_effect = searchMockUsers
+        return repo
+
+    def createSearch(self, rows, entityName):
+        def search(searchFilter, **options):
+            matched = [ row for row in rows if searchFilter is None or searchFilter.matches(row) ]
+            return create_return_from_repo(create_mock_entities(matched), entityName)
+        return search
+
+    def test_searchPostsShouldRankPostsByRelevance(self, service):
+        result = service.searchPostsByKeyValues(dict(search='hello'))
+
+        assert [ post.postId for post in result['posts'] ] == [ '1', '0' ]
+        assert result['matchedCount'] == 2
+
+    def test_searchPostsShouldFetchPostsInSingleEqFilter(self, service):
+        service.searchPostsByKeyValues(dict(search='hello', limit=1))
+
+        service._repo.searchPost.assert_called_once()
+        passedFilter = service._repo.searchPost.call_args[0][0]
+        assert passedFilter.getMongoFilter() == { 'postId': { '$in': [ '1' ] } }
+
+    def test_searchPostsShouldPageRankedPosts(self, service):
+        result = service.searchPostsByKeyValues(dict(search='hello world', offset=1, limit=2))
+
+        assert [ post.postId for post in result['posts'] ] == [ '1', '2' ]
+        assert result['returnCount'] == 2
+        assert result['matchedCount'] == 3
+
+    def test_searchPostsShouldMatchCjkByBigrams(self, service):
+        result = service.searchPostsByKeyValues(dict(search='世界'))
+
+        assert [ post.postId for post in result['posts'] ] == [ '3' ]
+
+    def test_searchPostsShouldApplyOtherCriterias(self, service):
+        result = service.searchPostsByKeyValues(dict(search='world', threadId='2', limit=1))
+
+        assert [ post.postId for post in result['posts'] ] == [ '2' ]
+        assert result['matchedCount'] == 1
+
+    def test_searchPostsShouldOnlyFetchPageOfNarrowedPosts(self, service):
+        result = service.searchPostsByKeyValues(dict(search='hello', threadId='1', limit=1))
+
+        assert [ post.postId for post in result['posts'] ] == [ '1' ]
+        assert result['matchedCount'] == 2
+        idsCall, pageCall = service._repo.searchPost.call_args_list
+        assert idsCall[1]['projection'].getRequestedFields() == [ 'postId' ]
+        assert pageCall[0][0].matches(dict(postId='1', threadId='1'))
+        assert not pageCall[0][0].matches(dict(postId='0', threadId='1'))
+
+    def test_searchPostsShouldLetRepoSortBySortField(self, service):
+        service.searchPostsByKeyValues(dict(search='hello', sortBy='createdAt', order='desc'))
+
+        passedFilter = service._repo.searchPost.call_args[0][0]
+        assert passedFilter.matches(dict(postId='0'))
+        assert not passedFilter.matches(dict(postId='2'))
+        assert service._repo.searchPost.call_args[1]['sorter'] == DescendingSorter('createdAt')
+
+    def test_searchPostsShouldNotSearchRepoWhenNothingMatched(self, service):
+        result = service.searchPostsByKeyValues(dict(search='nothing'))
+
+        assert result['posts'] == []
+        assert result['matchedCount'] == 0
+        assert service._repo.searchPost.call_count == 0
+
+    def test_searchPostsShouldSearchRepoUntilIndexIsBuilt(self):
+        repo = self.createRepo(mocks.createMockRepo())
+        service = SearchService(
+            repo, SearchFilterCreator, PrimitiveFilter, AggregateFilter, Paging,
+            searchIndex=SearchIndex(),
+        )
+
+        result = service.searchPostsByKeyValues(dict(search='hello'))
+
+        assert [ post.postId for post in result['posts'] ] == [ '0', '1' ]
+
+    @pytest.fixture(scope='function')
+    def cappedService(self, service):
+        searchIndex = SearchIndex(maxResults=1)
+        searchIndex.build(service._repo)
+        service._searchIndex = searchIndex
+        service._repo.reset_mock()
+        return service
+
+    def test_searchPostsShouldCountMatchesBeyondMaxResults(self, cappedService):
+        result = cappedService.searchPostsByKeyValues(dict(search='hello world', offset=2, limit=1))
+
+        assert [ post.postId for post in result['posts'] ] == [ '2' ]
+        assert result['matchedCount'] == 3
+
+    def test_searchPostsShouldFallBackToFuzzyFilterWhenSortedMatchesExceedMaxResults(
+        self, cappedService
+    ):
+        result = cappedService.searchPostsByKeyValues(dict(search='hello', sortBy='createdAt'))
+
+        passedFilter = cappedService._repo.searchPost.call_args[0][0]
+        assert passedFilter == SearchFilterCreator.create_postsearch(
+            dict(search='hello', sortBy='createdAt')
+        )
+        assert result['matchedCount'] == 2
+
+    def test_searchPostsShouldFallBackToFuzzyFilterWhenNarrowedMatchesExceedMaxResults(
+        self, cappedService
+    ):
+        result = cappedService.searchPostsByKeyValues(dict(search='hello', threadId='1'))
+
+        assert sorted( post.postId for post in result['posts'] ) == [ '0', '1' ]
+        assert result['matchedCount'] == 2
+
+    def test_searchThreadsShouldRankThreadsByRelevance(self, service):
+        result = service.searchThreadsByKeyValues(dict(search='hello world'))
+
+        assert [ thread.threadId for thread in result['threads'] ] == [ '2', '1' ]
+
+    def test_searchThreadsShouldLetJoiningRepoFetchThreads(self, searchIndex):
+        repo = mocks.createMockJoiningRepo()
+        repo.searchThreadWithRelations.side_effect = self.createSearch(self.THREAD_ROWS, 'threads')
+        service = SearchService(
+            repo, SearchFilterCreator, PrimitiveFilter, AggregateFilter, Paging,
+            searchIndex=searchIndex,
+        )
+
+        result = service.searchThreadsByKeyValues(dict(search='greetings'))
+
+        assert [ thread.threadId for thread in result['threads'] ] == [ '1' ]
+        assert repo.searchThread.call_count == 0
+
+
 # helper functions
+def searchMockUsers(searchFilter, **kwargs):
+    """
+    Returns mock users with userIds matched by searchFilter
+    """
+    userIds = searchFilter.getMongoFilter()['userId']['$in']
+    users = create_mock_entities([ dict(userId=userId) for userId in userIds ])
+    return create_return_from_repo(users, 'users')
+
+
+def createUserIdFilter(userIds):
+    return PrimitiveFilter.createFilter(dict(field='userId', operator='eq', value=userIds))
+
+
 def create_return_from_repo(entities, entity_name):
     return {
         entity_name: entities,
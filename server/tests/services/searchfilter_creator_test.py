@@ -5,7 +5,9 @@ This file houses tests for searchfilter_creator.py
 
 import pytest
 
-from server.services.searchfilter_creator import SearchFilterCreator
+from server.services.searchfilter_creator import (
+    SearchFilterCreator, sanitize_search_terms, MAX_SEARCH_TERMS, MAX_SEARCH_TERM_LENGTH,
+)
 from server.database.filter import PrimitiveFilter, FuzzyStringFilter
 from server.database.aggregate_filter import AggregateFilter, OrFilter, AndFilter
 from server.entity import User, Post, Thread
@@ -318,3 +320,23 @@ class TestThreadSearchFilter:
 
         narrowing_filters = result_filter._filters[1]._filters
         assert len(narrowing_filters) == 0
+
+
+class TestSanitizeSearchTerms:
+    def test_emptyTermsFromRepeatedSpacesShouldBeDropped(self):
+        assert sanitize_search_terms('  hello   world\t ') == [ 'hello', 'world' ]
+
+    def test_duplicatedTermsShouldBeDropped(self):
+        assert sanitize_search_terms('b a b a c') == [ 'b', 'a', 'c' ]
+
+    def test_numberAndLengthOfTermsShouldBeBounded(self):
+        terms = [ f'term{idx}' for idx in range(MAX_SEARCH_TERMS + 5) ]
+        longTerm = 'x' * (MAX_SEARCH_TERM_LENGTH * 2)
+
+        assert sanitize_search_terms(' '.join(terms)) == terms[:MAX_SEARCH_TERMS]
+        assert sanitize_search_terms(longTerm) == [ 'x' * MAX_SEARCH_TERM_LENGTH ]
+
+    def test_searchWithOnlySpacesShouldCreateEmptyFuzzyFilter(self):
+        result_filter = SearchFilterCreator.create_postsearch({ 'search': '   ' })
+
+        assert len(result_filter._filters[0]._filters) == 0
@@ -7,6 +7,7 @@ import pytest
 import tests.mocks as mocks
 from tests.helpers import create_mock_entity_fromattrs
 from server.services.session import SessionService
+from server.services.user_cache import UserCache
 from server.database.filter import PrimitiveFilter
 
 DEFAULT_USER = create_mock_entity_fromattrs({
@@ -141,3 +142,77 @@ class TestSessionService:
             SessionService.REQUEST_USER_KEY,
             user_from_repo,
         )
+
+
+class TestSessionServiceWithUserCache:
+    @pytest.fixture(scope='function')
+    def cached_session_service(self, session_service):
+        return SessionService(session_service._repo, session_service._context, UserCache())
+
+    def test_populate_request_userShouldSearchRepoOnlyOnceForSameUser(self, cached_session_service):
+        context = cached_session_service._context
+        context.read_session.return_value = DEFAULT_USER.userId
+        repo = cached_session_service._repo
+        repo.searchUser.return_value = dict(users=[ DEFAULT_USER ])
+
+        cached_session_service.populate_request_user()
+        cached_session_service.populate_request_user()
+
+        assert repo.searchUser.call_count == 1
+        context.write_global.assert_called_with(SessionService.REQUEST_USER_KEY, DEFAULT_USER)
+        assert cached_session_service._user_cache.getStats()['hits'] == 1
+
+    def test_populate_request_userShouldNotCacheUserInvalidatedDuringSearch(
+        self, cached_session_service
+    ):
+        context = cached_session_service._context
+        context.read_session.return_value = DEFAULT_USER.userId
+        repo = cached_session_service._repo
+        user_cache = cached_session_service._user_cache
+
+        def searchUser(searchFilter):
+            # user is updated by another request before the found user is cached
+            user_cache.invalidate(DEFAULT_USER.userId)
+            return dict(users=[ DEFAULT_USER ])
+        repo.searchUser.side_effect = searchUser
+
+        cached_session_service.populate_request_user()
+
+        assert user_cache.get(DEFAULT_USER.userId) is None
+
+    def test_populate_request_userShouldPinAnonymousUser(self, cached_session_service):
+        context = cached_session_service._context
+        context.read_session.return_value = None
+        repo = cached_session_service._repo
+
+        cached_session_service.populate_request_user()
+        cached_session_service._user_cache._clock = lambda: float('inf')
+        cached_session_service.populate_request_user()
+
+        assert repo.searchUser.call_count == 1
+        context.write_global.assert_called_with(SessionService.REQUEST_USER_KEY, ANONYMOUS_USER)
+
+
+class TestSessionServiceWithAnonymousUser:
+    def test_populate_request_userShouldNotSearchRepoForLoadedAnonymousUser(self, session_service):
+        context = session_service._context
+        context.read_session.return_value = None
+        repo = session_service._repo
+
+        session_service.load_anonymous_user()
+        session_service.populate_request_user()
+        session_service.populate_request_user()
+
+        assert repo.searchUser.call_count == 1
+        context.write_global.assert_called_with(SessionService.REQUEST_USER_KEY, ANONYMOUS_USER)
+
+    def test_loadAnonymousUserShouldLeaveLookupToRequestsWhenNotFound(self, session_service):
+        session_service._context.read_session.return_value = None
+        repo = session_service._repo
+        repo.searchUser.return_value = dict(users=[])
+
+        session_service.load_anonymous_user()
+        repo.searchUser.return_value = dict(users=[ ANONYMOUS_USER ])
+        session_service.populate_request_user()
+
+        assert repo.searchUser.call_count == 2
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for task_executor.py
+"""
+import time
+import threading
+
+import pytest
+
+from server.services.task_executor import TaskExecutor
+from server.exceptions import (
+    RecordNotFoundError, ServerMiscError, OperationTimeoutError
+)
+
+
+@pytest.fixture(scope='function')
+def executor():
+    executor = TaskExecutor(maxWorkers=4, timeout=2.0)
+    yield executor
+    executor.shutdown()
+
+
+class TestTaskExecutor:
+    def test_gatherShouldReturnResultsInOrderOfCalls(self, executor):
+        def delayed(value, delay):
+            return lambda: time.sleep(delay) or value
+
+        results = executor.gather([ delayed(1, 0.05), delayed(2, 0), delayed(3, 0.02) ])
+
+        assert results == [ 1, 2, 3 ]
+
+    def test_gatherShouldRunCallsConcurrently(self, executor):
+        # calls would never pass the barrier if they ran one after another
+        barrier = threading.Barrier(3, timeout=1.0)
+
+        results = executor.gather([ barrier.wait ] * 3)
+
+        assert sorted(results) == [ 0, 1, 2 ]
+
+    def test_gatherShouldReturnEmptyListWithoutCalls(self, executor):
+        assert executor.gather([]) == []
+
+    def test_gatherShouldPropagateMyAppException(self, executor):
+        def fail():
+            raise RecordNotFoundError('not found')
+
+        with pytest.raises(RecordNotFoundError):
+            executor.gather([ lambda: 1, fail ])
+
+    @pytest.mark.parametrize('callcount', [ 1, 2 ])
+    def test_gatherShouldRaiseOtherExceptionsAsServerMiscError(self, executor, callcount):
+        def fail():
+            raise ValueError('unexpected')
+
+        with pytest.raises(ServerMiscError):
+            executor.gather([ fail ] * callcount)
+
+    def test_gatherShouldRaiseTimeoutErrorWhenCallTakesTooLong(self, executor):
+        event = threading.Event()
+
+        start = time.monotonic()
+        with pytest.raises(OperationTimeoutError):
+            executor.gather([ lambda: event.wait(2.0), lambda: 1 ], timeout=0.1)
+        elapsed = time.monotonic() - start
+        event.set()
+
+        assert elapsed < 1.0
+
+    def test_timeoutShouldBeReportedWithStatusCode504(self):
+        assert OperationTimeoutError.getStatusCode() == 504
+
+    def test_gatherShouldRunNestedCallsInlineWithoutExhaustingPool(self):
+        executor = TaskExecutor(maxWorkers=2, timeout=2.0)
+
+        def nested(value):
+            return lambda: sum( executor.gather([ lambda: value, lambda: value ]) )
+
+        try:
+            results = executor.gather([ nested(1), nested(2), nested(3) ])
+        finally:
+            executor.shutdown()
+
+        assert results == [ 2, 4, 6 ]
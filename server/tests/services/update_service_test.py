@@ -11,6 +11,7 @@ import server.exceptions as exceptions
 from tests.helpers import create_mock_entities, create_mock_entity_fromattrs
 from server.database.filter import PrimitiveFilter
 from server.services.update_service import UpdateService
+from server.services.search_index import SearchIndex
 
 DEFAULT_SESSION_USER = create_mock_entity_fromattrs( dict(userId='test_user_id') )
 
@@ -62,6 +63,16 @@ class TestUserUpdateService:
 
         mock_repo.searchUser.assert_called_with(expectedFilter)
 
+    def test_updateUserShouldInvalidateCachedUser(self, setup_service):
+        user_cache = mocks.createMockUserCache()
+        service = UpdateService(
+            setup_service._repo, PrimitiveFilter, setup_service._session, user_cache
+        )
+
+        service.updateUser(self.DEFAULT_USER)
+
+        user_cache.invalidate.assert_called_once_with(self.DEFAULT_USER.userId)
+
     def test_updateUserShouldRaiseExceptionWhenReturnedOwnerNotMatchSession(self, setup_service):
         session_user = create_mock_entity_fromattrs( dict(userId='some_random_id') )
         setup_service._session.get_user.return_value = session_user
@@ -171,6 +182,18 @@ class TestPostUpdateService:
 
         assert result == self.DEFAULT_REPOUPDATE_RESULT
 
+    def test_updatePostShouldIndexUpdatedPostForSearch(self, setup_service):
+        search_index = SearchIndex()
+        search_index.add('posts', '0', create_mock_entity_fromattrs(dict(content='old')))
+        service = UpdateService(
+            setup_service._repo, PrimitiveFilter, setup_service._session, searchIndex=search_index
+        )
+
+        service.updatePost(self.DEFAULT_POST)
+
+        assert search_index.search('posts', [ 'old' ]) == ([], 0)
+        assert search_index.search('posts', [ 'test_post_1' ]) == ([ '0' ], 1)
+
 
 class TestThreadUpdateService:
     DEFAULT_REPOUPDATE_RESULT = 'default_result'
@@ -239,3 +262,27 @@ class TestThreadUpdateService:
         result = setup_service.updateThread(self.DEFAULT_THREAD)
 
         assert result == self.DEFAULT_REPOUPDATE_RESULT
+
+    def test_updateThreadShouldIndexUpdatedThreadForSearch(self, setup_service):
+        search_index = mocks.createMockSearchIndex()
+        search_index.coversUpdate.return_value = True
+        search_index.getIdField.return_value = 'threadId'
+        service = UpdateService(
+            setup_service._repo, PrimitiveFilter, setup_service._session, searchIndex=search_index
+        )
+
+        service.updateThread(self.DEFAULT_THREAD)
+
+        repo_thread = setup_service._repo.searchThread.return_value['threads'][0]
+        search_index.add.assert_called_once_with('threads', '0', repo_thread)
+
+    def test_updateThreadShouldNotSearchAgainWhenNoIndexedFieldUpdated(self, setup_service):
+        search_index = SearchIndex()
+        service = UpdateService(
+            setup_service._repo, PrimitiveFilter, setup_service._session, searchIndex=search_index
+        )
+        thread = create_mock_entity_fromattrs(dict(threadId='0', tags=[ 'tag' ]))
+
+        service.updateThread(thread)
+
+        assert setup_service._repo.searchThread.call_count == 1
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for user_cache.py
+"""
+import pytest
+
+from server.services.user_cache import UserCache
+from tests.helpers import create_mock_entity_fromattrs
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_user(userId):
+    return create_mock_entity_fromattrs(dict(userId=userId))
+
+
+@pytest.fixture(scope='function')
+def clock():
+    return FakeClock()
+
+
+class TestUserCache:
+    def test_getShouldReturnCachedUser(self, clock):
+        cache = UserCache(ttl=10, clock=clock)
+        user = create_user('1')
+
+        cache.put(user)
+
+        assert cache.get('1') is user
+        assert cache.getStats() == dict(hits=1, misses=0, size=1)
+
+    def test_getShouldMissUnknownUser(self, clock):
+        cache = UserCache(ttl=10, clock=clock)
+
+        assert cache.get('1') is None
+        assert cache.getStats()['misses'] == 1
+
+    def test_getShouldMissExpiredUser(self, clock):
+        cache = UserCache(ttl=10, clock=clock)
+        cache.put(create_user('1'))
+
+        clock.now = 10
+
+        assert cache.get('1') is None
+        assert cache.getStats() == dict(hits=0, misses=1, size=0)
+
+    def test_putShouldEvictLeastRecentlyUsedUserBeyondMaxSize(self, clock):
+        cache = UserCache(ttl=10, maxSize=2, clock=clock)
+        cache.put(create_user('1'))
+        cache.put(create_user('2'))
+        cache.get('1')
+
+        cache.put(create_user('3'))
+
+        assert cache.get('2') is None
+        assert cache.get('1') is not None
+        assert cache.get('3') is not None
+
+    def test_pinnedUserShouldNeverExpireNorBeEvicted(self, clock):
+        cache = UserCache(ttl=10, maxSize=1, clock=clock)
+        anonymous = create_user('0')
+        cache.pin(anonymous)
+        cache.put(create_user('1'))
+        cache.put(create_user('2'))
+
+        clock.now = 1000
+
+        assert cache.get('0') is anonymous
+
+    def test_invalidateShouldRemoveUser(self, clock):
+        cache = UserCache(ttl=10, clock=clock)
+        cache.put(create_user('1'))
+        cache.pin(create_user('0'))
+
+        cache.invalidate('1')
+        cache.invalidate('0')
+
+        assert cache.get('1') is None
+        assert cache.get('0') is None
+        assert cache.getStats()['size'] == 0
+
+    def test_putShouldNotCacheUserInvalidatedSinceGenerationWasRead(self, clock):
+        cache = UserCache(ttl=10, clock=clock)
+        generation = cache.getGeneration('1')
+
+        cache.invalidate('1')
+        cache.put(create_user('1'), generation)
+        cache.pin(create_user('1'), generation)
+
+        assert cache.get('1') is None
+
+    def test_putShouldCacheUserWhenGenerationIsCurrent(self, clock):
+        cache = UserCache(ttl=10, clock=clock)
+        cache.invalidate('1')
+        user = create_user('1')
+
+        cache.put(user, cache.getGeneration('1'))
+
+        assert cache.get('1') is user
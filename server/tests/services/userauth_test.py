@@ -8,6 +8,7 @@ import pytest
 import server.exceptions as exceptions
 from server.services.userauth import PasswordService, UserAuthenticationService
 from server.database.filter import PrimitiveFilter
+from server.database.projection import Projection
 import tests.mocks as mocks
 from tests.helpers import create_mock_entity_fromattrs
 
@@ -72,7 +73,9 @@ class TestLogin:
         expectedFilter = PrimitiveFilter.createFilter(dict(
             field='userName', operator='eq', value=[ credentials['userName'] ]
         ))
-        mockRepo.searchUser.assert_called_once_with(expectedFilter)
+        mockRepo.searchUser.assert_called_once_with(
+            expectedFilter, projection=Projection(includeHidden=[ 'password' ])
+        )
 
     def test_loginShouldSetSearchedUserInfoOnSession(self, user_auth):
         credentials = self.DEFAULT_USER_CREDENTIALS
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+This file houses tests for view_counter.py
+"""
+import time
+
+import pytest
+
+from server.services.view_counter import ViewCountAggregator
+import tests.mocks as mocks
+
+
+@pytest.fixture(scope='function')
+def mockRepo():
+    repo = mocks.createMockRepo()
+    repo.incrementThreadViews.return_value = dict(matchedCount=1, updatedCount=1)
+    return repo
+
+
+class TestViewCountAggregator:
+    def test_incrementShouldNotWriteToRepoBeforeFlush(self, mockRepo):
+        counter = ViewCountAggregator(mockRepo, flushSize=100)
+
+        counter.increment('1')
+        counter.increment('1')
+
+        assert mockRepo.incrementThreadViews.call_count == 0
+        assert counter.getPendingCount() == 2
+
+    def test_flushShouldWriteAggregatedCountsAtOnce(self, mockRepo):
+        counter = ViewCountAggregator(mockRepo, flushSize=100)
+        for threadId in [ '1', '2', '1', '3', '1' ]:
+            counter.increment(threadId)
+
+        counter.flush()
+
+        mockRepo.incrementThreadViews.assert_called_once_with({ '1': 3, '2': 1, '3': 1 })
+        assert counter.getPendingCount() == 0
+
+    def test_flushShouldNotWriteToRepoWhenNothingPending(self, mockRepo):
+        counter = ViewCountAggregator(mockRepo)
+
+        assert counter.flush() is None
+        assert mockRepo.incrementThreadViews.call_count == 0
+
+    def test_incrementShouldFlushWhenFlushSizeReached(self, mockRepo):
+        counter = ViewCountAggregator(mockRepo, flushSize=3)
+
+        for threadId in [ '1', '2', '1' ]:
+            counter.increment(threadId)
+
+        mockRepo.incrementThreadViews.assert_called_once_with({ '1': 2, '2': 1 })
+        assert counter.getPendingCount() == 0
+
+    def test_flushShouldKeepCountsWhenRepoFails(self, mockRepo):
+        mockRepo.incrementThreadViews.side_effect = Exception('connection refused')
+        counter = ViewCountAggregator(mockRepo, flushSize=100)
+        counter.increment('1')
+        counter.increment('2')
+
+        counter.flush()
+        counter.increment('1')
+        mockRepo.incrementThreadViews.side_effect = None
+        counter.flush()
+
+        mockRepo.incrementThreadViews.assert_called_with({ '1': 2, '2': 1 })
+
+    def test_stopShouldFlushPendingCounts(self, mockRepo):
+        counter = ViewCountAggregator(mockRepo, flushInterval=60)
+        counter.start()
+        counter.increment('1')
+
+        counter.stop()
+
+        mockRepo.incrementThreadViews.assert_called_once_with({ '1': 1 })
+
+    def test_startShouldFlushPeriodically(self, mockRepo):
+        counter = ViewCountAggregator(mockRepo, flushInterval=0.01)
+        counter.start()
+        try:
+            counter.increment('1')
+            deadline = time.time() + 2
+            while mockRepo.incrementThreadViews.call_count == 0 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            counter.stop()
+
+        mockRepo.incrementThreadViews.assert_called_once_with({ '1': 1 })